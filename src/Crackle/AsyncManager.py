@@ -1,17 +1,34 @@
 __author__ = 'shahab'
 
+import collections
 import itertools
+import logging
 import threading
 import sys
+import time
 from time import sleep
 
+from Crackle.Tracing import span, node_tags
 
-def start_thread_pool(nodes, target_function, join=True, sleep_time=0.000001):
+
+def start_thread_pool(nodes, target_function, join=True, sleep_time=0.000001, max_workers=None):
     threads = []
     results = {}
+    operation = getattr(target_function, "__name__", "task")
+    workers = threading.BoundedSemaphore(max_workers) if max_workers else None
+
+    def traced_function(node, results):
+        if workers is not None:
+            workers.acquire()
+        try:
+            with span(operation, "task", **node_tags(node)):
+                target_function(node, results)
+        finally:
+            if workers is not None:
+                workers.release()
 
     for node in nodes:
-        t = threading.Thread(target=target_function, args=[node, results])
+        t = threading.Thread(target=traced_function, args=[node, results])
         if not join:
             t.daemon = True
         t.start()
@@ -31,6 +48,24 @@ def start_thread_pool(nodes, target_function, join=True, sleep_time=0.000001):
     return ret_val
 
 
+def node_task(target_function, node):
+    """
+    Adapt a function with the signature required by :func:`start_thread_pool` (node, results) to a task of a
+    :class:`TaskGraph`, executed on a single node.
+
+    :param target_function: The function, which stores its result in results[node]
+    :param node: The node
+    :return: The task function, returning the result of target_function
+    """
+
+    def task():
+        results = {}
+        target_function(node, results)
+        return results.get(node, False)
+
+    return task
+
+
 def on_success(result):  # default implementation
     """Called on the result of the function"""
     return result
@@ -83,3 +118,182 @@ class Async(object):
         thread = self.threadfactory(None, func_wrapper, name)
         thread.start()
         return thread
+
+
+class Task:
+    """
+    A task of a :class:`TaskGraph`.
+
+    :ivar name: The name of the task
+    :ivar function: The function executing the task. It returns True if the task succeeds
+    :ivar dependencies: The names of the tasks that have to succeed before this task starts
+    :ivar tags: Additional information recorded in the trace of the task (e.g. node, server)
+    :ivar result: True if the task succeeded, False if it failed, None if it did not run
+    :ivar start_time: When the task started
+    :ivar end_time: When the task ended
+    """
+
+    def __init__(self, name, function, dependencies, tags=None):
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.tags = tags or {}
+        self.result = None
+        self.start_time = None
+        self.end_time = None
+
+    def get_duration(self):
+        """
+        :return: The duration of the task in seconds, or 0 if it did not run
+        """
+        return self.end_time - self.start_time if self.end_time is not None else 0
+
+    def __str__(self):
+        return self.name
+
+
+class TaskGraph:
+    """
+    A set of tasks with dependencies among them (a DAG), executed in parallel: each task runs in its own thread as
+    soon as all its dependencies succeed. If a task fails, the tasks depending on it do not run.
+
+    After the execution, :meth:`critical_path` returns the chain of tasks that determined the total duration.
+
+    :ivar tasks: The map name => :class:`Task`, in insertion order
+    :ivar max_workers: The maximum number of tasks running at the same time (None means no limit)
+    """
+
+    def __init__(self, max_workers=None):
+        self.tasks = collections.OrderedDict()
+        self.max_workers = max_workers
+        self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
+
+    def add_task(self, name, function, dependencies=(), **tags):
+        """
+        Add a task to the graph.
+
+        :param name: The name of the task. The part before ":" is the name of the operation in the trace
+        :param function: The function executing the task, without arguments. It returns True if the task succeeds
+        :param dependencies: The names of the tasks that have to succeed before this task starts
+        :param tags: Additional information recorded in the trace of the task (e.g. node, server)
+        :return: The name of the task
+        :raise: RuntimeError if a dependency is not in the graph
+        """
+
+        for dependency in dependencies:
+            if dependency not in self.tasks:
+                raise RuntimeError("Task {0} depends on unknown task {1}".format(name, dependency))
+
+        self.tasks[name] = Task(name, function, dependencies, tags)
+
+        return name
+
+    def run(self):
+        """
+        Execute the tasks.
+
+        :return: True if all the tasks succeeded, False otherwise
+        """
+
+        condition = threading.Condition()
+        completed = []
+        waiting = {name: len(task.dependencies) for name, task in self.tasks.items()}
+        dependents = collections.defaultdict(list)
+
+        for task in self.tasks.values():
+            for dependency in task.dependencies:
+                dependents[dependency].append(task)
+
+        def execute(task):
+            task.start_time = time.time()
+            with span(task.name.split(":")[0], "task", **task.tags):
+                try:
+                    result = bool(task.function())
+                except Exception as error:
+                    self.logger.error("Task {0} failed. Error: {1}".format(task, error))
+                    result = False
+            task.end_time = time.time()
+
+            with condition:
+                task.result = result
+                completed.append(task)
+                condition.notify()
+
+        def launch(task):
+            t = threading.Thread(target=execute, args=[task], name=task.name)
+            t.daemon = True
+            t.start()
+
+        ready = collections.deque(task for task in self.tasks.values() if not task.dependencies)
+        running = 0
+
+        with condition:
+            while ready or running:
+                while ready and (self.max_workers is None or running < self.max_workers):
+                    launch(ready.popleft())
+                    running += 1
+
+                condition.wait()
+
+                while completed:
+                    task = completed.pop()
+                    running -= 1
+
+                    if not task.result:
+                        self.logger.error("Task {0} failed after {1:.2f}s".format(task, task.get_duration()))
+                        continue
+
+                    self.logger.debug("Task {0} completed in {1:.2f}s".format(task, task.get_duration()))
+
+                    for dependent in dependents[task.name]:
+                        waiting[dependent.name] -= 1
+                        if not waiting[dependent.name]:
+                            ready.append(dependent)
+
+        return all(task.result for task in self.tasks.values())
+
+    def failed_tasks(self):
+        """
+        :return: The list of the tasks that failed or did not run in the last execution
+        """
+
+        return [task for task in self.tasks.values() if not task.result]
+
+    def critical_path(self):
+        """
+        Compute the critical path of the last execution: starting from the last task that ended, each task of the path
+        is preceded by the dependency that ended last.
+
+        :return: The list of the tasks in the critical path
+        """
+
+        executed = [task for task in self.tasks.values() if task.end_time is not None]
+
+        if not executed:
+            return []
+
+        task = max(executed, key=lambda t: t.end_time)
+        path = [task]
+
+        while task.dependencies:
+            task = max((self.tasks[name] for name in task.dependencies), key=lambda t: t.end_time or 0)
+            path.append(task)
+
+        return list(reversed(path))
+
+    def report(self):
+        """
+        Describe the critical path of the last execution.
+
+        :return: A string with the tasks in the critical path, their duration and the total duration
+        """
+
+        path = self.critical_path()
+
+        if not path:
+            return "No task executed."
+
+        return "Critical path: {0}. Total: {1:.2f}s".format(" -> ".join("{0} ({1:.2f}s)".format(task,
+                                                                                            task.get_duration())
+                                                                        for task in path),
+                                                            path[-1].end_time - path[0].start_time)
@@ -0,0 +1,182 @@
+"""
+This module pushes all the files needed by the containers of a server (the NFD configuration file and the link and
+routing scripts) in a single **bundle**, instead of one HTTPS request to LXD for each file of each container.
+
+A bundle is a compressed tar archive containing:
+
+    - **blobs/<sha1>**: the content of each distinct file, stored once per server. The NFD configuration file, that is
+      the same for all the containers, is therefore transferred once for each server instead of once for each node
+    - **deploy.sh**: the script that copies each blob in the right containers with *lxc file push*
+
+The archive is streamed to the server through a single SSH connection, that also extracts and deploys it. Since
+*lxc file push* works on stopped containers too, the bundle can be deployed as soon as the containers are created.
+
+The deploy script runs *sudo lxc file push* on the server, like the other commands sent through SSH use sudo: the
+remote user (Globals.username) needs passwordless sudo, and the lxc client of root must reach the local LXD daemon
+(the default). The user does not need to be in the lxd group.
+
+The files deployed are recorded in the manifest of each container (see :mod:`Crackle.Manifest`), so that the
+operations that push a single file skip it when the same content has already been deployed with a bundle.
+"""
+
+import io
+import logging
+import subprocess
+import tarfile
+
+import Crackle.Globals as Globals
+import Crackle.Constants as Constants
+from Crackle import Manifest
+from Crackle.Tracing import TracedPopen
+
+module_logger = logging.getLogger(__name__)
+
+# Directory where the bundles are extracted on the servers (experiment id, name of the bundle)
+__bundle_dir__ = "/tmp/crackle-bundle-{0}-{1}"
+
+# Permissions of the deployed files, as for :func:`Crackle.LxdAPI.push_file`
+__file_mode__ = "0700"
+
+
+def container_name(node):
+    """
+    :param node: The node
+    :return: The name of the container of the node
+    """
+
+    return node.container.name
+
+
+class ServerBundle:
+    """
+    The files to deploy in the containers of a server.
+
+    :ivar server: The server
+    :ivar name: The name of the bundle, unique among the bundles of the server
+    :ivar blobs: The distinct contents of the files (sha1 => content)
+    :ivar files: The files to deploy, as a list of (node, path in the container, sha1)
+    """
+
+    def __init__(self, server, name="0"):
+        self.server = server
+        self.name = name
+        self.blobs = {}
+        self.files = []
+
+    def add(self, node, path, content):
+        """
+        Add a file to deploy in the container of a node.
+
+        :param node: The node
+        :param path: The absolute path of the file inside the container
+        :param content: The content of the file, as bytes or string
+        """
+
+        if isinstance(content, str):
+            content = content.encode()
+
+        key = Manifest.digest(content)
+        self.blobs.setdefault(key, content)
+        self.files.append((node, path, key))
+
+    def deploy_script(self):
+        """
+        :return: The script that copies the blobs in the containers, as a string
+        """
+
+        lines = ["#!/bin/sh", "set -e", "cd \"$(dirname \"$0\")\""]
+        lines.extend("sudo lxc file push --uid=0 --gid=0 --mode={0} blobs/{1} {2}{3}".format(__file_mode__,
+                                                                                            key,
+                                                                                            container_name(node),
+                                                                                            path)
+                     for node, path, key in self.files)
+
+        return "\n".join(lines) + "\n"
+
+    def archive(self):
+        """
+        :return: The compressed tar archive with the blobs and the deploy script, as bytes
+        """
+
+        buffer = io.BytesIO()
+
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            entries = [("blobs/" + key, content) for key, content in self.blobs.items()]
+            entries.append(("deploy.sh", self.deploy_script().encode()))
+
+            for name, content in entries:
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                info.mode = 0o700
+                tar.addfile(info, io.BytesIO(content))
+
+        return buffer.getvalue()
+
+    def size(self):
+        """
+        :return: The total size of the distinct files, in bytes
+        """
+
+        return sum(len(content) for content in self.blobs.values())
+
+
+def build_bundles(nodes, files, name="0"):
+    """
+    Group the files of the nodes in one bundle for each server.
+
+    :param nodes: The nodes
+    :param files: The function returning the list of files (path in the container, content) of a node
+    :param name: The name of the bundles
+    :return: The dictionary server => :class:`ServerBundle`
+    """
+
+    bundles = {}
+
+    for node in nodes:
+        server = node.get_server()
+        bundle = bundles.get(server)
+
+        if bundle is None:
+            bundle = bundles[server] = ServerBundle(server, name)
+
+        for path, content in files(node):
+            bundle.add(node, path, content)
+
+    return bundles
+
+
+def push_bundle(bundle):
+    """
+    Stream a bundle to its server, extract it and deploy the files in the containers, with a single SSH connection.
+
+    :param bundle: The :class:`ServerBundle`
+    :return: True if all the files have been deployed, False otherwise
+    """
+
+    if not bundle.files:
+        return True
+
+    directory = __bundle_dir__.format(Globals.experiment_id, bundle.name)
+    archive = bundle.archive()
+
+    params = ["ssh",
+              "-i",
+              Constants.ssh_client_private_key,
+              "{0}@{1}".format(Globals.username, bundle.server),
+              "rm -rf {0} && mkdir -p {0} && tar -xz -C {0} && sh {0}/deploy.sh && rm -rf {0}".format(directory)]
+
+    p = TracedPopen(params, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, error = p.communicate(archive)
+
+    if p.returncode:
+        module_logger.error("[{0}] Error deploying the bundle. Error: {1}".format(bundle.server,
+                                                                                error.decode(errors="replace")))
+        return False
+
+    for node, path, key in bundle.files:
+        Manifest.record(container_name(node), path, key)
+
+    module_logger.info("[{0}] Bundle deployed: {1} files, {2} distinct ({3} bytes, {4} compressed)".format(
+            bundle.server, len(bundle.files), len(bundle.blobs), bundle.size(), len(archive)))
+
+    return True
@@ -34,19 +34,23 @@ The syntax of this file is the following (example)::
 import logging
 import os
 import subprocess
+import threading
 from itertools import cycle
-from random import randint
 
-from Crackle.LxcUtils import AddressGenerator, __router_network__, __gre_endpoints_network__
+import Crackle.LxcUtils as LxcUtils
+import Crackle.LxdAPI as LxdAPI
+import Crackle.Placement as Placement
+from Crackle.LxcUtils import AddressGenerator, __gre_endpoints_network__
 
 import requests
 from requests import exceptions as req_except
 
 from Crackle import Constants
 from Crackle import Globals
-from Crackle.AsyncManager import start_thread_pool
+from Crackle.AsyncManager import start_thread_pool, TaskGraph
 from Crackle.ColoredOutput import make_colored
 from Crackle.Constants import __CERTIFICATE__
+from Crackle.Tracing import TracedPopen
 from Crackle.LxcUtils import create_router_image
 
 module_logger = logging.getLogger(__name__)
@@ -81,7 +85,7 @@ def generate_certificate(client_cert_path, client_key_path):
               "/CN=www.cisco.com/L=Paris/O=Cisco/C=FR",
               "-nodes"]
 
-    p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+    p = TracedPopen(params, stdout=subprocess.DEVNULL)
 
     if p.wait():
         module_logger.error("Error generating the client cert.")
@@ -112,7 +116,7 @@ def generate_key_pair(ssh_client_private_key):
               "-P",
               ""]
 
-    p = subprocess.Popen(params)
+    p = TracedPopen(params)
 
     if p.wait():
         module_logger.error("Impossible to create the RSA key. Say bye bye to passwordless ssh.")
@@ -122,6 +126,44 @@ def generate_key_pair(ssh_client_private_key):
         module_logger.info("RSA key successfully generated.")
 
 
+class ServerResources:
+    """
+    This class describes the resources available on a server when the experiment is set up, as reported by the LXD
+    daemon. The containers already running on the server (e.g. the ones of other experiments) reduce the number of
+    containers that the server can still host.
+
+    :ivar cpus: The number of CPU threads of the server
+    :ivar memory_total: The total memory of the server, in bytes
+    :ivar memory_used: The memory in use on the server, in bytes
+    :ivar containers: The number of containers running on the server
+    """
+
+    def __init__(self, cpus, memory_total, memory_used, containers):
+        self.cpus = cpus
+        self.memory_total = memory_total
+        self.memory_used = memory_used
+        self.containers = containers
+
+    def get_capacity(self):
+        """
+        Compute how many new containers the server can host, given that each container needs
+        Globals.container_memory MB of memory and that each CPU thread can run Globals.containers_per_cpu containers.
+
+        :return: The number of new containers the server can host
+        """
+
+        cpu_capacity = self.cpus * float(Globals.containers_per_cpu) - self.containers
+        memory_capacity = (self.memory_total - self.memory_used) / (float(Globals.container_memory) * 1024 * 1024)
+
+        return max(0, int(min(cpu_capacity, memory_capacity)))
+
+    def __str__(self):
+        return "cpus={0} memory={1}/{2}MB containers={3}".format(self.cpus,
+                                                                 self.memory_used // (1024 * 1024),
+                                                                 self.memory_total // (1024 * 1024),
+                                                                 self.containers)
+
+
 class Server:
     """
     This class describes a physical server that has to be used for the experiment.
@@ -130,14 +172,19 @@ class Server:
     :ivar interface: The name of the interface of this server that will be used for inter-server communication
     :ivar ip_address: The IP address of the server
     :ivar container_gateway: The default gateway for the containers that will be instantiated on this server
+    :ivar tunnel_endpoint: The IP address of the tunnel endpoint on this server
+    :ivar capacity: The maximum number of containers this server can host, as configured (None if unknown)
+    :ivar resources: The :class:`ServerResources` of this server (None if unknown)
     """
-    def __init__(self, hostname, interface, ip_address, container_gateway, tunnel_endpoint):
+    def __init__(self, hostname, interface, ip_address, container_gateway, tunnel_endpoint, capacity=None):
 
         self.hostname = hostname
         self.interface = interface
         self.ip_address = ip_address
         self.container_gateway = container_gateway
         self.tunnel_endpoint = tunnel_endpoint
+        self.capacity = capacity
+        self.resources = None
 
     def get_hostname(self):
         """
@@ -177,6 +224,38 @@ class Server:
         """
         return self.tunnel_endpoint
 
+    def get_capacity(self):
+        """
+        Get the maximum number of containers this server can host: the lowest between the configured capacity and the
+        capacity computed from the resources of the server
+        :return: the maximum number of containers, or None if it is not known
+        """
+        capacities = [c for c in (self.capacity, self.resources.get_capacity() if self.resources else None)
+                      if c is not None]
+
+        return min(capacities) if capacities else None
+
+    def set_capacity(self, capacity):
+        """
+        Set the maximum number of containers this server can host
+        :param capacity: the maximum number of containers, or None if it is not known
+        """
+        self.capacity = capacity
+
+    def get_resources(self):
+        """
+        Get the resources of this server
+        :return: the :class:`ServerResources` of this server, or None if they are not known
+        """
+        return self.resources
+
+    def set_resources(self, resources):
+        """
+        Set the resources of this server
+        :param resources: the :class:`ServerResources` of this server
+        """
+        self.resources = resources
+
     def __str__(self):
 
         return self.hostname
@@ -199,21 +278,28 @@ class ClusterManager:
         list_server_names = Globals.server_names.split(",")
         list_interfaces = Globals.interfaces.split(",")
         list_ip_addresses = Globals.ip_addresses.split(",")
+        list_capacities = [int(float(c)) if c.strip() else None for c in str(Globals.server_capacities).split(",")]
+        list_capacities += [None] * (len(list_server_names) - len(list_capacities))
         self.username = Globals.username
         self.lxd_password = Globals.lxd_password
         self.lxd_port = int(Globals.lxd_port)
         self.node_list = node_list
 
         self.server_list = []
+        self.password_lock = threading.Lock()
 
         self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
 
-        for server, interface, ip in zip(list_server_names, list_interfaces, list_ip_addresses):
+        for server, interface, ip, capacity in zip(list_server_names,
+                                                   list_interfaces,
+                                                   list_ip_addresses,
+                                                   list_capacities):
             self.server_list.append(Server(server,
                                            interface,
                                            ip,
-                                           AddressGenerator.get_ip_address(__router_network__),
-                                           AddressGenerator.get_ip_address(__gre_endpoints_network__)))
+                                           AddressGenerator.get_ip_address(LxcUtils.__router_network__),
+                                           AddressGenerator.get_ip_address(__gre_endpoints_network__),
+                                           capacity))
 
     def get_server_list(self):
         """
@@ -234,69 +320,48 @@ class ClusterManager:
             - Configure the connections between the OpenVirtualSwitches
             - Create the base router image, if it has not been created yet.
 
+        The operations are the tasks of a :class:`Crackle.AsyncManager.TaskGraph`: the operations on different servers
+        run in parallel, and each operation starts as soon as the ones it depends on are completed (e.g. the bridge of
+        a server is configured as soon as the SSH key is installed on that server).
+
         :return: True if the setup successes, False otherwise
         """
-        
-        try:
-            if self.install_lxd_key():
-                self.logger.debug("LXD client certificate installed on the servers.")
-            else:
-                self.logger.error("Error installing LXD certificate on the servers")
-                return False
 
-            if self.install_ssh_key():
-                self.logger.debug("SSH public key installed on the servers.")
-            else:
-                self.logger.error("Error installing SSH public key on the servers")
-                return False
+        graph = TaskGraph()
 
-            if create_router_image():
-                self.logger.debug("Router image created on {0}".format(Globals.image_server))
-            else:
-                self.logger.error("Error creating base router image on {0}".format(Globals.image_server))
-                return False
+        graph.add_task("client-certificate", self.generate_client_certificate)
+        graph.add_task("ssh-key-pair", self.generate_ssh_key_pair)
 
-            if self.assign_servers():
-                self.logger.debug("ICN nodes correctly assigned to the servers.")
-            else:
-                self.logger.error("Error assigning the nodes to the servers")
-                return False
+        lxd_keys = [graph.add_task("lxd-key:{0}".format(server),
+                                   lambda server=server: self.install_server_lxd_key(server),
+                                   ["client-certificate"],
+                                   server=server.get_hostname())
+                    for server in self.server_list]
 
-            if self.configure_lxd_br_tunnel():
-                self.logger.debug("Bridge {0} configured on the cluster {1}".format(Constants.LXD_BRIDGE,
-                                                                                    self.server_list))
-            else:
-                self.logger.error("Error configuring bridge {0} on the servers {1}".format(Constants.LXD_BRIDGE,
-                                                                                           self.server_list))
-                return False
+        for server in self.server_list:
+            ssh_key = graph.add_task("ssh-key:{0}".format(server),
+                                     lambda server=server: self.install_server_ssh_key(server),
+                                     ["ssh-key-pair"],
+                                     server=server.get_hostname())
+            graph.add_task("bridge:{0}".format(server),
+                           lambda server=server: self.configure_server_lxd_br_tunnel(server),
+                           [ssh_key],
+                           server=server.get_hostname())
 
-                # if self.install_ns3_script():
-                #     self.logger.debug("NS3 script installed on servers {0}".format(self.server_list))
-                # else:
-                #     self.logger.error("Error installing ns3 script on the servers {0}".format(self.server_list))
-                #     return False
-        except req_except.ConnectionError as conn_err:
-            self.logger.error("Error connecting to the server {0}. "
-                              "Error: {1}".format(Globals.image_server,
-                                                    conn_err))
-            return False
-        except req_except.Timeout as timeout_error:
-            self.logger.error("Timeout connecting to the server {0}. "
-                              "Error: {1}".format(Globals.image_server,
-                                                  timeout_error))
-            return False
-        except req_except.TooManyRedirects as red_err:
-            self.logger.error("Error connecting to the server {0}. "
-                              "Error: {1}".format(Globals.image_server,
-                                                  red_error))
-            return False
-        except req_except.RequestException as error:
-            self.logger.error("Error connecting to the server {0}. "
-                              "Error: {1}".format(Globals.image_server,
-                                                  error))
-            return False
-        
-        return True
+        graph.add_task("router-image", create_router_image, lxd_keys)
+        graph.add_task("placement", self.assign_servers, lxd_keys)
+
+        result = graph.run()
+
+        self.logger.info("Cluster setup. {0}".format(graph.report()))
+        print(make_colored("blue", graph.report()))
+
+        for task in graph.tasks.values():
+            if not task.result:
+                self.logger.error("Cluster setup: task {0} {1}".format(task, "failed" if task.result is False
+                                                                       else "not executed"))
+
+        return result
 
     def install_ns3_script(self):
         """
@@ -315,7 +380,7 @@ class ClusterManager:
                                                       Globals.home_folder,
                                                       Globals.ns3_folder)]
 
-            p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+            p = TracedPopen(params, stdout=subprocess.DEVNULL)
 
             if p.wait():
                 self.logger.error("[{0}] Error copying the ns3 script.".format(server))
@@ -330,7 +395,7 @@ class ClusterManager:
                       "{0}@{1}".format(self.username, server),
                       "cd {0}{1} && ./waf".format(Globals.home_folder, Globals.ns3_folder)]
 
-            p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+            p = TracedPopen(params, stdout=subprocess.DEVNULL)
 
             if p.wait():
                 self.logger.error("[{0}] Error compiling ns3 script.".format(server))
@@ -352,108 +417,117 @@ class ClusterManager:
         """
 
         def setup_lxdbr(server, results):
+            results[server] = self.configure_server_lxd_br_tunnel(server)
 
-            params = ["ssh",
-                      "-i",
-                      Constants.ssh_client_private_key,
-                      "{0}@{1}".format(self.username, server),
-                      "sudo ovs-vsctl --if-exists del-br {0} && "
-                      "sudo ovs-vsctl --may-exist add-br {0}".format(Constants.LXD_BRIDGE)]
+        return start_thread_pool(self.server_list, setup_lxdbr)
 
-            p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+    def check_server_namespace(self, server):
+        """
+        Check that the router network and the GRE network of the experiment (see :class:`Crackle.LxcUtils.AddressPlan`)
+        are not configured on the server by another experiment.
 
-            if p.wait():
-                self.logger.error("[{0}] Error creating the LXD bridge {1}.".format(server,
-                                                                                    Constants.LXD_BRIDGE))
-                results[server] = False
-                return
-            else:
-                self.logger.debug("[{0}] LXD bridge {1} successfully created".format(server,
-                                                                                     Constants.LXD_BRIDGE))
+        :param server: The server to check
+        :return: True if the networks are free, False otherwise
+        """
 
-            params = ["ssh",
-                      "-i",
-                      Constants.ssh_client_private_key,
-                      "{0}@{1}".format(self.username, server),
-                      "sudo ip link set {0} up && "
-                      "sudo ovs-vsctl --may-exist add-port {1} {2} tag={3} -- "
-                      "set Interface {2} type=internal && "
-                      "sudo sysctl fs.inotify.max_user_instances=512 && "
-                      "sudo ovs-vsctl --may-exist add-port {1} {4} -- "
-                      "set interface {4} type=internal && "
-                      "sudo ip addr add {5}/16 brd + dev {4} && "
-                      "sudo ip addr add {7}/16 brd + dev {2} && "
-                      "sudo ip link set {4} up && "
-                      "sudo ip link set {2} up && "
-                      # "sudo iptables -t nat -F POSTROUTING && "
-                      "sudo iptables -t nat -A POSTROUTING -o {0} -s {6}"
-                      " ! -d {6} -j MASQUERADE".format(server.get_interface(),
-                                                       Constants.LXD_BRIDGE,
-                                                       __default_gateway_interface__.format(Globals.experiment_id),
-                                                       Constants.router_vlan,
-                                                       __tunnel_endpoint__.format(Globals.experiment_id),
-                                                       server.get_tunnel_endpoint(),
-                                                       __router_network__,
-                                                       server.get_container_gateway())]
-
-            p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+        plan = AddressGenerator.plan
+        own_interfaces = (__default_gateway_interface__.format(Globals.experiment_id),
+                          __tunnel_endpoint__.format(Globals.experiment_id))
 
-            if p.wait():
-                self.logger.error("[{0}] Error setting interface {1} up. Params: {2}".format(server,
-                                                                                             server.get_interface(),
-                                                                                             params))
-                results[server] = False
-                return
-            else:
-                self.logger.debug(
-                    "[{0}] Interface {1} set up. Params: {2}".format(server, server.get_interface(), params))
-
-            for serv in [s for s in self.server_list if s.get_hostname() != server.get_hostname()]:
-                params = ["ssh",
-                          "-i",
-                          Constants.ssh_client_private_key,
-                          "{0}@{1}".format(self.username, server),
-                          "sudo ovs-vsctl --if-exists del-port {0} {1} && "
-                          "sudo ovs-vsctl --may-exist add-port {0} {1} -- "
-                          "set interface {1} type=gre "
-                          "options:remote_ip={2} options:local_ip={3} && "
-                          "sudo ip route add {2}/32 dev {4}".format(Constants.LXD_BRIDGE,
-                                                                    __gre_port__.format(serv.get_tunnel_endpoint()),
-                                                                    serv.get_tunnel_endpoint(),
-                                                                    server.get_tunnel_endpoint(),
-                                                                    server.get_interface())]
-
-                p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
-
-                if p.wait():
-                    self.logger.error("[{0}] Error adding interface {1} to bridge {2}. Params = {3}".format(server,
-                                                                                                     server.get_interface(),
-                                                                                                     Constants.LXD_BRIDGE,
-                                                                                                     params))
-                    results[server] = False
-                    return
-                else:
-                    self.logger.debug("[{0}] Interface {1} correctly added to {2}".format(server,
-                                                                                      server.get_interface(),
-                                                                                      Constants.LXD_BRIDGE))
+        params = ["ssh",
+                  "-i",
+                  Constants.ssh_client_private_key,
+                  "{0}@{1}".format(self.username, server),
+                  "ip -o addr show to {0} && ip -o addr show to {1}".format(plan.router_network, plan.gre_network)]
 
-            params = ["ssh",
-                      "-i",
-                      Constants.ssh_client_private_key,
-                      "{0}@{1}".format(self.username, server),
-                      "sudo sysctl -w net.ipv4.ip_forward=1"]
+        p = TracedPopen(params, stdout=subprocess.PIPE, universal_newlines=True)
+        output, _ = p.communicate()
 
-            p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+        if p.returncode:
+            self.logger.error("[{0}] Error reading the addresses of the server. Params: {1}".format(server, params))
+            return False
 
-            if p.wait():
-                self.logger.error("[{0}] Error enabling sysctl.".format(server))
-                results[server] = False
-                return
-            else:
-                self.logger.debug("[{0}] Sysctl for IP forwarding enabled".format(server))
-                results[server] = True
+        # Each line is "<index>: <interface> inet <address> ..."
+        used = {line.split()[1].split("@")[0] for line in output.splitlines() if len(line.split()) > 1}
+        used.difference_update(own_interfaces)
 
-        return start_thread_pool(self.server_list, setup_lxdbr)
+        if used:
+            self.logger.error("[{0}] The networks {1} and {2} of the experiment are already used by the interfaces {3}"
+                              .format(server, plan.router_network, plan.gre_network, sorted(used)))
+            print(make_colored("red", "[{0}] The networks {1} and {2} of the experiment {3} are already used by "
+                                      "another experiment. Please choose another experiment id.".format(
+                                          server, plan.router_network, plan.gre_network, Globals.experiment_id)))
+            return False
+
+        return True
+
+    def configure_server_lxd_br_tunnel(self, server):
+        """
+        Configure the open virtual switch of a server: create the bridge and its internal ports, add a GRE port toward
+        each one of the other servers and enable IP forwarding. All the commands are sent with a single SSH call.
+        The setup fails if the networks of the experiment are used by another experiment
+        (see :meth:`check_server_namespace`).
+
+        :param server: The server to configure
+        :return: True if the setup succeeds, False otherwise
+        """
+
+        if not self.check_server_namespace(server):
+            return False
+
+        commands = ["sudo ovs-vsctl --if-exists del-br {0}".format(Constants.LXD_BRIDGE),
+                    "sudo ovs-vsctl --may-exist add-br {0}".format(Constants.LXD_BRIDGE),
+                    "sudo ip link set {0} up".format(server.get_interface()),
+                    "sudo ovs-vsctl --may-exist add-port {0} {1} tag={2} -- "
+                    "set Interface {1} type=internal".format(Constants.LXD_BRIDGE,
+                                                             __default_gateway_interface__.format(Globals.experiment_id),
+                                                             Constants.router_vlan),
+                    "sudo sysctl fs.inotify.max_user_instances=512",
+                    "sudo ovs-vsctl --may-exist add-port {0} {1} -- "
+                    "set interface {1} type=internal".format(Constants.LXD_BRIDGE,
+                                                             __tunnel_endpoint__.format(Globals.experiment_id)),
+                    "sudo ip addr add {0}/24 brd + dev {1}".format(server.get_tunnel_endpoint(),
+                                                                   __tunnel_endpoint__.format(Globals.experiment_id)),
+                    "sudo ip addr add {0}/16 brd + dev {1}".format(server.get_container_gateway(),
+                                                                   __default_gateway_interface__.format(
+                                                                       Globals.experiment_id)),
+                    "sudo ip link set {0} up".format(__tunnel_endpoint__.format(Globals.experiment_id)),
+                    "sudo ip link set {0} up".format(__default_gateway_interface__.format(Globals.experiment_id)),
+                    "sudo iptables -t nat -A POSTROUTING -o {0} -s {1}"
+                    " ! -d {1} -j MASQUERADE".format(server.get_interface(),
+                                                     LxcUtils.__router_network__)]
+
+        for serv in [s for s in self.server_list if s.get_hostname() != server.get_hostname()]:
+            commands.append("sudo ovs-vsctl --if-exists del-port {0} {1} && "
+                            "sudo ovs-vsctl --may-exist add-port {0} {1} -- "
+                            "set interface {1} type=gre "
+                            "options:remote_ip={2} options:local_ip={3} && "
+                            "sudo ip route add {2}/32 dev {4}".format(Constants.LXD_BRIDGE,
+                                                                      __gre_port__.format(serv.get_tunnel_endpoint()),
+                                                                      serv.get_tunnel_endpoint(),
+                                                                      server.get_tunnel_endpoint(),
+                                                                      server.get_interface()))
+
+        commands.append("sudo sysctl -w net.ipv4.ip_forward=1")
+
+        params = ["ssh",
+                  "-i",
+                  Constants.ssh_client_private_key,
+                  "{0}@{1}".format(self.username, server),
+                  " && ".join(commands)]
+
+        p = TracedPopen(params, stdout=subprocess.DEVNULL)
+
+        if p.wait():
+            self.logger.error("[{0}] Error configuring the LXD bridge {1}. Params: {2}".format(server,
+                                                                                              Constants.LXD_BRIDGE,
+                                                                                              params))
+            return False
+        else:
+            self.logger.debug("[{0}] LXD bridge {1} configured with {2} GRE ports".format(server,
+                                                                                         Constants.LXD_BRIDGE,
+                                                                                         len(self.server_list) - 1))
+            return True
 
     def install_lxd_key(self):
         """
@@ -463,7 +537,22 @@ class ClusterManager:
         :return: True if the certificate uploading succeeds, False otherwise
         """
 
-        # First: check if the certificate exist, otherwise generate a new one:
+        if not self.generate_client_certificate():
+            return False
+
+        # Install LXD certificate on each one of the servers
+
+        def install_cert(server, results):
+            results[server] = self.install_server_lxd_key(server)
+
+        return start_thread_pool(self.server_list, install_cert)
+
+    def generate_client_certificate(self):
+        """
+        Generate the LXD client certificate, if it does not exist yet.
+
+        :return: True if the certificate exists or it has been created, False otherwise
+        """
 
         if not (os.path.isfile(Constants.lxd_client_cert_path) or os.path.isfile(Constants.lxd_client_key_path)):
             self.logger.info("No client certificate found. Generating a new one.")
@@ -474,63 +563,124 @@ class ClusterManager:
                 self.logger.error("Error creating certificate for client.")
                 return False
 
-        # Install LXD certificate on each one of the servers
+        return True
 
-        def install_cert(server, results):
+    def install_server_lxd_key(self, server):
+        """
+        Upload the LXD client certificate on a server.
 
-            request = {
-                "type": "client",
-                "password": self.lxd_password
-            }
+        :param server: The server
+        :return: True if the certificate uploading succeeds, False otherwise
+        """
+
+        request = {
+            "type": "client",
+            "password": self.lxd_password
+        }
+
+        url = "{0}{1}{2}{3}{4}".format("https://",
+                                       server,
+                                       ":",
+                                       self.lxd_port,
+                                       __CERTIFICATE__)
+        try:
+            resp = requests.post(url=url,
+                                 json=request,
+                                 cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                 verify=False)
+
+            resp.raise_for_status()
+        except req_except.HTTPError as http_error:
+            # The server answers with an error also when the certificate is already trusted
+            self.logger.warning("Error registering client certificate on LXD"
+                                " server {0}. Error: {1}".format(server,
+                                                                 http_error))
+        except req_except.RequestException as error:
+            self.logger.error("Error connecting to the LXD server {0}. Error: {1}".format(server, error))
+            return False
+
+        return True
 
-            url = "{0}{1}{2}{3}{4}".format("https://",
-                                           server,
-                                           ":",
-                                           self.lxd_port,
-                                           __CERTIFICATE__)
+    def collect_resources(self):
+        """
+        Retrieve the CPUs, the memory and the number of running containers of each server from the LXD daemon, in
+        order to use them as capacity constraints for the placement. If the resources of a server cannot be
+        retrieved, its capacity is the configured one.
+
+        :return: True if the resources of all the servers have been retrieved, False otherwise
+        """
+
+        def get_resources(server, results):
             try:
-                resp = requests.post(url=url,
-                                     json=request,
-                                     cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                                     verify=False)
-
-                resp.raise_for_status()
-            except req_except.HTTPError as http_error:
-                self.logger.error("Error registering client certificate on LXD"
-                                  " server {0}. Error: {1}".format(server,
-                                                                   http_error.strerror))
+                resources = LxdAPI.get_resources(server.get_hostname())
+                containers = LxdAPI.list_containers(server.get_hostname())
+
+                server.set_resources(ServerResources(int(resources["cpu"]["total"]),
+                                                     int(resources["memory"]["total"]),
+                                                     int(resources["memory"]["used"]),
+                                                     len([c for c in containers
+                                                          if c.get(Constants.__status__) == Constants.__running__])))
+
+                self.logger.info("[{0}] Resources: {1}. Capacity: {2} containers".format(server,
+                                                                                        server.get_resources(),
+                                                                                        server.get_capacity()))
+                results[server] = True
+            except (RuntimeError, KeyError, TypeError, ValueError, req_except.RequestException) as error:
+                self.logger.warning("[{0}] Error retrieving the resources of the server. "
+                                    "Error: {1}".format(server, error))
                 results[server] = False
-                # return
 
-            results[server] = True
-
-        return start_thread_pool(self.server_list, install_cert)
+        return start_thread_pool(self.server_list, get_resources)
 
     def assign_servers(self, node=None):
         """
-        This function assign each container to a certain server in the cluster. The containers are evenly distributed
-        over the servers.
-
-        :param node_list: The list of nodes. Each node is a container
-        :return:
+        This function assign each container to a certain server in the cluster. By default (Globals.placement_algorithm
+        is round_robin) the containers are evenly distributed over the servers. If Globals.placement_algorithm is
+        partition, the topology is partitioned over the servers in order to minimize the traffic crossing the GRE
+        tunnels, while keeping the number of containers of each server proportional to its capacity (see
+        :mod:`Crackle.Placement`). In this case, if Globals.resource_aware_placement is set, the capacity of each
+        server is limited by its free CPUs and memory.
+
+        :param node: If set, assign only this node, added to the running experiment
+        :return: True if the nodes have been assigned, False otherwise
         """
         if not node:
-            servers = cycle(self.server_list)
-            node_server_file = open(Constants.node_server_file, "w")
+            if Globals.placement_algorithm == "round_robin":
+                assignment = dict(zip(self.node_list.keys(), cycle(self.server_list)))
+            else:
+                if Globals.resource_aware_placement and not self.collect_resources():
+                    print(make_colored("yellow", "Resources of some servers not available. "
+                                                 "Using the configured capacities for them."))
+
+                try:
+                    placement = Placement.place(self.node_list, self.server_list)
+                except RuntimeError as error:
+                    self.logger.error("Error placing the nodes on the servers: {0}".format(error))
+                    print(make_colored("red", "Error placing the nodes on the servers: {0}".format(error)))
+                    return False
 
-            for node, server in zip(self.node_list.values(), servers):
-                node.set_server(server)
-                node_server_file.write("{0} {1}".format(node, server))
+                assignment = placement.assignment
+                print(make_colored("blue", "Placement: {0}".format(placement)))
 
-            node_server_file.close()
+            with open(Constants.node_server_file, "w") as node_server_file:
+                for node_id, server in assignment.items():
+                    self.node_list[node_id].set_server(server)
+                    node_server_file.write("{0} {1}\n".format(node_id, server))
 
             return True
         else:
-            node.set_server(self.server_list[randint(0, len(self.server_list))])
+            try:
+                node.set_server(Placement.select_server(self.node_list, self.server_list, node))
+            except RuntimeError as error:
+                self.logger.error("Error placing the node {0}: {1}".format(node, error))
+                print(make_colored("red", "Error placing the node {0}: {1}".format(node, error)))
+                return False
+            return True
 
     def clean_cluster(self):
         """
-        Remove the bridge and the route entries created on the cluster.
+        Remove the bridge and the route entries created on the cluster. The inotify limit raised by the setup is
+        restored only on the servers where no other experiment (i.e. no other bridge) is running.
         :return:
         """
 
@@ -550,13 +700,16 @@ class ClusterManager:
                 command = []
 
             command2 = ["sudo ovs-vsctl --if-exist del-br {0} && "
-                        "sudo sysctl fs.inotify.max_user_instances=128 && "
-                        "sudo iptables -t nat -D POSTROUTING -o {1} -s {2}  ! -d {2} -j MASQUERADE".format(Constants.LXD_BRIDGE,
-                                                                                                           server.get_interface(),
-                                                                                                           __router_network__)]
+                        "{{ sudo ovs-vsctl list-br | grep -q '^{3}' || "
+                        "sudo sysctl fs.inotify.max_user_instances=128; }} && "
+                        "sudo iptables -t nat -D POSTROUTING -o {1} -s {2}  ! -d {2} -j MASQUERADE".format(
+                            Constants.LXD_BRIDGE,
+                            server.get_interface(),
+                            LxcUtils.__router_network__,
+                            Constants.LXD_BRIDGE_PREFIX)]
             params = header + command + command2
 
-            p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+            p = TracedPopen(params, stdout=subprocess.DEVNULL)
 
             if p.wait():
                 self.logger.error("[{0}] Error cleaning the server. params: {1}".format(server,
@@ -577,27 +730,63 @@ class ClusterManager:
         :return: True if the key installation succeeds, False otherwise
         """
 
+        if not self.generate_ssh_key_pair():
+            return False
+
+        def install_key(server, results):
+            results[server] = self.install_server_ssh_key(server)
+
+        return start_thread_pool(self.server_list, install_key)
+
+    def generate_ssh_key_pair(self):
+        """
+        Generate the RSA key pair used to access the servers, if it does not exist yet.
+
+        :return: True if the key pair exists or it has been created, False otherwise
+        """
+
         if not (os.path.isfile(Constants.ssh_client_private_key) or os.path.isfile(Constants.ssh_client_public_key)):
             try:
                 generate_key_pair(Constants.ssh_client_private_key)
             except RuntimeError:
                 return False
 
-        for server in self.server_list:
-            params = ["ssh-copy-id",
-                      "-i",
-                      Constants.ssh_client_private_key,
-                      "{0}@{1}".format(self.username,
-                                       server)]
+        return True
 
-            print(params)
+    def install_server_ssh_key(self, server):
+        """
+        Install the RSA key on a server, if it is not installed yet. Since ssh-copy-id asks for the password of the
+        user, the servers requiring it are served one at a time.
 
-            p = subprocess.Popen(params, stderr=subprocess.DEVNULL)
+        :param server: The server
+        :return: True if the key installation succeeds, False otherwise
+        """
+
+        params = ["ssh",
+                  "-i",
+                  Constants.ssh_client_private_key,
+                  "-o",
+                  "BatchMode=yes",
+                  "{0}@{1}".format(self.username, server),
+                  "true"]
+
+        if not TracedPopen(params, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).wait():
+            self.logger.info("[{0}] RSA key already installed.".format(server))
+            return True
+
+        params = ["ssh-copy-id",
+                  "-i",
+                  Constants.ssh_client_private_key,
+                  "{0}@{1}".format(self.username,
+                                   server)]
+
+        with self.password_lock:
+            p = TracedPopen(params, stderr=subprocess.DEVNULL)
 
             if p.wait():
                 self.logger.error("[{0}] Impossible to install the RSA key.".format(server))
                 return False
             else:
-                self.logger.info("RSA key successfully generated.")
-                
-            return True
+                self.logger.info("[{0}] RSA key successfully installed.".format(server))
+
+        return True
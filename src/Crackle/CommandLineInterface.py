@@ -20,6 +20,10 @@ from Crackle.RoutingNdn import RoutingNdn
 from Crackle.ClusterManager import ClusterManager
 from Crackle.ColoredOutput import make_colored
 from Crackle.MobilityManager import MobilityManager, grouped
+from Crackle.SetupPipeline import run_setup_pipeline
+from Crackle import Tracing
+from Crackle.Telemetry import TelemetryCollector
+from Crackle import StatsStore
 import Crackle.Globals as Globals
 from Crackle.Constants import __maximum_flow__, __tree_on_producer__, \
     __min_cost_multipath__, __tree_on_consumer__
@@ -102,8 +106,19 @@ help = make_colored("darkgreen",
                         Test commands:
                             setup_environment: prepare network and ndn to the test (executes script, lcreate, startndn, startrepo, routendn)
                             start: run the test (and collect statistics at the end)
-                            get_stats: collect statistics
+                            get_stats [resume]: collect statistics (resume: continue an interrupted collection)
+                            ingest [run]: store the collected statistics as columnar files in the analysis directory
                             start_bulk <n>: execute n identical tests one after the other
+
+                        Trace commands:
+                            trace: print the time spent in the setup phases, tasks, LXD calls and SSH commands
+                            trace reset: remove the recorded operations
+                            export_trace <file>: export the recorded operations in the Chrome trace format
+
+                        Telemetry commands:
+                            telemetry start [interval]: stream the link rates and the CPU usage of the containers
+                            telemetry show: print the last rates received
+                            telemetry stop: stop the streaming
                     """)
 
 how_to = """
@@ -251,6 +266,7 @@ class CrackleCmd(MyCmd):
         self.mobility_configured = False
         self.cluster_configured = False
         self.container_created = False
+        self.telemetry = None
 
         if any(item is None for item in [net, ndn, mob, cluster, route]):
             self.logger.warning("WARNING: Configuration file is not set. You can set it through the configure"
@@ -365,9 +381,20 @@ class CrackleCmd(MyCmd):
                 Test commands:
                     setup_environment: prepare network and ndn to the test (executes script, lcreate, startndn, startrepo, routendn)
                     start: run the test (and collect statistics at the end)
-                    get_stats: collect statistics
+                    get_stats [resume]: collect statistics (resume: continue an interrupted collection)
+                    ingest [run]: store the collected statistics as columnar files in the analysis directory
                     start_bulk <n>: execute n identical tests one after the other
 
+                Trace commands:
+                    trace: print the time spent in the setup phases, tasks, LXD calls and SSH commands
+                    trace reset: remove the recorded operations
+                    export_trace <file>: export the recorded operations in the Chrome trace format
+
+                Telemetry commands:
+                    telemetry start [interval]: stream the link rates and the CPU usage of the containers
+                    telemetry show: print the last rates received
+                    telemetry stop: stop the streaming
+
         :param line: If this parameter is specified, this function prints the help message of the command contained in line.
         :return:
         """
@@ -450,7 +477,8 @@ class CrackleCmd(MyCmd):
 
         exec_parser = node_subparser.add_parser(__command_exec__,
                                                 help="Execute a command in the node.")
-        exec_parser.add_argument("node_name", type=str, help="The name of the node")
+        exec_parser.add_argument("node_name", type=str,
+                                 help="The name of the node, or the names of the nodes separated by commas")
         exec_parser.add_argument("command", type=str, nargs='+', help="The command to execute")
 
         edit_parser = node_subparser.add_parser(__command_edit__,
@@ -818,6 +846,7 @@ class CrackleCmd(MyCmd):
                 self.node_subparsers[args.command_name].print_help()
                 return
             cmd = args.command
+            node_name = [Globals.experiment_id + name for name in args.node_name.split(",") if name]
 
         if args.command_name in [__command_add__]:
             if not all([args.cache_size, args.forwarding_strategy]):
@@ -1454,7 +1483,16 @@ class CrackleCmd(MyCmd):
         Execute a command on all the node of the experiment
         """
 
-        args = self.configure_parser.parse_args(shlex.split(line))
+        args = shlex.split(line)
+
+        if not args:
+            print(make_colored("yellow", "Usage: exec <command> [<arguments>]"))
+            return
+
+        if not self.container_created:
+            print(make_colored("yellow", "Please start the containers before running a command on them!"))
+            return
+
         self.logger.debug("Executing command {0} on each node of the network".format(args))
         if self.ndn.execute_cmd(args):
             print(make_colored("green", "Command {0} executed!".format(args)))
@@ -1485,13 +1523,19 @@ class CrackleCmd(MyCmd):
             - Setting the cache on the NDN forwarder
             - Setting the NDN routing tables of each node
             - Starting the mobility of the stations
+
+        The operations of each node are pipelined (see :mod:`Crackle.SetupPipeline`): a node goes on as soon as the
+        operations it depends on are completed, without waiting the other nodes.
         """
 
         self.logger.debug("Setting up the environment")
 
         try:
             if not self.cluster_configured:
-                if self.cluster.setup_cluster():
+                with Tracing.span("setup_cluster", "phase"):
+                    cluster_set_up = self.cluster.setup_cluster()
+
+                if cluster_set_up:
                     print(make_colored("green", "Cluster set up!"))
                     self.logger.debug("Cluster successfully set up!")
                     self.cluster_configured = True
@@ -1501,78 +1545,126 @@ class CrackleCmd(MyCmd):
                     return False
 
             if not self.container_created:
-                if self.net.spawn_containers():
-                    print(make_colored("green", "Containers spawned!"))
-                    self.container_created = True
-                    self.logger.debug(
-                            "Containers created on the cluster. Servers: {0}".format(self.cluster.get_server_list()))
-                else:
-                    self.logger.error(
-                            "Error spawning containers on the cluster. Servers: {0}".format(
-                                    self.cluster.get_server_list()))
-                    print(make_colored("red", "Error spawning containers. "
-                                              "See the log file {0} for details.".format(log_file)))
-                    return False
-
-                if self.net.start_containers():
-                    print(make_colored("green", "Containers started!"))
-                else:
-                    print(make_colored("red", "Error starting containers. "
-                                              "See the log file {0} for details.".format(log_file)))
-                    return False
-
-                if self.net.create_scripts():
-                    print(make_colored("green", "Scripts for MACVLAN interfaces created"))
-                else:
-                    print(make_colored("red", "Error creating scripts for links. "
-                                              "See the log file {0} for details.".format(log_file)))
+                with Tracing.span("setup_pipeline", "phase"):
+                    graph = run_setup_pipeline(self.node_list, self.net, self.ndn)
+                failed = graph.failed_tasks()
+
+                self.logger.info("Environment setup. {0}".format(graph.report()))
+                print(make_colored("blue", graph.report()))
+
+                if failed:
+                    self.logger.error("Error setting up the environment. "
+                                      "Tasks failed or not executed: {0}".format(", ".join(map(str, failed))))
+                    print(make_colored("red", "Error setting up the environment ({0} tasks failed or not executed). "
+                                              "See the log file {1} for details.".format(len(failed), log_file)))
                     return False
 
-                if self.net.create_links():
-                    print(make_colored("green", "Links created successfully!"))
-                else:
-                    print(make_colored("red", "Error creating links. "
-                                              "See the log file {0} for details.".format(log_file)))
-                    return False
+                self.container_created = True
+                print(make_colored("green", "Containers spawned and started, links created, "
+                                            "statistics started, routers configured and NDN routing set!"))
+                self.logger.debug("Environment set up on the cluster. Servers: {0}".format(
+                        self.cluster.get_server_list()))
 
-                if self.net.set_stats():
-                    print(make_colored("green", "Ifstat and mpstat started!"))
-                else:
-                    print(make_colored("red", "Error starting ifstat and mpstat. "
-                                              "See the log file {0} for details.".format(log_file)))
-                    return False
+                with Tracing.span("setup_mobility", "phase"):
+                    mobility_set_up = self.mob.setup_mobility()
 
-                if self.ndn.configure_router():
-                    print(make_colored("green", "Router Configured"))
-                else:
-                    print(make_colored("red",
-                                       "Error Configuring router. See the log file {0} for details.".format(log_file)))
-                    return False
-
-                if self.ndn.create_routing_scripts():
-                    print(make_colored("green", "Routing scripts created!"))
-                else:
-                    print(make_colored("red", "Error creating routing scripts. "
-                                              "See the log file {0} for details.".format(log_file)))
-                    return False
-
-                if self.ndn.push_routing_scripts() and self.ndn.set_ndn_routing():
-                    print(make_colored("green", "NDN routing set!"))
-                else:
-                    print(make_colored("red", "Error setting the routing. "
-                                              "See the log file {0} for details.".format(log_file)))
-                    return False
-
-                if self.mob.setup_mobility():
+                if mobility_set_up:
                     print(make_colored("green", "Mobility correctly set up!"))
                     self.mobility_configured = True
                 else:
                     print(make_colored("red", "Error setting the mobility. "
                                               "See the log file {0} for details.".format(log_file)))
                     return False
+
+            if Globals.tracing:
+                self.logger.info("Setup trace:\n{0}".format(Tracing.format_summary()))
+                print(Tracing.format_summary())
         except Exception as e:
             self.logger.error("Error during the configuration. {0}".format(traceback.print_exc()))
             print(make_colored("red", "Error during the configuration. See log for further details."))
+            return False
+
+        return True
+
+    def restore_environment(self):
+        """
+        Bring the environment back to the state it had right after the setup, by restoring in parallel the snapshots
+        of the containers (see :meth:`Crackle.NetworkManager.NetworkManager.snapshot_containers`) and starting again
+        the mobility. The stateless snapshots do not keep the links, the faces and the routes, so with them the links,
+        NFD and the routing are set up again on the restored containers.
+
+        :return: True if the environment has been restored, False otherwise
+        """
+
+        self.logger.debug("Restoring the environment from the snapshots.")
+
+        self.mob.kill_threads()
+        self.mobility_configured = False
+
+        with Tracing.span("restore_containers", "phase"):
+            restored = self.net.restore_containers()
+
+        if not restored:
+            print(make_colored("red", "Error restoring the containers. "
+                                      "See the log file {0} for details.".format(log_file)))
+            return False
+
+        if not Globals.snapshot_stateful:
+            with Tracing.span("setup_pipeline", "phase"):
+                graph = run_setup_pipeline(self.node_list, self.net, self.ndn, create_containers=False,
+                                           start_services=True)
+
+            if graph.failed_tasks():
+                self.logger.error("Error setting up the restored containers. {0}".format(graph.report()))
+                print(make_colored("red", "Error setting up the restored containers. "
+                                          "See the log file {0} for details.".format(log_file)))
+                return False
+
+        with Tracing.span("setup_mobility", "phase"):
+            mobility_set_up = self.mob.setup_mobility()
+
+        if not mobility_set_up:
+            print(make_colored("red", "Error setting the mobility. "
+                                      "See the log file {0} for details.".format(log_file)))
+            return False
+
+        self.mobility_configured = True
+        print(make_colored("green", "Environment restored from the snapshots!"))
+
+        return True
+
+    def prepare_test(self, first):
+        """
+        Prepare the environment for a test of a series. If the snapshots of the containers are enabled
+        (Globals.snapshot_restore), the environment is set up once, snapshotted, and restored before each next test;
+        if the restore fails, it is set up again from scratch. Otherwise the environment is set up again for each test.
+
+        :param first: True for the first test of the series
+        :return: True if the environment is ready, False otherwise
+        """
+
+        if not first and Globals.snapshot_restore and self.net.snapshot_taken:
+            if self.restore_environment():
+                return True
+            print(make_colored("yellow", "Setting up the environment again."))
+
+        if self.container_created and not first:
+            self.mob.kill_threads()
+            self.mobility_configured = False
+            self.net.stop_containers()
+            self.container_created = False
+
+        if not self.container_created:
+            if not self.setup_environment():
+                return False
+
+            if Globals.snapshot_restore:
+                with Tracing.span("snapshot_containers", "phase"):
+                    if not self.net.snapshot_containers():
+                        print(make_colored("yellow", "Error taking the snapshots of the containers: the environment "
+                                                     "will be set up again for each test."))
+
+        return True
 
     def do_setup_environment(self, line):
         """
@@ -1588,6 +1680,77 @@ class CrackleCmd(MyCmd):
         """
         self.setup_environment()
 
+    def do_trace(self, line):
+        """
+        Print the time spent in each operation recorded since the start (or the last "trace reset"): number of calls,
+        total time, median, 95th percentile and maximum duration::
+
+            trace
+            trace reset
+        """
+
+        if line.strip() == "reset":
+            Tracing.tracer.reset()
+            print(make_colored("green", "Trace reset."))
+        else:
+            print(Tracing.format_summary())
+
+    def do_export_trace(self, line):
+        """
+        Export the recorded operations in the Chrome trace format (load it in chrome://tracing or
+        https://ui.perfetto.dev)::
+
+            export_trace <path of the output file>
+        """
+
+        path = line.strip() or os.path.join(Globals.log_dir, "trace.json")
+
+        try:
+            n_spans = Tracing.export_chrome_trace(path)
+            print(make_colored("green", "{0} operations exported in {1}".format(n_spans, path)))
+        except IOError as error:
+            self.logger.error("Error exporting the trace in {0}: {1}".format(path, error))
+            print(make_colored("red", "Error exporting the trace in {0}: {1}".format(path, error)))
+
+    def do_telemetry(self, line):
+        """
+        Stream live metrics (link rates and CPU usage) from the containers during the experiment
+        (see :mod:`Crackle.Telemetry`)::
+
+            telemetry start [interval in seconds]
+            telemetry show
+            telemetry stop
+        """
+
+        args = line.split()
+
+        if not self.configured or not self.container_created:
+            print(make_colored("red", "The containers are not running."))
+            return
+
+        if self.telemetry is None or self.telemetry.node_list is not self.node_list:
+            if self.telemetry is not None:
+                self.telemetry.stop()
+            self.telemetry = TelemetryCollector(self.node_list)
+
+        if args and args[0] == "start":
+            try:
+                interval = float(args[1]) if len(args) > 1 else None
+            except ValueError:
+                print(make_colored("red", "Invalid interval {0}".format(args[1])))
+                return
+            if self.telemetry.start(interval):
+                print(make_colored("green", "Telemetry started."))
+            else:
+                print(make_colored("red", "Error starting the telemetry on some servers. See log for details."))
+        elif args and args[0] == "stop":
+            self.telemetry.stop()
+            print(make_colored("green", "Telemetry stopped."))
+        elif not args or args[0] == "show":
+            print(self.telemetry.format_status())
+        else:
+            print(make_colored("red", "Unknown telemetry command {0}".format(args[0])))
+
     def do_reset_environment(self, line):
         """
         Quickly reset the environment in order to start a new experiment
@@ -1623,9 +1786,13 @@ class CrackleCmd(MyCmd):
 
     def do_start_bulk(self, line):
         """
-        Start n experiment in parallel. The n parameter has to be specified as command line argument as follow:
+        Start n experiments one after the other. The n parameter has to be specified as command line argument as
+        follow:
 
         start_bulk n
+
+        The environment is set up for the first experiment and, if Globals.snapshot_restore is set, the containers are
+        snapshotted and restored before each next experiment instead of being set up again.
         """
 
         try:
@@ -1640,10 +1807,15 @@ class CrackleCmd(MyCmd):
         else:
             self.logger.debug("Starting {0} experiments.".format(args.N))
             for i in range(int(args.N)):
-                self.mob.kill_threads()
-                self.net.stop_containers()
-                self.net.start_containers()
-                self.setup_environment()
+                if not self.prepare_test(i == 0):
+                    print(make_colored("red", "Error preparing the test {0}. "
+                                              "See the log file {1} for details.".format(i + 1, log_file)))
+                    return
+
+                with Tracing.span("test", "phase"):
+                    self.ndn.start_test()
+                with Tracing.span("get_stats", "phase"):
+                    self.net.get_stats()
 
     def help_start_bulk(self):
         """
@@ -1655,11 +1827,31 @@ class CrackleCmd(MyCmd):
 
     def do_get_stats(self, line):
         """
-        Get statistics from each node after the experiment
+        Get statistics from each node after the experiment. With "resume", continue an interrupted collection.
         """
 
         self.logger.debug("Getting the statistic files")
-        self.net.get_stats()
+        self.net.get_stats(resume=line.strip() == "resume")
+
+    def do_ingest(self, line):
+        """
+        Ingest the statistics collected by get_stats in the analysis store (see :mod:`Crackle.StatsStore`), as the run
+        with the given name (by default the current date and time)::
+
+            ingest [run]
+        """
+
+        run = line.strip() or time.strftime("%Y%m%d-%H%M%S")
+
+        try:
+            result = StatsStore.ingest(run)
+            print(make_colored("green", "Run {0} ingested: {1} files, {2} rows in {3:.2f}s".format(run,
+                                                                                                  result["files"],
+                                                                                                  result["rows"],
+                                                                                                  result["time"])))
+        except (OSError, ValueError) as error:
+            self.logger.error("Error ingesting the statistics. Error: {0}".format(error))
+            print(make_colored("red", "Error ingesting the statistics: {0}".format(error)))
 
     def exit(self):
         """
@@ -1667,6 +1859,9 @@ class CrackleCmd(MyCmd):
         """
 
         print(make_colored("green", "Cleaning the cluster. Wait.."))
+        if self.telemetry is not None:
+            self.telemetry.stop()
+
         if self.configured:
             if self.container_created:
                 self.logger.debug("Killing all the containers")
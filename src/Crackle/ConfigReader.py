@@ -354,17 +354,20 @@ These files are the following:
 import logging
 import os
 import shutil
+from array import array
 from configparser import ConfigParser
 
-#from pyvoro import compute_2d_voronoi
 from random import randint
 
 from sympy import Point
 from Crackle.ColoredOutput import make_colored
 from Crackle.LxcUtils import RouterContainer, BaseStationContainer, StationContainer, AddressGenerator
+import Crackle.LxcUtils as LxcUtils
 import Crackle.TopologyStructs as TopologyStructs
+import Crackle.TopologyCore as TopologyCore
 import Crackle.Globals as Globals
 import Crackle.Constants as Constants
+from Crackle.Voronoi import compute_2d_voronoi
 
 __mobility_models__ = ["constant_position", "random_waypoint"]
 __topology_configuration__ = "topo.brite"
@@ -378,6 +381,164 @@ __icn_strategies__ = ["best-route", "multicast", "load-balance", "broadcast", "n
 module_logger = logging.getLogger(__name__)
 
 
+class TopologyColumns:
+    """
+    The content of a topo.brite file, stored by column. Node references in the links are indexes in the node columns.
+
+    :ivar node_ids: The names of the nodes
+    :ivar node_types: The types of the nodes, as indexes in :data:`Crackle.Constants.__node_types__`
+    :ivar cache_probabilities: The cache probabilities of the nodes
+    :ivar cache_sizes: The cache sizes of the nodes
+    :ivar cache_policies: The cache policies of the nodes
+    :ivar forward_strategies: The forwarding strategies of the nodes, as indexes in :data:`__icn_strategies__`
+    :ivar x: The x coordinate of the nodes (0 for the routers)
+    :ivar y: The y coordinate of the nodes (0 for the routers)
+    :ivar link_from: The first endpoints of the links
+    :ivar link_to: The second endpoints of the links
+    :ivar bandwidth: The bandwidth of the links
+    """
+
+    def __init__(self):
+        self.node_ids = []
+        self.node_types = array("b")
+        self.cache_probabilities = []
+        self.cache_sizes = []
+        self.cache_policies = []
+        self.forward_strategies = array("b")
+        self.x = array("d")
+        self.y = array("d")
+
+        self.link_from = array("l")
+        self.link_to = array("l")
+        self.bandwidth = array("d")
+
+
+def tokenize_topology(raw_topo, file_name=__topology_configuration__):
+    """
+    First pass of the parsing of topo.brite: read the file line by line into a :class:`TopologyColumns` and check
+    its content. All the errors are logged with their position, and the first one is raised.
+
+    :param raw_topo: The file topo.brite, or any iterable over its lines
+    :param file_name: The name of the file, used in the error messages
+    :return: The :class:`TopologyColumns` with the content of the file
+    :raises: :class:`SyntaxError` pointing to the line of the first error found
+    """
+
+    router, base_station, mobile_station = Constants.__node_types__
+    node_types = {node_type: i for i, node_type in enumerate(Constants.__node_types__)}
+    strategies = {strategy: i for i, strategy in enumerate(__icn_strategies__)}
+
+    columns = TopologyColumns()
+    node_index = {}
+    errors = []
+
+    def error(line_number, line, message):
+        errors.append(SyntaxError(message, (file_name, line_number, None, line.rstrip("\n"))))
+        module_logger.error("{0}:{1}: {2}".format(file_name, line_number, message))
+
+    section = None
+
+    for line_number, line in enumerate(raw_topo, start=1):
+        stripped = line.strip()
+
+        if stripped.startswith("Nodes:"):
+            section = "nodes"
+            continue
+        elif stripped.startswith("Edges:"):
+            section = "edges"
+            continue
+        elif section == "edges" and stripped == "" and len(columns.link_from):
+            # The list of edges ends with the first empty line
+            section = None
+            continue
+        elif section is None or stripped == "" or stripped.startswith("#"):
+            continue
+
+        fields = stripped.split()
+
+        if section == "nodes":
+
+            if len(fields) < 7:
+                error(line_number, line, "Expected at least 7 fields in the node description, found {0}".format(
+                    len(fields)))
+                continue
+
+            node_id, cache_probability, cache_size, cache_policy, forward_strategy = (fields[0], fields[2],
+                                                                                      fields[3], fields[4],
+                                                                                      fields[5])
+            node_type = fields[-1]
+
+            if node_id in node_index:
+                error(line_number, line, "Node {0} already defined".format(node_id))
+                continue
+
+            if node_type not in node_types:
+                error(line_number, line, "Unknown node type {0}".format(node_type))
+                continue
+
+            try:
+                if int(cache_size) < 0:
+                    raise ValueError
+            except ValueError:
+                error(line_number, line, "Wrong value for cache size: {0}".format(cache_size))
+                continue
+
+            if forward_strategy not in strategies:
+                error(line_number, line, "Wrong value for forward strategy: {0}".format(forward_strategy))
+                continue
+
+            x = y = 0.0
+
+            if node_type != router:
+                try:
+                    x = float(fields[6])
+                    y = float(fields[7])
+                except (IndexError, ValueError):
+                    error(line_number, line, "Missing or wrong position of the node {0}".format(node_id))
+                    continue
+
+            node_index[node_id] = len(columns.node_ids)
+            columns.node_ids.append(node_id)
+            columns.node_types.append(node_types[node_type])
+            columns.cache_probabilities.append(cache_probability)
+            columns.cache_sizes.append(cache_size)
+            columns.cache_policies.append(cache_policy)
+            columns.forward_strategies.append(strategies[forward_strategy])
+            columns.x.append(x)
+            columns.y.append(y)
+
+        else:
+
+            if len(fields) < 6:
+                error(line_number, line, "Expected at least 6 fields in the edge description, found {0}".format(
+                    len(fields)))
+                continue
+
+            node_from, node_to, bandwidth = fields[1], fields[2], fields[5]
+
+            missing = [node for node in (node_from, node_to) if node not in node_index]
+
+            if missing:
+                error(line_number, line, "Endpoints of the link not in the list of nodes: {0}".format(
+                    ", ".join(missing)))
+                continue
+
+            try:
+                bandwidth = float(bandwidth)
+            except ValueError:
+                error(line_number, line, "Wrong value for bandwidth: {0}".format(bandwidth))
+                continue
+
+            columns.link_from.append(node_index[node_from])
+            columns.link_to.append(node_index[node_to])
+            columns.bandwidth.append(bandwidth)
+
+    if errors:
+        raise errors[0]
+
+    return columns
+
+
 class ConfigReader:
     """
     This class is in charge of reading the configuration files and setup a list of nodes with the configuration provided
@@ -399,11 +560,12 @@ cc        - The file routing.dist, containing the routing tables of the nodes sp
 
         self.test_path = None
 
-    def setup_conf(self, test_path):
+    def setup_conf(self, test_path, experiment_id=None):
         """
         Main method of this class. It reads the test_path folder and parses the configuration files inside it.
 
         :param test_path: The path of the test folder containing the configuration
+        :param experiment_id: If set, the experiment id, used as it is instead of the one of the settings file
         :return: the node_list configured with the user config inputs
         """
         # Path test folder
@@ -427,15 +589,17 @@ cc        - The file routing.dist, containing the routing tables of the nodes sp
 
         try:
             self.logger.debug("Starting to parse the settings file {0}.".format(settings_file))
-            self.parse_settings(settings_file)
+            self.parse_settings(settings_file, experiment_id)
         except SyntaxError:
             print(make_colored("red", "[SyntaxError]: Error reading the {0} file".format(settings_file)))
             self.logger.error("Error reading the {0} file".format(settings_file))
             return None
 
-            # parsing the topology
-
         topo_file = test_path + "/" + __topology_configuration__
+        workload_file = test_path + "/" + __workload_configuration__
+        mobility_file = test_path + "/" + __mobility_configuration__
+
+        # parsing the topology
 
         try:
             self.logger.debug("Opening topology file {0}".format(topo_file))
@@ -448,15 +612,20 @@ cc        - The file routing.dist, containing the routing tables of the nodes sp
         try:
             self.logger.debug("Parsing topology file {0}".format(topo_file))
             self.parse_topology(raw_topo)
-        except SyntaxError:
+        except SyntaxError as error:
             self.logger.error("Error reading the {0} file".format(topo_file))
-            print(make_colored("red",
-                               "[SyntaxError]: syntax error or malformed links in {0}/topo.brite".format(test_path)))
+            if error.lineno is not None:
+                print(make_colored("red", "[SyntaxError]: {0}:{1}: {2}".format(topo_file,
+                                                                              error.lineno,
+                                                                              error.msg)))
+            else:
+                print(make_colored("red",
+                                   "[SyntaxError]: syntax error or malformed links in {0}/topo.brite".format(
+                                       test_path)))
             return None
 
         # parsing the workload
 
-        workload_file = test_path + "/workload.conf"
         try:
             self.logger.debug("Opening workload file {0}".format(workload_file))
             workload = open(workload_file, 'r')
@@ -500,7 +669,6 @@ cc        - The file routing.dist, containing the routing tables of the nodes sp
             return None
 
         # Parsing the mobility
-        mobility_file = test_path + "/" + __mobility_configuration__
         try:
             self.logger.debug("Opening mobility file {0}".format(mobility_file))
             mobility = open(mobility_file, 'r')
@@ -533,155 +701,103 @@ cc        - The file routing.dist, containing the routing tables of the nodes sp
         container for each node in the topology. The objects of the list are instances of
         :class:`Crackle.TopologyStructs.Node`.
 
+        The file is parsed in two passes: :func:`tokenize_topology` reads it line by line into a
+        :class:`TopologyColumns` and checks it, then :meth:`build_topology` creates all the nodes and links.
+        Nothing is created if the file contains an error.
+
         :param raw_topo: The file topo.brite, with the description of the topology.
         :return:  1 if parsing succeed, otherwise it raises a SyntaxError
         :raises: :class:`SyntaxError` if an error is found.
         """
-        index = 0
-        bs_list = []
-
-        self.logger.debug("Reading nodes from topo.brite")
-
-        line = raw_topo.readline()
-        while line and not line.strip().startswith("Nodes:"):
-            # Read the nodes from the topology file until the "Nodes:" tag is found'
-            line = raw_topo.readline()
 
-        line = raw_topo.readline()
-        while line and not line.strip().startswith("Edges:"):
-            if not (line.strip().startswith("#") or line.strip() == ''):
-                sline = line.split()
-
-                if len(sline) < 4:
-                    raise SyntaxError
-
-                node_type = sline[len(sline) - 1]
-                node_id = Globals.experiment_id + sline[0]
-                cache_size = sline[3]
-                cache_policy = sline[4]
-                cache_probability = sline[2]
-                forward_strategy = sline[5]
-
-                if int(cache_size) < 0:
-                    self.logger.error("[{0}] Wrong value fr cache size.".format(node_id))
-                    raise SyntaxError
-
-                if forward_strategy not in __icn_strategies__:
-                    self.logger.error("[{0}] Wrong value fr forward strategy.".format(node_id))
-                    raise SyntaxError
-
-                if node_type == "AS_NODE":
-
-                    self.logger.debug("Node_Id={0} Node_Type={1} cache_size={2}".format(node_id,
-                                                                                        node_type,
-                                                                                        cache_size))
-
-                    container = RouterContainer(node_id)
-
-                    self.node_list[node_id] = TopologyStructs.Router(node_id,
-                                                                     cache_size,
-                                                                     cache_policy,
-                                                                     cache_probability,
-                                                                     forward_strategy,
-                                                                     container=container,
-                                                                     vlan=Constants.router_vlan)
-
-                elif node_type == "AS_BASE_STATION":
-
-                    x = sline[6]
-                    y = sline[7]
-                    self.logger.debug("Node_Id={0} Node_Type={1} cache_size={2}"
-                                      "position=({3}, {4})".format(node_id,
-                                                                   node_type,
-                                                                   cache_size,
-                                                                   x,
-                                                                   y))
-
-                    self.logger.debug("[{0}] Creating container".format(node_id))
-                    container = BaseStationContainer(node_id)
-
-                    self.node_list[node_id] = TopologyStructs.BaseStation(node_id,
-                                                                          cache_size,
-                                                                          cache_policy,
-                                                                          cache_probability,
-                                                                          forward_strategy,
-                                                                          x,
-                                                                          y,
-                                                                          container=container,
-                                                                          vlan=Constants.router_vlan,
-                                                                          bs_vlan=Constants.base_station_vlan)
-
-                    bs_list.append(self.node_list[node_id])
-
-                elif node_type == "AS_MOBILE_NODE":
-                    # Here we are setting just the parameters linked to the router.
-                    # In the mobility section we'll set the mobility parameters.
-
-                    start_x = sline[6]
-                    start_y = sline[7]
-                    self.logger.debug("[{0}] Node_Id={0} Node_Type={1} cache_size={2}".format(node_id,
-                                                                                              node_type,
-                                                                                              cache_size))
-
-                    self.logger.debug("[{0}] Creating container".format(node_id))
-
-                    container = StationContainer(node_id)
-
-                    self.node_list[node_id] = TopologyStructs.Station(node_id,
-                                                                      cache_size,
-                                                                      cache_policy,
-                                                                      cache_probability,
-                                                                      forward_strategy,
-                                                                      container=container,
-                                                                      mobile=True)
-                    self.node_list[node_id].set_starting_point(start_x, start_y)
-
-                else:
-                    raise SyntaxError
-
-            line = raw_topo.readline()
-
-        # Read the edges from the topology file until the end of the file
-        line = raw_topo.readline()
+        try:
+            columns = tokenize_topology(raw_topo, getattr(raw_topo, "name", __topology_configuration__))
+        finally:
+            raw_topo.close()
 
-        self.logger.debug("Node list: {0}".format(self.node_list))
+        self.logger.debug("Read {0} nodes and {1} links from topo.brite".format(len(columns.node_ids),
+                                                                               len(columns.link_from)))
 
-        self.logger.debug("Reading links from topo.brite.")
+        return self.build_topology(columns)
 
-        while line.strip() != "":
-            if not (line.strip().startswith("#") or line.strip() == ''):
-                sline = line.split()
-                link_id = sline[0]
-                node_from = Globals.experiment_id + sline[1]
-                node_to = Globals.experiment_id + sline[2]
-                cost = sline[4]
-                bandwidth = sline[5]
-
-                self.logger.debug("[{0}] node_from={1} node_to={2} bandwidth={3}".format(link_id,
-                                                                                         node_from,
-                                                                                         node_to,
-                                                                                         bandwidth))
-
-                if all(node in self.node_list.keys() for node in [node_from, node_to]):
-                    self.node_list[node_from].add_link(TopologyStructs.WiredLink(self.node_list[node_from],
-                                                                            self.node_list[node_to],
-                                                                            node_to,
-                                                                            True,
-                                                                            float(bandwidth) / 1000))
-
-                    # add also the to from link because for the moment links are bidirectional in topo.brite
-                    self.node_list[node_to].add_link(TopologyStructs.WiredLink(self.node_list[node_to],
-                                                                          self.node_list[node_from],
-                                                                          node_from,
-                                                                          True,
-                                                                          float(bandwidth) / 1000))
-                else:
-                    self.logger.error("Endpoints of the link not in the list of nodes.")
-                    raise SyntaxError
+    def build_topology(self, columns):
+        """
+        Create the nodes, the containers and the links described by the columns read from topo.brite, and compute
+        the cells of the base stations.
 
-            line = raw_topo.readline()
+        :param columns: The :class:`TopologyColumns` returned by :func:`tokenize_topology`
+        :return: 1
+        """
 
-        raw_topo.close()
+        router, base_station, mobile_station = Constants.__node_types__
+
+        TopologyCore.clear()
+
+        # Compute all the addresses of the topology in one pass: one router address and one MAC per container,
+        # one base station address and one MAC per base station, one link address and one MAC per link endpoint.
+
+        n_base_stations = columns.node_types.count(Constants.__node_types__.index(base_station))
+        n_links = 2 * len(columns.link_from)
+
+        AddressGenerator.reserve({LxcUtils.__router_network__: len(columns.node_ids),
+                                  LxcUtils.__base_station_network__: n_base_stations,
+                                  LxcUtils.__links_addresses__: n_links},
+                                 len(columns.node_ids) + n_base_stations + n_links)
+
+        node_ids = [Globals.experiment_id + node_id for node_id in columns.node_ids]
+        nodes = []
+
+        for i, node_id in enumerate(node_ids):
+            node_type = Constants.__node_types__[columns.node_types[i]]
+            forward_strategy = __icn_strategies__[columns.forward_strategies[i]]
+
+            if node_type == router:
+                node = TopologyStructs.Router(node_id,
+                                              columns.cache_sizes[i],
+                                              columns.cache_policies[i],
+                                              columns.cache_probabilities[i],
+                                              forward_strategy,
+                                              container=RouterContainer(node_id),
+                                              vlan=Constants.router_vlan)
+            elif node_type == base_station:
+                node = TopologyStructs.BaseStation(node_id,
+                                                   columns.cache_sizes[i],
+                                                   columns.cache_policies[i],
+                                                   columns.cache_probabilities[i],
+                                                   forward_strategy,
+                                                   columns.x[i],
+                                                   columns.y[i],
+                                                   container=BaseStationContainer(node_id),
+                                                   vlan=Constants.router_vlan,
+                                                   bs_vlan=Constants.base_station_vlan)
+            else:
+                # Here we are setting just the parameters linked to the router.
+                # In the mobility section we'll set the mobility parameters.
+                node = TopologyStructs.Station(node_id,
+                                               columns.cache_sizes[i],
+                                               columns.cache_policies[i],
+                                               columns.cache_probabilities[i],
+                                               forward_strategy,
+                                               container=StationContainer(node_id),
+                                               mobile=True)
+                node.set_starting_point(columns.x[i], columns.y[i])
+
+            nodes.append(node)
+            self.node_list[node_id] = node
+
+        # Links are bidirectional in topo.brite, so each edge creates the two unidirectional links
+
+        for node_from, node_to, bandwidth in zip(columns.link_from, columns.link_to, columns.bandwidth):
+            nodes[node_from].add_link(TopologyStructs.WiredLink(nodes[node_from],
+                                                                nodes[node_to],
+                                                                node_ids[node_to],
+                                                                True,
+                                                                bandwidth / 1000))
+            nodes[node_to].add_link(TopologyStructs.WiredLink(nodes[node_to],
+                                                              nodes[node_from],
+                                                              node_ids[node_from],
+                                                              True,
+                                                              bandwidth / 1000))
 
         # Compute BS neighbors
 
@@ -689,7 +805,7 @@ cc        - The file routing.dist, containing the routing tables of the nodes sp
 
         bs_list = {}
 
-        for n in self.node_list.values():
+        for n in nodes:
             if type(n) is TopologyStructs.BaseStation:
                 bs_list[(n.get_x(), n.get_y())] = n
 
@@ -699,7 +815,7 @@ cc        - The file routing.dist, containing the routing tables of the nodes sp
                                                            Globals.mobility_area_y_max)], 2.0)
 
         for cell in cells:
-            print("Creating shape with vertices: {}".format(cell["vertices"]))
+            self.logger.debug("Creating shape with vertices: {}".format(cell["vertices"]))
             bs_list[cell["original"]].create_shape(cell["vertices"])
 
         return 1
@@ -922,11 +1038,13 @@ cc        - The file routing.dist, containing the routing tables of the nodes sp
                                                                                       type(self.node_list[node_id])))
                     raise SyntaxError
 
-    def parse_settings(self, settings):
+    def parse_settings(self, settings, experiment_id=None):
         """
         This function parses the settings.conf file and fills the :mod:`Crackle.Globals` file with them.
 
         :param settings: The settings.conf file.
+        :param experiment_id: If set, the experiment id, used as it is instead of the one of the settings file with
+                              a random suffix (e.g. when assigned by the :class:`Crackle.ExperimentRunner.ExperimentRunner`)
         :return:  1 if parsing succeed, otherwise it raises a SyntaxError
         """
 
@@ -943,14 +1061,27 @@ cc        - The file routing.dist, containing the routing tables of the nodes sp
         for opt in settings:
             value = config.get("Settings", opt)
             if opt == "experiment_id":
-                value = str(value)
-                value += str(randint(0, 1000))
+                value = str(experiment_id) if experiment_id else str(value) + str(randint(0, 1000))
             self.logger.debug("Settings file: option={0} value={1}".format(opt, value))
             setattr(Globals, opt, value) if opt == "lxd_port" else setattr(Globals, opt,
                                                                            value if not is_number(value) else float(
                                                                                value))
 
+        if experiment_id:
+            Globals.experiment_id = str(experiment_id)
+
+        if Globals.mobility_area_x_0 is None:
+            Globals.mobility_area_x_0 = 0.0
+        if Globals.mobility_area_x_max is None:
+            Globals.mobility_area_x_max = Globals.mobility_area_x_0 + float(Globals.mobility_area_w)
+        if Globals.mobility_area_y_0 is None:
+            Globals.mobility_area_y_0 = 0.0
+        if Globals.mobility_area_y_max is None:
+            Globals.mobility_area_y_max = Globals.mobility_area_y_0 + float(Globals.mobility_area_h)
+
         Constants.LXD_BRIDGE += Globals.experiment_id
+        Constants.node_server_file += Globals.experiment_id
+        AddressGenerator.setup(Globals.experiment_id)
 
         return 1
 
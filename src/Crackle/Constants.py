@@ -33,8 +33,13 @@ ns3_script_local = "../ns3-script/lxc-tap-wifi-emulation.cc"
 nfd_conf_file = "../ns3-script/nfd.conf"
 
 node_server_file = "/tmp/nsf.crackle"
+voronoi_cache_dir = "/tmp/crackle-voronoi"
 
-LXD_BRIDGE = "br0"
+# The bridge of an experiment is LXD_BRIDGE_PREFIX followed by the experiment id
+LXD_BRIDGE_PREFIX = "br0"
+LXD_BRIDGE = LXD_BRIDGE_PREFIX
+
+setup_snapshot = "crackle-setup"
 
 router_vlan = 1
 base_station_vlan = 2
@@ -83,6 +88,10 @@ __EXEC__ = "/" + __API_VERSION__ + "/containers/{0}/exec"  # To complete with th
 __PUSH__ = "/" + __API_VERSION__ + "/containers/{0}/files?path={1}"
 __PULL__ = "/" + __API_VERSION__ + "/containers/{0}/files?path={1}"
 __STATE__ = "/" + __API_VERSION__ + "/containers/{0}/state"
+__SNAPSHOTS__ = "/" + __API_VERSION__ + "/containers/{0}/snapshots"
+__SNAPSHOT__ = "/" + __API_VERSION__ + "/containers/{0}/snapshots/{1}"
+__SERVER__ = "/{0}".format(__API_VERSION__)
 __IMAGES__ = "/{0}/images".format(__API_VERSION__)
+__RESOURCES__ = "/{0}/resources".format(__API_VERSION__)
 __ALIAS__ = "/{0}/images/aliases".format(__API_VERSION__)
 __OPERATION__ = "/" + __API_VERSION__ + "/operation/{0}"
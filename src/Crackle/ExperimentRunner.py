@@ -0,0 +1,391 @@
+"""
+This module runs several experiments at the same time on the same servers, e.g. the configurations of a parameter
+sweep.
+
+The configuration of an experiment is module-level state (:mod:`Crackle.Globals`, :mod:`Crackle.Constants`, the
+:class:`Crackle.LxcUtils.AddressGenerator`), so each experiment runs in its own *crackle.py* process, in batch mode
+with -c: the process places the nodes, sets up the bridge and the tunnels of the experiment on the servers, creates the
+containers, runs the tests and finally removes the containers and cleans the cluster (also when it fails or it is
+stopped by the runner).
+The experiments are isolated by their **namespace**:
+
+    - the experiment id, assigned by the runner and used without the random suffix. It prefixes the names of the
+      containers and the LXD bridge, and the runner chooses it so that the address plan of the experiment (router
+      network, GRE endpoints and MAC addresses, see :class:`Crackle.LxcUtils.AddressPlan`) does not overlap with the
+      ones of the running experiments
+    - a working copy of the configuration folder in Globals.runner_dir/<experiment id>, whose settings.conf contains
+      the experiment id, the overridden settings and a log, scripts and analysis directory of its own. The output of
+      the process is written in crackle.out in the same folder
+
+The experiments are started in order, as long as the containers of the running experiments fit in the capacity of the
+cluster (the sum of Globals.server_capacities, unbounded if not configured) and at most Globals.runner_max_parallel
+experiments are running. An experiment that does not fit waits, while the following smaller ones can start. An
+experiment larger than the whole cluster is started alone.
+"""
+
+import configparser
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import Crackle.Globals as Globals
+import Crackle.LxcUtils as LxcUtils
+from Crackle.ColoredOutput import make_colored
+
+module_logger = logging.getLogger(__name__)
+
+__settings__ = "settings.conf"
+__topology__ = "topo.brite"
+__section__ = "Settings"
+__output__ = "crackle.out"
+
+__crackle__ = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "crackle.py")
+
+# Seconds between two checks of the running experiments
+__poll_interval__ = 1
+
+# Experiment ids tried before giving up on finding a free namespace
+__max_candidates__ = 1000
+
+
+def read_settings(folder):
+    """
+    Read the settings.conf of a configuration folder, without loading it in :mod:`Crackle.Globals`.
+
+    :param folder: The configuration folder
+    :return: The dictionary option => value (as strings)
+    :raise: RuntimeError if the settings cannot be read
+    """
+
+    config = configparser.ConfigParser()
+
+    try:
+        if not config.read(os.path.join(folder, __settings__)):
+            raise RuntimeError("Settings file not found in {0}".format(folder))
+        return dict(config.items(__section__))
+    except configparser.Error as error:
+        raise RuntimeError("Error reading the settings of {0}: {1}".format(folder, error))
+
+
+def count_containers(path):
+    """
+    Count the containers of an experiment: the nodes declared in its topo.brite.
+
+    :param path: The path of the topo.brite
+    :return: The number of containers
+    """
+
+    count, nodes = 0, False
+
+    with open(path) as topology:
+        for line in topology:
+            stripped = line.strip()
+            if stripped.startswith("Nodes:"):
+                nodes = True
+            elif stripped.startswith("Edges:"):
+                break
+            elif nodes and stripped and not stripped.startswith("#"):
+                count += 1
+
+    return count
+
+
+def cluster_capacity(settings):
+    """
+    Compute the number of containers the cluster can host.
+
+    :param settings: The settings of an experiment, as returned by :func:`read_settings`
+    :return: The sum of the capacities of the servers, or None if the capacity of a server is not configured
+    """
+
+    servers = [s for s in settings.get("server_names", "").split(",") if s.strip()]
+    capacities = [c.strip() for c in settings.get("server_capacities", "").split(",")]
+    capacities += [""] * (len(servers) - len(capacities))
+
+    if not servers or not all(capacities[:len(servers)]):
+        return None
+
+    return sum(int(float(c)) for c in capacities[:len(servers)])
+
+
+def address_namespace(experiment_id):
+    """
+    :param experiment_id: The experiment id
+    :return: The ranges used by the experiment, as the tuple (router network, first GRE endpoint, first MAC address)
+    """
+
+    plan = LxcUtils.AddressPlan(experiment_id)
+
+    return (plan.router_network,
+            plan.pool(LxcUtils.__gre_endpoints_network__).next_address,
+            plan.mac_pool.next_address >> 20)
+
+
+class Experiment:
+    """
+    An experiment run by the :class:`ExperimentRunner`.
+
+    :ivar folder: The configuration folder
+    :ivar overrides: The settings overriding the ones of settings.conf (option => value)
+    :ivar n_times: The number of times the test is executed
+    :ivar name: The name of the experiment
+    :ivar files: The files replacing the ones of the configuration folder in the working copy (name => path)
+    :ivar arguments: The additional arguments of crackle.py
+    :ivar experiment_id: The experiment id assigned by the runner
+    :ivar namespace: The address ranges of the experiment id (see :func:`address_namespace`)
+    :ivar workdir: The working copy of the configuration folder
+    :ivar size: The number of containers of the experiment
+    :ivar return_code: The exit code of the process, None while it is running or if it has not been started
+    """
+
+    def __init__(self, folder, overrides=None, n_times=1, name=None, files=None, arguments=None):
+        self.folder = folder
+        self.overrides = overrides or {}
+        self.n_times = n_times
+        self.name = name or os.path.basename(os.path.normpath(folder))
+        self.files = files or {}
+        self.arguments = arguments or []
+        self.experiment_id = None
+        self.namespace = None
+        self.workdir = None
+        self.size = count_containers(self.files.get(__topology__, os.path.join(folder, __topology__)))
+        self.process = None
+        self.output = None
+        self.return_code = None
+        self.start_time = None
+        self.end_time = None
+
+    def __str__(self):
+        return self.name
+
+    def prepare(self, runner_dir):
+        """
+        Create the working copy of the configuration folder, with the settings of the experiment namespace.
+
+        :param runner_dir: The directory of the working copies
+        """
+
+        self.workdir = os.path.abspath(os.path.join(runner_dir, self.experiment_id))
+
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        shutil.copytree(self.folder, self.workdir)
+
+        for name, path in self.files.items():
+            shutil.copyfile(path, os.path.join(self.workdir, name))
+
+        config = configparser.ConfigParser()
+        config.read(os.path.join(self.folder, __settings__))
+
+        for option, value in self.overrides.items():
+            config.set(__section__, option, str(value))
+
+        config.set(__section__, "experiment_id", self.experiment_id)
+        config.set(__section__, "log_dir", os.path.join(self.workdir, "log/"))
+        config.set(__section__, "scripts_dir", os.path.join(self.workdir, "scripts/"))
+        config.set(__section__, "analysis_dir", os.path.join(self.workdir, "analysis/"))
+
+        with open(os.path.join(self.workdir, __settings__), "w") as settings:
+            config.write(settings)
+
+        os.makedirs(os.path.join(self.workdir, "log"), exist_ok=True)
+
+    def start(self):
+        """
+        Start the crackle.py process of the experiment, which creates the environment of the experiment and removes it
+        at the end.
+        """
+
+        self.output = open(os.path.join(self.workdir, __output__), "w")
+        self.process = subprocess.Popen([sys.executable, __crackle__,
+                                         "-s", self.workdir,
+                                         "-t",
+                                         "-c",
+                                         "-n", str(self.n_times),
+                                         "-e", self.experiment_id] + self.arguments,
+                                        cwd=os.path.dirname(__crackle__),
+                                        stdout=self.output,
+                                        stderr=subprocess.STDOUT)
+        self.start_time = time.time()
+
+    def poll(self):
+        """
+        :return: True if the experiment is still running, False otherwise
+        """
+
+        if self.process is None or self.return_code is not None:
+            return False
+
+        self.return_code = self.process.poll()
+
+        if self.return_code is not None:
+            self.end_time = time.time()
+            self.output.close()
+            return False
+
+        return True
+
+    def stop(self):
+        """
+        Terminate the process of the experiment.
+        """
+
+        if self.poll():
+            self.process.terminate()
+            self.process.wait()
+            self.poll()
+
+    def get_status(self):
+        """
+        :return: The status of the experiment: waiting, running, done or failed
+        """
+
+        if self.process is None:
+            return "waiting"
+        if self.return_code is None:
+            return "running"
+
+        return "done" if self.return_code == 0 else "failed"
+
+    def get_duration(self):
+        """
+        :return: The running time of the experiment, in seconds (0 if not started)
+        """
+
+        if self.start_time is None:
+            return 0
+
+        return (self.end_time or time.time()) - self.start_time
+
+
+class ExperimentRunner:
+    """
+    Run several experiments at the same time on the cluster.
+
+    :ivar experiments: The list of :class:`Experiment`, in order of submission
+    :ivar capacity: The number of containers of the cluster (None if unbounded)
+    :ivar max_parallel: The maximum number of experiments running at the same time
+    :ivar runner_dir: The directory of the working copies of the experiments
+    """
+
+    def __init__(self, experiments, capacity=None, max_parallel=None, runner_dir=None):
+        self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
+        self.experiments = list(experiments)
+
+        settings = read_settings(self.experiments[0].folder) if self.experiments else {}
+
+        self.capacity = capacity if capacity is not None else cluster_capacity(settings)
+        self.max_parallel = int(float(max_parallel or settings.get("runner_max_parallel",
+                                                                   Globals.runner_max_parallel)))
+        self.runner_dir = runner_dir or settings.get("runner_dir", Globals.runner_dir)
+        self.prefix = settings.get("experiment_id", "") or "x"
+        self.next_candidate = 0
+
+    def assign_namespace(self, experiment, running):
+        """
+        Assign to an experiment a new experiment id whose address ranges do not overlap with the ones of the running
+        experiments.
+
+        :param experiment: The :class:`Experiment` to start
+        :param running: The list of the running experiments
+        :return: True if an experiment id has been found, False otherwise
+        """
+
+        used = [{e.namespace[i] for e in running} for i in range(3)]
+
+        for candidate in range(self.next_candidate, self.next_candidate + __max_candidates__):
+            experiment_id = "{0}{1}".format(self.prefix, candidate)
+            namespace = address_namespace(experiment_id)
+
+            if not any(value in values for value, values in zip(namespace, used)):
+                self.next_candidate = candidate + 1
+                experiment.experiment_id = experiment_id
+                experiment.namespace = namespace
+                self.logger.info("[{0}] Experiment id {1}, router network {2}".format(experiment, experiment_id,
+                                                                                     namespace[0]))
+                return True
+
+        return False
+
+    def fits(self, experiment, running):
+        """
+        :param experiment: The :class:`Experiment` waiting to start
+        :param running: The list of the running experiments
+        :return: True if the experiment can start, False otherwise
+        """
+
+        if len(running) >= self.max_parallel:
+            return False
+        if self.capacity is None or not running:
+            return True
+
+        return sum(e.size for e in running) + experiment.size <= self.capacity
+
+    def run(self):
+        """
+        Run all the experiments and wait for their end.
+
+        :return: True if all the experiments succeeded, False otherwise
+        """
+
+        waiting = list(self.experiments)
+        running = []
+
+        print(make_colored("blue", "Running {0} experiments, at most {1} at the same time, on a capacity of {2} "
+                                   "containers".format(len(waiting), self.max_parallel,
+                                                       self.capacity if self.capacity is not None else "unbounded")))
+
+        try:
+            while waiting or running:
+                for experiment in list(waiting):
+                    if not self.fits(experiment, running) or not self.assign_namespace(experiment, running):
+                        continue
+
+                    try:
+                        experiment.prepare(self.runner_dir)
+                        experiment.start()
+                    except (OSError, configparser.Error) as error:
+                        self.logger.error("[{0}] Error starting the experiment. Error: {1}".format(experiment, error))
+                        print(make_colored("red", "[{0}] Error starting the experiment: {1}".format(experiment,
+                                                                                                  error)))
+                        experiment.return_code = -1
+                        waiting.remove(experiment)
+                        continue
+
+                    waiting.remove(experiment)
+                    running.append(experiment)
+                    print(make_colored("blue", "[{0}] Started as {1} ({2} containers)".format(
+                        experiment, experiment.experiment_id, experiment.size)))
+
+                time.sleep(__poll_interval__)
+
+                for experiment in list(running):
+                    if not experiment.poll():
+                        running.remove(experiment)
+                        color = "green" if experiment.return_code == 0 else "red"
+                        print(make_colored(color, "[{0}] Finished in {1:.0f}s with exit code {2}".format(
+                            experiment, experiment.get_duration(), experiment.return_code)))
+        except KeyboardInterrupt:
+            print(make_colored("yellow", "Stopping the running experiments"))
+            for experiment in running:
+                experiment.stop()
+
+        return all(e.return_code == 0 for e in self.experiments)
+
+    def format_summary(self):
+        """
+        Format the status of the experiments as a table.
+
+        :return: The table, as a string
+        """
+
+        lines = ["{0:<24} {1:<8} {2:>10} {3:>8} {4:>10}".format("Experiment", "ID", "Containers", "Status",
+                                                                "Time(s)")]
+
+        for e in self.experiments:
+            lines.append("{0:<24} {1:<8} {2:>10} {3:>8} {4:>10.0f}".format(e.name, e.experiment_id or "-", e.size,
+                                                                         e.get_status(), e.get_duration()))
+
+        return "\n".join(lines)
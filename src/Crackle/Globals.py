@@ -16,6 +16,16 @@ test_duration = None
 chunk_size = None  # This is the size of one chunk (in Byte)
 layer2_prot = None  # can be udp, tcp or ethernet
 
+# Workload: if workload_engine is set, each client sends requests following its arrival process and popularity inside
+# its time window (see Crackle.Workload), otherwise it downloads its name once. At most workload_workers requests run
+# at the same time, and workload_seed makes the timeline reproducible (0: random). If workload_replay is set, the
+# requests are written in a trace pushed in each container and replayed there, instead of being dispatched one by one
+
+workload_engine = 0
+workload_replay = 0
+workload_workers = 64
+workload_seed = 0
+
 # Client Parameters
 
 file_size_distribution = None
@@ -32,12 +42,74 @@ nfd_stats_interval = None
 
 wldr_face = None
 
+# Maximum number of setup operations running at the same time (0: no limit)
+
+setup_workers = 64
+
+# Repeated tests: if set, the containers are snapshotted after the first setup and restored before each next test,
+# instead of being created again. Stateful snapshots (CRIU) also keep links, faces and routes, otherwise they are set
+# up again after each restore.
+
+snapshot_restore = 0
+snapshot_stateful = 0
+
+# Scripts: if set, the compiled link and routing scripts are also written in scripts_dir, otherwise they are pushed
+# to the containers directly from memory
+
+write_scripts = 1
+
+# Bundles: if set, the NFD configuration file and the scripts of the containers of each server are pushed in a single
+# archive through SSH (see Crackle.Bundle), otherwise each file is pushed with a request to LXD
+
+bundle_push = 0
+
+# Number of containers of a server in each bundle: the containers of a bundle wait until all of them are created
+# (0 means one bundle for all the containers of the server)
+
+bundle_chunk_size = 32
+
+# Manifest: if set, before skipping the push of a file unchanged since the last push (see Crackle.Manifest) its content
+# is also verified inside the container
+
+manifest_verify = 0
+
+# Statistics: number of nodes from which the statistics are downloaded at the same time, size of the chunks of the
+# downloads (bytes) and number of attempts for each download
+
+stats_workers = 16
+stats_chunk_size = 1048576
+stats_retries = 3
+
+# Telemetry: sampling interval of the live metrics (seconds) and number of samples kept for each node
+
+telemetry_interval = 1
+telemetry_history = 600
+
+# Analysis store: if ingest_stats is set, the statistics collected after each test are ingested in analysis_dir (see
+# Crackle.StatsStore) by ingest_workers processes (0: one for each CPU)
+
+analysis_dir = "../analysis/"
+ingest_stats = 0
+ingest_workers = 0
+
+# Tracing: if set, the setup phases, the tasks, the LXD calls and the SSH commands are recorded (see Crackle.Tracing)
+
+tracing = 0
+
+# Handoff: if set, the station attaches to the new base station before leaving the old one
+
+handoff_make_before_break = 0
+
 # Global Routing
 
 global_routing = None
 
 # Mobility Parameters
 
+mobility_area_w = 200
+mobility_area_h = 200
+
+# Bounds of the mobility area. If not set, they default to (0, mobility_area_w) and (0, mobility_area_h)
 mobility_area_x_0 = None
 mobility_area_x_max = None
 mobility_area_y_0 = None
@@ -72,8 +144,37 @@ ip_addresses = ""
 lxd_password = ""
 lxd_port = ""
 
+# Maximum number of containers of each server, comma separated (empty: unknown, the containers are evenly distributed)
+server_capacities = ""
+
+# Placement of the containers on the servers: partition (minimize the traffic between the servers) or round_robin
+placement_algorithm = "round_robin"
+placement_imbalance = 0.05  # fraction by which a server can exceed its share of containers
+placement_traffic_weight = 1  # weight of the expected traffic with respect to the link capacity
+
+# If set, the capacity of each server is limited by the CPUs and the memory still available on it
+resource_aware_placement = 0
+container_memory = 256  # memory needed by a container, in MB
+containers_per_cpu = 8  # containers that can share a CPU thread
+
 router_base_image = ""
 
 # Experiment ID for multiple experiments on a server
 
 experiment_id = ""
+
+# Concurrent experiments (see Crackle.ExperimentRunner): directory of the working copies of the experiments and maximum
+# number of experiments running at the same time
+
+runner_dir = "/tmp/crackle-runs/"
+runner_max_parallel = 4
+
+# Streamed command output (e.g. nfd-status on all the nodes): lines buffered before the commands wait for the reader,
+# and maximum number of commands running at the same time
+
+exec_buffer_lines = 10000
+exec_max_active = 64
+
+# Directory of the results of the parameter sweeps (see Crackle.Sweep)
+
+sweep_dir = "../sweeps/"
@@ -63,20 +63,26 @@ Putting all the pieces together, Routers and Base Stations are connected through
 are in turn connected to the simulator NS-3, one process per base station. Each simulator process provides some tap
 interfaces through which the mobile stations can connect to the base station (exploiting the simulator).
 """
+import collections
+import hashlib
 import logging
-import random
 import socket
 import binascii
 import ssl
 import struct
+import threading
 import time
 
+import numpy
+
 import Crackle.Globals
 from Crackle import LxdAPI
+from Crackle import Manifest
 
 import Crackle.Constants as Constants
 from Crackle import Globals
 from Crackle.ColoredOutput import make_colored
+from Crackle.Tracing import TracedPopen
 import subprocess
 
 
@@ -87,7 +93,7 @@ __sta_bridge__ = "{0}-mbr"
 
 module_logger = logging.getLogger(__name__)
 
-__router_network__ = "10.{0}.0.0/16".format(random.randint(0x05, 0xfe))
+__router_network__ = None  # Set by AddressGenerator.setup, depending on the experiment id
 __base_station_network__ = "10.1.0.0/16"
 __links_addresses__ = "10.2.0.0/16"
 __gre_endpoints_network__ = "10.4.0.0/16"
@@ -281,7 +287,7 @@ def create_tap_device(tap_name, server, vlan):
               "{0}@{1}".format(Globals.username, server),
               "sudo ip tuntap add name {0} mode tap".format(tap_name)]
 
-    p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+    p = TracedPopen(params, stdout=subprocess.DEVNULL)
 
     if not p.wait():
         module_logger.info("Tap {0} correctly created!".format(tap_name))
@@ -305,7 +311,7 @@ def create_tap_device(tap_name, server, vlan):
                                                                            Constants.LXD_BRIDGE,
                                                                            vlan)]
 
-    p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+    p = TracedPopen(params, stdout=subprocess.DEVNULL)
 
     if not p.wait():
         module_logger.info("Tap {0} correctly configured and added to {1}!".format(tap_name,
@@ -316,18 +322,222 @@ def create_tap_device(tap_name, server, vlan):
         raise RuntimeError
 
 
+def experiment_hash(experiment_id):
+    """
+    Hash the experiment id into an integer, used to derive the address ranges of the experiment.
+
+    :param experiment_id: The experiment id
+    :return: A 32 bit integer
+    """
+
+    return struct.unpack(">I", hashlib.sha1(str(experiment_id).encode()).digest()[:4])[0]
+
+
+def format_ip_addresses(values):
+    """
+    Convert an array of IPv4 addresses from integers to strings.
+
+    :param values: The addresses, as unsigned 32 bit integers
+    :return: The list of addresses in dotted notation
+    """
+
+    packed = numpy.asarray(values).astype(">u4").tobytes()
+
+    return [socket.inet_ntoa(packed[i:i + 4]) for i in range(0, len(packed), 4)]
+
+
+__hex_digits__ = numpy.frombuffer(b"0123456789abcdef", dtype=numpy.uint8)
+__mac_nibble_shifts__ = numpy.arange(44, -1, -4, dtype=numpy.uint64)
+__mac_digit_columns__ = [i for i in range(17) if i % 3 != 2]
+
+
+def format_mac_addresses(values):
+    """
+    Convert an array of MAC addresses from integers to strings.
+
+    :param values: The addresses, as unsigned 64 bit integers
+    :return: The list of addresses in colon notation
+    """
+
+    values = numpy.asarray(values, dtype=numpy.uint64).reshape(-1, 1)
+
+    # One row of 17 characters per address: the 12 hex digits and the colons between them
+    chars = numpy.full((len(values), 17), ord(":"), dtype=numpy.uint8)
+    chars[:, __mac_digit_columns__] = __hex_digits__[((values >> __mac_nibble_shifts__) &
+                                                      numpy.uint64(0xf)).astype(numpy.intp)]
+
+    return chars.view("S17").ravel().astype(str).tolist()
+
+
+class AddressPool:
+    """
+    A range of addresses assigned in order. The addresses are computed in blocks, converting all the addresses of a
+    block at once, and then handed out one at a time.
+
+    :ivar next_address: The first address not yet computed
+    :ivar last_address: The last address of the range
+    :ivar formatter: The function converting an array of addresses to strings
+    :ivar reserved: The addresses computed and not yet handed out
+    """
+
+    def __init__(self, first_address, last_address, formatter):
+        self.next_address = first_address
+        self.last_address = last_address
+        self.formatter = formatter
+        self.reserved = collections.deque()
+
+    def reserve(self, n):
+        """
+        Compute the next n addresses of the range.
+
+        :param n: The number of addresses
+        :raises: :class:`RuntimeError` if the range does not contain n more addresses
+        """
+
+        if n <= 0:
+            return
+
+        if self.next_address + n - 1 > self.last_address:
+            raise RuntimeError("Address range exhausted: {0} addresses requested, {1} available".format(
+                n, self.last_address - self.next_address + 1))
+
+        self.reserved.extend(self.formatter(numpy.arange(self.next_address, self.next_address + n,
+                                                         dtype=numpy.uint64)))
+        self.next_address += n
+
+    def get(self):
+        """
+        Return the next address of the range.
+
+        :return: The address, as string
+        """
+
+        if not self.reserved:
+            self.reserve(1)
+
+        return self.reserved.popleft()
+
+
+class AddressPlan:
+    """
+    The addresses of an experiment: one :class:`AddressPool` for each network and one for the MAC addresses.
+    The ranges are derived from a hash of the experiment id, so the same experiment always gets the same addresses:
+
+        - the router network 10.<5..254>.0.0/16 (250 networks)
+        - the GRE endpoints 10.4.<0..255>.0/24 (256 networks)
+        - the MAC addresses 00:16:3e:<0..f>0:00:00/20 (16 ranges)
+
+    Two experiment ids may therefore get the same ranges. The :class:`Crackle.ExperimentRunner.ExperimentRunner`
+    chooses ids whose ranges do not overlap, while the ids chosen by hand are checked when the cluster is configured
+    (:meth:`Crackle.ClusterManager.ClusterManager.check_server_namespace`): the setup fails if the router network or the
+    GRE network is already configured on a server. The MAC ranges only matter within the bridge of an experiment, so
+    they are not checked.
+
+    The plan can be shared by several threads.
+
+    :ivar router_network: The network of the routers of the experiment
+    :ivar gre_network: The network of the GRE endpoints of the experiment
+    :ivar pools: The map network => :class:`AddressPool`
+    :ivar mac_pool: The :class:`AddressPool` of the MAC addresses
+    """
+
+    def __init__(self, experiment_id):
+        h = experiment_hash(experiment_id)
+
+        router_subnet = 0x05 + h % (0xfe - 0x05 + 1)
+        self.router_network = "10.{0}.0.0/16".format(router_subnet)
+
+        router_base = 0x0a000000 | router_subnet << 16
+        gre_base = 0x0a040000 | (h >> 8 & 0xff) << 8
+        self.gre_network = "{0}/24".format(socket.inet_ntoa(struct.pack(">I", gre_base)))
+
+        self.pools = {self.router_network: AddressPool(router_base + 1, router_base + 0xfffe, format_ip_addresses),
+                      __base_station_network__: AddressPool(0x0a010001, 0x0a01fffe, format_ip_addresses),
+                      __links_addresses__: AddressPool(0x0a020001, 0x0a02fffe, format_ip_addresses),
+                      __gre_endpoints_network__: AddressPool(gre_base + 1, gre_base + 0xfe, format_ip_addresses)}
+
+        mac_base = 0x00163e000000 | (h >> 16 & 0x0f) << 20
+        self.mac_pool = AddressPool(mac_base + 1, mac_base + 0xfffff, format_mac_addresses)
+
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def pool(self, network):
+        """
+        Return the pool of network.
+
+        :param network: The network
+        :return: The :class:`AddressPool` of the network
+        :raises: :class:`RuntimeError` if the network is not part of the plan
+        """
+
+        try:
+            return self.pools[network]
+        except KeyError:
+            raise RuntimeError("Network {0} not in the address plan".format(network))
+
+    def reserve(self, ip_addresses, mac_addresses=0):
+        """
+        Compute in one pass the addresses that are going to be requested.
+
+        :param ip_addresses: The map network => number of addresses
+        :param mac_addresses: The number of MAC addresses
+        """
+
+        with self.lock:
+            for network, n in ip_addresses.items():
+                self.pool(network).reserve(n)
+            self.mac_pool.reserve(mac_addresses)
+
+    def get_ip_address(self, network):
+        with self.lock:
+            return self.pool(network).get()
+
+    def get_mac_address(self):
+        with self.lock:
+            return self.mac_pool.get()
+
+
 class AddressGenerator:
     """
     The purpose of this class is to generate sequential deterministic MAC/IP addresses
-    in order to assign them to the node in the network.
+    in order to assign them to the node in the network. The addresses come from the :class:`AddressPlan` of the
+    current experiment, created by :meth:`setup`.
     """
 
-    mac_address = 0x00163e000000
-    router_ip_address = struct.unpack(">I", socket.inet_aton(__router_network__[:-3]))[0]
-    bs_ip_address = 0x0a010000
-    link_ip_address = 0x0a020000
-    gre_endpoint_start_address = 0x0a040000
-    gre_endpoint_final_address = 0x0a04fffe
+    plan = None
+
+    @staticmethod
+    def setup(experiment_id):
+        """
+        Create the address plan of the experiment experiment_id and set the router network accordingly.
+
+        :param experiment_id: The experiment id
+        """
+
+        global __router_network__
+
+        AddressGenerator.plan = AddressPlan(experiment_id)
+        __router_network__ = AddressGenerator.plan.router_network
+
+    @staticmethod
+    def reserve(ip_addresses, mac_addresses=0):
+        """
+        Compute in one pass the addresses that are going to be requested.
+
+        :param ip_addresses: The map network => number of addresses
+        :param mac_addresses: The number of MAC addresses
+        """
+
+        AddressGenerator.plan.reserve(ip_addresses, mac_addresses)
 
     @staticmethod
     def get_mac_address():
@@ -336,8 +546,7 @@ class AddressGenerator:
 
         :return: The MAC address
         """
-        AddressGenerator.mac_address += 1
-        return ':'.join(map(''.join, zip(*[iter(hex(AddressGenerator.mac_address)[2:].zfill(12))]*2)))
+        return AddressGenerator.plan.get_mac_address()
 
     @staticmethod
     def get_ip_address(network):
@@ -347,20 +556,10 @@ class AddressGenerator:
         :return: The MAC address
         """
 
-        if network == __base_station_network__:
-            AddressGenerator.bs_ip_address += 1
-            return socket.inet_ntoa(struct.pack('>I', AddressGenerator.bs_ip_address))
-        elif network == __router_network__:
-            AddressGenerator.router_ip_address += 1
-            return socket.inet_ntoa(struct.pack('>I', AddressGenerator.router_ip_address))
-        elif network == __links_addresses__:
-            AddressGenerator.link_ip_address += 1
-            return socket.inet_ntoa(struct.pack('>I', AddressGenerator.link_ip_address))
-        elif network == __gre_endpoints_network__:
-            return socket.inet_ntoa(struct.pack('>I', random.randint(AddressGenerator.gre_endpoint_start_address,
-                                                                     AddressGenerator.gre_endpoint_final_address)))
-        else:
-            raise RuntimeError
+        return AddressGenerator.plan.get_ip_address(network)
+
+
+AddressGenerator.setup(Globals.experiment_id)
 
 
 class RouterContainer:
@@ -564,6 +763,8 @@ class RouterContainer:
 
         self.description["source"]["certificate"] = image_server_certificate
 
+        Manifest.forget(self.name)
+
         try:
 
             LxdAPI.create_container(description=self.description,
@@ -587,6 +788,8 @@ class RouterContainer:
                               "Server on which launch the container not set. (Strange behavior!).".format(self.name))
             raise RuntimeError
 
+        Manifest.forget(self.name)
+
         try:
             LxdAPI.stop_container(self.server,
                                   self.name,
@@ -609,6 +812,8 @@ class RouterContainer:
                               "Server on which launch the container not set. (Strange behavior!).".format(self.name))
             raise RuntimeError
 
+        Manifest.forget(self.name)
+
         try:
             LxdAPI.delete_container(self.server,
                                     self.name)
@@ -618,6 +823,54 @@ class RouterContainer:
 
         return True
 
+    def snapshot_container(self, snapshot, stateful=True):
+        """
+        Take a snapshot of the container, replacing an older snapshot with the same name.
+
+        :param snapshot: The name of the snapshot
+        :param stateful: Whether to save the state of the running processes
+        :return: True if the snapshot has been taken, False otherwise
+        """
+
+        if self.server is None:
+            self.logger.error("[{0}] Impossible to take a snapshot of the container. "
+                              "Server on which launch the container not set. (Strange behavior!).".format(self.name))
+            raise RuntimeError
+
+        try:
+            if snapshot in LxdAPI.list_snapshots(self.server, self.name):
+                LxdAPI.delete_snapshot(self.server, self.name, snapshot)
+            LxdAPI.create_snapshot(self.server, self.name, snapshot, stateful)
+        except RuntimeError:
+            self.logger.error("[{0}] Error taking the snapshot {1}.".format(self.name, snapshot))
+            return False
+
+        return True
+
+    def restore_container(self, snapshot, stateful=True):
+        """
+        Restore the container from a snapshot.
+
+        :param snapshot: The name of the snapshot
+        :param stateful: Whether to restore the state of the running processes saved in the snapshot
+        :return: True if the container has been restored, False otherwise
+        """
+
+        if self.server is None:
+            self.logger.error("[{0}] Impossible to restore the container. "
+                              "Server on which launch the container not set. (Strange behavior!).".format(self.name))
+            raise RuntimeError
+
+        Manifest.forget(self.name)
+
+        try:
+            LxdAPI.restore_snapshot(self.server, self.name, snapshot, stateful)
+        except RuntimeError:
+            self.logger.error("[{0}] Error restoring the snapshot {1}.".format(self.name, snapshot))
+            return False
+
+        return True
+
     def start_container(self):
         """
         Start the container.
@@ -659,7 +912,7 @@ class RouterContainer:
                                                                      self.vlan,
                                                                      self.server.get_container_gateway())]
 
-        p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+        p = TracedPopen(params, stdout=subprocess.DEVNULL)
 
         if p.wait():
             self.logger.error("[{0}] Error adding interface {1} to bridge {2}.".format(self.server,
@@ -672,12 +925,14 @@ class RouterContainer:
                                                                                   Constants.LXD_BRIDGE))
         return True
 
-    def pull_file(self, source_path, dest_path):
+    def pull_file(self, source_path, dest_path, chunk_size=2048, offset=0):
         """
         Download a file from the container.
 
         :param source_path: The location of the file inside the container
         :param dest_path: The destination of the file in the host
+        :param chunk_size: The size of the chunks written to dest_path
+        :param offset: The number of bytes already downloaded in dest_path (see :func:`Crackle.LxdAPI.pull_file`)
         :return: True if the file pull succeed, false otherwise
         """
 
@@ -692,9 +947,11 @@ class RouterContainer:
                              destination_path=dest_path,
                              mode={Constants.__header_X_LXD_gid__: "0",
                                    Constants.__header_X_LXD_uid__: "0",
-                                   Constants.__header_X_LXD_mode__: "700"})
+                                   Constants.__header_X_LXD_mode__: "700"},
+                             chunk_size=chunk_size,
+                             offset=offset)
         except RuntimeError:
-            self.logger.error("[{0}] Error pushing file {1} to {2}.".format(self.name,
+            self.logger.error("[{0}] Error pulling file {1} to {2}.".format(self.name,
                                                                             source_path,
                                                                             dest_path))
             return False
@@ -722,16 +979,30 @@ class RouterContainer:
 
         return True
 
-    def push_file(self, source_path, dest_path):
+    def push_file(self, source_path, dest_path, data=None):
         """
-        Push a file inside the container.
+        Push a file inside the container. The upload is skipped if the same content has already been pushed at
+        dest_path (see :mod:`Crackle.Manifest`).
 
         :param source_path: The location of the file to push
         :param dest_path: The path of the file inside the container
+        :param data: The content of the file, if it is not read from source_path
 
         :return: True if the push succeed, False otherwise
         """
 
+        try:
+            data = Manifest.read_content(source_path, data)
+        except IOError as error:
+            self.logger.error("[{0}] Error reading file {1}. Error: {2}".format(self.name, source_path, error))
+            return False
+
+        key = Manifest.digest(data)
+
+        if Manifest.lookup(self.name, dest_path) == key and self.verify_file(dest_path, key):
+            self.logger.debug("[{0}] File {1} unchanged, not pushed".format(self.name, dest_path))
+            return True
+
         self.logger.info("[{0}] Pushing file {1} inside the container ({2})".format(self.name,
                                                                                     source_path,
                                                                                     dest_path))
@@ -743,11 +1014,39 @@ class RouterContainer:
                              destination_path=dest_path,
                              mode={Constants.__header_X_LXD_gid__: "0",
                                    Constants.__header_X_LXD_uid__: "0",
-                                   Constants.__header_X_LXD_mode__: "700"})
+                                   Constants.__header_X_LXD_mode__: "700"},
+                             data=data)
         except RuntimeError:
             self.logger.error("[{0}] Error pushing file {1} to {2}.".format(self.name,
                                                                             source_path,
                                                                             dest_path))
+            Manifest.forget(self.name, dest_path)
+            return False
+
+        Manifest.record(self.name, dest_path, key)
+
+        return True
+
+    def verify_file(self, path, key):
+        """
+        Check that a file inside the container has the expected content, if Globals.manifest_verify is set.
+
+        :param path: The path of the file inside the container
+        :param key: The expected sha1 of the content
+        :return: True if the content is the expected one (or if the verification is disabled), False otherwise
+        """
+
+        if not Globals.manifest_verify:
+            return True
+
+        try:
+            LxdAPI.exec_cmd(server=self.server,
+                            container=self.name,
+                            cmd=Manifest.verify_command(path, key),
+                            environment={"HOME": "/root", "USER": "root"})
+        except RuntimeError:
+            self.logger.info("[{0}] File {1} modified inside the container".format(self.name, path))
+            Manifest.forget(self.name, path)
             return False
 
         return True
@@ -779,6 +1078,38 @@ class RouterContainer:
 
         return True
 
+    def run_command_output(self, params):
+        """
+        Run a command inside the container and capture its output through the websockets of the operation.
+
+        :param params: The list with the command and the parameters
+        :return: The tuple (return code, stdout, stderr as strings), or None if the command cannot be executed
+        """
+
+        try:
+            return_code, stdout, stderr = LxdAPI.exec_cmd(server=self.server,
+                                                          container=self.name,
+                                                          cmd=params,
+                                                          environment={"HOME": "/root", "USER": "root"},
+                                                          check_return=False,
+                                                          capture=True)
+        except RuntimeError:
+            self.logger.error("[{0}] Error executing command {1}".format(self.name, params))
+            return None
+
+        return return_code, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+    def stream_command(self, params, multiplexer, tag=None):
+        """
+        Start a command inside the container without waiting for its end, streaming its output into a multiplexer.
+
+        :param params: The list with the command and the parameters
+        :param multiplexer: The :class:`Crackle.LxdAPI.OutputMultiplexer`
+        :param tag: The tag of the output lines (by default the name of the container)
+        """
+
+        multiplexer.add(tag or self.name, self.server, self.name, params, {"HOME": "/root", "USER": "root"})
+
 
 class BaseStationContainer(RouterContainer):
     """
@@ -1000,7 +1331,7 @@ class BaseStationContainer(RouterContainer):
                                                                      self.bs_ip_address,
                                                                      self.server.get_container_gateway())]
 
-        p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+        p = TracedPopen(params, stdout=subprocess.DEVNULL)
 
         if p.wait():
             self.logger.error("[{0}] Error adding interface {1} {2} to bridge {3}.".format(self.server,
@@ -1160,7 +1491,7 @@ class StationContainer(RouterContainer):
 
         command = [" ".join(eth0_conf + commands)[:-3]]
         params = header + command
-        p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+        p = TracedPopen(params, stdout=subprocess.DEVNULL)
         if p.wait():
             self.logger.error("[{0}] Error setting interfaces of mobile station {1}. Params: {2}".format(self.server,
                                                                                                          self.veth0_name,
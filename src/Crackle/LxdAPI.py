@@ -2,16 +2,20 @@
 This class manages the interaction with the LXD daemon through REST APIs and websockets.
 
 """
+import codecs
 import logging
+import queue
 import ssl
+import threading
 import urllib
-from websocket import WebSocket
+from websocket import WebSocket, WebSocketConnectionClosedException
 
 import requests
 import requests.exceptions as req_except
 
 from Crackle import Globals
 from Crackle import Constants
+from Crackle import Tracing
 
 module_logger = logging.getLogger(__name__)
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
@@ -68,10 +72,10 @@ def stop_container(server="", container="", async=False):
     }
 
     try:
-        resp = requests.put(url=url,
-                            json=state_json,
-                            cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                            verify=False)
+        resp = Tracing.http_request("PUT", url=url,
+                                    json=state_json,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("Error stopping container {0}. "
@@ -96,9 +100,9 @@ def stop_container(server="", container="", async=False):
                                         response[Constants.__operation__])
 
         try:
-            resp = requests.get(url=operation_url + "/wait?timeout=30",
-                                cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                                verify=False)
+            resp = Tracing.http_request("GET", url=operation_url + "/wait?timeout=30",
+                                        cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                        verify=False)
             resp.raise_for_status()
         except req_except.HTTPError as http_error:
             module_logger.error("[{0}] Error stopping the container. Error: {1}".format(container, http_error.strerror))
@@ -129,10 +133,10 @@ def start_container(server="", container=""):
     }
 
     try:
-        resp = requests.put(url=url,
-                            json=state_json,
-                            cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                            verify=False)
+        resp = Tracing.http_request("PUT", url=url,
+                                    json=state_json,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("Error starting container {0}. "
@@ -157,9 +161,9 @@ def start_container(server="", container=""):
                                     response[Constants.__operation__])
 
     try:
-        resp = requests.get(url=operation_url + "/wait?timeout=30",
-                            cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                            verify=False)
+        resp = Tracing.http_request("GET", url=operation_url + "/wait?timeout=30",
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("[{0}] Error starting the container. Error: {1}".format(container, http_error.strerror))
@@ -194,10 +198,10 @@ def create_container(description=default_container,
     # Create the container on the server
 
     try:
-        resp = requests.post(url=url,
-                             json=description,
-                             cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                             verify=False)
+        resp = Tracing.http_request("POST", url=url,
+                                    json=description,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
 
@@ -221,9 +225,9 @@ def create_container(description=default_container,
     # Wait for container creation
 
     try:
-        resp = requests.get(url=operation_url + "/wait?timeout=60",
-                            cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                            verify=False)
+        resp = Tracing.http_request("GET", url=operation_url + "/wait?timeout=60",
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("{0}. Error: {1}".format(error_message, http_error.strerror))
@@ -237,7 +241,17 @@ def create_container(description=default_container,
         module_logger.debug("[{0}] {1}. Response: {2}".format(description["name"], success_message, resp.json()))
 
 
-def push_file(server="", container="", source_path="", destination_path="", mode=default_file_modes):
+def push_file(server="", container="", source_path="", destination_path="", mode=default_file_modes, data=None):
+    """
+    Push a file inside a container.
+
+    :param server: The server on which the container is running
+    :param container: The name of the container
+    :param source_path: The path of the local file to push (ignored if data is given)
+    :param destination_path: The path of the file inside the container
+    :param mode: The headers with uid, gid and permissions of the file
+    :param data: The content of the file, if it is not read from source_path
+    """
 
     url_prefix = "{0}{1}{2}{3}".format("https://",
                                        server,
@@ -248,17 +262,21 @@ def push_file(server="", container="", source_path="", destination_path="", mode
                           Constants.__PUSH__.format(container,
                                                     destination_path))
 
-    file = open(source_path, "rb")
+    if data is None:
+        with open(source_path, "rb") as f:
+            data = f.read()
+    else:
+        source_path = source_path or destination_path
 
     headers = mode.copy()
     headers[Constants.__header_content_type__] = "application/octet-stream"
 
     try:
-        resp = requests.post(url=url,
-                             cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                             verify=False,
-                             headers=headers,
-                             data=file)
+        resp = Tracing.http_request("POST", url=url,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False,
+                                    headers=headers,
+                                    data=data)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("Error pushing file {0}. "
@@ -276,7 +294,21 @@ def push_file(server="", container="", source_path="", destination_path="", mode
         raise RuntimeError
 
 
-def pull_file(server="", container="", source_path="", destination_path="", mode=default_file_modes):
+def pull_file(server="", container="", source_path="", destination_path="", mode=default_file_modes,
+              chunk_size=2048, offset=0):
+    """
+    Pull a file from a container, streaming it to a local file.
+
+    :param server: The server on which the container is running
+    :param container: The name of the container
+    :param source_path: The path of the file inside the container
+    :param destination_path: The path of the local file
+    :param mode: Unused, kept for symmetry with :func:`push_file`
+    :param chunk_size: The size of the chunks written to the local file
+    :param offset: The number of bytes already in the local file. The transfer is resumed from there if the server
+                   honors the Range header, otherwise the file is downloaded again from the beginning
+    :return: The size of the local file
+    """
 
     url_prefix = "{0}{1}{2}{3}".format("https://",
                                        server,
@@ -287,23 +319,27 @@ def pull_file(server="", container="", source_path="", destination_path="", mode
                           Constants.__PULL__.format(container,
                                                     source_path))
 
+    headers = {"Range": "bytes={0}-".format(offset)} if offset else {}
+
     try:
-        resp = requests.get(url=url,
-                            cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                            verify=False,
-                            stream=True)
+        resp = Tracing.http_request("GET", url=url,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False,
+                                    headers=headers,
+                                    stream=True)
         resp.raise_for_status()
-    except req_except.HTTPError as http_error:
+
+        with open(destination_path, "ab" if offset and resp.status_code == 206 else "wb") as f:
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                if chunk:  # filter out keep-alive new chunks
+                    f.write(chunk)
+            return f.tell()
+    except req_except.RequestException as error:
         module_logger.error("Error pulling file {0}. "
                             "Error: {1}".format(source_path,
-                                                http_error.strerror))
+                                                error))
         raise RuntimeError
 
-    with open(destination_path, 'wb') as f:
-        for chunk in resp.iter_content(chunk_size=2048):
-            if chunk:  # filter out keep-alive new chunks
-                f.write(chunk)
-
 
 def publish_image(server="",
                   publish_description=default_publish_description):
@@ -317,10 +353,10 @@ def publish_image(server="",
                           Constants.__IMAGES__)
 
     try:
-        resp = requests.post(url=url,
-                             cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                             verify=False,
-                             json=publish_description)
+        resp = Tracing.http_request("POST", url=url,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False,
+                                    json=publish_description)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("Error publishing image {on 0}. "
@@ -346,9 +382,9 @@ def publish_image(server="",
     # Wait for image creation
 
     try:
-        resp = requests.get(url=operation_url + "/wait",
-                            cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                            verify=False)
+        resp = Tracing.http_request("GET", url=operation_url + "/wait",
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("[{0}] Error publishing image. Error: {1}".format(server,
@@ -386,10 +422,10 @@ def set_alias(server="", image_fingerprint="", alias=""):
     }
 
     try:
-        resp = requests.post(url=url,
-                             json=alias_dict,
-                             cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                             verify=False)
+        resp = Tracing.http_request("POST", url=url,
+                                    json=alias_dict,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("Error setting alias for router image on {0}. Error: {1}".format(server,
@@ -410,10 +446,10 @@ def delete_container(server="", container=""):
     delete_command = {}
 
     try:
-        resp = requests.delete(url=url,
-                               json=delete_command,
-                               cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                               verify=False)
+        resp = Tracing.http_request("DELETE", url=url,
+                                    json=delete_command,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("[{0}] Error deleting container. "
@@ -432,9 +468,9 @@ def list_images(server=""):
                           Constants.__ALIAS__)
 
     try:
-        resp = requests.get(url=url,
-                            cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                            verify=False)
+        resp = Tracing.http_request("GET", url=url,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("Error listing alias of {0}. Error: {1}".format(server,
@@ -444,43 +480,393 @@ def list_images(server=""):
     return resp.json()[Constants.__metadata__]
 
 
-def exec_cmd(server="", container="", cmd=[],
-             environment={}, interactive=False,
-             output=False, websocket=False,
-             check_return=True, sync=True):
+def get_resources(server=""):
+    """
+    Query the LXD daemon to retrieve the resources of the server (CPU, memory)
 
-    command_json = {
-        "command": cmd,
-        "environment": environment
+    :param server: The server to query
+    :return: The resources of the server, as returned by the LXD daemon
+    """
+
+    url_prefix = "{0}{1}{2}{3}".format("https://",
+                                       server,
+                                       ":",
+                                       Globals.lxd_port)
+
+    url = "{0}{1}".format(url_prefix,
+                          Constants.__RESOURCES__)
+
+    try:
+        resp = Tracing.http_request("GET", url=url,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
+        resp.raise_for_status()
+    except req_except.HTTPError as http_error:
+        module_logger.error("[{0}] Error retrieving the resources. Error: {1}".format(server,
+                                                                                    http_error.strerror))
+        raise RuntimeError
+
+    return resp.json()[Constants.__metadata__]
+
+
+def list_containers(server=""):
+    """
+    Query the LXD daemon to retrieve the containers of the server, with their status
+
+    :param server: The server to query
+    :return: The list of containers of the server, as returned by the LXD daemon
+    """
+
+    url_prefix = "{0}{1}{2}{3}".format("https://",
+                                       server,
+                                       ":",
+                                       Globals.lxd_port)
+
+    url = "{0}{1}?recursion=1".format(url_prefix,
+                                      Constants.__CONTAINERS__)
+
+    try:
+        resp = Tracing.http_request("GET", url=url,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
+        resp.raise_for_status()
+    except req_except.HTTPError as http_error:
+        module_logger.error("[{0}] Error listing the containers. Error: {1}".format(server,
+                                                                                  http_error.strerror))
+        raise RuntimeError
+
+    return resp.json()[Constants.__metadata__]
+
+
+def wait_operation(server="", container="", response=None, timeout=60, error_message="Operation failed"):
+    """
+    Wait the end of an asynchronous LXD operation.
+
+    :param server: The server executing the operation
+    :param container: The container involved in the operation (for logging)
+    :param response: The response of the request that started the operation
+    :param timeout: The maximum time to wait, in seconds
+    :param error_message: The message logged if the operation fails
+    :return: The metadata of the operation
+    :raise: RuntimeError if the operation fails
+    """
+
+    url_prefix = "{0}{1}{2}{3}".format("https://",
+                                       server,
+                                       ":",
+                                       Globals.lxd_port)
+
+    if response[Constants.__response_type__] == Constants.__failure__:
+        module_logger.error("[{0}] {1}. Error code: {2}".format(container,
+                                                                error_message,
+                                                                response[Constants.__error_code__]))
+        raise RuntimeError
+
+    operation_url = "{0}{1}".format(url_prefix,
+                                    response[Constants.__operation__])
+
+    try:
+        resp = Tracing.http_request("GET", url=operation_url + "/wait?timeout={0}".format(timeout),
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
+        resp.raise_for_status()
+    except req_except.HTTPError as http_error:
+        module_logger.error("[{0}] {1}. Error: {2}".format(container, error_message, http_error.strerror))
+        raise RuntimeError
+
+    metadata = resp.json()[Constants.__metadata__]
+
+    if metadata[Constants.__status__] != Constants.__success__:
+        module_logger.error("[{0}] {1}. Response: {2}".format(container, error_message, resp.json()))
+        raise RuntimeError
+
+    return metadata
+
+
+def get_server_info(server=""):
+    """
+    Query the LXD daemon to retrieve the configuration and the environment of the server (e.g. the storage driver)
+
+    :param server: The server to query
+    :return: The information of the server, as returned by the LXD daemon
+    """
+
+    url_prefix = "{0}{1}{2}{3}".format("https://",
+                                       server,
+                                       ":",
+                                       Globals.lxd_port)
+
+    url = "{0}{1}".format(url_prefix,
+                          Constants.__SERVER__)
+
+    try:
+        resp = Tracing.http_request("GET", url=url,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
+        resp.raise_for_status()
+    except req_except.HTTPError as http_error:
+        module_logger.error("[{0}] Error retrieving the server information. Error: {1}".format(server,
+                                                                                             http_error.strerror))
+        raise RuntimeError
+
+    return resp.json()[Constants.__metadata__]
+
+
+def list_snapshots(server="", container=""):
+    """
+    Query the LXD daemon to retrieve the names of the snapshots of a container
+
+    :param server: The server on which the container is running
+    :param container: The name of the container
+    :return: The list of the names of the snapshots
+    """
+
+    url_prefix = "{0}{1}{2}{3}".format("https://",
+                                       server,
+                                       ":",
+                                       Globals.lxd_port)
+
+    url = "{0}{1}".format(url_prefix,
+                          Constants.__SNAPSHOTS__.format(container))
+
+    try:
+        resp = Tracing.http_request("GET", url=url,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
+        resp.raise_for_status()
+    except req_except.HTTPError as http_error:
+        module_logger.error("[{0}] Error listing the snapshots. Error: {1}".format(container,
+                                                                                 http_error.strerror))
+        raise RuntimeError
+
+    return [snapshot.rstrip("/").split("/")[-1] for snapshot in resp.json()[Constants.__metadata__]]
+
+
+def create_snapshot(server="", container="", snapshot="", stateful=True):
+    """
+    Take a snapshot of a container. A stateful snapshot also saves the memory of the running processes (it requires
+    CRIU on the server). On copy-on-write storage (ZFS, btrfs, LVM) the snapshot shares the unchanged blocks with the
+    container.
+
+    :param server: The server on which the container is running
+    :param container: The name of the container
+    :param snapshot: The name of the snapshot
+    :param stateful: Whether to save the state of the running processes
+    """
+
+    url_prefix = "{0}{1}{2}{3}".format("https://",
+                                       server,
+                                       ":",
+                                       Globals.lxd_port)
+
+    url = "{0}{1}".format(url_prefix,
+                          Constants.__SNAPSHOTS__.format(container))
+
+    snapshot_json = {
+        "name": snapshot,       # Name of the snapshot
+        "stateful": stateful    # Whether to include the state of the running processes
     }
 
+    try:
+        resp = Tracing.http_request("POST", url=url,
+                                    json=snapshot_json,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
+        resp.raise_for_status()
+    except req_except.HTTPError as http_error:
+        module_logger.error("[{0}] Error creating snapshot {1}. Error: {2}".format(container,
+                                                                                 snapshot,
+                                                                                 http_error.strerror))
+        raise RuntimeError
+
+    wait_operation(server, container, resp.json(), error_message="Error creating snapshot {0}".format(snapshot))
+
+    module_logger.debug("[{0}] Snapshot {1} created".format(container, snapshot))
+
+
+def restore_snapshot(server="", container="", snapshot="", stateful=True):
+    """
+    Restore a container from one of its snapshots.
+
+    :param server: The server on which the container is running
+    :param container: The name of the container
+    :param snapshot: The name of the snapshot
+    :param stateful: Whether to restore the state of the running processes saved in the snapshot
+    """
+
     url_prefix = "{0}{1}{2}{3}".format("https://",
                                        server,
                                        ":",
                                        Globals.lxd_port)
 
-    if interactive:
-        command_json["interactive"] = True
-    else:
-        command_json["interactive"] = False
+    url = "{0}{1}".format(url_prefix,
+                          Constants.__CONTAINER__.format(container))
 
-    if websocket:
-        command_json["wait-for-websocket"] = True
-    else:
-        command_json["wait-for-websocket"] = False
+    restore_json = {
+        "restore": snapshot,    # Name of the snapshot to restore
+        "stateful": stateful    # Whether to restore the state of the running processes
+    }
+
+    try:
+        resp = Tracing.http_request("PUT", url=url,
+                                    json=restore_json,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
+        resp.raise_for_status()
+    except req_except.HTTPError as http_error:
+        module_logger.error("[{0}] Error restoring snapshot {1}. Error: {2}".format(container,
+                                                                                  snapshot,
+                                                                                  http_error.strerror))
+        raise RuntimeError
+
+    wait_operation(server, container, resp.json(), error_message="Error restoring snapshot {0}".format(snapshot))
+
+    module_logger.debug("[{0}] Snapshot {1} restored".format(container, snapshot))
+
+
+def delete_snapshot(server="", container="", snapshot=""):
+    """
+    Delete a snapshot of a container.
+
+    :param server: The server on which the container is running
+    :param container: The name of the container
+    :param snapshot: The name of the snapshot
+    """
+
+    url_prefix = "{0}{1}{2}{3}".format("https://",
+                                       server,
+                                       ":",
+                                       Globals.lxd_port)
 
     url = "{0}{1}".format(url_prefix,
-                          Constants.__EXEC__.format(container))
+                          Constants.__SNAPSHOT__.format(container, snapshot))
+
+    try:
+        resp = Tracing.http_request("DELETE", url=url,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
+        resp.raise_for_status()
+    except req_except.HTTPError as http_error:
+        module_logger.error("[{0}] Error deleting snapshot {1}. Error: {2}".format(container,
+                                                                                 snapshot,
+                                                                                 http_error.strerror))
+        raise RuntimeError
+
+    wait_operation(server, container, resp.json(), error_message="Error deleting snapshot {0}".format(snapshot))
+
+
+def read_websocket(ws, chunks):
+    """
+    Read a websocket of an LXD operation until the end of the stream.
+
+    :param ws: The websocket
+    :param chunks: The list where the received data are appended, as bytes
+    """
+
+    try:
+        while True:
+            data = ws.recv()
+            if not data:
+                break
+            chunks.append(data.encode() if isinstance(data, str) else data)
+    except WebSocketConnectionClosedException:
+        pass
+
+
+def print_websocket(ws):
+    """
+    Print the data received from a websocket of an LXD operation until the end of the stream.
+
+    :param ws: The websocket
+    """
+
+    try:
+        while True:
+            data = ws.recv()
+            if not data:
+                break
+            print(data.decode(errors="replace") if isinstance(data, bytes) else data, end="", flush=True)
+    except WebSocketConnectionClosedException:
+        pass
+
+
+def connect_websockets(server, operation, fds):
+    """
+    Connect to the websockets of the standard input, output and error of an exec operation.
+
+    :param server: The server on which the container is running
+    :param operation: The path of the operation
+    :param fds: The secrets of the file descriptors, from the metadata of the operation
+    :return: The dictionary file descriptor ('0', '1', '2') => websocket
+    """
+
+    sockets = {}
+
+    try:
+        for fd in ['0', '1', '2']:
+            secret = urllib.parse.urlencode({'secret': fds[fd]})
+            wsurl = "wss://{0}{1}/websocket?{2}".format("{0}:{1}".format(server, Globals.lxd_port),
+                                                        operation,
+                                                        secret)
+            ws = WebSocket(
+                sslopt={"keyfile": Constants.lxd_client_key_path,
+                        "certfile": Constants.lxd_client_cert_path,
+                        "cert_reqs": ssl.CERT_NONE})
+            ws.connect(wsurl)
+            sockets[fd] = ws
+    except Exception:
+        close_websockets(sockets)
+        raise
+
+    return sockets
+
+
+def close_websockets(sockets):
+    """
+    Close the websockets of an exec operation.
+
+    :param sockets: The dictionary file descriptor => websocket
+    """
+
+    for ws in sockets.values():
+        try:
+            ws.close()
+        except Exception as error:
+            module_logger.debug("Error closing websocket: {0}".format(error))
+
+
+def start_exec(server="", container="", cmd=[], environment={}, interactive=False, websocket=False):
+    """
+    Start a command inside a container, without waiting for its end.
+
+    :param server: The server on which the container is running
+    :param container: The name of the container
+    :param cmd: The list with the command and the parameters
+    :param environment: The environment variables of the command
+    :param interactive: If the command requires an interactive session
+    :param websocket: If the command waits for the connection to the websockets of the operation
+    :return: The response of the LXD daemon
+    :raise: RuntimeError if the command cannot be started
+    """
+
+    command_json = {
+        "command": cmd,
+        "environment": environment,
+        "interactive": bool(interactive),
+        "wait-for-websocket": bool(websocket)
+    }
+
+    url = "https://{0}:{1}{2}".format(server, Globals.lxd_port, Constants.__EXEC__.format(container))
 
     try:
-        resp = requests.post(url=url,
-                             json=command_json,
-                             cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                             verify=False)
+        resp = Tracing.http_request("POST", url=url,
+                                    json=command_json,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("[{0}] Error executing command {1}. "
-                            "Error: {0}".format(container, cmd, http_error.strerror))
+                            "Error: {2}".format(container, cmd, http_error.strerror))
         raise RuntimeError
 
     response = resp.json()
@@ -494,67 +880,264 @@ def exec_cmd(server="", container="", cmd=[],
                                                                                           response))
         raise RuntimeError
 
-    operation_url = "{0}{1}".format(url_prefix,
-                                    response[Constants.__operation__])
+    return response
+
+
+def wait_exec(server="", container="", cmd=[], response=None):
+    """
+    Wait for the end of a command started with :func:`start_exec`.
 
-    if sync:
+    :param server: The server on which the container is running
+    :param container: The name of the container
+    :param cmd: The list with the command and the parameters
+    :param response: The response returned by :func:`start_exec`
+    :return: The tuple (True if the operation succeeded, return code of the command)
+    :raise: RuntimeError if the status of the operation cannot be retrieved
+    """
 
-        # Wait the operation end
+    operation_url = "https://{0}:{1}{2}".format(server, Globals.lxd_port, response[Constants.__operation__])
 
-        if websocket:
-            # Read from websocket
-            op = response['operation']
-            fds = response['metadata']['metadata']['fds']
-            sockets = {}
+    try:
+        response = Tracing.http_request("GET", url=operation_url + "/wait",
+                                        cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                        verify=False)
+        result = response.json()[Constants.__status__]
+        status_code = int(response.json()[Constants.__metadata__][Constants.__metadata__][Constants.__return__])
+    except (req_except.RequestException, KeyError, TypeError, ValueError) as error:
+        module_logger.error("[{0}] Error executing CMD {1}. Error: {2}".format(container, cmd, error))
+        raise RuntimeError
 
-            stdout, stdin, stderr = '1', '0', '2'
+    return result == Constants.__success__, status_code
 
-            for fd in [stdin, stdout, stderr]:
-                secret = urllib.parse.urlencode({'secret': fds[fd]})
-                wsurl = "wss://{0}{1}/websocket?{2}".format("{0}:{1}".format(server, Globals.lxd_port),
-                                                            op,
-                                                            secret)
-                ws = WebSocket(
-                    sslopt={"keyfile": Constants.lxd_client_key_path,
-                            "certfile": Constants.lxd_client_cert_path,
-                            "cert_reqs": ssl.CERT_NONE})
-                ws.connect(wsurl)
-                sockets[fd] = ws
 
-            # stdout = 1, stderr = 2
-            buffer = sockets[stdout].recv()
-            while output and buffer:
-                print(buffer.decode(), end="", flush=True)
-                buffer = sockets[stdout].recv()
+def exec_cmd(server="", container="", cmd=[],
+             environment={}, interactive=False,
+             output=False, websocket=False,
+             check_return=True, sync=True, capture=False):
+    """
+    Execute a command inside a container.
 
+    :param server: The server on which the container is running
+    :param container: The name of the container
+    :param cmd: The list with the command and the parameters
+    :param environment: The environment variables of the command
+    :param interactive: If the command requires an interactive session
+    :param output: If the output of the command has to be printed to stdout (with websocket)
+    :param websocket: If the output of the command is read through the websockets of the operation
+    :param check_return: If True, a return code different from 0 is an error
+    :param sync: If True, wait the end of the command
+    :param capture: If True, the standard output and error of the command are read through the websockets and
+                    returned (implies websocket and sync)
+    :return: With capture, the tuple (return code, stdout, stderr as bytes)
+    :raise: RuntimeError if the command cannot be executed (or fails, with check_return)
+    """
+
+    if capture:
+        websocket = sync = True
+
+    response = start_exec(server, container, cmd, environment, interactive, websocket)
+
+    if not sync:
+        return
+
+    if websocket:
+        # Read stdout (1) and stderr (2) at the same time, so that the command does not stall on a full pipe
+        sockets = connect_websockets(server, response[Constants.__operation__],
+                                     response[Constants.__metadata__][Constants.__metadata__]['fds'])
+        stdout_chunks, stderr_chunks = [], []
+
+        def reader(chunks):
+            return print_websocket if output and not capture else lambda ws: read_websocket(ws, chunks)
 
         try:
-            response = requests.get(url=operation_url + "/wait",
-                                cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                                verify=False)
-            # if response.status_code != 404:
-            #     response.raise_for_status()
-            # else:
-            #     return
-        except req_except.HTTPError as http_error:
-            module_logger.error("[{0}] Error executing CMD {1}. Error: {2}. Status: {3}".format(container,
-                                                                                                cmd,
-                                                                                                http_error.strerror,
-                                                                                                response.status_code))
-            raise RuntimeError
+            stderr_reader = threading.Thread(target=reader(stderr_chunks), args=[sockets['2']])
+            stderr_reader.daemon = True
+            stderr_reader.start()
+            reader(stdout_chunks)(sockets['1'])
+            stderr_reader.join()
+        finally:
+            close_websockets(sockets)
+
+    success, status_code = wait_exec(server, container, cmd, response)
+
+    if not success or (status_code and check_return):
+        module_logger.error("[{0}] Command {1} failed, returning {2}".format(container,
+                                                                             cmd,
+                                                                             status_code))
+        raise RuntimeError
+    else:
+        module_logger.debug("[{0}] Command {1} executed successfully".format(container, cmd))
 
-        result = response.json()[Constants.__status__]
-        status_code = int(response.json()[Constants.__metadata__][Constants.__metadata__][Constants.__return__])
+    if capture:
+        return status_code, b"".join(stdout_chunks), b"".join(stderr_chunks)
 
-        if result != Constants.__success__ or (status_code and check_return):
-            module_logger.error("[{0}] Command {1} failed, returning {2}".format(container,
-                                                                                 cmd,
-                                                                                 status_code))
-            raise RuntimeError
-        else:
-            module_logger.debug("[{0}] Command {1} executed successfully. Response: {2}".format(container,
-                                                                                                cmd,
-                                                                                                resp.json()))
+
+class OutputMultiplexer:
+    """
+    Execute several commands at the same time, in the same or in different containers, and stream their output as
+    they produce it. The output is split in lines, tagged with the source of the command (e.g. the node), and
+    collected in a bounded buffer of Globals.exec_buffer_lines lines: when the buffer is full the readers of the
+    websockets wait, so a slow consumer slows down the commands instead of filling the memory.
+
+    The commands are queued with :meth:`add`, which does not block, and executed by at most Globals.exec_max_active
+    worker threads. The output is consumed by iterating on the multiplexer, until all the commands have ended::
+
+        multiplexer = OutputMultiplexer()
+        for node in nodes:
+            multiplexer.add(str(node), node.get_server(), node.container.name, ["nfd-status"])
+        for tag, stream, line in multiplexer:
+            ...
+
+    Each item is the tuple (tag, stream, line), where stream is "stdout" or "stderr", and, when a command ends,
+    (tag, "exit", return code), with None as return code if the command could not be executed.
+
+    :ivar buffer: The bounded queue of the output lines
+    :ivar commands: The queue of the commands waiting for a worker
+    :ivar max_active: The maximum number of commands running at the same time (and of worker threads)
+    :ivar return_codes: The list of (tag, return code) of the ended commands, in order of termination. A tag appears
+                        once for each command added with it
+    """
+
+    stdout = "stdout"
+    stderr = "stderr"
+    exit = "exit"
+
+    def __init__(self, buffer_lines=None, max_active=None):
+        self.buffer = queue.Queue(int(buffer_lines or Globals.exec_buffer_lines))
+        self.commands = queue.Queue()
+        self.max_active = int(max_active or Globals.exec_max_active)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.workers = 0
+        self.return_codes = []
+
+    def add(self, tag, server, container, cmd, environment={"HOME": "/root", "USER": "root"}):
+        """
+        Queue a command and stream its output into the multiplexer. A new worker thread is started only if less than
+        Globals.exec_max_active are running.
+
+        :param tag: The tag of the output lines of the command
+        :param server: The server on which the container is running
+        :param container: The name of the container
+        :param cmd: The list with the command and the parameters
+        :param environment: The environment variables of the command
+        """
+
+        with self.lock:
+            self.pending += 1
+            self.commands.put((tag, server, container, cmd, environment))
+
+            if self.workers >= self.max_active:
+                return
+
+            self.workers += 1
+
+        t = threading.Thread(target=self.work)
+        t.daemon = True
+        t.start()
+
+    def work(self):
+        """
+        Execute the queued commands, one at a time, until the queue is empty.
+        """
+
+        while True:
+            with self.lock:
+                try:
+                    command = self.commands.get_nowait()
+                except queue.Empty:
+                    self.workers -= 1
+                    return
+
+            self.run(*command)
+
+    def run(self, tag, server, container, cmd, environment):
+        """
+        Execute a command and put its output lines into the buffer.
+        """
+
+        status_code = None
+
+        try:
+            response = start_exec(server, container, cmd, environment, websocket=True)
+            sockets = connect_websockets(server, response[Constants.__operation__],
+                                         response[Constants.__metadata__][Constants.__metadata__]['fds'])
+            try:
+                reader = threading.Thread(target=self.read, args=[tag, self.stderr, sockets['2']])
+                reader.daemon = True
+                reader.start()
+                self.read(tag, self.stdout, sockets['1'])
+                reader.join()
+            finally:
+                close_websockets(sockets)
+
+            success, status_code = wait_exec(server, container, cmd, response)
+        except Exception as error:
+            module_logger.error("[{0}] Error executing command {1}. Error: {2}".format(container, cmd, error))
+            self.buffer.put((tag, self.stderr, "Error executing command: {0}".format(error)))
+
+        self.buffer.put((tag, self.exit, status_code))
+
+    def read(self, tag, stream, ws):
+        """
+        Read a websocket until the end of the stream, putting each line into the buffer. The bytes are decoded
+        incrementally, so a character split between two messages is decoded correctly.
+
+        :param tag: The tag of the lines
+        :param stream: The name of the stream (stdout or stderr)
+        :param ws: The websocket
+        """
+
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        partial = ""
+
+        try:
+            while True:
+                data = ws.recv()
+                if not data:
+                    break
+                lines = (partial + (decoder.decode(data) if isinstance(data, bytes) else data)).split("\n")
+                partial = lines.pop()
+                for line in lines:
+                    self.buffer.put((tag, stream, line))
+        except WebSocketConnectionClosedException:
+            pass
+
+        partial += decoder.decode(b"", final=True)
+
+        if partial:
+            self.buffer.put((tag, stream, partial))
+
+    def __iter__(self):
+        while True:
+            with self.lock:
+                if not self.pending and self.buffer.empty():
+                    return
+
+            item = self.buffer.get()
+
+            if item[1] == self.exit:
+                with self.lock:
+                    self.pending -= 1
+                    self.return_codes.append((item[0], item[2]))
+
+            yield item
+
+    def relay(self, colors=None):
+        """
+        Print the output lines of the commands as they arrive, prefixed by their tag, until all the commands have
+        ended.
+
+        :param colors: The function coloring the tags (tag => string), if any
+        :return: The list of (tag, return code) of the commands, sorted by tag (None as return code if the command
+                 could not be executed)
+        """
+
+        for tag, stream, line in self:
+            if stream != self.exit:
+                print("[{0}] {1}".format(colors(tag) if colors else tag, line), flush=True)
+
+        return sorted(self.return_codes, key=lambda item: item[0])
 
 
 def get_container_status(server="", name=""):
@@ -575,9 +1158,9 @@ def get_container_status(server="", name=""):
                           Constants.__STATE__.format(name))
 
     try:
-        resp = requests.get(url=url,
-                            cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
-                            verify=False)
+        resp = Tracing.http_request("GET", url=url,
+                                    cert=(Constants.lxd_client_cert_path, Constants.lxd_client_key_path),
+                                    verify=False)
         resp.raise_for_status()
     except req_except.HTTPError as http_error:
         module_logger.error("[{0}] Error retrieving status of {1}. Error: {2}".format(server,
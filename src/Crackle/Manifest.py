@@ -0,0 +1,110 @@
+"""
+This module keeps, for each container, the **manifest** of the files pushed inside it: path => sha1 of the content.
+
+:meth:`Crackle.LxcUtils.RouterContainer.push_file` looks up the manifest before uploading a file, and skips the upload
+when the same content has already been pushed at the same path. In this way, when the routing is recomputed and the
+scripts are pushed again, only the scripts that actually changed are transferred.
+
+The manifest is kept on the client. When Globals.manifest_verify is set, a file found in the manifest is also
+verified inside the container (with *sha1sum*) before skipping the upload, at the cost of one command execution.
+
+The entries of a container are forgotten when the container is created, stopped, deleted or restored from a
+snapshot, and the entry of a file has to be forgotten when the file is modified inside the container (see
+:func:`forget`).
+"""
+
+import hashlib
+import threading
+
+# The manifest: container name => {path in the container => sha1 of the content}
+__manifest__ = {}
+__manifest_lock__ = threading.Lock()
+
+
+def digest(content):
+    """
+    :param content: The content of a file, as bytes or string
+    :return: The hex sha1 digest of the content
+    """
+
+    if isinstance(content, str):
+        content = content.encode()
+
+    return hashlib.sha1(content).hexdigest()
+
+
+def read_content(source_path, data=None):
+    """
+    Get the content of a file to push.
+
+    :param source_path: The path of the local file
+    :param data: The content of the file, if it is not read from source_path
+    :return: The content, as bytes
+    """
+
+    if data is not None:
+        return data.encode() if isinstance(data, str) else data
+
+    with open(source_path, "rb") as f:
+        return f.read()
+
+
+def lookup(container, path):
+    """
+    :param container: The name of the container
+    :param path: The absolute path of the file inside the container
+    :return: The sha1 of the content pushed at path, or None if the file is not in the manifest
+    """
+
+    with __manifest_lock__:
+        return __manifest__.get(container, {}).get(path)
+
+
+def record(container, path, key):
+    """
+    Record a file pushed inside a container.
+
+    :param container: The name of the container
+    :param path: The absolute path of the file inside the container
+    :param key: The sha1 of the content
+    """
+
+    with __manifest_lock__:
+        __manifest__.setdefault(container, {})[path] = key
+
+
+def forget(container, path=None):
+    """
+    Forget the files pushed inside a container, because the container has been destroyed or restored, or because a
+    file has been modified inside the container.
+
+    :param container: The name of the container
+    :param path: The path of the modified file (by default all the files)
+    """
+
+    with __manifest_lock__:
+        if path is None:
+            __manifest__.pop(container, None)
+        else:
+            __manifest__.get(container, {}).pop(path, None)
+
+
+def verify_command(path, key):
+    """
+    Get the command that checks, inside the container, that a file has the expected content.
+
+    :param path: The absolute path of the file inside the container
+    :param key: The expected sha1 of the content
+    :return: The list with the command and the parameters. The command fails if the content is different
+    """
+
+    return ["sh", "-c", "echo '{0}  {1}' | sha1sum -c --status".format(key, path)]
+
+
+def size():
+    """
+    :return: The number of files in the manifest
+    """
+
+    with __manifest_lock__:
+        return sum(len(files) for files in __manifest__.values())
@@ -17,6 +17,7 @@ import Crackle.Constants as Constants
 from Crackle import TopologyStructs
 from Crackle.ColoredOutput import make_colored
 from Crackle.AsyncManager import Async, start_thread_pool
+from Crackle.Tracing import TracedPopen
 from Crackle.ConfigReader import __mobility_models__
 
 """
@@ -363,7 +364,7 @@ class MobilityManager:
                 if len(commands):
                     command = [" ".join(commands)]
                     params = header + command
-                    p = subprocess.Popen(params, stdout=subprocess.DEVNULL)
+                    p = TracedPopen(params, stdout=subprocess.DEVNULL)
 
                     if p.wait() == 0:
                         self.logger.info("[{0}] NS3 processes correctly terminated".format(server))
@@ -382,7 +383,7 @@ class MobilityManager:
 
                     self.logger.info(params)
 
-                    p = subprocess.Popen(params)
+                    p = TracedPopen(params)
 
                     if p.wait() == 0:
                         self.logger.info("[{0}] Taps interfaces correctly deleted!".format(server))
@@ -511,15 +512,59 @@ class MobilityManager:
         """
         This function forces an handover from previous_base_station to next_base_station.
 
-        :param node:
-        :param previous_base_station:
-        :param next_base_station:
-        :return:
+        The link, face and route changes are coalesced into a single exec per affected container and phase (see
+        :meth:`Crackle.TopologyStructs.Station.handoff_commands`). The execs of a phase run in parallel, the phases
+        run in order. If the setting handoff_make_before_break is set, the station and next_base_station are attached
+        first, and the old faces are destroyed only if the attach succeeded; otherwise the station leaves
+        previous_base_station first, and attaches to next_base_station even if the detach failed.
+        The latency of each handoff is logged.
+
+        :param node: The mobile station
+        :param previous_base_station: The base station the node is leaving
+        :param next_base_station: The base station the node is attaching to
+        :return: True if all the commands succeeded, False otherwise
         """
 
-        self.disconnect_from(node, previous_base_station)
-        self.logger.debug("[{0}] Attaching to base station {1}".format(node, next_base_station))
-        self.attach_to(node, next_base_station)
+        def run_handoff_command(n, results):
+            self.logger.debug("[{0}] Handoff command: {1}".format(n, phase[n]))
+            results[n] = n.run_command(phase[n], websocket=False)
+
+        start = time.time()
+
+        self.logger.debug("[{0}] Handoff from {1} to {2}".format(node, previous_base_station, next_base_station))
+
+        make_before_break = bool(Globals.handoff_make_before_break)
+        phases = node.handoff_commands(previous_base_station,
+                                       next_base_station,
+                                       prefix=__sta_prefix__ if node.get_client_apps() else None,
+                                       make_before_break=make_before_break)
+
+        ret = True
+
+        for phase in phases:
+            if not start_thread_pool(list(phase.keys()), run_handoff_command):
+                ret = False
+                if make_before_break:
+                    break
+
+        latency = (time.time() - start) * 1000
+
+        if ret:
+            self.thread_print("[{0}] Handoff from {1} to {2} completed in {3:.1f} ms".format(node,
+                                                                                            previous_base_station,
+                                                                                            next_base_station,
+                                                                                            latency))
+        else:
+            self.logger.error("[{0}] Error during handoff from {1} to {2} ({3:.1f} ms)".format(node,
+                                                                                             previous_base_station,
+                                                                                             next_base_station,
+                                                                                             latency))
+
+        if node.get_repositories():
+            if Globals.global_routing:
+                self.ndn.recompute_global_routing(None, Constants.__tree_on_consumer__, True, rerouting=True)
+
+        return ret
 
     def disconnect_from(self, node, base_station):
         """
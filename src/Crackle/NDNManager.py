@@ -3,9 +3,9 @@ This module controls the NDN components of the network, as the forwarder NFD or
 experiment by starting the repos/client in the network.
 """
 
-import stat
 import os
 import logging
+import re
 import threading
 import time
 import shutil
@@ -13,10 +13,16 @@ import shutil
 from Crackle.ColoredOutput import make_colored
 import Crackle.Globals as Globals
 from Crackle.AsyncManager import start_thread_pool
-from Crackle.Constants import layer_2_protocols, __tree_on_consumer__, __min_cost_multipath__, \
+from Crackle.Constants import __tree_on_consumer__, __min_cost_multipath__, \
     __tree_on_producer__, __maximum_flow__, nfd_conf_file
 from Crackle import TopologyStructs
 from Crackle.RoutingNdn import RoutingNdn
+from Crackle import ScriptCompiler
+from Crackle import LxdAPI
+from Crackle import Manifest
+from Crackle.ScriptCompiler import routing_suffix
+from Crackle.Tracing import percentile
+from Crackle.Workload import WorkloadEngine
 
 # TODO Move constants to Globals
 
@@ -26,76 +32,21 @@ _DEBUG = False
 
 module_logger = logging.getLogger(__name__)
 
-## Routing files
-routing_reset_suffix = "_resetndnrouting.sh"
-routing_suffix = "_setndnrouting.sh"
-route_register_template = "nfdc register ndn:/{0} {1}://{2}:6363\n"
-ethernet_route_register_template = "nfdc register ndn:/{0} {1}://[{2}]/{3}\n"
-face_create_template = "nfdc create {} {}://{}:6363\n"
-ethernet_face_create_template = "nfdc create {} {}://[{}]/{}\n"
-
-route_unregister_template = "nfdc unregister ndn:/{0} {1}://{2}:6363\n"
-ethernet_route_unregister_template = "nfdc unregister ndn:/{0} {1}://[{2}]\n"
-face_destroy_template = "nfdc destroy {0}://{1}:6363\n"
-ethernet_face_destroy_template = "nfdc destroy {0}://[{1}]\n"
-
 ## NFD configuration file
 __nfd_conf_file__ = "/etc/ndn/nfd.conf"
+__default_cs_capacity__ = 65536
 
-# Script template
-
-route_script = """
-#!/bin/bash
-
-create_faces() {{
-    :
-    {}
-}}
-
-destroy_faces() {{
-    :
-    {}
-}}
-
-reset_routing() {{
-    :
-    {}
-}}
-
-set_routing() {{
-    :
-    {}
-}}
-
-case $1 in
-    create_faces)
-    create_faces
-    ;;
-    destroy_faces)
-    destroy_faces
-    ;;
-    reset_routing)
-    reset_routing
-    ;;
-    set_routing)
-    set_routing
-    ;;
-    set)
-    create_faces
-    set_routing
-    ;;
-    reset)
-    destroy_faces
-    reset_routing
-    ;;
-    *)
-    exit 1
-    ;;
-esac
-
-exit 0
-
-"""
+## Summary printed by ndn-icp-download (lines as "<Key>: <value> [unit]")
+__download_time_pattern__ = re.compile(r"(?:elapsed|download|total)\s*time\s*[:=]?\s*([\d.]+)\s*(ms|s|sec|seconds)?",
+                                       re.IGNORECASE)
+# The unit is captured as it is: its case tells the bit rates (bps, b/s) from the byte rates (Bps, B/s)
+__throughput_pattern__ = re.compile(r"(?:throughput|goodput|rate)\s*[:=]?\s*([\d.]+)\s*([kmg]?)"
+                                    r"(bps|bits?/s|b/s|bytes?/s)",
+                                    re.IGNORECASE)
+__retransmissions_pattern__ = re.compile(r"(?:retransmi\w*|retx|timeouts?)\s*[:=]?\s*(\d+)", re.IGNORECASE)
+__bytes_pattern__ = re.compile(r"bytes\s*(?:received|downloaded)?\s*[:=]?\s*(\d+)", re.IGNORECASE)
+__rate_units__ = {"": 1, "k": 10 ** 3, "m": 10 ** 6, "g": 10 ** 9}
+__byte_rate_units__ = ("Bps", "B/s")
 
 
 class NDNManager:
@@ -103,110 +54,128 @@ class NDNManager:
     This class contains the methods for managing the NDN part of the experiment and starting the experiment itself.
 
     :ivar node_list: The list of all the node in the network (routers, base stations and mobile stations)
+    :ivar scripts: The routing scripts compiled by :meth:`create_routing_scripts` (file name => content)
+    :ivar download_reports: The :class:`DownloadReport` of the clients of the last test
     """
 
     def __init__(self, node_list, server_list):
         self.node_list = node_list
         self.server_list = server_list
         self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
+        self.scripts = {}
+        self.download_reports = []
 
-    def configure_router(self):
+    def reconfigure_node(self, n, results, cache_size=None, strategy=None):
         """
-        Set the cache size using the value contained in the configuration file "topo.brite".
+        Change the cache size and/or the forwarding strategy of a node with a single command execution, through the
+        NFD management and without restarting NFD (see :func:`Crackle.ScriptCompiler.render_reconfigure_script`).
 
-        :return:
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
+        :param cache_size: The new cache size, in packets (None to keep the current one)
+        :param strategy: The new forwarding strategy (None to keep the current one)
         """
 
-        def set_strategy_cache(n, results):
+        script = ScriptCompiler.render_reconfigure_script(n, cache_size, strategy)
 
-            try:
-                cache_size = n.get_cache_size()
-                cache_policy = n.get_cache_policy()
-                forward_strategy = n.get_forward_strategy()
+        if script is None:
+            results[n] = True
+            return
 
-                if cache_policy == "l":
-                    cache_policy = "LRU"
+        try:
+            ret = n.run_command(["sh", "-c", script])
+            Manifest.forget(n.container.name, __nfd_conf_file__)
 
-                params = ["sed",
-                          "-i",
-                          "s/^.*cs_max_packets .*$/  cs_max_packets {0}/".format(cache_size),
-                          __nfd_conf_file__]
+            if not ret:
+                print(make_colored("red", "[{0}] Error while configuring router".format(n)))
+                self.logger.error("[{0}] Error while configuring router".format(n))
+                results[n] = False
+            else:
+                self.logger.info("[{0}] Router configured. Cache={1} and "
+                                 "Forwarding Strategy={2}".format(n, cache_size, strategy))
+                results[n] = True
+        except Exception as error:
+            self.logger.error("[{0}] Error setting up the router. "
+                              "Error: {1}".format(n,
+                                                  error))
+            results[n] = False
 
-                params2 = ["sed",
-                           "-i",
-                           "0,/\/ / s/best-route/{0}/".format(forward_strategy),
-                           __nfd_conf_file__]
+    def reconfigure_routers(self, changes):
+        """
+        Change the cache size and/or the forwarding strategy of several nodes in parallel.
 
-                ret = n.run_command(params) and n.run_command(params2)
+        :param changes: The dictionary node => (cache size, forwarding strategy), where None keeps the current value
+        :return: True if all the nodes have been reconfigured, False otherwise
+        """
 
-                if not ret:
-                    print(make_colored("red", "[{0}] Error while configuring router".format(n)))
-                    self.logger.error("[{0}] Error while setting cache".format(n))
-                    results[n] = False
-                else:
-                    logging.info("[{0}] Router configured. Cache={1} and "
-                                 "Forwarding Strategy={2}".format(n, cache_size, forward_strategy))
-                    results[n] = True
+        def reconfigure(n, results):
+            self.reconfigure_node(n, results, *changes[n])
 
-                params = ["service",
-                          "nfd",
-                          "restart"]
+        return start_thread_pool(list(changes), reconfigure)
 
-                ret = n.run_command(params)
+    def configure_node_router(self, n, results):
+        """
+        Set the cache size and the forwarding strategy of a node, as configured in its model, without restarting NFD.
 
-                if not ret:
-                    self.logger.error("[{0}] Error restarting NFD".format(n))
-                    print(make_colored("red", "[{0}] Error restarting NFD".format(n)))
-                    results[n] = False
-                else:
-                    self.logger.info("[{0}] NFD restarted".format(n))
-                    results[n] = True
-            except Exception as error:
-                self.logger.error("[{0}] Error setting up the router. "
-                                  "Error: {1}".format(n,
-                                                      error))
-                results[n] = False
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
+        """
 
-        return start_thread_pool(self.node_list.values(), set_strategy_cache, sleep_time=0.1)
+        self.reconfigure_node(n, results, n.get_cache_size(), n.get_forward_strategy())
 
-    def start_nfd(self):
+    def configure_router(self):
         """
-        Start the NDN forwarder on all the nodes in the network.
+        Set the cache size using the value contained in the configuration file "topo.brite".
 
         :return:
         """
 
-        def start(n, results):
+        return start_thread_pool(self.node_list.values(), self.configure_node_router)
+
+    def start_node_nfd(self, n, results):
+        """
+        Push the NFD configuration file inside the container of a node and start NFD.
+
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
+        """
+
+        ret = n.push_file(nfd_conf_file, __nfd_conf_file__)
+        if not ret:
+            self.logger.error("[{0}] Error sending NFD configuration file".format(n))
+            print(make_colored("red", "[{0}] Error sending NFD configuration file".format(n)))
+            results[n] = False
+        else:
+            self.logger.info("[{0}] NFD configuration file sent".format(n))
+            results[n] = True
+
+        params = ["service", "nfd", "start"]
+
+        try:
+
+            ret = n.run_command(params)
 
-            ret = n.push_file(nfd_conf_file, __nfd_conf_file__)
             if not ret:
-                self.logger.error("[{0}] Error sending NFD configuration file".format(n))
-                print(make_colored("red", "[{0}] Error sending NFD configuration file".format(n)))
+                self.logger.error("[{0}] Error starting NFD".format(n))
+                print(make_colored("red", "[{0}] Error starting NFD".format(n)))
                 results[n] = False
             else:
-                self.logger.info("[{0}] NFD configuration file sent".format(n))
+                self.logger.info("[{0}] NFD started".format(n))
                 results[n] = True
+        except Exception as error:
+            self.logger.error("[{0}] Error starting ICN forwarder. "
+                              "Error: {1}".format(n,
+                                                  error))
+            results[n] = False
 
-            params = ["service", "nfd", "start"]
-
-            try:
-
-                ret = n.run_command(params)
+    def start_nfd(self):
+        """
+        Start the NDN forwarder on all the nodes in the network.
 
-                if not ret:
-                    self.logger.error("[{0}] Error starting NFD".format(n))
-                    print(make_colored("red", "[{0}] Error starting NFD".format(n)))
-                    results[n] = False
-                else:
-                    self.logger.info("[{0}] NFD started".format(n))
-                    results[n] = True
-            except Exception as error:
-                self.logger.error("[{0}] Error starting ICN forwarder. "
-                                  "Error: {1}".format(n,
-                                                      error))
-                results[n] = False
+        :return:
+        """
 
-        return start_thread_pool(self.node_list.values(), start)
+        return start_thread_pool(self.node_list.values(), self.start_node_nfd)
 
     def stop_nfd(self):
         """
@@ -328,42 +297,7 @@ class NDNManager:
         :return:
         """
 
-        def rst_cache(n, results):
-
-            try:
-                params = ["sed",
-                          "-i",
-                          "s/^.*cs_max_packets .*$/  cs_max_packets 65536/",
-                          __nfd_conf_file__]
-
-                ret = n.run_command(params)
-
-                if ret:
-                    self.logger.error("[{0}] Error resetting cache".format(n))
-                    print(make_colored("red", "[{0}] Error resetting cache".format(n)))
-                    results[n] = False
-                else:
-                    self.logger.info("[{0}] Cache reset successfully".format(n))
-                    results[n] = True
-
-                params = ["service",
-                          "nfd",
-                          "restart"]
-
-                ret = n.run_command(params)
-
-                if ret:
-                    self.logger.error("[{0}] Error restarting NFD".format(n))
-                    print(make_colored("red", "[{0}] Error restarting NFD".format(n)))
-                else:
-                    self.logger.info("[{0}] NFD restarted".format(n))
-            except Exception as error:
-                self.logger.error("[{0}] Error re-setting the cache. "
-                                  "Error: {1}".format(n,
-                                                      error))
-                results[n] = False
-
-        return start_thread_pool(self.node_list.values(), rst_cache)
+        return self.reconfigure_routers({n: (__default_cs_capacity__, None) for n in self.node_list.values()})
 
     def show_route(self, node):
         """
@@ -374,15 +308,13 @@ class NDNManager:
         """
 
         if node in self.node_list:
-            routes = self.node_list[node].get_routes()
-            if routes:
+            if len(self.node_list[node].get_routes()):
                 print(make_colored("blue", node).replace(Globals.experiment_id, ""))
-                for route in routes.values():
-                    for route2 in route.values():
-                        print(make_colored("yellow", "\ticn_name:"),
-                              "ndn:/{0}".format(route2.get_icn_name()).replace("/", ""),
-                              make_colored("yellow", "next hop:"),
-                              "{0}".format(route2.get_next_hop()).replace(Globals.experiment_id, ""))
+                for route in self.node_list[node].iter_routes():
+                    print(make_colored("yellow", "\ticn_name:"),
+                          "ndn:/{0}".format(route.get_icn_name()).replace("/", ""),
+                          make_colored("yellow", "next hop:"),
+                          "{0}".format(route.get_next_hop()).replace(Globals.experiment_id, ""))
 
     def add_route(self, node, name, nexthop, container_created=False):
         """
@@ -464,48 +396,54 @@ class NDNManager:
                                                                                                        nexthop))
             print(make_colored("red", "The node {0} does not exist!".format(node)))
 
-    def start_repositories(self):
+    def start_node_repositories(self, n, results):
         """
-        Start all the repositories in the network.
+        Start the repositories of a node.
 
-        :return:
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
         """
 
-        def start_repo(n, results):
+        ret_val = True
 
-            ret_val = True
+        try:
+            for repo in n.get_repositories():
+                name = repo.get_folder()
 
-            try:
-                for repo in n.get_repositories():
-                    name = repo.get_folder()
+                params = ["service",
+                          "repo-ng",
+                          "start"]
 
-                    params = ["service",
-                              "repo-ng",
-                              "start"]
+                self.logger.debug("[{0}] Repo {1}. Params={2}".format(n,
+                                                                      params,
+                                                                      params))
 
-                    self.logger.debug("[{0}] Repo {1}. Params={2}".format(n,
-                                                                          params,
-                                                                          params))
+                ret = n.run_command(params, sync=True)
 
-                    ret = n.run_command(params, sync=True)
+                if not ret:
+                    print(make_colored("red", "[{0}] Error starting repo for {1}".format(n,
+                                                                                         name)))
+                else:
+                    self.logger.info("[{0}]: repo-ng {1} started".format(n,
+                                                                         name))
 
-                    if not ret:
-                        print(make_colored("red", "[{0}] Error starting repo for {1}".format(n,
-                                                                                             name)))
-                    else:
-                        self.logger.info("[{0}]: repo-ng {1} started".format(n,
-                                                                             name))
+                ret_val &= ret
 
-                    ret_val &= ret
+            results[n] = ret_val
+        except Exception as error:
+            self.logger.error("[{0}] Error starting repositories. "
+                              "Error: {1}".format(n,
+                                                  error))
+            results[n] = False
 
-                results[n] = ret_val
-            except Exception as error:
-                self.logger.error("[{0}] Error starting repositories. "
-                                  "Error: {1}".format(n,
-                                                      error))
-                results[n] = False
+    def start_repositories(self):
+        """
+        Start all the repositories in the network.
 
-        return start_thread_pool(self.node_list.values(), start_repo)
+        :return:
+        """
+
+        return start_thread_pool(self.node_list.values(), self.start_node_repositories)
 
     def start_virtual_repositories(self):
         """
@@ -579,78 +517,29 @@ class NDNManager:
 
     def create_routing_scripts(self):
         """
-        Create the routing scripts for setting the routing tables of the nodes.
+        Create the routing scripts for setting the routing tables of the nodes. The scripts of all the nodes are
+        compiled in a single pass (see :mod:`Crackle.ScriptCompiler`), kept in memory and, if Globals.write_scripts is
+        set, written in Globals.scripts_dir.
 
-        :return:
+        :return: True if the scripts have been created, False otherwise
         """
 
-        def create_script(n_from, results):
-            routing_script = open(Globals.scripts_dir + str(n_from) + routing_suffix, 'w')
-            create_faces, destroy_faces, registers, unregisters = [], [], [], []
-
-            for link in n_from.get_links().values():
-                if Globals.layer2_prot != layer_2_protocols[4]:
-                    create_faces.append(face_create_template.format("-W" if Globals.wldr_face else "",
-                                                                    Globals.layer2_prot,
-                                                                    link.get_node_to().get_ip_address(
-                                                                            n_from)))
-                    destroy_faces.append(face_destroy_template.format(Globals.layer2_prot,
-                                                                      link.get_node_to().get_ip_address(
-                                                                              n_from)))
-                else:
-                    create_faces.append(ethernet_face_create_template.format("-W" if Globals.wldr_face else "",
-                                                                             Globals.layer2_prot,
-                                                                             link.get_node_to().get_mac_address(n_from),
-                                                                             link.get_node_to() if (type(
-                                                                                     link.get_node_to()) is not TopologyStructs.Station) or
-                                                                                                   (type(
-                                                                                                           link.get_node_to()) is TopologyStructs.Station and
-                                                                                                    type(
-                                                                                                            n_from) is TopologyStructs.Router) else "wlan0"))
-                    destroy_faces.append(ethernet_face_destroy_template.format(Globals.layer2_prot,
-                                                                               link.get_node_to().get_mac_address(
-                                                                                       n_from)))
-
-            for node_to in n_from.get_routes():
-                for prefix in n_from.get_routes()[node_to]:
-                    if Globals.layer2_prot not in layer_2_protocols:
-                        self.logger.error("[{0}] Layer 2 protocol not recognized!.".format(n_from))
-                        results[n_from] = False
-                        return
-                    if Globals.layer2_prot != layer_2_protocols[4]:
-
-                        unregisters.append(route_unregister_template.format(prefix,
-                                                                            Globals.layer2_prot,
-                                                                            node_to.get_ip_address(n_from)))
-                        registers.append(route_register_template.format(prefix,
-                                                                        Globals.layer2_prot,
-                                                                        node_to.get_ip_address(n_from)))
-                    else:
-                        unregisters.append(ethernet_route_unregister_template.format(prefix,
-                                                                                     Globals.layer2_prot,
-                                                                                     node_to.get_mac_address(n_from)))
-                        registers.append(ethernet_route_register_template.format(prefix,
-                                                                                 Globals.layer2_prot,
-                                                                                 node_to.get_mac_address(n_from),
-                                                                                 node_to if type(
-                                                                                         node_to) is not TopologyStructs.Station else "wlan0"))
-
-            routing_script.write(route_script.format("\n".join(create_faces),
-                                                     "\n".join(destroy_faces),
-                                                     "\n".join(unregisters),
-                                                     "\n".join(registers)))
-
-            routing_script.close()
+        self.logger.info("Creating the NDN routing scripts")
 
-            os.chmod(Globals.scripts_dir + str(n_from) + routing_suffix,
-                     stat.S_IXUSR | stat.S_IRUSR | stat.S_IWUSR | stat.S_IRWXU)
+        try:
+            scripts = ScriptCompiler.compile_scripts(self.node_list.values(), links=False)
+            if Globals.write_scripts:
+                ScriptCompiler.write_scripts(scripts)
+        except (RuntimeError, OSError) as error:
+            self.logger.error("Error creating the NDN routing scripts. Error: {0}".format(error))
+            print(make_colored("red", "Error creating the NDN routing scripts."))
+            return False
 
-            self.logger.debug("[{0}] NDN routing scripts created.".format(n_from))
-            results[n_from] = True
+        self.scripts.update(scripts)
 
-        self.logger.info("Creating the NDN routing scripts")
+        self.logger.debug("{0} NDN routing scripts created.".format(len(scripts)))
 
-        return start_thread_pool(self.node_list.values(), create_script)
+        return True
 
     def reset_ndn_routing(self, rerouting=False):
         """
@@ -684,6 +573,30 @@ class NDNManager:
 
         return start_thread_pool(self.node_list.values(), reset_routing)
 
+    def push_node_routing_script(self, n, results):
+        """
+        Push the routing script inside the container of a node.
+
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
+        """
+
+        try:
+            ret = ScriptCompiler.push_script(n, routing_suffix, self.scripts)
+
+            if ret:
+                self.logger.info("[{0}] Routing script successfully pushed inside the container".format(n))
+                results[n] = True
+            else:
+                self.logger.error("[{0}] Error pushing NDN routing script".format(n))
+                print(make_colored("red", "[{0}] Error pushing NDN routing script".format(n)))
+                results[n] = False
+        except Exception as error:
+            self.logger.error("[{0}] Error pushing NDN routing script."
+                              "Error: {1}".format(n,
+                                                  error))
+            results[n] = False
+
     def push_routing_scripts(self):
         """
         Push the routing scripts inside the containers
@@ -691,29 +604,37 @@ class NDNManager:
         :return:
         """
 
-        def push_scripts(n, results):
+        return start_thread_pool(self.node_list.values(), self.push_node_routing_script)
 
-            routing_set_script = "/root/{0}{1}".format(n,
-                                                       routing_suffix)
+    def set_node_routing(self, n, results, rerouting=False):
+        """
+        Execute the routing script of a node.
 
-            try:
-                ret = n.push_file(Globals.scripts_dir + str(n) + routing_suffix,
-                                  routing_set_script)
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
+        :param rerouting: If True, only the routes are set again (the faces already exist)
+        """
 
-                if ret:
-                    self.logger.info("[{0}] Routing script successfully pushed inside the container".format(n))
-                    results[n] = True
-                else:
-                    self.logger.error("[{0}] Error pushing NDN routing script".format(n))
-                    print(make_colored("red", "[{0}] Error pushing NDN routing script".format(n)))
-                    results[n] = False
-            except Exception as error:
-                self.logger.error("[{0}] Error pushing NDN routing script."
-                                  "Error: {1}".format(n,
-                                                      error))
-                results[n] = False
+        try:
+            if rerouting:
+                params = ["/root/{0}{1}".format(n, routing_suffix), "set_routing"]
+            else:
+                params = ["/root/{0}{1}".format(n, routing_suffix), "set"]
 
-        return start_thread_pool(self.node_list.values(), push_scripts)
+            ret = n.run_command(params)
+
+            if ret:
+                self.logger.info("[{0}] NDN routing set".format(n))
+                results[n] = True
+            else:
+                self.logger.error("[{0}] Error while executing the NDN routing script".format(n))
+                print(make_colored("red", "[{0}] Error while executing the NDN routing script".format(n)))
+                results[n] = False
+        except Exception as error:
+            self.logger.error("Error while executing the NDN routing script {0}. "
+                              "Error: {1}".format(n,
+                                                  error))
+            results[n] = False
 
     def set_ndn_routing(self, rerouting=False):
         """
@@ -723,26 +644,7 @@ class NDNManager:
         """
 
         def set_routing(n, results):
-            try:
-                if rerouting:
-                    params = ["/root/{0}{1}".format(n, routing_suffix), "set_routing"]
-                else:
-                    params = ["/root/{0}{1}".format(n, routing_suffix), "set"]
-
-                ret = n.run_command(params)
-
-                if ret:
-                    self.logger.info("[{0}] NDN routing set".format(n))
-                    results[n] = True
-                else:
-                    self.logger.error("[{0}] Error while executing the NDN routing script".format(n))
-                    print(make_colored("red", "[{0}] Error while executing the NDN routing script".format(n)))
-                    results[n] = False
-            except Exception as error:
-                self.logger.error("Error while executing the NDN routing script {0}. "
-                                  "Error: {1}".format(n,
-                                                      error))
-                results[n] = False
+            self.set_node_routing(n, results, rerouting)
 
         self.logger.info("Setting NDN routing")
 
@@ -750,64 +652,60 @@ class NDNManager:
 
     def list_nfd_status(self):
         """
-        Show the routing tables of the nodes in the network.
+        Show the status of NFD (faces, FIB, strategies) on all the nodes of the network. The command runs on all the
+        nodes at the same time, and the output lines are printed as they arrive, prefixed by the node.
 
-        :return:
+        :return: True if the status has been retrieved from all the nodes, False otherwise
         """
         self.logger.info("Listing nfd status")
 
+        multiplexer = LxdAPI.OutputMultiplexer()
+
         for node in self.node_list.values():
-            params = ["nfd-status", "-fb"]
-            print(make_colored("blue", node))
-            print("\n\n")
-            try:
-                ret = node.run_command(params, output=True)
-            except Exception as error:
-                self.logger.error("[{0}] Error showing NFD status. "
-                                  "Error: {1}".format(node,
-                                                      error))
-                ret = False
+            node.stream_command(["nfd-status", "-fb"], multiplexer)
 
-            if not ret:
+        return_codes = multiplexer.relay(lambda node: make_colored("blue", node))
+
+        for node, return_code in return_codes:
+            if return_code != 0:
                 self.logger.error("[{0}] Error displaying NFD-STATUS".format(node))
                 print(make_colored("red", "[{0}] Error displaying NFD-STATUS".format(node)))
 
+        return all(return_code == 0 for _, return_code in return_codes)
+
     def execute_cmd(self, cmd):
         """
-        Execute the command on each node of the network.
+        Execute the command on each node of the network. The command runs on all the nodes at the same time, and the
+        output lines are printed as they arrive, prefixed by the node.
 
         :param cmd: The array with the command and the parameters to execute.
-        :return:
+        :return: True if the command succeeded on all the nodes, False otherwise
         """
         self.logger.info("Executing cmd {0}".format(cmd))
 
-        def exec_command(n, results):
-            try:
-                ret = n.run_command(cmd)
+        multiplexer = LxdAPI.OutputMultiplexer()
 
-                if ret:
-                    self.logger.error("[{0}] executeCmd {1} returned an error".format(n,
-                                                                                      cmd))
-                    print(make_colored("red", "[{0}] executeCmd returned an error".format(n)))
-                    results[n] = False
-                else:
-                    self.logger.info("[{0}] Successfully Executed cmd {1}".format(n,
-                                                                                  cmd))
-                    results[n] = True
-            except Exception as error:
-                self.logger.error("[{0}] Error executing command {2}. "
-                                  "Error: {1}".format(n,
-                                                      error,
-                                                      cmd))
-                results[n] = False
+        for node in self.node_list.values():
+            node.stream_command(cmd, multiplexer)
 
-        return start_thread_pool(self.node_list.values(), exec_command)
+        return_codes = multiplexer.relay(lambda node: make_colored("blue", node.replace(Globals.experiment_id, "")))
+
+        for node, return_code in return_codes:
+            if return_code != 0:
+                self.logger.error("[{0}] executeCmd {1} returned {2}".format(node, cmd, return_code))
+                print(make_colored("red", "[{0}] executeCmd returned an error".format(node)))
+
+        return all(return_code == 0 for _, return_code in return_codes)
 
     def start_test(self):
         """
-        Run the test by starting the clients.
+        Run the test by starting the clients. If Globals.workload_engine is set, each client sends requests following
+        its arrival process, popularity and time window (see :mod:`Crackle.Workload`), dispatched from here or, if
+        Globals.workload_replay is set, replayed inside the containers. Otherwise each client downloads its name once.
+        The performance of the downloads is collected in :attr:`download_reports` and summarized at the end of the
+        test.
 
-        :return:
+        :return: The list of :class:`DownloadReport`
         """
         shutil.rmtree(Globals.log_dir)
         os.mkdir(Globals.log_dir)
@@ -818,21 +716,45 @@ class NDNManager:
 
         self.logger.info("Test start time={0}".format(Globals.test_start_time))
 
-        client_manager_list = []
+        engine = None
 
-        # Start all the clients
+        if Globals.workload_engine:
+            engine = WorkloadEngine(self.node_list, run_download)
+            try:
+                if Globals.workload_replay:
+                    engine.generate_traces()
+                else:
+                    engine.generate()
+            except RuntimeError as error:
+                self.logger.error("Error generating the workload. Error: {0}".format(error))
+                print(make_colored("red", "Error generating the workload: {0}".format(error)))
+                return []
+
+            if not Globals.workload_replay:
+                self.download_reports = engine.run()
+            elif engine.push_traces():
+                self.download_reports = engine.replay()
+            else:
+                print(make_colored("red", "Error pushing the workload traces"))
+                return []
+        else:
+            client_manager_list = []
 
-        for node in self.node_list.values():
-            for client in node.get_client_apps():
-                self.logger.debug("[{0}] Starting client {1}".format(node, client))
+            # Start all the clients
 
-                cm = ClientManager(client, node)
-                client_manager_list.append(cm)
-                cm.start()
+            for node in self.node_list.values():
+                for client in node.get_client_apps():
+                    self.logger.debug("[{0}] Starting client {1}".format(node, client))
 
-        # Wait for clients' end
-        for cm in client_manager_list:
-            cm.join()
+                    cm = ClientManager(client, node)
+                    client_manager_list.append(cm)
+                    cm.start()
+
+            # Wait for clients' end
+            for cm in client_manager_list:
+                cm.join()
+
+            self.download_reports = [cm.report for cm in client_manager_list if cm.report is not None]
 
         # Wait until the end of the test in case the total
         # duration = time.time() - int(Globals.test_start_time)
@@ -849,6 +771,150 @@ class NDNManager:
 
         self.logger.info("END TEST")
 
+        summary = format_download_summary(self.download_reports)
+        if engine is not None:
+            summary += "\n" + engine.format_summary()
+        self.logger.info(summary)
+        print(make_colored("green", summary))
+
+        return self.download_reports
+
+
+class DownloadReport:
+    """
+    The performance of a download, parsed from the output of ndn-icp-download.
+
+    :ivar node: The node where the client runs
+    :ivar client_id: The identifier of the client
+    :ivar name: The name of the downloaded content
+    :ivar start_time: The start time of the download, in seconds since the epoch
+    :ivar end_time: The end time of the download, in seconds since the epoch
+    :ivar return_code: The return code of ndn-icp-download (None if it could not be executed)
+    :ivar download_time: The download time in seconds, as reported by ndn-icp-download (or measured by the client
+                         manager if not reported)
+    :ivar throughput: The throughput in bit/s (None if not available)
+    :ivar retransmissions: The number of retransmitted interests (None if not reported)
+    :ivar bytes: The number of bytes received (None if not reported)
+    """
+
+    def __init__(self, node, client_id, name, start_time, end_time, return_code):
+        self.node = node
+        self.client_id = client_id
+        self.name = name
+        self.start_time = start_time
+        self.end_time = end_time
+        self.return_code = return_code
+        self.download_time = end_time - start_time
+        self.throughput = None
+        self.retransmissions = None
+        self.bytes = None
+
+    def is_successful(self):
+        """
+        :return: True if the download completed, False otherwise
+        """
+
+        return self.return_code == 0
+
+    def parse(self, text):
+        """
+        Fill the report with the summary printed by ndn-icp-download. The values not found in text are not modified.
+
+        :param text: The output of ndn-icp-download
+        """
+
+        match = __download_time_pattern__.search(text)
+        if match:
+            self.download_time = float(match.group(1)) / (1000 if (match.group(2) or "").lower() == "ms" else 1)
+
+        match = __bytes_pattern__.search(text)
+        if match:
+            self.bytes = int(match.group(1))
+
+        match = __throughput_pattern__.search(text)
+        if match:
+            unit = match.group(3)
+            bits = 8 if unit in __byte_rate_units__ or unit.lower().startswith("byte") else 1
+            self.throughput = float(match.group(1)) * __rate_units__[match.group(2).lower()] * bits
+        elif self.bytes is not None and self.download_time > 0:
+            self.throughput = self.bytes * 8 / self.download_time
+
+        match = __retransmissions_pattern__.search(text)
+        if match:
+            self.retransmissions = int(match.group(1))
+
+    def to_dict(self):
+        """
+        :return: The report as a dictionary
+        """
+
+        return {"node": str(self.node),
+                "client": self.client_id,
+                "name": self.name,
+                "start_time": self.start_time,
+                "end_time": self.end_time,
+                "return_code": self.return_code,
+                "download_time": self.download_time,
+                "throughput": self.throughput,
+                "retransmissions": self.retransmissions,
+                "bytes": self.bytes}
+
+
+def run_download(node, client, name):
+    """
+    Download a content with ndn-icp-download from a node, capturing its output.
+
+    :param node: The node of the client
+    :param client: The :class:`Crackle.TopologyStructs.Client`
+    :param name: The name of the content
+    :return: The :class:`DownloadReport`
+    """
+
+    start_time = time.time()
+    ret = node.run_command_output(["ndn-icp-download", "-u", name])
+
+    report = DownloadReport(node, client.get_client_id(), name, start_time, time.time(),
+                            ret[0] if ret is not None else None)
+
+    if ret is not None:
+        report.parse(ret[1] + "\n" + ret[2])
+        module_logger.debug("[{0}] Output of client application {1}: {2}".format(node,
+                                                                                 client.get_client_id(),
+                                                                                 ret[1] + ret[2]))
+
+    return report
+
+
+def format_download_summary(reports):
+    """
+    Summarize the downloads of a test: number of completed downloads, distribution of the completion time, mean
+    throughput and retransmissions.
+
+    :param reports: The list of :class:`DownloadReport`
+    :return: The summary, as a string
+    """
+
+    if not reports:
+        return "No download executed."
+
+    completed = [r for r in reports if r.is_successful()]
+    times = sorted(r.download_time for r in completed)
+    throughputs = [r.throughput for r in completed if r.throughput is not None]
+    retransmissions = [r.retransmissions for r in reports if r.retransmissions is not None]
+
+    lines = ["Downloads completed: {0}/{1}".format(len(completed), len(reports))]
+
+    if times:
+        lines.append("Completion time (s): min {0:.2f}, p50 {1:.2f}, p95 {2:.2f}, max {3:.2f}".format(
+                times[0], percentile(times, 50), percentile(times, 95), times[-1]))
+    if throughputs:
+        lines.append("Mean throughput: {0:.3f} Mbit/s".format(sum(throughputs) / len(throughputs) / 10 ** 6))
+    if retransmissions:
+        lines.append("Retransmissions: {0} (max {1} per download)".format(sum(retransmissions),
+                                                                          max(retransmissions)))
+
+    return "\n".join(lines)
+
 
 class ClientManager(threading.Thread):
     """
@@ -857,6 +923,7 @@ class ClientManager(threading.Thread):
 
     :ivar client: The client to start
     :ivar container: The container on which the client has to run
+    :ivar report: The :class:`DownloadReport` of the download, available when the thread ends
     """
 
     def __init__(self, client, node):
@@ -865,6 +932,7 @@ class ClientManager(threading.Thread):
         self.client = client
         self.file_sizes = {}
         self.node = node
+        self.report = None
 
         self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
 
@@ -899,13 +967,11 @@ class ClientManager(threading.Thread):
         #
         # self.logger.info("[{0}] Params={1}".format(self.client.get_client_id(), params))
 
-        params = ["ndn-icp-download",
-                  "-u",
-                  self.client.get_name()]
         print(make_colored('blue', 'downloading ...'))
-        ret = self.node.run_command(params)
 
-        if not ret:
+        self.report = run_download(self.node, self.client, self.client.get_name())
+
+        if not self.report.is_successful():
             self.logger.error("[{0}] Error executing client application {1}".format(self.node,
                                                                                     self.client.get_client_id()))
             print(make_colored("red", "[{0}] Error executing "
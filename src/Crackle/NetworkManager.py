@@ -7,43 +7,68 @@ import os
 import random
 import shutil
 import ssl
-import stat
 import logging
 import subprocess
+import tarfile
 import threading
 
 import time
 
+import requests.exceptions as req_except
+
 from Crackle import TopologyStructs
+from Crackle import LxdAPI
+from Crackle import Manifest
 from Crackle.ColoredOutput import make_colored
 import Crackle.Globals as Globals
 import Crackle.Constants as Constants
+import Crackle.Placement as Placement
 
 from Crackle.AsyncManager import start_thread_pool
 from Crackle.LxcUtils import RouterContainer
+from Crackle import ScriptCompiler
+from Crackle.ScriptCompiler import create_suffix, remove_suffix
 
 _DEBUG = False
 
-create_suffix = "_create.sh"
-remove_suffix = "_remove.sh"
+ifstat_path_template = "{0}link_{1}_{2}.log"
+mpstat_path_template = "{0}mpstat_{1}.log"
 
-net_card_name = "$(ifconfig | grep eth0 | cut -d \" \" -f 1)"
+nfd_log = "/var/log/ndn/nfd.log"
 
-macvlan_template = "ip link add name {0} link " + net_card_name + " type macvlan && ip link set dev {0} address {3} && " \
-                                                                  "ip link set {0} up && ip addr add {1}/32 brd + dev {0} && ip route add {2} dev {0}\n"
+# Archive with the statistic files inside the containers, and file marking the nodes whose statistics have been
+# collected in Globals.log_dir/<node>
+stats_archive = "/tmp/crackle-stats.tar.gz"
+stats_marker = ".collected"
+__nfd_conf_file__ = "/etc/ndn/nfd.conf"
 
-delete_macvlan_template = "ip link delete {0}"
+# LXD storage drivers with copy-on-write snapshots
+__cow_storage_drivers__ = {"zfs", "btrfs", "lvm", "ceph"}
 
-# with HTB:
 
-shaping_template = "tc qdisc del dev {0} root; tc qdisc add dev {0} root handle 1: " \
-                   "tbf rate {1} burst {2}kb latency 70ms && tc qdisc add dev {0} parent 1:1 codel\n"
+def extract_stats(archive, directory):
+    """
+    Extract the files of a statistics archive in a directory, without their path.
 
-ifstat_path_template = "{0}link_{1}_{2}.log"
-mpstat_path_template = "{0}mpstat_{1}.log"
+    :param archive: The path of the archive
+    :param directory: The destination directory
+    :return: The total size of the extracted files, in bytes
+    """
 
-nfd_log = "/var/log/ndn/nfd.log"
-__nfd_conf_file__ = "/etc/ndn/nfd.conf"
+    os.makedirs(directory, exist_ok=True)
+
+    extracted = 0
+
+    with tarfile.open(archive, "r:gz") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            source = tar.extractfile(member)
+            with open(os.path.join(directory, os.path.basename(member.name)), "wb") as f:
+                shutil.copyfileobj(source, f, 2 ** 20)
+            extracted += member.size
+
+    return extracted
 
 
 class NetworkManager:
@@ -53,6 +78,7 @@ class NetworkManager:
     network commands on the experiment nodes.
 
     :ivar: node_list: The complete list of nodes of the network.
+    :ivar scripts: The link scripts compiled by :meth:`create_scripts` (file name => content)
     """
 
     def __init__(self, node_list, server_list):
@@ -60,6 +86,8 @@ class NetworkManager:
         self.server_list = server_list
         self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
         self.stat_files = {}
+        self.snapshot_taken = False
+        self.scripts = {}
 
         self.base_station_list = []
         self.mobile_station_list = []
@@ -338,53 +366,42 @@ class NetworkManager:
 
             return
 
-        forward_strategy_old = node.get_forward_strategy()
-
         node.set_forward_strategy(forward_strategy)
 
-        self.reset_node_strategy(node, forward_strategy, forward_strategy_old)
-
         if not container_created:
             self.logger.error("{0} Error in forward_strategy".format(forward_strategy))
 
             print(make_colored("red", "{0} Error in forward_strategy".format(forward_strategy)))
 
-    def reset_node_strategy(self, n, forward_strategy, forward_strategy_old):
+            return
 
-        try:
+        self.reset_node_strategy(node, forward_strategy)
+
+    def reset_node_strategy(self, n, forward_strategy):
+        """
+        Change the forwarding strategy of a running node through the NFD management, without restarting NFD.
 
-            param = ["sed",
-                     "-i",
-                     "0,/\/ / s/{0}/{1}/".format(forward_strategy_old, forward_strategy),
-                     __nfd_conf_file__]
+        :param n: The node
+        :param forward_strategy: The new forwarding strategy
+        :return: True if the strategy has been changed, False otherwise
+        """
 
-            ret = n.run_command(param)
+        try:
+            ret = n.run_command(["sh", "-c", ScriptCompiler.render_reconfigure_script(n, strategy=forward_strategy)])
+            Manifest.forget(n.container.name, __nfd_conf_file__)
 
             if not ret:
                 print(make_colored("red", "[{0}] Error while reseting node".format(n)))
                 self.logger.error("[{0}] Error while reseting node".format(n))
-
             else:
-                logging.info("[{0}] Router configured. and "
-                             "Forwarding Strategy={1}".format(n, forward_strategy))
-
-            params = ["service",
-                      "nfd",
-                      "restart"]
-
-            ret = n.run_command(params)
-
-            if not ret:
-                self.logger.error("[{0}] Error restarting NFD".format(n))
-                print(make_colored("red", "[{0}] Error restarting NFD".format(n)))
-
-            else:
-                self.logger.info("[{0}] NFD restarted".format(n))
+                self.logger.info("[{0}] Forwarding Strategy={1}".format(n, forward_strategy))
 
+            return ret
         except Exception as error:
             self.logger.error("[{0}] Error setting up the router. "
                               "Error: {1}".format(n,
                                                   error))
+            return False
 
     def add_node(self, node_name, cache_size, forwarding_strategy, container_created=False):
         """
@@ -401,7 +418,15 @@ class NetworkManager:
                                                                container=RouterContainer(node_name),
                                                                vlan=Constants.router_vlan)
 
-            self.node_list[node_name].set_server(self.server_list[random.randint(0, len(self.server_list) - 1)])
+            try:
+                self.node_list[node_name].set_server(Placement.select_server(self.node_list,
+                                                                             self.server_list,
+                                                                             self.node_list[node_name]))
+            except RuntimeError as error:
+                del self.node_list[node_name]
+                self.logger.error("Impossible to create the node {0}: {1}".format(node_name, error))
+                print(make_colored("red", "Impossible to create the node {0}: {1}".format(node_name, error)))
+                return
 
             if container_created:
                 self.node_list[node_name].spawn_container()
@@ -474,20 +499,39 @@ class NetworkManager:
 
     def exec(self, node, command, container_created):
         """
-        Execute the command command on the node
-        :param node: The target node
+        Execute the command command on the node, printing its output as it arrives.
+
+        :param node: The target node, or a list of target nodes (on which the command runs at the same time)
         :param command: An array containing the command to execute
-        :return:
+        :return: True if the command succeeded on all the nodes, False otherwise
         """
 
-        if node in self.node_list:
-            if container_created:
-                self.node_list[node].run_command(command, output=True)
-            else:
-                print(make_colored("yellow", "Please start the containers before running a command on them!"))
-        else:
-            self.logger.error("The node {0} does not exist.".format(node.replace(Globals.experiment_id, "")))
-            print(make_colored("red", "Node {0} does not exist!".format(node.replace(Globals.experiment_id, ""))))
+        nodes = node if isinstance(node, list) else [node]
+        missing = [n for n in nodes if n not in self.node_list]
+
+        if missing:
+            for n in missing:
+                self.logger.error("The node {0} does not exist.".format(n.replace(Globals.experiment_id, "")))
+                print(make_colored("red", "Node {0} does not exist!".format(n.replace(Globals.experiment_id, ""))))
+            return False
+
+        if not container_created:
+            print(make_colored("yellow", "Please start the containers before running a command on them!"))
+            return False
+
+        multiplexer = LxdAPI.OutputMultiplexer()
+
+        for n in nodes:
+            self.node_list[n].stream_command(command, multiplexer)
+
+        return_codes = multiplexer.relay(lambda n: make_colored("blue", n.replace(Globals.experiment_id, "")))
+
+        for n, return_code in return_codes:
+            if return_code != 0:
+                self.logger.error("[{0}] Command {1} returned {2}".format(n, command, return_code))
+                print(make_colored("red", "[{0}] Command returned {1}".format(n, return_code)))
+
+        return all(return_code == 0 for _, return_code in return_codes)
 
     def list_tunnels(self):
         """
@@ -533,66 +577,61 @@ class NetworkManager:
         This allows to create the virtual topology and to set the link bandwith according on the configuration that has
         been specified in the topo.brite file.
 
-        :return:
-
-        """
+        The scripts of all the nodes are compiled in a single pass (see :mod:`Crackle.ScriptCompiler`), kept in memory
+        and, if Globals.write_scripts is set, written in Globals.scripts_dir.
 
-        def create_script(n_from, results):
+        :return: True if the scripts have been created, False otherwise
 
-            f = open(Globals.scripts_dir + str(n_from) + create_suffix, 'w')
-
-            f.write("#!/bin/bash\n\n"
-                    "sysctl -w net.ipv4.ip_forward=1\n")
-
-            for link in n_from.get_links().values():
-
-                self.logger.debug("[{0}] Creating script for creating link from {0} to {1}".format(n_from,
-                                                                                                   link.get_node_to()))
-
-                f.write(macvlan_template.format(link.get_node_to(),
-                                                n_from.get_ip_address(link.get_node_to()),
-                                                link.get_node_to().get_ip_address(n_from),
-                                                n_from.get_mac_address(link.get_node_to())))
-
-                burst = link.get_burst()
+        """
 
-                if link.is_shaped():
-                    f.write(shaping_template.format(link.get_node_to(),
-                                                    str(link.get_capacity()) + "Mbit",
-                                                    burst))
-                f.write("\n")
-            f.write("exit 0\n")
-            f.close()
-            os.chmod(Globals.scripts_dir + str(n_from) + create_suffix,
-                     stat.S_IXUSR | stat.S_IRUSR | stat.S_IWUSR | stat.S_IRWXU)
+        self.logger.info("Creating scripts to set/remove links...")
 
-            results[n_from] = True
+        try:
+            scripts = ScriptCompiler.compile_scripts(self.node_list.values(), routing=False)
+            if Globals.write_scripts:
+                ScriptCompiler.write_scripts(scripts)
+        except (RuntimeError, OSError) as error:
+            self.logger.error("Error creating the link scripts. Error: {0}".format(error))
+            print(make_colored("red", "Error creating the link scripts."))
+            return False
 
-        def remove_script(n_from, results):
-            if len(n_from.get_links()) > 0:
-                f = open(Globals.scripts_dir + str(n_from) + remove_suffix, 'w')
-                f.write("#!/bin/bash\n\n")
+        self.scripts.update(scripts)
 
-                for link in n_from.get_links().values():
-                    self.logger.debug("[{0}] Creating script for removing link from {0} to {1}".format(n_from,
-                                                                                                       link.get_node_to()))
+        return True
 
-                    f.write(delete_macvlan_template.format(link.get_node_to()))
-                f.close()
-                os.chmod(Globals.scripts_dir + str(n_from) + remove_suffix,
-                         stat.S_IXUSR | stat.S_IRUSR |
-                         stat.S_IWUSR | stat.S_IRWXU)
+    def create_node_links(self, n, res):
+        """
+        Push and execute the link creation script inside the container of a node.
 
-            results[n_from] = True
+        :param n: The node
+        :param res: The dictionary where the result is stored (node => True/False)
+        """
 
-        self.logger.info("Creating scripts to set/remove links...")
+        try:
+            if not ScriptCompiler.push_script(n, create_suffix, self.scripts):
+                self.logger.error("[{0}] Error pushing the file {1}.".format(n,
+                                                                          ScriptCompiler.script_name(n, create_suffix)))
+                res[n] = False
+                return
+            else:
+                self.logger.debug("[{0}] File {1} successfully pushed.".format(n,
+                                                                               ScriptCompiler.script_name(n,
+                                                                                                          create_suffix)))
 
-        if not os.path.exists(Globals.scripts_dir):
-            os.makedirs(Globals.scripts_dir, exist_ok=True)
+            ret = n.run_command([ScriptCompiler.remote_script_path(n, create_suffix)])
 
-        return start_thread_pool(self.node_list.values(),
-                                 create_script) and start_thread_pool(self.node_list.values(),
-                                                                      remove_script)
+            if not ret:
+                self.logger.error("[{0}]: Error while executing the link creation script".format(n))
+                print(make_colored("red", "[{0}]: Error while executing the link creation script".format(n)))
+                res[n] = False
+            else:
+                self.logger.info("[{0}] Links created.".format(n))
+                res[n] = True
+        except Exception as error:
+            self.logger.error("Error creating links. "
+                              "Error: {1}".format(n,
+                                                  error))
+            res[n] = False
 
     def create_links(self):
         """
@@ -604,40 +643,9 @@ class NetworkManager:
 
         """
 
-        def create_links(n, res):
-
-            try:
-                if not n.push_file(Globals.scripts_dir + str(n) + create_suffix,
-                                   "/root/{0}{1}".format(n, create_suffix)):
-                    self.logger.error("[{0}] Error pushing the file. SourcePath={1}, DestPath={2}.".format(n,
-                                                                                                           Globals.scripts_dir + str(
-                                                                                                                   n) + create_suffix,
-                                                                                                           "/root/create_link_scripts"))
-                    res[n] = False
-                    return
-                else:
-                    self.logger.debug("[{0}] File {1} successfully pushed.".format(n,
-                                                                                   Globals.scripts_dir + str(
-                                                                                           n) + create_suffix))
-
-                ret = n.run_command(["/root/{0}{1}".format(n, create_suffix)])
-
-                if not ret:
-                    self.logger.error("[{0}]: Error while executing the link creation script".format(n))
-                    print(make_colored("red", "[{0}]: Error while executing the link creation script".format(n)))
-                    res[n] = False
-                else:
-                    self.logger.info("[{0}] Links created.".format(n))
-                    res[n] = True
-            except Exception as error:
-                self.logger.error("Error creating links. "
-                                  "Error: {1}".format(n,
-                                                      error))
-                res[n] = False
-
         self.logger.info("Creating the links...")
 
-        return start_thread_pool(self.node_list.values(), create_links)
+        return start_thread_pool(self.node_list.values(), self.create_node_links)
 
     def assign_station_vlans(self):
         """
@@ -654,6 +662,25 @@ class NetworkManager:
                                                                         start_vlan + len(self.base_station_list)))
             start_vlan += len(self.base_station_list) + 1
 
+    def spawn_node_container(self, n, results):
+        """
+        Create the container of a node.
+
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
+        """
+
+        try:
+            if n.spawn_container():
+                results[n] = True
+            else:
+                results[n] = False
+        except req_except.RequestException as error:
+            self.logger.error("Error spawning container {0}. "
+                              "Error: {1}".format(n,
+                                                  error))
+            results[n] = False
+
     def spawn_containers(self):
         """
         Create the containers on the servers in the cluster.
@@ -663,19 +690,37 @@ class NetworkManager:
 
         self.assign_station_vlans()
 
-        def spawn_container(n, results):
-            try:
-                if n.spawn_container():
-                    results[n] = True
-                else:
-                    results[n] = False
-            except req_except.RequestException as error:
-                self.logger.error("Error spawning container {0}. "
-                                  "Error: {1}".format(n,
-                                                      error))
-                results[n] = False
+        return start_thread_pool(self.node_list.values(), self.spawn_node_container, sleep_time=0.2)
+
+    def start_node_container(self, n, results):
+        """
+        Push the NFD configuration file inside the container of a node and start it.
 
-        return start_thread_pool(self.node_list.values(), spawn_container, sleep_time=0.2)
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
+        """
+
+        try:
+            ret = n.push_file(Constants.nfd_conf_file, __nfd_conf_file__)
+            if not ret:
+                self.logger.error("[{0}] Error sending NFD configuration file".format(n))
+                print(make_colored("red", "[{0}] Error sending NFD configuration file".format(n)))
+                results[n] = False
+            else:
+                self.logger.info("[{0}] NFD configuration file sent".format(n))
+                results[n] = True
+            if n.start_container():
+                self.logger.info("[{0}]: Container started.".format(n))
+                results[n] = True
+            else:
+                print(make_colored("red", "[{0}]: Container failed to start.".format(n)))
+                self.logger.error("[{0}]: Container failed to start.".format(n))
+                results[n] = False
+        except Exception as error:
+            self.logger.error("Error starting container {0}. "
+                              "Error: {1}".format(n,
+                                                  error))
+            results[n] = False
 
     def start_containers(self):
         """
@@ -687,31 +732,7 @@ class NetworkManager:
 
         self.logger.info("Starting all the containers")
 
-        def start_container(n, results):
-
-            try:
-                ret = n.push_file(Constants.nfd_conf_file, __nfd_conf_file__)
-                if not ret:
-                    self.logger.error("[{0}] Error sending NFD configuration file".format(n))
-                    print(make_colored("red", "[{0}] Error sending NFD configuration file".format(n)))
-                    results[n] = False
-                else:
-                    self.logger.info("[{0}] NFD configuration file sent".format(n))
-                    results[n] = True
-                if n.start_container():
-                    self.logger.info("[{0}]: Container started.".format(n))
-                    results[n] = True
-                else:
-                    print(make_colored("red", "[{0}]: Container failed to start.".format(n)))
-                    self.logger.error("[{0}]: Container failed to start.".format(n))
-                    results[n] = False
-            except Exception as error:
-                self.logger.error("Error starting container {0}. "
-                                  "Error: {1}".format(n,
-                                                      error))
-                results[n] = False
-
-        return start_thread_pool(self.node_list.values(), start_container, sleep_time=0.2)
+        return start_thread_pool(self.node_list.values(), self.start_node_container, sleep_time=0.2)
 
     def delete_containers(self):
         """
@@ -723,6 +744,8 @@ class NetworkManager:
 
         self.logger.info("Deleting all the containers")
 
+        self.snapshot_taken = False
+
         def delete_container(n, results):
 
             try:
@@ -751,6 +774,9 @@ class NetworkManager:
 
         self.logger.info("Stopping all the containers")
 
+        # The containers are ephemeral: stopping them destroys their snapshots too
+        self.snapshot_taken = False
+
         def stop_container(n, results):
 
             try:
@@ -769,6 +795,106 @@ class NetworkManager:
 
         return start_thread_pool(self.node_list.values(), stop_container)
 
+    def check_snapshot_storage(self):
+        """
+        Check the storage driver of the LXD daemons. On ZFS, btrfs and LVM the snapshots are copy-on-write, so they are
+        taken in constant time and share the unchanged blocks with the containers. With the dir driver each snapshot
+        is a full copy of the root filesystem of the container.
+
+        :return: The list of servers without copy-on-write storage
+        """
+
+        servers = []
+
+        for server in self.server_list:
+            try:
+                driver = LxdAPI.get_server_info(server)["environment"].get("storage", "")
+            except (RuntimeError, KeyError, req_except.RequestException) as error:
+                self.logger.warning("[{0}] Impossible to retrieve the storage driver. Error: {1}".format(server, error))
+                continue
+
+            if driver not in __cow_storage_drivers__:
+                self.logger.warning("[{0}] Storage driver {1} is not copy-on-write: "
+                                    "the snapshots are full copies of the containers".format(server, driver))
+                servers.append(server)
+
+        return servers
+
+    def snapshot_node_container(self, n, results):
+        """
+        Take a snapshot of the container of a node.
+
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
+        """
+
+        try:
+            if n.snapshot_container(Constants.setup_snapshot, bool(Globals.snapshot_stateful)):
+                self.logger.info("[{0}]: Snapshot taken.".format(n))
+                results[n] = True
+            else:
+                self.logger.error("[{0}]: Error taking the snapshot.".format(n))
+                results[n] = False
+        except Exception as error:
+            self.logger.error("Error taking the snapshot of container {0}. "
+                              "Error: {1}".format(n,
+                                                  error))
+            results[n] = False
+
+    def snapshot_containers(self):
+        """
+        Take a snapshot of all the containers, once the environment is set up and before any test is started. The
+        snapshot is used by :meth:`restore_containers` to bring the experiment back to this state.
+
+        :return: True if all the snapshots have been taken, False otherwise
+        """
+
+        self.logger.info("Taking a snapshot of all the containers")
+
+        self.check_snapshot_storage()
+        self.snapshot_taken = start_thread_pool(self.node_list.values(), self.snapshot_node_container)
+
+        return self.snapshot_taken
+
+    def restore_node_container(self, n, results):
+        """
+        Restore the container of a node from the snapshot taken after the setup.
+
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
+        """
+
+        try:
+            if n.restore_container(Constants.setup_snapshot, bool(Globals.snapshot_stateful)):
+                self.logger.info("[{0}]: Container restored.".format(n))
+                results[n] = True
+            else:
+                self.logger.error("[{0}]: Error restoring the container.".format(n))
+                results[n] = False
+        except Exception as error:
+            self.logger.error("Error restoring container {0}. "
+                              "Error: {1}".format(n,
+                                                  error))
+            results[n] = False
+
+    def restore_containers(self):
+        """
+        Restore all the containers, in parallel, from the snapshot taken by :meth:`snapshot_containers`. With stateful
+        snapshots the links, the NDN faces, the routes and the statistic processes come back as they were after the
+        setup, while the state produced by the previous test (logs, content store of NFD) is discarded. Stateless
+        snapshots restart the containers: the caller has to set up again the links, NFD and the routing.
+
+        :return: True if all the containers have been restored, False otherwise
+        """
+
+        if not self.snapshot_taken:
+            self.logger.error("Impossible to restore the containers: no snapshot taken.")
+            return False
+
+        self.logger.info("Restoring all the containers")
+
+        return start_thread_pool(self.node_list.values(), self.restore_node_container)
+
     def remove_links(self):
         """
         Remove the network links created by the previous method :meth:`Crackle.NetworkManager.NetworkManager.create_links`
@@ -779,21 +905,17 @@ class NetworkManager:
 
         def remove_link(n, results):
 
-            if not n.push_file(Globals.scripts_dir + str(n) + remove_suffix,
-                               "/root/{0}{1}".format(n, remove_suffix)):
-                self.logger.error("[{0}] Error pushing the file. SourcePath={1}, "
-                                  "DestPath={2}.".format(n,
-                                                         Globals.scripts_dir + str(n) + create_suffix,
-                                                         "/root/remove_link_scripts"))
+            if not ScriptCompiler.push_script(n, remove_suffix, self.scripts):
+                self.logger.error("[{0}] Error pushing the file {1}.".format(n,
+                                                                          ScriptCompiler.script_name(n, remove_suffix)))
                 results[n] = False
                 return
             else:
                 self.logger.debug("[{0}] File {1} successfully pushed.".format(n,
-                                                                               Globals.scripts_dir + str(
-                                                                                       n) + create_suffix))
+                                                                               ScriptCompiler.script_name(n,
+                                                                                                          remove_suffix)))
 
-            ret = n.run_command(["/root/{0}{1}".format(n,
-                                                       remove_suffix)])
+            ret = n.run_command([ScriptCompiler.remote_script_path(n, remove_suffix)])
 
             if ret:
                 self.logger.error("[{0}]: Error while executing the link deleting script".format(n))
@@ -834,121 +956,127 @@ class NetworkManager:
 
         return routing_algorithm
 
-    def set_stats(self):
+    def set_node_stats(self, n, results):
         """
-        Starts the software *ifstat* and *mpstat* in the network, in order to take some statistics about the usage of
-        each link/interface and about the CPU usage.
-
-        :return:
+        Start *ifstat* and *mpstat* on a node.
 
+        :param n: The node
+        :param results: The dictionary where the result is stored (node => True/False)
         """
-        self.logger.info("Set up per link statistics.")
 
-        def start_stat(n, results):
+        self.stat_files[n] = []
 
-            self.stat_files[n] = []
+        # try:
+        ret = n.run_command(["rm", "-rf", Globals.remote_log_dir])
+        if not ret:
+            results[n] = False
+            self.logger.error("[{1}]: Error deleting folder {0}".format(Globals.remote_log_dir, n))
+            print(
+                    make_colored("red",
+                                 "[{1}]: Error deleting folder {0}".format(Globals.remote_log_dir, n)))
+            return
+        else:
+            self.logger.info("[{1}] Folder {0} deleted".format(Globals.remote_log_dir, n))
 
-            # try:
-            ret = n.run_command(["rm", "-rf", Globals.remote_log_dir])
-            if not ret:
-                results[n] = False
-                self.logger.error("[{1}]: Error deleting folder {0}".format(Globals.remote_log_dir, n))
-                print(
-                        make_colored("red",
-                                     "[{1}]: Error deleting folder {0}".format(Globals.remote_log_dir, n)))
-                return
-            else:
-                self.logger.info("[{1}] Folder {0} deleted".format(Globals.remote_log_dir, n))
+        ret = n.run_command(["mkdir", "-p", Globals.remote_log_dir])
 
-            ret = n.run_command(["mkdir", "-p", Globals.remote_log_dir])
+        if not ret:
+            results[n] = False
+            self.logger.error("[{1}]: Error creating folder {0}".format(Globals.remote_log_dir, n))
+            print(
+                    make_colored("red",
+                                 "[{1}]: Error creating folder {0}".format(Globals.remote_log_dir, n)))
+            return
+        else:
+            self.logger.info("[{1}] Folder {0} created".format(Globals.remote_log_dir, n))
 
-            if not ret:
-                results[n] = False
-                self.logger.error("[{1}]: Error creating folder {0}".format(Globals.remote_log_dir, n))
-                print(
-                        make_colored("red",
-                                     "[{1}]: Error creating folder {0}".format(Globals.remote_log_dir, n)))
-                return
-            else:
-                self.logger.info("[{1}] Folder {0} created".format(Globals.remote_log_dir, n))
+        if type(n) != TopologyStructs.Station:
 
-            if type(n) != TopologyStructs.Station:
+            for link in n.get_links().values():
 
-                for link in n.get_links().values():
+                params = ["/bin/bash",
+                          "-c",
+                          "nohup ifstat -i {0} -b -t > {1} &".format(link.get_node_to(),
+                                                                     ifstat_path_template.format(
+                                                                           Globals.remote_log_dir,
+                                                                           link.get_node_from(),
+                                                                           link.get_node_to()))]
+                self.stat_files[n].append(ifstat_path_template.format(Globals.remote_log_dir,
+                                                                      link.get_node_from(),
+                                                                      link.get_node_to()))
+                if not n.run_command(params):
+                    results[n] = False
+                    self.logger.error("[{0}] Error setting up ifstat statistics".format(n))
+                    return
+
+        if type(n) == TopologyStructs.BaseStation:
+
+            params = ["/bin/bash",
+                      "-c",
+                      "nohup ifstat -i wlan0 -b -t > {0} &".format(
+                              ifstat_path_template.format(Globals.remote_log_dir,
+                                                          n,
+                                                          "base_station"))]
+            self.stat_files[n].append(ifstat_path_template.format(Globals.remote_log_dir,
+                                                                  n,
+                                                                  "bs_aggregate_traffic"))
+            if not n.run_command(params):
+                results[n] = False
+                self.logger.error("[{0}] Error setting up ifstat statistics".format(n))
+                return
 
-                    params = ["/bin/bash",
-                              "-c",
-                              "nohup ifstat -i {0} -b -t > {1} &".format(link.get_node_to(),
-                                                                         ifstat_path_template.format(
-                                                                               Globals.remote_log_dir,
-                                                                               link.get_node_from(),
-                                                                               link.get_node_to()))]
-                    self.stat_files[n].append(ifstat_path_template.format(Globals.remote_log_dir,
-                                                                          link.get_node_from(),
-                                                                          link.get_node_to()))
-                    if not n.run_command(params):
-                        results[n] = False
-                        self.logger.error("[{0}] Error setting up ifstat statistics".format(n))
-                        return
+        if type(n) == TopologyStructs.Station:
 
-            if type(n) == TopologyStructs.BaseStation:
+            for bs in self.base_station_list:
 
                 params = ["/bin/bash",
                           "-c",
-                          "nohup ifstat -i wlan0 -b -t > {0} &".format(
-                                  ifstat_path_template.format(Globals.remote_log_dir,
-                                                              n,
-                                                              "base_station"))]
+                          "nohup ifstat -i {0} -b -t > {1} &".format(bs, ifstat_path_template.format(
+                                  Globals.remote_log_dir,
+                                  n,
+                                  bs))]
                 self.stat_files[n].append(ifstat_path_template.format(Globals.remote_log_dir,
                                                                       n,
-                                                                      "bs_aggregate_traffic"))
+                                                                      bs))
                 if not n.run_command(params):
                     results[n] = False
                     self.logger.error("[{0}] Error setting up ifstat statistics".format(n))
                     return
+                else:
+                    self.logger.info("[{0}] ifstat statistics set up".format(n))
 
-            if type(n) == TopologyStructs.Station:
-
-                for bs in self.base_station_list:
-
-                    params = ["/bin/bash",
-                              "-c",
-                              "nohup ifstat -i {0} -b -t > {1} &".format(bs, ifstat_path_template.format(
-                                      Globals.remote_log_dir,
-                                      n,
-                                      bs))]
-                    self.stat_files[n].append(ifstat_path_template.format(Globals.remote_log_dir,
-                                                                          n,
-                                                                          bs))
-                    if not n.run_command(params):
-                        results[n] = False
-                        self.logger.error("[{0}] Error setting up ifstat statistics".format(n))
-                        return
-                    else:
-                        self.logger.info("[{0}] ifstat statistics set up".format(n))
+        params = ["/bin/bash",
+                  "-c",
+                  "nohup mpstat -P ALL 1 > {0} &".format(mpstat_path_template.format(Globals.remote_log_dir,
+                                                                                     n))]
 
-            params = ["/bin/bash",
-                      "-c",
-                      "nohup mpstat -P ALL 1 > {0} &".format(mpstat_path_template.format(Globals.remote_log_dir,
-                                                                                         n))]
+        self.stat_files[n].append(mpstat_path_template.format(Globals.remote_log_dir, n))
 
-            self.stat_files[n].append(mpstat_path_template.format(Globals.remote_log_dir, n))
+        if not n.run_command(params):
+            results[n] = False
+            self.logger.error("[{0}] Error setting up mpstat statistics".format(n))
+            return
+        else:
+            self.logger.info("[{0}] mpstat statistics set up".format(n))
 
-            if not n.run_command(params):
-                results[n] = False
-                self.logger.error("[{0}] Error setting up mpstat statistics".format(n))
-                return
-            else:
-                self.logger.info("[{0}] mpstat statistics set up".format(n))
+        results[n] = True
+        # except Exception as error:
+        #     self.logger.error("[{0}] Error setting up statistics. "
+        #                       "Error: {1}".format(n,
+        #                                           error))
+        #     results[n] = False
 
-            results[n] = True
-            # except Exception as error:
-            #     self.logger.error("[{0}] Error setting up statistics. "
-            #                       "Error: {1}".format(n,
-            #                                           error))
-            #     results[n] = False
+    def set_stats(self):
+        """
+        Starts the software *ifstat* and *mpstat* in the network, in order to take some statistics about the usage of
+        each link/interface and about the CPU usage.
 
-        return start_thread_pool(self.node_list.values(), start_stat)
+        :return:
+
+        """
+        self.logger.info("Set up per link statistics.")
+
+        return start_thread_pool(self.node_list.values(), self.set_node_stats)
 
     def kill_stats(self):
         """
@@ -1000,38 +1128,109 @@ class NetworkManager:
 
         return start_thread_pool(self.node_list.values(), kill_stat)
 
-    def get_stats(self):
+    def get_stats(self, resume=False):
         """
-        Get the statistics from the nodes.
+        Get the statistics from the nodes. On each node, *nfd.log* and the files in Globals.remote_log_dir (the output
+        of *ifstat* and *mpstat*) are compressed in one archive inside the container. The archives are downloaded in
+        parallel (at most Globals.stats_workers at a time, in chunks of Globals.stats_chunk_size bytes) and extracted
+        in Globals.log_dir/<node>.
 
-        :return:
+        A failed download is retried up to Globals.stats_retries times, resuming from the bytes already received. With
+        resume, Globals.log_dir is not cleaned: the nodes already collected are skipped and the interrupted downloads
+        are resumed.
 
+        :param resume: If True, resume a previous collection instead of starting a new one
+        :return: True if the statistics of all the nodes have been collected, False otherwise
         """
-        if os.path.isdir(Globals.log_dir):
+
+        if not resume and os.path.isdir(Globals.log_dir):
             shutil.rmtree(Globals.log_dir)
 
         os.makedirs(Globals.log_dir, exist_ok=True)
 
+        progress = {"collected": 0, "skipped": 0, "failed": 0, "compressed": 0, "extracted": 0}
+        lock = threading.Lock()
+        start = time.time()
+
+        remote_files = " ".join(os.path.relpath(path, "/") for path in [nfd_log, Globals.remote_log_dir] if path)
+        compress = "tar -czf {0}.tmp --ignore-failed-read -C / {1} 2>/dev/null; " \
+                   "[ $? -le 1 ] && mv {0}.tmp {0}".format(stats_archive, remote_files)
+
+        # With resume, the archive of an interrupted download is not created again
+        if resume:
+            compress = "[ -f {0} ] || {{ {1}; }}".format(stats_archive, compress)
+        else:
+            compress = "rm -f {0}; {1}".format(stats_archive, compress)
+
         def gather(n, results):
 
-            directory = Globals.log_dir + "/" + str(n)
-            os.makedirs(directory, exist_ok=True)
+            directory = os.path.join(Globals.log_dir, str(n))
+            marker = os.path.join(directory, stats_marker)
+            archive = os.path.join(Globals.log_dir, "{0}.tar.gz.part".format(n))
+
+            if resume and os.path.exists(marker):
+                self.logger.info("[{0}] Statistics already collected".format(n))
+                with lock:
+                    progress["skipped"] += 1
+                results[n] = True
+                return
 
             try:
-                n.pull_file(nfd_log, directory + "/" + os.path.basename(os.path.normpath(nfd_log)))
-            #                for f in self.stat_files[n]:
-            #                    if n.pull_file(f, directory + "/" + os.path.basename(os.path.normpath(f))):
-            #                        self.logger.info("[{0}] File nfd.log retrieved".format(n))
-            #                    else:
-            #                        self.logger.error("[{1}]: File {0} not found in".format(nfd_log, n))
-            #                        print(make_colored("red", "[{1}]: File {0} not found in".format(nfd_log, n)))
-            except Exception as error:
+                if not n.run_command(["/bin/bash", "-c", compress]):
+                    raise RuntimeError("error compressing the statistic files")
+
+                for attempt in range(max(int(Globals.stats_retries), 1)):
+                    offset = os.path.getsize(archive) if os.path.exists(archive) else 0
+                    if n.pull_file(stats_archive, archive, int(Globals.stats_chunk_size), offset):
+                        break
+                    self.logger.warning("[{0}] Download of the statistics interrupted "
+                                        "(attempt {1})".format(n, attempt + 1))
+                else:
+                    raise RuntimeError("error downloading the statistic files")
+
+                extracted = extract_stats(archive, directory)
+                compressed = os.path.getsize(archive)
+
+                open(marker, "w").close()
+                os.remove(archive)
+
+                self.logger.info("[{0}] Statistic files retrieved ({1} bytes, {2} compressed)".format(n,
+                                                                                                     extracted,
+                                                                                                     compressed))
+                with lock:
+                    progress["collected"] += 1
+                    progress["compressed"] += compressed
+                    progress["extracted"] += extracted
+                results[n] = True
+            except (RuntimeError, OSError, tarfile.TarError) as error:
                 self.logger.error("[{0}] Error gathering statistic files. "
                                   "Error: {1}".format(n,
                                                       error))
+                print(make_colored("red", "[{0}] Error gathering statistic files".format(n)))
+                with lock:
+                    progress["failed"] += 1
                 results[n] = False
 
-        return start_thread_pool(self.node_list.values(), gather)
+        ret = start_thread_pool(self.node_list.values(), gather, max_workers=int(Globals.stats_workers) or None)
+
+        elapsed = time.time() - start
+        collected = progress["collected"] + progress["skipped"]
+        compressed = progress["compressed"] / 2 ** 20
+
+        summary = "Statistics collected from {0}/{1} nodes ({2} already collected, {3} failed): {4:.1f} MB " \
+                  "({5:.1f} MB compressed) in {6:.1f}s, {7:.1f} MB/s".format(collected,
+                                                                           len(self.node_list),
+                                                                           progress["skipped"],
+                                                                           progress["failed"],
+                                                                           progress["extracted"] / 2 ** 20,
+                                                                           compressed,
+                                                                           elapsed,
+                                                                           compressed / max(elapsed, 1e-6))
+
+        self.logger.info(summary)
+        print(make_colored("green" if ret else "red", summary))
+
+        return ret
 
         # stest_path = Globals.test_folder.split("/")
         # test = stest_path[-1]
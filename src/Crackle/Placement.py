@@ -0,0 +1,510 @@
+"""
+This module decides on which server of the cluster each container of the experiment is spawned.
+
+The nodes connected by a link placed on different servers communicate through the GRE tunnels between the
+OpenVirtualSwitches of the servers (see :meth:`Crackle.ClusterManager.ClusterManager.configure_lxd_br_tunnel`), so the
+placement tries to keep on the same server the nodes exchanging most of the traffic. The topology is seen as a graph
+where:
+
+    - Each node weights 1 (one container)
+    - Each link weights its capacity plus the traffic expected on it, estimated by sending the requests of each client \
+    toward the closest repository serving its name
+
+The graph is partitioned in as many parts as the servers with a multilevel scheme (the same used by METIS):
+
+    1. **Coarsening**: the nodes connected by the heaviest links are merged together, until the graph is small
+    2. **Initial partition**: the coarse graph is partitioned by growing the parts from the heaviest links
+    3. **Refinement**: the coarse graph is expanded back, level by level, and at each level the nodes on the border \
+    of the parts are moved to the part where they have the heaviest links (Kernighan-Lin/Fiduccia-Mattheyses moves)
+
+The size of each part is proportional to the capacity of the corresponding server (the maximum number of containers it
+can host) and it cannot exceed it. If the capacity of the servers is not known, the containers are evenly distributed.
+"""
+
+import logging
+import random
+from collections import defaultdict, deque
+
+import Crackle.Globals as Globals
+
+module_logger = logging.getLogger(__name__)
+
+# Capacity given to the wireless links, which do not have one. It is the same used for computing the routes.
+__wireless_capacity__ = 1000
+
+# The coarsening stops when the graph has less than this number of nodes for each part
+__coarsening_threshold__ = 20
+
+# Maximum number of refinement passes at each level
+__refinement_passes__ = 8
+
+
+class Placement:
+    """
+    The result of the placement of the nodes on the servers.
+
+    :ivar assignment: The map node_id => server
+    :ivar load: The map server => number of containers assigned
+    :ivar cut_links: The number of links between nodes placed on different servers
+    :ivar cut_capacity: The sum of the capacities of the cut links, in Mbps. It is the maximum bandwidth that can \
+    cross the GRE tunnels
+    :ivar cut_traffic: The traffic expected on the cut links, in Mbps
+    :ivar total_traffic: The traffic expected on all the links, in Mbps
+    """
+
+    def __init__(self, assignment, load, cut_links, cut_capacity, cut_traffic, total_traffic):
+        self.assignment = assignment
+        self.load = load
+        self.cut_links = cut_links
+        self.cut_capacity = cut_capacity
+        self.cut_traffic = cut_traffic
+        self.total_traffic = total_traffic
+
+    def __str__(self):
+        string = "Containers per server: {0}. " \
+                 "Cross-server links: {1}, capacity: {2:.2f} Mbps, " \
+                 "expected traffic: {3:.4f} Mbps out of {4:.4f} Mbps".format(", ".join("{0}={1}".format(server, load)
+                                                                                        for server, load
+                                                                                        in self.load.items()),
+                                                                              self.cut_links,
+                                                                              self.cut_capacity,
+                                                                              self.cut_traffic,
+                                                                              self.total_traffic)
+        return string
+
+
+def arrival_rate(arrival):
+    """
+    Get the request rate of a client from its arrival process (e.g. Poisson_2 => 2 requests per second).
+
+    :param arrival: The arrival process, as written in the workload.conf file
+    :return: The number of requests per second
+    """
+
+    try:
+        return float(str(arrival).split("_")[-1])
+    except ValueError:
+        return 1.0
+
+
+def serves(repo, client):
+    """
+    Check if a repository serves the name requested by a client.
+
+    :param repo: The :class:`Crackle.TopologyStructs.Repo`
+    :param client: The :class:`Crackle.TopologyStructs.Client`
+    :return: True if the name of the client starts with the name of the repository
+    """
+
+    prefix = [c for c in str(repo.get_folder()).split("/") if c]
+    name = [c for c in str(client.get_name()).split("/") if c]
+
+    return name[:len(prefix)] == prefix
+
+
+def topology_edges(node_list):
+    """
+    Get the undirected edges of the topology with their capacity.
+
+    :param node_list: The dictionary node_id => :class:`Crackle.TopologyStructs.Router`
+    :return: The map (node_id, node_id) => capacity, with the node ids of each edge sorted
+    """
+
+    edges = {}
+
+    for node in node_list.values():
+        for link in node.get_links().values():
+            neighbor = link.get_node_to().get_node_id()
+
+            if neighbor not in node_list or neighbor == node.get_node_id():
+                continue
+
+            capacity = getattr(link, "capacity", None) or __wireless_capacity__
+            edge = tuple(sorted((node.get_node_id(), neighbor)))
+            edges[edge] = max(edges.get(edge, 0), float(capacity))
+
+    return edges
+
+
+def expected_traffic(node_list, edges):
+    """
+    Estimate the traffic on each edge. The requests of each client follow the shortest path toward the closest node
+    with a repository serving the name of the client, and the data come back on the same path.
+
+    :param node_list: The dictionary node_id => :class:`Crackle.TopologyStructs.Router`
+    :param edges: The edges returned by :func:`topology_edges`
+    :return: The map edge => expected traffic, in Mbps
+    """
+
+    adjacency = defaultdict(list)
+
+    for a, b in edges:
+        adjacency[a].append(b)
+        adjacency[b].append(a)
+
+    chunk_size = float(Globals.chunk_size or 1024)
+
+    # Group the clients by the set of nodes serving them, so that each group needs one BFS.
+    groups = defaultdict(list)
+
+    for node in node_list.values():
+        for client in node.get_client_apps():
+            producers = frozenset(n.get_node_id() for n in node_list.values()
+                                  for repo in n.get_repositories() if serves(repo, client))
+            if producers:
+                groups[producers].append((node.get_node_id(), arrival_rate(client.get_arrival())))
+
+    traffic = defaultdict(float)
+
+    for producers, consumers in groups.items():
+        parent = {p: None for p in producers}
+        queue = deque(producers)
+
+        while queue:
+            n = queue.popleft()
+            for neighbor in adjacency[n]:
+                if neighbor not in parent:
+                    parent[neighbor] = n
+                    queue.append(neighbor)
+
+        for consumer, rate in consumers:
+            mbps = rate * chunk_size * 8 / 1000000
+            n = consumer
+
+            while n in parent and parent[n] is not None:
+                traffic[tuple(sorted((n, parent[n])))] += mbps
+                n = parent[n]
+
+    return traffic
+
+
+def edge_weights(edges, traffic):
+    """
+    Combine capacity and expected traffic in the weight of each edge. Both are normalized with respect to their
+    maximum, and the traffic is multiplied by Globals.placement_traffic_weight.
+
+    :param edges: The edges returned by :func:`topology_edges`
+    :param traffic: The traffic returned by :func:`expected_traffic`
+    :return: The map edge => weight
+    """
+
+    max_capacity = max(edges.values(), default=0) or 1.0
+    max_traffic = max(traffic.values(), default=0) or 1.0
+    traffic_weight = float(Globals.placement_traffic_weight)
+
+    return {edge: capacity / max_capacity + traffic_weight * traffic.get(edge, 0) / max_traffic
+            for edge, capacity in edges.items()}
+
+
+def coarsen(weights, adjacency, max_weight, rng):
+    """
+    Merge the nodes connected by the heaviest edges (heavy edge matching).
+
+    :param weights: The weight of each node
+    :param adjacency: For each node, the map neighbor => edge weight
+    :param max_weight: The maximum weight of a merged node
+    :param rng: The random generator used for visiting the nodes
+    :return: The tuple (mapping node => coarse node, coarse weights, coarse adjacency)
+    """
+
+    order = list(range(len(weights)))
+    rng.shuffle(order)
+
+    mapping = [-1] * len(weights)
+    coarse_weights = []
+
+    for v in order:
+        if mapping[v] >= 0:
+            continue
+
+        best, best_weight = -1, 0
+        for u, w in adjacency[v].items():
+            if mapping[u] < 0 and u != v and w > best_weight and weights[u] + weights[v] <= max_weight:
+                best, best_weight = u, w
+
+        mapping[v] = len(coarse_weights)
+        if best >= 0:
+            mapping[best] = mapping[v]
+            coarse_weights.append(weights[v] + weights[best])
+        else:
+            coarse_weights.append(weights[v])
+
+    coarse_adjacency = [defaultdict(float) for _ in coarse_weights]
+
+    for v, neighbors in enumerate(adjacency):
+        for u, w in neighbors.items():
+            if mapping[u] != mapping[v]:
+                coarse_adjacency[mapping[v]][mapping[u]] += w
+
+    return mapping, coarse_weights, coarse_adjacency
+
+
+def initial_partition(weights, adjacency, targets):
+    """
+    Partition the coarse graph by growing the parts. The nodes are visited in BFS order, starting from the heaviest
+    ones, and each node is assigned to the part where it has the heaviest edges among the parts below their target.
+
+    :param weights: The weight of each node
+    :param adjacency: For each node, the map neighbor => edge weight
+    :param targets: The target weight of each part
+    :return: The part of each node
+    """
+
+    parts = [-1] * len(weights)
+    load = [0.0] * len(targets)
+
+    visited = [False] * len(weights)
+    order = []
+
+    for root in sorted(range(len(weights)), key=lambda v: -weights[v]):
+        if visited[root]:
+            continue
+        visited[root] = True
+        queue = deque([root])
+        while queue:
+            v = queue.popleft()
+            order.append(v)
+            for u in sorted(adjacency[v], key=lambda n: -adjacency[v][n]):
+                if not visited[u]:
+                    visited[u] = True
+                    queue.append(u)
+
+    for v in order:
+        connection = defaultdict(float)
+        for u, w in adjacency[v].items():
+            if parts[u] >= 0:
+                connection[parts[u]] += w
+
+        candidates = [p for p in range(len(targets)) if load[p] + weights[v] <= targets[p]]
+
+        if candidates:
+            part = max(candidates, key=lambda p: (connection[p], targets[p] - load[p]))
+        else:
+            part = min(range(len(targets)), key=lambda p: (load[p] + weights[v]) / targets[p])
+
+        parts[v] = part
+        load[part] += weights[v]
+
+    return parts
+
+
+def refine(weights, adjacency, parts, targets, limits):
+    """
+    Improve the partition by moving the nodes on the border of the parts to the part where they have the heaviest
+    edges, as long as the part does not exceed its limit. Nodes in parts above their limit are moved even if the cut
+    grows, until the parts are back within their limits.
+
+    :param weights: The weight of each node
+    :param adjacency: For each node, the map neighbor => edge weight
+    :param parts: The part of each node. It is modified in place
+    :param targets: The target weight of each part
+    :param limits: The maximum weight of each part
+    :return: The part of each node
+    """
+
+    load = [0.0] * len(targets)
+    for v, p in enumerate(parts):
+        load[p] += weights[v]
+
+    for _ in range(__refinement_passes__):
+        moved = False
+
+        for v in range(len(weights)):
+            p = parts[v]
+            overloaded = load[p] > limits[p]
+
+            connection = defaultdict(float)
+            for u, w in adjacency[v].items():
+                connection[parts[u]] += w
+
+            if not overloaded and all(q == p for q in connection):
+                continue
+
+            # A move must reduce the cut, or keep it and improve the balance, unless the part is overloaded
+            best, best_key = p, None
+            for q in range(len(targets)):
+                if q == p or load[q] + weights[v] > limits[q]:
+                    continue
+
+                gain = connection[q] - connection[p]
+                balance = (load[q] + weights[v]) / targets[q]
+
+                if not overloaded and (gain < 0 or (gain == 0 and balance >= load[p] / targets[p])):
+                    continue
+
+                if best_key is None or (gain, -balance) > best_key:
+                    best, best_key = q, (gain, -balance)
+
+            if best != p:
+                parts[v] = best
+                load[p] -= weights[v]
+                load[best] += weights[v]
+                moved = True
+
+        if not moved:
+            break
+
+    return parts
+
+
+def partition(weights, adjacency, capacities, imbalance, seed=0):
+    """
+    Partition a graph with the multilevel scheme.
+
+    :param weights: The weight of each node
+    :param adjacency: For each node, the map neighbor => edge weight
+    :param capacities: The capacity of each part. None means unlimited
+    :param imbalance: The fraction by which a part can exceed its target
+    :param seed: The seed of the random generator used for the coarsening
+    :return: The part of each node
+    :raise: RuntimeError if the nodes do not fit in the capacities
+    """
+
+    if not weights:
+        return []
+
+    total = float(sum(weights))
+
+    known = [c for c in capacities if c is not None]
+    if len(known) == len(capacities) and sum(known) < total:
+        raise RuntimeError("The servers can host {0} containers, {1} requested.".format(int(sum(known)), int(total)))
+
+    # The target of each part is proportional to its capacity (the parts with unknown capacity get the largest
+    # share), but it cannot exceed the capacity: the excess is shared among the other parts.
+    shares = [c if c is not None else (max(known) if known else 1.0) for c in capacities]
+    targets = [0.0] * len(capacities)
+    remaining = total
+    active = [p for p in range(len(capacities)) if shares[p] > 0]
+
+    while active:
+        share_sum = float(sum(shares[p] for p in active))
+        full = [p for p in active if capacities[p] is not None and remaining * shares[p] / share_sum > capacities[p]]
+
+        if not full:
+            for p in active:
+                targets[p] = remaining * shares[p] / share_sum
+            break
+
+        for p in full:
+            targets[p] = float(capacities[p])
+            remaining -= capacities[p]
+            active.remove(p)
+
+    # The parts that cannot host any node are left out
+    used = [p for p in range(len(targets)) if targets[p] > 0]
+
+    limits = [min(targets[p] * (1 + imbalance), capacities[p]) if capacities[p] is not None
+              else targets[p] * (1 + imbalance) for p in used]
+    targets = [targets[p] for p in used]
+
+    if not targets:
+        raise RuntimeError("No server can host containers: the capacity of all the servers is 0.")
+
+    if len(targets) == 1:
+        return [used[0]] * len(weights)
+
+    rng = random.Random(seed)
+    levels = []
+
+    while len(weights) > __coarsening_threshold__ * len(targets):
+        mapping, coarse_weights, coarse_adjacency = coarsen(weights, adjacency, min(targets) / 2, rng)
+
+        if len(coarse_weights) > 0.95 * len(weights):
+            break
+
+        levels.append((mapping, weights, adjacency))
+        weights, adjacency = coarse_weights, coarse_adjacency
+
+    parts = refine(weights, adjacency, initial_partition(weights, adjacency, targets), targets, limits)
+
+    for mapping, weights, adjacency in reversed(levels):
+        parts = refine(weights, adjacency, [parts[mapping[v]] for v in range(len(weights))], targets, limits)
+
+    return [used[p] for p in parts]
+
+
+def place(node_list, server_list):
+    """
+    Assign the nodes to the servers, minimizing the traffic between the servers.
+
+    :param node_list: The dictionary node_id => :class:`Crackle.TopologyStructs.Router`
+    :param server_list: The list of :class:`Crackle.ClusterManager.Server`
+    :return: The :class:`Placement`
+    :raise: RuntimeError if the nodes do not fit in the servers
+    """
+
+    node_ids = sorted(node_list.keys())
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    edges = topology_edges(node_list)
+    traffic = expected_traffic(node_list, edges)
+    weights = edge_weights(edges, traffic)
+
+    adjacency = [defaultdict(float) for _ in node_ids]
+    for (a, b), w in weights.items():
+        adjacency[index[a]][index[b]] += w
+        adjacency[index[b]][index[a]] += w
+
+    parts = partition([1] * len(node_ids),
+                      adjacency,
+                      [server.get_capacity() for server in server_list],
+                      float(Globals.placement_imbalance))
+
+    assignment = {node_id: server_list[parts[i]] for i, node_id in enumerate(node_ids)}
+
+    load = {server: 0 for server in server_list}
+    for server in assignment.values():
+        load[server] += 1
+
+    cut = [edge for edge in edges if assignment[edge[0]] is not assignment[edge[1]]]
+
+    placement = Placement(assignment,
+                          load,
+                          len(cut),
+                          sum(edges[edge] for edge in cut),
+                          sum(traffic.get(edge, 0) for edge in cut),
+                          sum(traffic.values()))
+
+    module_logger.info("Placement of {0} nodes on {1} servers. {2}".format(len(node_ids),
+                                                                            len(server_list),
+                                                                            placement))
+
+    return placement
+
+
+def select_server(node_list, server_list, node):
+    """
+    Select the server for a node added to a running experiment: the server hosting most of its neighbors, among the
+    servers that can host one more container, or the least loaded one if the node has no neighbors. As in
+    :func:`partition`, a server with capacity None has no limit, and a server with capacity 0 is full.
+
+    :param node_list: The dictionary node_id => :class:`Crackle.TopologyStructs.Router`
+    :param server_list: The list of :class:`Crackle.ClusterManager.Server`
+    :param node: The node to place
+    :return: The selected server
+    :raise: RuntimeError if no server can host the node
+    """
+
+    load = {server: 0 for server in server_list}
+    for n in node_list.values():
+        if n is not node and n.get_server() in load:
+            load[n.get_server()] += 1
+
+    capacities = {server: server.get_capacity() for server in server_list}
+
+    def relative_load(server):
+        capacity = capacities[server]
+        return load[server] if capacity is None else load[server] / capacity
+
+    available = [s for s in server_list if capacities[s] is None or load[s] < capacities[s]]
+
+    if not available:
+        raise RuntimeError("No server can host the node {0}: all the servers are full".format(node))
+
+    neighbors = defaultdict(int)
+    for link in node.get_links().values():
+        server = link.get_node_to().get_server()
+        if server in available:
+            neighbors[server] += 1
+
+    return min(available, key=lambda s: (-neighbors[s], relative_load(s)))
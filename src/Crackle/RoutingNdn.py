@@ -98,7 +98,7 @@ class RoutingNdn:
 
         #  Init Routing
         for i in self.node_list.values():
-            i.routes = {}
+            i.reset_routes()
 
         # TreeOnConsumer Algorithm
 
@@ -0,0 +1,436 @@
+"""
+This module compiles the scripts executed inside the containers:
+
+    - **<node>_create.sh**: create the MACVLAN interfaces and the traffic shapers of the node
+    - **<node>_remove.sh**: remove the MACVLAN interfaces of the node
+    - **<node>_setndnrouting.sh**: create the NDN faces and fill the routing table of the node
+
+and the commands that change the cache size and the forwarding strategy of a running node
+(:func:`render_reconfigure_script`).
+
+The scripts of all the nodes are rendered in a single pass over the topology into memory, as a dictionary
+file name => content, without starting a thread for each node. They can then be written in Globals.scripts_dir as one
+batch (:func:`write_scripts`), or pushed to the containers directly from memory (:func:`push_script`) when
+Globals.write_scripts is 0.
+
+The time needed to compile the scripts of a large topology can be measured with::
+
+    python3 -m Crackle.ScriptCompiler 10000
+"""
+
+import io
+import logging
+import os
+import stat
+import sys
+import tempfile
+import time
+
+import Crackle.Globals as Globals
+from Crackle import TopologyStructs
+from Crackle.Constants import layer_2_protocols
+
+module_logger = logging.getLogger(__name__)
+
+## Link scripts
+
+create_suffix = "_create.sh"
+remove_suffix = "_remove.sh"
+
+net_card_name = "$(ifconfig | grep eth0 | cut -d \" \" -f 1)"
+
+macvlan_template = "ip link add name {0} link " + net_card_name + " type macvlan && ip link set dev {0} address {3} && " \
+                                                                  "ip link set {0} up && ip addr add {1}/32 brd + dev {0} && ip route add {2} dev {0}\n"
+
+delete_macvlan_template = "ip link delete {0}\n"
+
+# with HTB:
+
+shaping_template = "tc qdisc del dev {0} root; tc qdisc add dev {0} root handle 1: " \
+                   "tbf rate {1} burst {2}kb latency 70ms && tc qdisc add dev {0} parent 1:1 codel\n"
+
+## Routing scripts
+
+routing_reset_suffix = "_resetndnrouting.sh"
+routing_suffix = "_setndnrouting.sh"
+route_register_template = "nfdc register ndn:/{0} {1}://{2}:6363\n"
+ethernet_route_register_template = "nfdc register ndn:/{0} {1}://[{2}]/{3}\n"
+face_create_template = "nfdc create {} {}://{}:6363\n"
+ethernet_face_create_template = "nfdc create {} {}://[{}]/{}\n"
+
+route_unregister_template = "nfdc unregister ndn:/{0} {1}://{2}:6363\n"
+ethernet_route_unregister_template = "nfdc unregister ndn:/{0} {1}://[{2}]\n"
+face_destroy_template = "nfdc destroy {0}://{1}:6363\n"
+ethernet_face_destroy_template = "nfdc destroy {0}://[{1}]\n"
+
+route_script = """
+#!/bin/bash
+
+create_faces() {{
+    :
+    {}
+}}
+
+destroy_faces() {{
+    :
+    {}
+}}
+
+reset_routing() {{
+    :
+    {}
+}}
+
+set_routing() {{
+    :
+    {}
+}}
+
+case $1 in
+    create_faces)
+    create_faces
+    ;;
+    destroy_faces)
+    destroy_faces
+    ;;
+    reset_routing)
+    reset_routing
+    ;;
+    set_routing)
+    set_routing
+    ;;
+    set)
+    create_faces
+    set_routing
+    ;;
+    reset)
+    destroy_faces
+    reset_routing
+    ;;
+    *)
+    exit 1
+    ;;
+esac
+
+exit 0
+
+"""
+
+## Router reconfiguration
+
+__nfd_conf_file__ = "/etc/ndn/nfd.conf"
+
+cs_persist_template = "sed -i 's/^.*cs_max_packets .*$/  cs_max_packets {0}/' " + __nfd_conf_file__
+strategy_persist_template = "sed -i '0,/\\/ / s#/localhost/nfd/strategy/[^ ]*#/localhost/nfd/strategy/{0}#' " + \
+                            __nfd_conf_file__
+
+cs_capacity_template = "nfdc cs config capacity {0}"
+# Legacy nfdc syntax (as the routing scripts) first, then the current one
+strategy_set_template = "{{ nfdc set-strategy / ndn:/localhost/nfd/strategy/{0} || " \
+                        "nfdc strategy set / /localhost/nfd/strategy/{0}; }}"
+
+# Permissions of the scripts (rwx for the owner)
+__script_mode__ = stat.S_IXUSR | stat.S_IRUSR | stat.S_IWUSR | stat.S_IRWXU
+
+# Directory of the scripts inside the containers
+__remote_scripts_dir__ = "/root/"
+
+
+def script_name(node, suffix):
+    """
+    Get the name of a script of a node.
+
+    :param node: The node
+    :param suffix: The suffix of the script (create_suffix, remove_suffix, routing_suffix)
+    :return: The name of the file
+    """
+
+    return "{0}{1}".format(node, suffix)
+
+
+def remote_script_path(node, suffix):
+    """
+    Get the path of a script of a node inside its container.
+
+    :param node: The node
+    :param suffix: The suffix of the script (create_suffix, remove_suffix, routing_suffix)
+    :return: The path of the script inside the container
+    """
+
+    return __remote_scripts_dir__ + script_name(node, suffix)
+
+
+def render_create_script(node):
+    """
+    Render the script that creates the MACVLAN interfaces and the traffic shapers of a node.
+
+    :param node: The node
+    :return: The content of the script
+    """
+
+    parts = ["#!/bin/bash\n\n"
+             "sysctl -w net.ipv4.ip_forward=1\n"]
+
+    for link in node.get_links().values():
+        node_to = link.get_node_to()
+
+        parts.append(macvlan_template.format(node_to,
+                                             node.get_ip_address(node_to),
+                                             node_to.get_ip_address(node),
+                                             node.get_mac_address(node_to)))
+
+        if link.is_shaped():
+            parts.append(shaping_template.format(node_to,
+                                                 str(link.get_capacity()) + "Mbit",
+                                                 link.get_burst()))
+        parts.append("\n")
+
+    parts.append("exit 0\n")
+
+    return "".join(parts)
+
+
+def render_remove_script(node):
+    """
+    Render the script that removes the MACVLAN interfaces of a node.
+
+    :param node: The node
+    :return: The content of the script, or None if the node has no links
+    """
+
+    links = node.get_links()
+
+    if not links:
+        return None
+
+    return "#!/bin/bash\n\n" + "".join(delete_macvlan_template.format(link.get_node_to()) for link in links.values())
+
+
+def render_routing_script(node):
+    """
+    Render the routing script of a node, that creates its faces and fills its routing table.
+
+    :param node: The node
+    :return: The content of the script
+    :raise: RuntimeError if the layer 2 protocol is not recognized
+    """
+
+    protocol = Globals.layer2_prot
+
+    if protocol not in layer_2_protocols:
+        module_logger.error("[{0}] Layer 2 protocol {1} not recognized!".format(node, protocol))
+        raise RuntimeError
+
+    ethernet = protocol == layer_2_protocols[4]
+    wldr = "-W" if Globals.wldr_face else ""
+
+    create_faces, destroy_faces, registers, unregisters = [], [], [], []
+
+    for link in node.get_links().values():
+        node_to = link.get_node_to()
+
+        if not ethernet:
+            address = node_to.get_ip_address(node)
+            create_faces.append(face_create_template.format(wldr, protocol, address))
+            destroy_faces.append(face_destroy_template.format(protocol, address))
+        else:
+            address = node_to.get_mac_address(node)
+            station = type(node_to) is TopologyStructs.Station
+            interface = node_to if not station or type(node) is TopologyStructs.Router else "wlan0"
+            create_faces.append(ethernet_face_create_template.format(wldr, protocol, address, interface))
+            destroy_faces.append(ethernet_face_destroy_template.format(protocol, address))
+
+    for route in node.iter_routes():
+        next_hop = route.get_next_hop()
+        prefix = route.get_icn_name()
+
+        if not ethernet:
+            address = next_hop.get_ip_address(node)
+            unregisters.append(route_unregister_template.format(prefix, protocol, address))
+            registers.append(route_register_template.format(prefix, protocol, address))
+        else:
+            address = next_hop.get_mac_address(node)
+            interface = next_hop if type(next_hop) is not TopologyStructs.Station else "wlan0"
+            unregisters.append(ethernet_route_unregister_template.format(prefix, protocol, address))
+            registers.append(ethernet_route_register_template.format(prefix, protocol, address, interface))
+
+    return route_script.format("\n".join(create_faces),
+                               "\n".join(destroy_faces),
+                               "\n".join(unregisters),
+                               "\n".join(registers))
+
+
+def render_reconfigure_script(node, cache_size=None, strategy=None):
+    """
+    Render the commands that change the cache size and/or the forwarding strategy of a node, to be executed in one
+    shell inside its container. The new values are written in nfd.conf, so they survive a restart, and, if NFD is
+    running, applied through the NFD management (nfdc) without restarting it. Only if NFD does not accept a command
+    (e.g. a version without runtime CS configuration), NFD is restarted and the routing script of the node is executed
+    again to create its faces and routes.
+
+    :param node: The node
+    :param cache_size: The new cache size, in packets (None to keep the current one)
+    :param strategy: The new forwarding strategy of the / prefix (None to keep the current one)
+    :return: The script, or None if there is nothing to change
+    """
+
+    persist, runtime = [], []
+
+    if cache_size is not None:
+        persist.append(cs_persist_template.format(int(cache_size)))
+        runtime.append(cs_capacity_template.format(int(cache_size)))
+
+    if strategy is not None:
+        persist.append(strategy_persist_template.format(strategy))
+        runtime.append(strategy_set_template.format(strategy))
+
+    if not persist:
+        return None
+
+    fallback = "service nfd restart && {{ [ ! -x {0} ] || {0} set; }}".format(remote_script_path(node, routing_suffix))
+
+    return "{0} && if pgrep -x nfd > /dev/null; then {{ {1}; }} || {{ {2}; }}; fi".format(" && ".join(persist),
+                                                                                        " && ".join(runtime),
+                                                                                        fallback)
+
+
+def compile_scripts(nodes, links=True, routing=True):
+    """
+    Render the scripts of the nodes in a single pass.
+
+    :param nodes: The nodes
+    :param links: If True, the scripts creating and removing the links are rendered
+    :param routing: If True, the routing scripts are rendered
+    :return: The dictionary file name => content of the script
+    :raise: RuntimeError if a script cannot be rendered
+    """
+
+    scripts = {}
+
+    for node in nodes:
+        if links:
+            scripts[script_name(node, create_suffix)] = render_create_script(node)
+            remove_script = render_remove_script(node)
+            if remove_script is not None:
+                scripts[script_name(node, remove_suffix)] = remove_script
+
+        if routing:
+            scripts[script_name(node, routing_suffix)] = render_routing_script(node)
+
+    return scripts
+
+
+def write_scripts(scripts, directory=None):
+    """
+    Write a batch of compiled scripts, with the execution permission.
+
+    :param scripts: The dictionary file name => content returned by :func:`compile_scripts`
+    :param directory: The destination directory (by default Globals.scripts_dir)
+    :return: The number of bytes written
+    """
+
+    directory = directory or Globals.scripts_dir
+    os.makedirs(directory, exist_ok=True)
+
+    written = 0
+
+    for name, content in scripts.items():
+        fd = os.open(os.path.join(directory, name), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, __script_mode__)
+        os.fchmod(fd, __script_mode__)
+        with io.open(fd, "w") as f:
+            written += f.write(content)
+
+    return written
+
+
+def push_script(node, suffix, scripts=None):
+    """
+    Push a script inside the container of a node: from memory if it has been compiled in scripts, otherwise from
+    the file in Globals.scripts_dir. Nothing is transferred if the script has not changed since the last push
+    (see :mod:`Crackle.Manifest`).
+
+    :param node: The node
+    :param suffix: The suffix of the script (create_suffix, remove_suffix, routing_suffix)
+    :param scripts: The dictionary file name => content returned by :func:`compile_scripts`
+    :return: True if the push succeed, False otherwise
+    """
+
+    name = script_name(node, suffix)
+
+    if scripts is not None and name in scripts:
+        return node.push_file(None, remote_script_path(node, suffix), data=scripts[name].encode())
+
+    return node.push_file(os.path.join(Globals.scripts_dir, name), remote_script_path(node, suffix))
+
+
+def synthetic_topology(n_nodes, degree):
+    """
+    Write a topo.brite describing a circulant topology: node i is linked to the nodes i + 1 ... i + degree / 2.
+
+    :param n_nodes: The number of nodes
+    :param degree: The degree of each node
+    :return: The topo.brite, as a file-like object
+    """
+
+    lines = ["Topology:", "", "Nodes: ({0})".format(n_nodes)]
+    lines.extend("n{0} 1 100 0 l best-route AS_NODE".format(i) for i in range(n_nodes))
+
+    edges = [(i, (i + k) % n_nodes) for k in range(1, max(degree // 2, 1) + 1) for i in range(n_nodes)]
+
+    lines.extend(["", "Edges: ({0})".format(len(edges))])
+    lines.extend("{0} n{1} n{2} 1 1 100.0 2 0 E_AS U".format(e, i, j) for e, (i, j) in enumerate(edges))
+    lines.append("")
+
+    return io.StringIO("\n".join(lines))
+
+
+def benchmark(n_nodes=10000, degree=4, n_prefixes=10):
+    """
+    Measure the time needed to compile and write the scripts of a synthetic topology.
+
+    :param n_nodes: The number of nodes
+    :param degree: The degree of each node
+    :param n_prefixes: The number of routes of each node
+    :return: The dictionary with the time (in seconds) of each step and the size of the scripts
+    """
+
+    from Crackle import LxcUtils
+    from Crackle.ConfigReader import ConfigReader
+
+    Globals.experiment_id = Globals.experiment_id or "b"
+    Globals.layer2_prot = Globals.layer2_prot or layer_2_protocols[4]
+    LxcUtils.AddressGenerator.setup(Globals.experiment_id)
+
+    result = {}
+
+    start = time.time()
+    reader = ConfigReader()
+    reader.parse_topology(synthetic_topology(n_nodes, degree))
+    nodes = list(reader.node_list.values())
+
+    for node in nodes:
+        neighbors = [link.get_node_to() for link in node.get_links().values()]
+        for p in range(n_prefixes):
+            node.add_route(neighbors[p % len(neighbors)], "prefix{0}".format(p))
+    result["topology"] = time.time() - start
+
+    start = time.time()
+    scripts = compile_scripts(nodes)
+    result["compile"] = time.time() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.time()
+        result["bytes"] = write_scripts(scripts, directory + "/")
+        result["write"] = time.time() - start
+
+    result["scripts"] = len(scripts)
+
+    return result
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    times = benchmark(n)
+    print("{0} nodes: topology {1:.2f}s, {2} scripts ({3} bytes) compiled in {4:.2f}s "
+          "and written in {5:.2f}s".format(n, times["topology"], times["scripts"], times["bytes"],
+                                          times["compile"], times["write"]))
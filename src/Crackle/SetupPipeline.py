@@ -0,0 +1,201 @@
+"""
+This module sets up the experiment with a pipeline per node, instead of executing each operation on all the nodes
+before starting the next one. The operations of each node are the tasks of a :class:`Crackle.AsyncManager.TaskGraph`:
+
+    - **spawn**: create the container
+    - **bundle**: push the NFD configuration file and the compiled scripts of a group of Globals.bundle_chunk_size
+      containers of a server in a single archive (see :mod:`Crackle.Bundle`), once these containers exist. The pushes
+      of the single files in the following tasks are then skipped (or executed as a fallback if the bundle fails).
+      A node only waits for the bundle of its own group, so a slow container does not hold back the whole server
+    - **start**: start the container
+    - **scripts**: compile the scripts for the MACVLAN interfaces of all the nodes in one pass (locally, it does not
+      need the containers)
+    - **links**: create the links, as soon as the node and all its neighbors are started
+    - **stats**: start *ifstat* and *mpstat*, as soon as the links of the node exist
+    - **nfd**, **repositories**: start NFD and the repositories (only if the containers were already running)
+    - **router**: set cache and forwarding strategy and restart NFD, as soon as the links of the node exist
+    - **routing-scripts**: compile the routing scripts of all the nodes in one pass
+    - **routing-script**: push the routing script of the node
+    - **routing**: create the faces and fill the routing table, as soon as NFD is configured on the node and the links \
+    of the neighbors exist
+
+In this way a node does not wait the slowest node of each phase, and the total setup time approaches the time of the
+slowest chain of dependent operations.
+"""
+
+import os
+
+import logging
+
+import Crackle.Globals as Globals
+import Crackle.Constants as Constants
+from Crackle import Bundle
+from Crackle.ScriptCompiler import create_suffix, remove_suffix, routing_suffix, script_name, remote_script_path
+from Crackle.AsyncManager import TaskGraph, node_task
+from Crackle.Tracing import node_tags
+
+module_logger = logging.getLogger(__name__)
+
+__nfd_conf_file__ = "/etc/ndn/nfd.conf"
+
+
+def neighbors(node, node_list):
+    """
+    Get the neighbors of a node.
+
+    :param node: The node
+    :param node_list: The dictionary node_id => node of the experiment
+    :return: The list of the neighbors of the node
+    """
+
+    return [link.get_node_to() for link in node.get_links().values()
+            if link.get_node_to().get_node_id() in node_list and link.get_node_to() is not node]
+
+
+def bundle_task(server, nodes, net, ndn, nfd_conf=True, name="0"):
+    """
+    Get the task pushing a bundle to a server.
+
+    :param server: The server
+    :param nodes: The nodes of the bundle, placed on the server
+    :param net: The :class:`Crackle.NetworkManager.NetworkManager`
+    :param ndn: The :class:`Crackle.NDNManager.NDNManager`
+    :param nfd_conf: If True, the NFD configuration file is included in the bundle
+    :param name: The name of the bundle, unique among the bundles of the server
+    :return: The function executing the task. It always succeeds: if the bundle cannot be deployed, the files are
+             pushed one by one by the following tasks
+    """
+
+    def push():
+        try:
+            conf = None
+            if nfd_conf:
+                with open(Constants.nfd_conf_file, "rb") as f:
+                    conf = f.read()
+
+            def files(node):
+                if conf is not None:
+                    yield __nfd_conf_file__, conf
+                for scripts, suffix in ((net.scripts, create_suffix), (net.scripts, remove_suffix),
+                                        (ndn.scripts, routing_suffix)):
+                    name = script_name(node, suffix)
+                    if name in scripts:
+                        yield remote_script_path(node, suffix), scripts[name]
+
+            if not Bundle.push_bundle(Bundle.build_bundles(nodes, files, name)[server]):
+                raise RuntimeError("error deploying the bundle")
+        except (IOError, RuntimeError) as e:
+            module_logger.warning("[{0}] Bundle not pushed ({1}): the files are pushed one by one".format(server, e))
+        return True
+
+    return push
+
+
+def build_setup_pipeline(node_list, net, ndn, create_containers=True, start_services=False):
+    """
+    Build the graph of the setup operations.
+
+    :param node_list: The dictionary node_id => node of the experiment
+    :param net: The :class:`Crackle.NetworkManager.NetworkManager`
+    :param ndn: The :class:`Crackle.NDNManager.NDNManager`
+    :param create_containers: If True, the containers are created and started
+    :param start_services: If True, NFD and the repositories are started (when the containers are already running)
+    :return: The :class:`Crackle.AsyncManager.TaskGraph`
+    """
+
+    graph = TaskGraph(max_workers=int(Globals.setup_workers) or None)
+
+    def prepare():
+        os.makedirs(Globals.scripts_dir, exist_ok=True)
+        if create_containers:
+            net.assign_station_vlans()
+        return True
+
+    graph.add_task("prepare", prepare)
+    graph.add_task("scripts", net.create_scripts, ["prepare"])
+    graph.add_task("routing-scripts", ndn.create_routing_scripts, ["prepare"])
+
+    def task(operation, node):
+        return "{0}:{1}".format(operation, node)
+
+    def add(operation, node, function, dependencies):
+        return graph.add_task(task(operation, node), function, dependencies, **node_tags(node))
+
+    nodes = list(node_list.values())
+
+    if create_containers:
+        for node in nodes:
+            add("spawn", node, node_task(net.spawn_node_container, node), ["prepare"])
+
+    bundles = {}
+
+    if Globals.bundle_push:
+        servers = {}
+        for node in nodes:
+            servers.setdefault(node.get_server(), []).append(node)
+
+        for server, server_nodes in servers.items():
+            chunk_size = int(Globals.bundle_chunk_size) or len(server_nodes)
+
+            for start in range(0, len(server_nodes), chunk_size):
+                chunk = server_nodes[start:start + chunk_size]
+                name = str(start // chunk_size)
+                spawned = [task("spawn", n) for n in chunk] if create_containers else []
+                bundle = graph.add_task("bundle:{0}:{1}".format(server, name),
+                                        bundle_task(server, chunk, net, ndn, create_containers, name),
+                                        ["scripts", "routing-scripts"] + spawned, server=str(server))
+                for n in chunk:
+                    bundles[n] = [bundle]
+
+    def bundled(node):
+        return bundles.get(node, [])
+
+    for node in nodes:
+        started = []
+
+        if create_containers:
+            started = [add("start", node, node_task(net.start_node_container, node),
+                           [task("spawn", node)] + bundled(node))]
+
+        add("routing-script", node, node_task(ndn.push_node_routing_script, node),
+            ["routing-scripts"] + started + bundled(node))
+
+    for node in nodes:
+        started = [task("start", n) for n in [node] + neighbors(node, node_list)] if create_containers else []
+
+        links = add("links", node, node_task(net.create_node_links, node), ["scripts"] + started + bundled(node))
+
+        add("stats", node, node_task(net.set_node_stats, node), [links])
+
+        last = links
+
+        if start_services:
+            last = add("nfd", node, node_task(ndn.start_node_nfd, node), [last])
+            last = add("repositories", node, node_task(ndn.start_node_repositories, node), [last])
+
+        add("router", node, node_task(ndn.configure_node_router, node), [last])
+
+    for node in nodes:
+        add("routing", node, node_task(ndn.set_node_routing, node),
+            [task("router", node), task("routing-script", node)] +
+            [task("links", n) for n in neighbors(node, node_list)])
+
+    return graph
+
+
+def run_setup_pipeline(node_list, net, ndn, create_containers=True, start_services=False):
+    """
+    Build and execute the graph of the setup operations.
+
+    :param node_list: The dictionary node_id => node of the experiment
+    :param net: The :class:`Crackle.NetworkManager.NetworkManager`
+    :param ndn: The :class:`Crackle.NDNManager.NDNManager`
+    :param create_containers: If True, the containers are created and started
+    :param start_services: If True, NFD and the repositories are started (when the containers are already running)
+    :return: The executed :class:`Crackle.AsyncManager.TaskGraph`
+    """
+
+    graph = build_setup_pipeline(node_list, net, ndn, create_containers, start_services)
+    graph.run()
+
+    return graph
@@ -0,0 +1,422 @@
+"""
+This module ingests the statistic files collected by :meth:`Crackle.NetworkManager.NetworkManager.get_stats` into a
+columnar store, so that the analyses load typed arrays instead of parsing the raw logs again.
+
+The files of Globals.log_dir are parsed in parallel processes and written as NumPy archives, partitioned by run and
+node::
+
+    <Globals.analysis_dir>/<run>/<node>/link_<neighbor>.npz   ifstat: time, rx, tx (bit/s)
+    <Globals.analysis_dir>/<run>/<node>/cpu.npz               mpstat: time, cpu (-1 for all), one column per field
+    <Globals.analysis_dir>/<run>/<node>/nfd.npz               NFD log: time, level, module, event, face
+
+The string columns of the NFD log (level, module, event) are stored as codes, with the dictionaries of the values
+(level_values, module_values, event_values). The times of ifstat and mpstat, that only print the time of the day, are
+in seconds since the midnight of the start of the run.
+
+The store is queried with :class:`StatsStore`, e.g.::
+
+    store = StatsStore()
+    time, rx, tx = store.link_throughput("r1", "r2")
+"""
+
+import concurrent.futures
+import logging
+import os
+import time
+
+import numpy
+
+import Crackle.Globals as Globals
+
+module_logger = logging.getLogger(__name__)
+
+__link_prefix__ = "link_"
+__mpstat_prefix__ = "mpstat_"
+__nfd_log__ = "nfd.log"
+__extension__ = ".npz"
+
+
+def time_of_day(text, meridiem=None):
+    """
+    Convert a time printed by ifstat or mpstat to seconds since midnight.
+
+    :param text: The time, as HH:MM:SS
+    :param meridiem: AM or PM, if the time is printed in the 12 hours format
+    :return: The number of seconds, or None if text is not a time
+    """
+
+    parts = text.split(":")
+
+    if len(parts) != 3:
+        return None
+
+    try:
+        hours, minutes, seconds = int(parts[0]), int(parts[1]), float(parts[2])
+    except ValueError:
+        return None
+
+    if meridiem == "PM" and hours != 12:
+        hours += 12
+    elif meridiem == "AM" and hours == 12:
+        hours = 0
+
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def unwrap_days(times):
+    """
+    Make the times of the day monotonic, adding one day each time the clock goes back (after midnight).
+
+    :param times: The array of times, in seconds since midnight
+    :return: The array of times since the midnight of the first day
+    """
+
+    if len(times) < 2:
+        return times
+
+    days = numpy.concatenate(([0], numpy.cumsum(numpy.diff(times) < -43200)))
+
+    return times + days * 86400
+
+
+def to_float(text):
+    """
+    :param text: A number printed by ifstat or mpstat
+    :return: The number, or NaN if it is not available (e.g. "n/a")
+    """
+
+    try:
+        return float(text)
+    except ValueError:
+        return float("nan")
+
+
+def parse_ifstat(path):
+    """
+    Parse the output of *ifstat -b -t* for a single interface.
+
+    :param path: The path of the file
+    :return: The dictionary of columns: time (seconds), rx and tx (bit/s)
+    """
+
+    times, rx, tx = [], [], []
+
+    with open(path, errors="replace") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 3:
+                continue
+            t = time_of_day(fields[0])
+            if t is None:
+                continue
+            times.append(t)
+            rx.append(to_float(fields[1]))
+            tx.append(to_float(fields[2]))
+
+    return {"time": unwrap_days(numpy.array(times, dtype=numpy.float64)),
+            "rx": numpy.array(rx, dtype=numpy.float64) * 1000,
+            "tx": numpy.array(tx, dtype=numpy.float64) * 1000}
+
+
+def parse_mpstat(path):
+    """
+    Parse the output of *mpstat -P ALL <interval>*.
+
+    :param path: The path of the file
+    :return: The dictionary of columns: time (seconds), cpu (-1 for all the CPUs) and one column for each field printed
+             by mpstat (usr, sys, idle...), in percentage
+    """
+
+    names = None
+    times, cpus, values = [], [], []
+
+    with open(path, errors="replace") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 3 or fields[0].startswith("Average"):
+                continue
+
+            meridiem = fields[1] if fields[1] in ("AM", "PM") else None
+            t = time_of_day(fields[0], meridiem)
+            if t is None:
+                continue
+            fields = fields[2:] if meridiem else fields[1:]
+
+            if fields[0] == "CPU":
+                names = names or [name.lstrip("%") for name in fields[1:]]
+                continue
+            if names is None:
+                continue
+
+            times.append(t)
+            cpus.append(-1 if fields[0] == "all" else int(fields[0]))
+            values.append([to_float(v) for v in fields[1:len(names) + 1]])
+
+    columns = {"time": unwrap_days(numpy.array(times, dtype=numpy.float64)),
+               "cpu": numpy.array(cpus, dtype=numpy.int16)}
+
+    data = numpy.array(values, dtype=numpy.float32).reshape(len(values), len(names or []))
+
+    for i, name in enumerate(names or []):
+        columns[name] = data[:, i]
+
+    return columns
+
+
+def parse_nfd_log(path):
+    """
+    Parse the log of NFD (lines as "<timestamp> <LEVEL>: [<Module>] <event> face=<id> ...").
+
+    :param path: The path of the file
+    :return: The dictionary of columns: time (seconds since the epoch), level, module and event (codes), face (-1 if
+             not present), and the dictionaries level_values, module_values, event_values
+    """
+
+    dictionaries = {"level": {}, "module": {}, "event": {}}
+    times, codes, faces = [], {"level": [], "module": [], "event": []}, []
+
+    def code(column, value):
+        values = dictionaries[column]
+        c = values.get(value)
+        if c is None:
+            c = values[value] = len(values)
+        codes[column].append(c)
+
+    with open(path, errors="replace") as f:
+        for line in f:
+            fields = line.split(None, 4)
+            if len(fields) < 3 or not fields[2].startswith("["):
+                continue
+            try:
+                t = float(fields[0])
+            except ValueError:
+                continue
+
+            face = -1
+            rest = fields[4] if len(fields) > 4 else ""
+            position = rest.find("face=")
+            if position >= 0:
+                digits = rest[position + 5:].split(None, 1)[0].rstrip(",")
+                face = int(digits) if digits.isdigit() else -1
+
+            times.append(t)
+            code("level", fields[1].rstrip(":"))
+            code("module", fields[2].strip("[]"))
+            code("event", fields[3] if len(fields) > 3 else "")
+            faces.append(face)
+
+    columns = {"time": numpy.array(times, dtype=numpy.float64),
+               "face": numpy.array(faces, dtype=numpy.int32)}
+
+    for column, values in dictionaries.items():
+        columns[column] = numpy.array(codes[column], dtype=numpy.uint16)
+        columns[column + "_values"] = numpy.array(sorted(values, key=values.get), dtype=str)
+
+    return columns
+
+
+def ingest_file(args):
+    """
+    Parse a statistic file and write its columns in the store. Executed in the worker processes.
+
+    :param args: The tuple (path of the file, path of the output archive, kind of file: ifstat, mpstat, nfd)
+    :return: The tuple (path of the output archive, number of rows)
+    """
+
+    path, destination, kind = args
+
+    parser = {"ifstat": parse_ifstat, "mpstat": parse_mpstat, "nfd": parse_nfd_log}[kind]
+    columns = parser(path)
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    numpy.savez_compressed(destination, **columns)
+
+    return destination, len(columns["time"])
+
+
+def ingest_tasks(log_dir, run_dir):
+    """
+    List the statistic files of a run.
+
+    :param log_dir: The directory with one directory for each node, as written by get_stats
+    :param run_dir: The directory of the run in the store
+    :return: The list of arguments of :func:`ingest_file`
+    """
+
+    tasks = []
+
+    for node in sorted(os.listdir(log_dir)):
+        node_dir = os.path.join(log_dir, node)
+        if not os.path.isdir(node_dir):
+            continue
+
+        for name in os.listdir(node_dir):
+            path = os.path.join(node_dir, name)
+            prefix = "{0}{1}_".format(__link_prefix__, node)
+
+            if name.startswith(prefix) and name.endswith(".log"):
+                neighbor = name[len(prefix):-len(".log")]
+                tasks.append((path, os.path.join(run_dir, node, __link_prefix__ + neighbor + __extension__), "ifstat"))
+            elif name.startswith(__mpstat_prefix__) and name.endswith(".log"):
+                tasks.append((path, os.path.join(run_dir, node, "cpu" + __extension__), "mpstat"))
+            elif name == __nfd_log__:
+                tasks.append((path, os.path.join(run_dir, node, "nfd" + __extension__), "nfd"))
+
+    return tasks
+
+
+def ingest(run, log_dir=None, analysis_dir=None, workers=None):
+    """
+    Ingest the statistic files of a run in the store, in parallel processes.
+
+    :param run: The name of the run
+    :param log_dir: The directory of the statistic files (by default Globals.log_dir)
+    :param analysis_dir: The directory of the store (by default Globals.analysis_dir)
+    :param workers: The number of processes (by default Globals.ingest_workers, or the number of CPUs if 0)
+    :return: The dictionary with the number of files, the number of rows and the time spent
+    """
+
+    log_dir = log_dir or Globals.log_dir
+    run_dir = os.path.join(analysis_dir or Globals.analysis_dir, run)
+    workers = int(workers if workers is not None else Globals.ingest_workers) or None
+
+    start = time.time()
+    tasks = ingest_tasks(log_dir, run_dir)
+    rows = 0
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for destination, n_rows in executor.map(ingest_file, tasks, chunksize=4):
+            rows += n_rows
+
+    result = {"files": len(tasks), "rows": rows, "time": time.time() - start}
+
+    module_logger.info("Run {0} ingested in {1}: {2} files, {3} rows in {4:.2f}s".format(run, run_dir, len(tasks), rows,
+                                                                                       result["time"]))
+
+    return result
+
+
+class StatsStore:
+    """
+    Query the statistics ingested by :func:`ingest`.
+
+    :ivar directory: The directory of the store
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or Globals.analysis_dir
+
+    def runs(self):
+        """
+        :return: The names of the ingested runs, sorted by ingestion time
+        """
+
+        if not os.path.isdir(self.directory):
+            return []
+
+        runs = [run for run in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, run))]
+
+        return sorted(runs, key=lambda run: os.path.getmtime(os.path.join(self.directory, run)))
+
+    def nodes(self, run=None):
+        """
+        :param run: The run (by default the last one)
+        :return: The names of the nodes of the run
+        """
+
+        return sorted(os.listdir(self.run_dir(run)))
+
+    def links(self, node, run=None):
+        """
+        :param node: The node
+        :param run: The run (by default the last one)
+        :return: The names of the neighbors of the node with statistics
+        """
+
+        return sorted(name[len(__link_prefix__):-len(__extension__)]
+                      for name in os.listdir(os.path.join(self.run_dir(run), str(node)))
+                      if name.startswith(__link_prefix__))
+
+    def run_dir(self, run=None):
+        """
+        :param run: The run (by default the last one)
+        :return: The directory of the run
+        :raise: RuntimeError if no run has been ingested
+        """
+
+        if run is None:
+            runs = self.runs()
+            if not runs:
+                raise RuntimeError("No run ingested in {0}".format(self.directory))
+            run = runs[-1]
+
+        return os.path.join(self.directory, run)
+
+    def load(self, node, name, run=None):
+        """
+        Load the columns of a file of the store.
+
+        :param node: The node
+        :param name: The name of the file, without extension (link_<neighbor>, cpu, nfd)
+        :param run: The run (by default the last one)
+        :return: The dictionary of columns
+        """
+
+        with numpy.load(os.path.join(self.run_dir(run), str(node), name + __extension__)) as data:
+            return {column: data[column] for column in data.files}
+
+    def link_throughput(self, node_from, node_to, run=None):
+        """
+        Get the time series of the throughput of a link, measured on node_from.
+
+        :param node_from: The node where the link starts
+        :param node_to: The node where the link ends
+        :param run: The run (by default the last one)
+        :return: The tuple of arrays (time, received bit/s, transmitted bit/s)
+        """
+
+        columns = self.load(node_from, __link_prefix__ + str(node_to), run)
+
+        return columns["time"], columns["rx"], columns["tx"]
+
+    def cpu_usage(self, node, run=None, cpu=-1):
+        """
+        Get the time series of the CPU usage of a node.
+
+        :param node: The node
+        :param run: The run (by default the last one)
+        :param cpu: The CPU (by default -1, all the CPUs)
+        :return: The tuple of arrays (time, usage in percentage)
+        """
+
+        columns = self.load(node, "cpu", run)
+        selected = columns["cpu"] == cpu
+
+        return columns["time"][selected], 100 - columns["idle"][selected]
+
+    def nfd_event_rate(self, node, event, run=None, bin_size=1.0):
+        """
+        Count the NFD events of a type (e.g. onIncomingInterest) over time.
+
+        :param node: The node
+        :param event: The event
+        :param run: The run (by default the last one)
+        :param bin_size: The length of the bins, in seconds
+        :return: The tuple of arrays (start of the bins, events per second)
+        """
+
+        columns = self.load(node, "nfd", run)
+        codes = list(columns["event_values"])
+
+        if event not in codes or not len(columns["time"]):
+            return numpy.array([]), numpy.array([])
+
+        times = columns["time"][columns["event"] == codes.index(event)]
+
+        if not len(times):
+            return numpy.array([]), numpy.array([])
+
+        n_bins = int((times.max() - times.min()) // bin_size) + 1
+        counts, edges = numpy.histogram(times, times.min() + numpy.arange(n_bins + 1) * bin_size)
+
+        return edges[:-1], counts / bin_size
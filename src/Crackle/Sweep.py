@@ -0,0 +1,388 @@
+"""
+This module runs **parameter sweeps**: a sweep spec lists the values of some parameters of an experiment, and every
+combination of the values (a **point**) is tested. A spec is an INI file like::
+
+    [Sweep]
+    base = ../Medium_Network
+    n_times = 2
+
+    [Parameters]
+    settings.layer2_prot = ether, udp
+    link.shahab-mauro = 10, 100
+    strategy.* = best-route, ncc
+    cache.* = 1000, 10000
+    topology = topo.brite, topo_large.brite
+
+where base is the configuration folder of the experiment (relative to the spec), and each parameter is one of:
+
+    - **settings.<option>**: an option of settings.conf
+    - **link.<node>-<node>**: the capacity of a link, in Mbit/s
+    - **strategy.<node>** or **strategy.\\***: the forwarding strategy of a node (or of all the nodes)
+    - **cache.<node>** or **cache.\\***: the cache size of a node (or of all the nodes), in packets
+    - **topology**: the topo.brite of the experiment, as a file of the base folder
+
+The link capacities, strategies, cache sizes and the settings in :data:`__runtime_settings__` are changed on the
+running experiment (with :meth:`Crackle.NetworkManager.NetworkManager.edit_link` and
+:meth:`Crackle.NDNManager.NDNManager.reconfigure_routers`, which changes the strategy and the cache of all the nodes
+in parallel without restarting NFD). The other parameters require to build the experiment again, so the points are
+grouped by their value: each group is an experiment, built once and run by the
+:class:`Crackle.ExperimentRunner.ExperimentRunner` (so that the groups run at the same time when the cluster has
+room), which tests all the points of the group in turn.
+
+The results of each point (the summary of the downloads of each run and the collected statistics) are written in
+Globals.sweep_dir/<spec name>/<point>, and the results of all the points in results.json.
+"""
+
+import collections
+import configparser
+import itertools
+import json
+import logging
+import os
+import shutil
+
+import Crackle.Globals as Globals
+from Crackle.ColoredOutput import make_colored
+from Crackle.ExperimentRunner import Experiment, ExperimentRunner
+from Crackle.Tracing import percentile
+
+module_logger = logging.getLogger(__name__)
+
+__sweep_section__ = "Sweep"
+__parameters_section__ = "Parameters"
+
+__settings__ = "settings"
+__link__ = "link"
+__strategy__ = "strategy"
+__cache__ = "cache"
+__topology__ = "topology"
+__all_nodes__ = "*"
+
+# Points of a group, written in its working folder and read by crackle.py --points
+__points_file__ = "sweep.json"
+__results_dir__ = "sweep"
+__point_file__ = "point.json"
+
+# The settings used only when the test runs, that can be changed without building the experiment again
+__runtime_settings__ = ("test_duration",
+                        "workload_engine",
+                        "workload_replay",
+                        "workload_workers",
+                        "workload_seed")
+
+
+def parse_spec(path):
+    """
+    Parse a sweep spec.
+
+    :param path: The path of the spec
+    :return: The tuple (base folder, number of runs of each point, list of (kind, target, list of values))
+    :raise: RuntimeError if the spec is not valid
+    """
+
+    config = configparser.ConfigParser()
+    config.optionxform = str
+
+    try:
+        if not config.read(path):
+            raise RuntimeError("Sweep spec {0} not found".format(path))
+        base = os.path.join(os.path.dirname(os.path.abspath(path)), config.get(__sweep_section__, "base"))
+        n_times = config.getint(__sweep_section__, "n_times", fallback=1)
+        options = config.items(__parameters_section__)
+    except (configparser.Error, ValueError) as error:
+        raise RuntimeError("Error reading the sweep spec {0}: {1}".format(path, error))
+
+    parameters = []
+
+    for key, values in options:
+        kind, _, target = key.partition(".")
+
+        if kind not in (__settings__, __link__, __strategy__, __cache__, __topology__) or \
+                (kind != __topology__ and not target) or (kind == __link__ and "-" not in target):
+            raise RuntimeError("Sweep parameter {0} not recognized".format(key))
+
+        values = [v.strip() for v in values.split(",") if v.strip()]
+
+        if not values:
+            raise RuntimeError("Sweep parameter {0} has no values".format(key))
+
+        parameters.append((kind, target, values))
+
+    return base, n_times, parameters
+
+
+def is_runtime(kind, target):
+    """
+    :param kind: The kind of the parameter
+    :param target: The target of the parameter
+    :return: True if the parameter can be changed on the running experiment, False otherwise
+    """
+
+    return kind in (__link__, __strategy__, __cache__) or (kind == __settings__ and target in __runtime_settings__)
+
+
+def expand(parameters):
+    """
+    Expand the parameters of a sweep into its points, grouped by the parameters requiring a new experiment.
+
+    :param parameters: The list of (kind, target, list of values) returned by :func:`parse_spec`
+    :return: The ordered dictionary rebuild parameters => list of points, where each point is the list of
+             (kind, target, value) of all the parameters
+    """
+
+    groups = collections.OrderedDict()
+
+    for values in itertools.product(*[[(kind, target, v) for v in values] for kind, target, values in parameters]):
+        key = tuple(p for p in values if not is_runtime(p[0], p[1]))
+        groups.setdefault(key, []).append(list(values))
+
+    return groups
+
+
+def point_name(index):
+    """
+    :param index: The index of the point in the sweep
+    :return: The name of the point
+    """
+
+    return "p{0:03d}".format(index)
+
+
+def format_parameter(kind, target):
+    """
+    :return: The name of the parameter, as in the spec
+    """
+
+    return "{0}.{1}".format(kind, target) if target else kind
+
+
+def summarize_reports(reports):
+    """
+    Summarize the downloads of a run.
+
+    :param reports: The list of :class:`Crackle.NDNManager.DownloadReport`
+    :return: The dictionary with the number of requests and of completed downloads, the completion time (mean and
+             p95, in seconds) and the mean throughput (bit/s)
+    """
+
+    completed = [r for r in reports if r.is_successful()]
+    times = sorted(r.download_time for r in completed)
+    throughputs = [r.throughput for r in completed if r.throughput is not None]
+
+    return {"requests": len(reports),
+            "completed": len(completed),
+            "download_time": sum(times) / len(times) if times else None,
+            "download_time_p95": percentile(times, 95) if times else None,
+            "throughput": sum(throughputs) / len(throughputs) if throughputs else None}
+
+
+def apply_point(point, previous, net, ndn):
+    """
+    Apply the runtime parameters of a point to the running experiment, skipping the ones that did not change since
+    the previous point.
+
+    :param point: The list of (kind, target, value) of the point
+    :param previous: The list of (kind, target, value) of the previous point, or None
+    :param net: The :class:`Crackle.NetworkManager.NetworkManager`
+    :param ndn: The :class:`Crackle.NDNManager.NDNManager`
+    :return: True if the parameters have been applied, False otherwise
+    """
+
+    def nodes(target):
+        if target == __all_nodes__:
+            return list(net.node_list.values())
+        return [net.node_list[Globals.experiment_id + target]]
+
+    changed = [p for p in point if is_runtime(p[0], p[1]) and (previous is None or p not in previous)]
+    configure = {}
+
+    try:
+        for kind, target, value in changed:
+            module_logger.info("Setting {0}={1}".format(format_parameter(kind, target), value))
+
+            if kind == __settings__:
+                try:
+                    setattr(Globals, target, float(value))
+                except ValueError:
+                    setattr(Globals, target, value)
+            elif kind == __link__:
+                node_from, node_to = target.split("-", 1)
+                net.edit_link(Globals.experiment_id + node_from, Globals.experiment_id + node_to, float(value),
+                              container_created=True)
+            elif kind == __strategy__:
+                for node in nodes(target):
+                    node.set_forward_strategy(value)
+                    configure[node] = (configure.get(node, (None, None))[0], value)
+            elif kind == __cache__:
+                for node in nodes(target):
+                    node.set_cache_size(int(float(value)))
+                    configure[node] = (int(float(value)), configure.get(node, (None, None))[1])
+    except (KeyError, ValueError) as error:
+        module_logger.error("Error applying the point {0}. Error: {1}".format(point, error))
+        print(make_colored("red", "Error applying the point {0}: {1}".format(point, error)))
+        return False
+
+    return not configure or ndn.reconfigure_routers(configure)
+
+
+def run_points(folder, net, ndn, n_times=1):
+    """
+    Test the points of a group on the experiment built from folder. Executed by crackle.py --points, in the process
+    of the experiment.
+
+    :param folder: The working folder of the group, containing the points file
+    :param net: The :class:`Crackle.NetworkManager.NetworkManager`
+    :param ndn: The :class:`Crackle.NDNManager.NDNManager`
+    :param n_times: The number of runs of each point
+    :return: True if all the points have been tested, False otherwise
+    """
+
+    with open(os.path.join(folder, __points_file__)) as f:
+        points = json.load(f)
+
+    previous = None
+    ret = True
+
+    for entry in points:
+        point = [tuple(p) for p in entry["parameters"]]
+        directory = os.path.join(folder, __results_dir__, entry["name"])
+        os.makedirs(directory, exist_ok=True)
+
+        print(make_colored("blue", "[{0}] {1}".format(entry["name"], ", ".join(
+            "{0}={1}".format(format_parameter(k, t), v) for k, t, v in point))))
+
+        if not apply_point(point, previous, net, ndn):
+            ret = False
+            continue
+
+        previous = point
+        runs = []
+
+        for i in range(n_times):
+            reports = ndn.start_test()
+            net.get_stats()
+
+            runs.append(summarize_reports(reports))
+            shutil.copytree(Globals.log_dir, os.path.join(directory, "run-{0}".format(i)))
+
+        with open(os.path.join(directory, __point_file__), "w") as f:
+            json.dump({"name": entry["name"], "parameters": entry["parameters"], "runs": runs}, f, indent=2)
+
+    return ret
+
+
+def collect_results(experiments):
+    """
+    Read the results of the points tested by the experiments of a sweep.
+
+    :param experiments: The list of :class:`Crackle.ExperimentRunner.Experiment`
+    :return: The list of the results of the points, sorted by name
+    """
+
+    results = []
+
+    for experiment in experiments:
+        if experiment.workdir is None:
+            continue
+
+        directory = os.path.join(experiment.workdir, __results_dir__)
+
+        for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+            try:
+                with open(os.path.join(directory, name, __point_file__)) as f:
+                    results.append(json.load(f))
+            except (IOError, ValueError) as error:
+                module_logger.warning("[{0}] Results of point {1} not available. Error: {2}".format(experiment,
+                                                                                                   name, error))
+
+    return sorted(results, key=lambda r: r["name"])
+
+
+def format_results(results):
+    """
+    Format the results of the points of a sweep as a table, with the mean over the runs of each point.
+
+    :param results: The list returned by :func:`collect_results`
+    :return: The table, as a string
+    """
+
+    def mean(runs, key):
+        values = [r[key] for r in runs if r[key] is not None]
+        return sum(values) / len(values) if values else float("nan")
+
+    lines = ["{0:<6} {1:>10} {2:>10} {3:>14}  {4}".format("Point", "Completed", "Time(s)", "Tput(Mbit/s)",
+                                                          "Parameters")]
+
+    for r in results:
+        runs = r["runs"]
+        lines.append("{0:<6} {1:>10} {2:>10.2f} {3:>14.3f}  {4}".format(
+            r["name"],
+            "{0}/{1}".format(sum(x["completed"] for x in runs), sum(x["requests"] for x in runs)),
+            mean(runs, "download_time"),
+            mean(runs, "throughput") / 10 ** 6,
+            ", ".join("{0}={1}".format(format_parameter(k, t), v) for k, t, v in r["parameters"])))
+
+    return "\n".join(lines)
+
+
+def run_sweep(path, n_times=None):
+    """
+    Run a sweep: expand the spec into points, run one experiment for each group of points, and collect the results.
+
+    :param path: The path of the sweep spec
+    :param n_times: The number of runs of each point (by default the one of the spec)
+    :return: True if all the experiments succeeded, False otherwise
+    :raise: RuntimeError if the spec is not valid
+    """
+
+    base, spec_n_times, parameters = parse_spec(path)
+    groups = expand(parameters)
+
+    sweep_dir = os.path.join(Globals.sweep_dir, os.path.splitext(os.path.basename(path))[0])
+    os.makedirs(sweep_dir, exist_ok=True)
+
+    experiments = []
+    index = 0
+
+    for number, (rebuild, points) in enumerate(groups.items()):
+        entries = [{"name": point_name(index + i), "parameters": point} for i, point in enumerate(points)]
+        index += len(points)
+
+        points_file = os.path.join(sweep_dir, "group-{0}.json".format(number))
+        with open(points_file, "w") as f:
+            json.dump(entries, f, indent=2)
+
+        files = {__points_file__: points_file}
+        overrides = {}
+
+        for kind, target, value in rebuild:
+            if kind == __topology__:
+                files["topo.brite"] = os.path.join(base, value)
+            else:
+                overrides[target] = value
+
+        experiments.append(Experiment(base, overrides, n_times or spec_n_times, name="group-{0}".format(number),
+                                      files=files, arguments=["--points"]))
+
+    print(make_colored("blue", "Sweep {0}: {1} points in {2} experiments".format(path, index, len(experiments))))
+
+    runner = ExperimentRunner(experiments)
+    ret = runner.run()
+    print(runner.format_summary())
+
+    results = collect_results(experiments)
+
+    for r in results:
+        shutil.rmtree(os.path.join(sweep_dir, r["name"]), ignore_errors=True)
+    for experiment in experiments:
+        directory = os.path.join(experiment.workdir or "", __results_dir__)
+        for name in os.listdir(directory) if experiment.workdir and os.path.isdir(directory) else []:
+            shutil.copytree(os.path.join(directory, name), os.path.join(sweep_dir, name))
+
+    with open(os.path.join(sweep_dir, "results.json"), "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(format_results(results))
+    print(make_colored("green", "Results of the sweep written in {0}".format(sweep_dir)))
+
+    return ret
@@ -0,0 +1,397 @@
+"""
+This module streams live metrics from the containers during the experiment, instead of waiting for the *ifstat* and
+*mpstat* files collected at the end by :meth:`Crackle.NetworkManager.NetworkManager.get_stats`.
+
+Inside each container a small **collector** samples, every Globals.telemetry_interval seconds, the byte counters of
+the interfaces (from /sys/class/net) and the CPU counters (from /proc/stat). On each server a **relay**, started
+through a single SSH connection, launches the collectors of the containers of the server with *lxc exec* and
+multiplexes their output on the SSH connection. The client reads the connection of each server and computes the
+rates. The relay runs *sudo lxc exec*, like the other commands sent through SSH use sudo: the remote user
+(Globals.username) needs passwordless sudo, and the lxc client of root must reach the local LXD daemon (the default).
+The user does not need to be in the lxd group.
+
+The samples are sent as compact binary frames. Each frame has a header (type, node index, payload length, as
+``!BHH``) followed by the payload:
+
+    - **interfaces** frame: the names of the interfaces of the node, separated by "\\n" (sent once at start)
+    - **sample** frame: the timestamp and the CPU counters (busy, total) as ``!dQQ``, followed by the received and
+      transmitted bytes of each interface as ``!QQ``, in the order of the interfaces frame
+
+The interfaces of a node are named after its neighbors, so the utilization of a link is the rate of the interface
+named after the other end of the link (see :meth:`TelemetryCollector.get_link_rate`).
+"""
+
+import collections
+import logging
+import struct
+import subprocess
+import threading
+
+import Crackle.Globals as Globals
+import Crackle.Constants as Constants
+from Crackle.Tracing import TracedPopen
+
+module_logger = logging.getLogger(__name__)
+
+# Frame types
+__interfaces_frame__ = 0
+__sample_frame__ = 1
+
+__frame_header__ = struct.Struct("!BHH")
+__sample_header__ = struct.Struct("!dQQ")
+__interface_counters__ = struct.Struct("!QQ")
+
+# Executed inside the containers: python3 -c collector_script <node index> <interval>
+collector_script = r"""
+import os, struct, sys, time
+node, interval = int(sys.argv[1]), float(sys.argv[2])
+out = sys.stdout.buffer
+ifaces = sorted(i for i in os.listdir("/sys/class/net") if i != "lo")
+def frame(kind, payload):
+    out.write(struct.pack("!BHH", kind, node, len(payload)) + payload)
+    out.flush()
+def counter(iface, name):
+    try:
+        with open("/sys/class/net/%s/statistics/%s" % (iface, name)) as f:
+            return int(f.read())
+    except (IOError, ValueError):
+        return 0
+frame(0, "\n".join(ifaces).encode())
+while True:
+    with open("/proc/stat") as f:
+        cpu = [int(v) for v in f.readline().split()[1:]]
+    total = sum(cpu)
+    idle = cpu[3] + (cpu[4] if len(cpu) > 4 else 0)
+    payload = struct.pack("!dQQ", time.time(), total - idle, total)
+    for iface in ifaces:
+        payload += struct.pack("!QQ", counter(iface, "rx_bytes"), counter(iface, "tx_bytes"))
+    frame(1, payload)
+    time.sleep(interval)
+"""
+
+# Executed on the servers: python3 - <interval> <node index>:<container> ...
+relay_script = r"""
+import struct, subprocess, sys, threading
+COLLECTOR = %r
+interval = sys.argv[1]
+lock = threading.Lock()
+out = sys.stdout.buffer
+processes = []
+def read(stream, n):
+    data = b""
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+def forward(process):
+    while True:
+        header = read(process.stdout, 5)
+        payload = header and read(process.stdout, struct.unpack("!BHH", header)[2])
+        if payload is None:
+            return
+        try:
+            with lock:
+                out.write(header + payload)
+                out.flush()
+        except (IOError, ValueError):
+            for p in processes:
+                p.kill()
+            sys.exit(0)
+for arg in sys.argv[2:]:
+    index, container = arg.split(":", 1)
+    processes.append(subprocess.Popen(["sudo", "lxc", "exec", container, "--", "python3", "-c", COLLECTOR, index,
+                                       interval], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL))
+threads = [threading.Thread(target=forward, args=[p]) for p in processes]
+for t in threads:
+    t.daemon = True
+    t.start()
+for t in threads:
+    t.join()
+""" % collector_script
+
+
+def read_exactly(stream, size):
+    """
+    Read exactly size bytes from a stream.
+
+    :param stream: The stream
+    :param size: The number of bytes
+    :return: The bytes read, or None if the stream ended before
+    """
+
+    data = b""
+
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+
+    return data
+
+
+def read_frame(stream):
+    """
+    Read a frame from a stream.
+
+    :param stream: The stream
+    :return: The tuple (type, node index, payload), or None if the stream ended
+    """
+
+    header = read_exactly(stream, __frame_header__.size)
+
+    if header is None:
+        return None
+
+    kind, index, length = __frame_header__.unpack(header)
+    payload = read_exactly(stream, length)
+
+    return None if payload is None else (kind, index, payload)
+
+
+class Sample:
+    """
+    The rates of a node between two consecutive samples.
+
+    :ivar node: The node
+    :ivar time: The timestamp of the sample, in seconds since the epoch
+    :ivar cpu: The CPU utilization, between 0 and 1
+    :ivar rates: The dictionary interface => (received bit/s, transmitted bit/s)
+    """
+
+    __slots__ = ("node", "time", "cpu", "rates")
+
+    def __init__(self, node, time, cpu, rates):
+        self.node = node
+        self.time = time
+        self.cpu = cpu
+        self.rates = rates
+
+
+class TelemetryCollector:
+    """
+    Collect the live metrics of the containers, with one SSH connection for each server.
+
+    :ivar node_list: The dictionary node_id => node of the experiment
+    :ivar nodes: The nodes, in the order of the indexes used in the frames
+    :ivar interfaces: The names of the interfaces of each node (node => list of names)
+    :ivar counters: The last counters received from each node (node => (time, busy, total, [(rx, tx), ...]))
+    :ivar history: The last Globals.telemetry_history samples of each node (node => deque of :class:`Sample`)
+    :ivar listeners: The functions called with each new :class:`Sample`
+    :ivar processes: The SSH connections (server => process)
+    """
+
+    def __init__(self, node_list):
+        self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
+        self.node_list = node_list
+        self.nodes = list(node_list.values())
+        self.interfaces = {}
+        self.counters = {}
+        self.history = {}
+        self.listeners = []
+        self.processes = {}
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """
+        Register a function called, from the reader threads, with each new :class:`Sample` (e.g. to adapt the
+        experiment to the link utilization).
+
+        :param listener: The function
+        """
+
+        self.listeners.append(listener)
+
+    def is_running(self):
+        """
+        :return: True if the collector is running, False otherwise
+        """
+
+        return any(p.poll() is None for p in self.processes.values())
+
+    def start(self, interval=None):
+        """
+        Start the collectors in the containers and the relays on the servers.
+
+        :param interval: The sampling interval, in seconds (by default Globals.telemetry_interval)
+        :return: True if the relays have been started on all the servers, False otherwise
+        """
+
+        if self.is_running():
+            self.logger.warning("Telemetry already running")
+            return True
+
+        interval = float(interval or Globals.telemetry_interval)
+
+        servers = collections.defaultdict(list)
+        for index, node in enumerate(self.nodes):
+            servers[node.get_server()].append("{0}:{1}".format(index, node.container.name))
+
+        self.processes = {}
+        self.threads = []
+        ret = True
+
+        for server, containers in servers.items():
+            params = ["ssh",
+                      "-i",
+                      Constants.ssh_client_private_key,
+                      "{0}@{1}".format(Globals.username, server),
+                      "python3 - {0} {1}".format(interval, " ".join(containers))]
+
+            try:
+                p = TracedPopen(params, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+                p.stdin.write(relay_script.encode())
+                p.stdin.close()
+            except OSError as error:
+                self.logger.error("[{0}] Error starting the telemetry relay. Error: {1}".format(server, error))
+                ret = False
+                continue
+
+            self.processes[server] = p
+
+            t = threading.Thread(target=self.read, args=[server, p], name="telemetry-{0}".format(server))
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+        self.logger.info("Telemetry started on {0} servers, every {1}s".format(len(self.processes), interval))
+
+        return ret
+
+    def stop(self):
+        """
+        Stop the relays (and therefore the collectors, whose output is closed).
+        """
+
+        for p in self.processes.values():
+            if p.poll() is None:
+                p.terminate()
+            p.wait()
+
+        for t in self.threads:
+            t.join(timeout=5)
+
+        self.logger.info("Telemetry stopped")
+
+    def read(self, server, process):
+        """
+        Read the frames sent by the relay of a server until the connection is closed.
+
+        :param server: The server
+        :param process: The SSH process
+        """
+
+        while True:
+            frame = read_frame(process.stdout)
+
+            if frame is None:
+                break
+
+            kind, index, payload = frame
+
+            if index >= len(self.nodes):
+                self.logger.warning("[{0}] Frame from unknown node {1}".format(server, index))
+                continue
+
+            node = self.nodes[index]
+
+            if kind == __interfaces_frame__:
+                with self.lock:
+                    self.interfaces[node] = payload.decode().split("\n") if payload else []
+            elif kind == __sample_frame__:
+                self.update(node, payload)
+
+        self.logger.debug("[{0}] Telemetry connection closed".format(server))
+
+    def update(self, node, payload):
+        """
+        Update the rates of a node with a sample frame.
+
+        :param node: The node
+        :param payload: The payload of the frame
+        """
+
+        timestamp, busy, total = __sample_header__.unpack_from(payload)
+        counters = [__interface_counters__.unpack_from(payload, offset)
+                    for offset in range(__sample_header__.size, len(payload), __interface_counters__.size)]
+
+        with self.lock:
+            previous = self.counters.get(node)
+            self.counters[node] = (timestamp, busy, total, counters)
+            interfaces = self.interfaces.get(node, [])
+
+            if previous is None or timestamp <= previous[0]:
+                return
+
+            elapsed = timestamp - previous[0]
+            cpu = (busy - previous[1]) / max(total - previous[2], 1)
+            rates = {name: ((rx - old_rx) * 8 / elapsed, (tx - old_tx) * 8 / elapsed)
+                     for name, (rx, tx), (old_rx, old_tx) in zip(interfaces, counters, previous[3])}
+
+            sample = Sample(node, timestamp, cpu, rates)
+            history = self.history.setdefault(node, collections.deque(maxlen=int(Globals.telemetry_history)))
+            history.append(sample)
+
+        for listener in self.listeners:
+            try:
+                listener(sample)
+            except Exception as error:
+                self.logger.error("Error in telemetry listener {0}. Error: {1}".format(listener, error))
+
+    def get_last_sample(self, node):
+        """
+        :param node: The node
+        :return: The last :class:`Sample` of the node, or None
+        """
+
+        with self.lock:
+            history = self.history.get(node)
+            return history[-1] if history else None
+
+    def get_history(self, node):
+        """
+        :param node: The node
+        :return: The list of the last samples of the node
+        """
+
+        with self.lock:
+            return list(self.history.get(node, []))
+
+    def get_link_rate(self, node_from, node_to):
+        """
+        Get the current rate of a link.
+
+        :param node_from: The node where the link starts
+        :param node_to: The node where the link ends
+        :return: The tuple (received bit/s, transmitted bit/s) on node_from, or None if not available
+        """
+
+        sample = self.get_last_sample(node_from)
+
+        return sample.rates.get(str(node_to)) if sample is not None else None
+
+    def format_status(self):
+        """
+        Format the last samples of the nodes as a table, with the CPU utilization of each node and the rate of each
+        link.
+
+        :return: The table, as a string
+        """
+
+        lines = ["{0:<16} {1:<16} {2:>6} {3:>12} {4:>12}".format("Node", "Interface", "CPU%", "RX(Mbit/s)",
+                                                                "TX(Mbit/s)")]
+        lines.append("-" * len(lines[0]))
+
+        for node in self.nodes:
+            sample = self.get_last_sample(node)
+            if sample is None:
+                continue
+            for name, (rx, tx) in sorted(sample.rates.items()):
+                lines.append("{0:<16} {1:<16} {2:>6.1f} {3:>12.3f} {4:>12.3f}".format(str(node), name,
+                                                                                    sample.cpu * 100,
+                                                                                    rx / 10 ** 6, tx / 10 ** 6))
+
+        return "\n".join(lines) if len(lines) > 2 else "No telemetry sample received."
@@ -0,0 +1,345 @@
+"""
+This module contains the compact tables backing the topology classes of :mod:`Crackle.TopologyStructs`:
+
+    - The **node table**, that assigns to each node a dense integer index
+    - The **name table**, that assigns to each ICN name a dense integer index
+    - The **link table**, that stores the wired links by column (endpoints, capacity, addresses)
+    - The **FIB**, the routing table of a node, stored as a set of integers packing (next hop index, name index)
+
+Routes and links are referred through the integer indexes of the tables, so large topologies with many routes use
+a fraction of the memory required by one object (and one dictionary) per entry, and they can be scanned quickly.
+
+The tables are module level, since they are shared by all the nodes of the experiment. They are emptied with
+:func:`clear` when a new topology is built.
+"""
+
+import socket
+import struct
+from array import array
+
+
+class InternTable:
+    """
+    Table that assigns a dense integer index to each distinct key.
+
+    :ivar keys: The list of keys, ordered by index
+    :ivar indexes: The map key => index
+    """
+
+    __slots__ = ("keys", "indexes")
+
+    def __init__(self):
+        self.keys = []
+        self.indexes = {}
+
+    def intern(self, key):
+        """
+        Return the index of key, adding it to the table if needed.
+
+        :param key: The key to intern
+        :return: The index of the key
+        """
+
+        index = self.indexes.get(key)
+
+        if index is None:
+            index = len(self.keys)
+            self.keys.append(key)
+            self.indexes[key] = index
+
+        return index
+
+    def index(self, key):
+        """
+        Return the index of key.
+
+        :param key: The key
+        :return: The index of the key
+        :raises: :class:`KeyError` if the key is not in the table
+        """
+
+        return self.indexes[key]
+
+    def __getitem__(self, index):
+        return self.keys[index]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        """
+        Remove all the keys from the table.
+        """
+
+        self.keys = []
+        self.indexes = {}
+
+
+class NodeTable(InternTable):
+    """
+    Table that assigns a dense integer index to each node, using the node identifier as key.
+    Adding a node with an identifier already in the table replaces the node object, keeping the index.
+
+    :ivar nodes: The list of node objects, ordered by index
+    """
+
+    __slots__ = ("nodes",)
+
+    def __init__(self):
+        InternTable.__init__(self)
+        self.nodes = []
+
+    def add(self, node):
+        """
+        Add a node to the table.
+
+        :param node: The :class:`Crackle.TopologyStructs.Router` to add
+        :return: The index of the node
+        """
+
+        index = self.intern(node.get_node_id())
+
+        if index == len(self.nodes):
+            self.nodes.append(node)
+        else:
+            self.nodes[index] = node
+
+        return index
+
+    def node(self, index):
+        """
+        Return the node object corresponding to index.
+
+        :param index: The index of the node
+        :return: The :class:`Crackle.TopologyStructs.Router` with that index
+        """
+
+        return self.nodes[index]
+
+    def clear(self):
+        InternTable.clear(self)
+        self.nodes = []
+
+
+class LinkTable:
+    """
+    Table of the wired links, stored by column. Each link is identified by its row. The rows of the deleted links are
+    reused by the next links added.
+
+    :ivar node_from: The index of the first endpoint of each link (-1 if the row is free)
+    :ivar node_to: The index of the second endpoint of each link
+    :ivar capacity: The capacity of each link, in Mbps
+    :ivar ip_address: The IP address of the interface of node_from, as unsigned 32 bit integer
+    :ivar mac_address: The MAC address of the interface of node_from, as unsigned 64 bit integer
+    :ivar free_rows: The list of free rows
+    """
+
+    __slots__ = ("node_from", "node_to", "capacity", "ip_address", "mac_address", "free_rows")
+
+    def __init__(self):
+        self.node_from = array("l")
+        self.node_to = array("l")
+        self.capacity = array("d")
+        self.ip_address = array("L")
+        self.mac_address = array("Q")
+        self.free_rows = []
+
+    def add(self, node_from, node_to, capacity, ip_address, mac_address):
+        """
+        Add a link to the table.
+
+        :param node_from: The index of the first endpoint
+        :param node_to: The index of the second endpoint
+        :param capacity: The capacity of the link
+        :param ip_address: The IP address of the interface of node_from, as string
+        :param mac_address: The MAC address of the interface of node_from, as string
+        :return: The row of the link
+        """
+
+        ip_address = ip_to_int(ip_address)
+        mac_address = mac_to_int(mac_address)
+
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.node_from[row] = node_from
+            self.node_to[row] = node_to
+            self.capacity[row] = capacity
+            self.ip_address[row] = ip_address
+            self.mac_address[row] = mac_address
+        else:
+            row = len(self.node_from)
+            self.node_from.append(node_from)
+            self.node_to.append(node_to)
+            self.capacity.append(capacity)
+            self.ip_address.append(ip_address)
+            self.mac_address.append(mac_address)
+
+        return row
+
+    def remove(self, row):
+        """
+        Remove a link from the table.
+
+        :param row: The row of the link
+        """
+
+        self.node_from[row] = -1
+        self.free_rows.append(row)
+
+    def rows(self):
+        """
+        Iterate over the rows of the links in the table.
+
+        :return: A generator over the rows in use
+        """
+
+        return (row for row, node_from in enumerate(self.node_from) if node_from >= 0)
+
+    def __len__(self):
+        return len(self.node_from) - len(self.free_rows)
+
+    def clear(self):
+        """
+        Remove all the links from the table.
+        """
+
+        self.__init__()
+
+
+def fib_key(next_hop, name):
+    """
+    Pack an entry of a FIB in a single integer.
+
+    :param next_hop: The index of the next hop
+    :param name: The index of the name (lower than 2^32)
+    :return: The key of the entry
+    """
+
+    return next_hop << 32 | name
+
+
+class Fib:
+    """
+    The routing table of a node. Each entry is a couple (next hop, name), where the next hop is an index of the
+    node table and the name is an index of the name table.
+
+    The entries are packed in a single integer each (:func:`fib_key`) and stored in a set, so that adding, finding and
+    removing an entry take constant time, with about 70 bytes per entry. Removing all the entries of a next hop scans
+    the table.
+
+    :ivar entries: The set of the keys of the entries
+    """
+
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        self.entries = set()
+
+    def contains(self, next_hop, name):
+        """
+        Find an entry in the table.
+
+        :param next_hop: The index of the next hop
+        :param name: The index of the name
+        :return: True if the entry is in the table, False otherwise
+        """
+
+        return fib_key(next_hop, name) in self.entries
+
+    def add(self, next_hop, name):
+        """
+        Add an entry to the table, if it is not already there.
+
+        :param next_hop: The index of the next hop
+        :param name: The index of the name
+        :return: The current :class:`Fib` instance
+        """
+
+        self.entries.add(fib_key(next_hop, name))
+
+        return self
+
+    def remove(self, next_hop, name):
+        """
+        Remove an entry from the table.
+
+        :param next_hop: The index of the next hop
+        :param name: The index of the name
+        :return: The current :class:`Fib` instance
+        :raises: :class:`KeyError` if the entry is not in the table
+        """
+
+        try:
+            self.entries.remove(fib_key(next_hop, name))
+        except KeyError:
+            raise KeyError((next_hop, name))
+
+        return self
+
+    def remove_next_hop(self, next_hop):
+        """
+        Remove all the entries through next_hop.
+
+        :param next_hop: The index of the next hop
+        :return: The current :class:`Fib` instance
+        :raises: :class:`KeyError` if there are no entries through next_hop
+        """
+
+        keys = [key for key in self.entries if key >> 32 == next_hop]
+
+        if not keys:
+            raise KeyError(next_hop)
+
+        self.entries.difference_update(keys)
+
+        return self
+
+    def clear(self):
+        """
+        Remove all the entries from the table.
+        """
+
+        self.__init__()
+
+    def __iter__(self):
+        return ((key >> 32, key & 0xffffffff) for key in self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def ip_to_int(ip_address):
+    """
+    Convert an IPv4 address to an integer.
+
+    :param ip_address: The IP address, as string
+    :return: The IP address, as integer
+    """
+
+    return struct.unpack(">I", socket.inet_aton(ip_address))[0]
+
+
+def mac_to_int(mac_address):
+    """
+    Convert a MAC address to an integer.
+
+    :param mac_address: The MAC address, as string
+    :return: The MAC address, as integer
+    """
+
+    return int(mac_address.replace(":", ""), 16)
+
+
+nodes = NodeTable()
+names = InternTable()
+links = LinkTable()
+
+
+def clear():
+    """
+    Remove the content of all the tables of this module, before building a new topology.
+    """
+
+    nodes.clear()
+    names.clear()
+    links.clear()
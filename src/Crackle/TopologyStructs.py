@@ -12,13 +12,13 @@ import json
 import logging
 
 import math
-from numpy.core import operand_flag_tests
 from sympy.geometry import Polygon, Point, Circle
 from Crackle.Constants import layer_2_protocols
 import Crackle.Constants as Constants
 from math import sqrt
 import Crackle.Globals as Globals
 from Crackle.LxcUtils import AddressGenerator
+import Crackle.TopologyCore as TopologyCore
 from abc import ABCMeta, abstractmethod
 
 __register__ = "register"
@@ -43,13 +43,17 @@ class Router:
     :ivar container: The linux container associated to this router
     :ivar mobile: Boolean that says if this node is mobile or not
     :ivar address: IP address of the underlying linux container
+    :ivar index: The index of this router in the node table of :mod:`Crackle.TopologyCore`
     """
 
+    __slots__ = ("cache_size", "cache_policy", "cache_prob", "forward_strategy", "client_apps", "repo_apps", "links",
+                 "routes", "node_id", "mobile", "container", "vlan", "server", "index")
+
+    logger = logging.getLogger(__name__ + ".Router")
+
     def __init__(self, node_id, cache_size, cache_policy, cache_probability,
                  forward_strategy, container=None, vlan=Constants.router_vlan, mobile=False):
 
-        self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
-
         self.cache_size = cache_size
         self.cache_policy = cache_policy
         self.cache_prob = cache_probability
@@ -58,7 +62,7 @@ class Router:
         self.client_apps = []
         self.repo_apps = []
         self.links = {}
-        self.routes = {}
+        self.routes = TopologyCore.Fib()
 
         self.node_id = node_id
         self.mobile = mobile
@@ -68,6 +72,8 @@ class Router:
 
         self.server = ""
 
+        self.index = TopologyCore.nodes.add(self)
+
     def set_forward_strategy(self, forward_strategy):
         """
         Set the cache size. The default value is 65536 packets.
@@ -156,28 +162,31 @@ class Router:
         """
         return self.container.spawn_container()
 
-    def push_file(self, source_path, dest_path):
+    def push_file(self, source_path, dest_path, data=None):
         """
         Push a file inside the container.
 
         :param source_path: The location of the file to push
         :param dest_path: The path of the file inside the container
+        :param data: The content of the file, if it is not read from source_path
 
         :return: True if the push succeed, False otherwise
         """
 
-        return self.container.push_file(source_path, dest_path)
+        return self.container.push_file(source_path, dest_path, data)
 
-    def pull_file(self, source_path, dest_path):
+    def pull_file(self, source_path, dest_path, chunk_size=2048, offset=0):
         """
         Download a file from the container.
 
         :param source_path: The location of the file inside the container
         :param dest_path: The destination of the file in the host
+        :param chunk_size: The size of the chunks written to dest_path
+        :param offset: The number of bytes already downloaded in dest_path
         :return: True if the file pull succeed, false otherwise
         """
 
-        return self.container.pull_file(source_path, dest_path)
+        return self.container.pull_file(source_path, dest_path, chunk_size, offset)
 
     def stop_container(self, async=False):
         """
@@ -209,6 +218,26 @@ class Router:
         else:
             return True
 
+    def snapshot_container(self, snapshot, stateful=True):
+        """
+        Take a snapshot of the container associated with this router.
+
+        :param snapshot: The name of the snapshot
+        :param stateful: Whether to save the state of the running processes
+        :return: True if the snapshot has been taken, False otherwise
+        """
+        return self.container.snapshot_container(snapshot, stateful)
+
+    def restore_container(self, snapshot, stateful=True):
+        """
+        Restore the container associated with this router from a snapshot.
+
+        :param snapshot: The name of the snapshot
+        :param stateful: Whether to restore the state of the running processes saved in the snapshot
+        :return: True if the container has been restored, False otherwise
+        """
+        return self.container.restore_container(snapshot, stateful)
+
     def add_client(self, client):
         """
         Add a client to the list of client of this router.
@@ -271,6 +300,7 @@ class Router:
         """
         self.container.delete_neighbor(link.get_node_to())
         del self.links[link.get_node_to()]
+        link.release()
 
         return self
 
@@ -280,7 +310,7 @@ class Router:
 
         :return:
         """
-        del self.routes[next_hop][icn_name]
+        self.routes.remove(next_hop.index, TopologyCore.names.index(icn_name))
 
     def delete_all_routes(self, next_hop):
         """
@@ -289,7 +319,17 @@ class Router:
         :return:
         """
 
-        del self.routes[next_hop]
+        self.routes.remove_next_hop(next_hop.index)
+
+    def reset_routes(self):
+        """
+        Delete all the routes of this node.
+
+        :return: The current :class:`Router` instance
+        """
+
+        self.routes.clear()
+        return self
 
     def add_route(self, node_to, prefix):
         """
@@ -305,12 +345,7 @@ class Router:
                                                                           prefix,
                                                                           node_to))
 
-        route = Route(self, prefix, node_to)
-
-        if node_to in self.routes:
-            self.routes[node_to][prefix] = route
-        else:
-            self.routes[node_to] = {prefix: route}
+        self.routes.add(node_to.index, TopologyCore.names.intern(prefix))
 
         return self
 
@@ -425,19 +460,36 @@ class Router:
         """
         Get the list of L3 routes of this router
 
-        :return: The list of routes on this router.
+        :return: The :class:`Crackle.TopologyCore.Fib` of this router.
         """
         return self.routes
 
+    def iter_routes(self):
+        """
+        Iterate over the L3 routes of this router.
+
+        :return: A generator of :class:`Route`, one for each entry of the routing table
+        """
+
+        node_table = TopologyCore.nodes
+        name_table = TopologyCore.names
+
+        for next_hop, name in self.routes:
+            yield Route(self, name_table[name], node_table.node(next_hop))
+
     def get_route(self, icn_name, node_to):
         """
         Return the route for the name icn_name through node_to
         :param icn_name:
         :param node_to:
         :return:
+        :raises: :class:`KeyError` if the route does not exist
         """
 
-        return self.routes[node_to][icn_name]
+        if not self.routes.contains(node_to.index, TopologyCore.names.index(icn_name)):
+            raise KeyError(icn_name)
+
+        return Route(self, icn_name, node_to)
 
     def get_client_apps(self):
         """
@@ -499,6 +551,26 @@ class Router:
                                           sync=sync,
                                           output=output)
 
+    def run_command_output(self, params):
+        """
+        Run a cmd on this router and capture its output.
+
+        :param params: The list with the command and the parameters
+        :return: The tuple (return code, stdout, stderr), or None if the command cannot be executed
+        """
+
+        return self.container.run_command_output(params)
+
+    def stream_command(self, params, multiplexer):
+        """
+        Start a cmd on this router, streaming its output into a multiplexer with the router as tag.
+
+        :param params: The list with the command and the parameters
+        :param multiplexer: The :class:`Crackle.LxdAPI.OutputMultiplexer`
+        """
+
+        self.container.stream_command(params, multiplexer, str(self))
+
     def __str__(self):
         return self.node_id
 
@@ -525,6 +597,10 @@ class BaseStation(Router):
     :ivar shape: The shape object (Circle, Square, Hexagon)
     """
 
+    __slots__ = ("tap_list", "bs_tap", "bs_vlan", "x", "y", "neighbors", "BS", "shape")
+
+    logger = logging.getLogger(__name__ + ".BaseStation")
+
     def __init__(self,
                  node_id,
                  cache_size,
@@ -540,7 +616,6 @@ class BaseStation(Router):
 
         Router.__init__(self, node_id, cache_size, cache_policy, cache_probability, forward_strategy, container, vlan,
                         mobile)
-        self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
 
         self.tap_list = []
         self.bs_tap = ""
@@ -784,6 +859,11 @@ class Station(Router):
     :ivar speed: The speed of the base station. This parameter makes sense just for the Random Waypoint mobility model.
     """
 
+    __slots__ = ("mobility_model", "starting_point", "mobility_duration", "speed", "boundary_x_0", "boundary_x_max",
+                 "boundary_y_0", "boundary_y_max")
+
+    logger = logging.getLogger(__name__ + ".Station")
+
     def __init__(self,
                  node_id,
                  cache_size,
@@ -804,8 +884,6 @@ class Station(Router):
         Router.__init__(self, node_id, cache_size, cache_policy, cache_probability, forward_strategy,
                         container=container, vlan=1, mobile=mobile)
 
-        self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
-
         self.mobility_model = mobility_model
         self.starting_point = starting_point
         self.mobility_duration = mobility_duration
@@ -992,6 +1070,24 @@ class Station(Router):
         :return:
         """
 
+        params1 = self.default_route_params(next_hop, prefix)
+
+        self.logger.debug("[{0}] Updating default route. Params={1}".format(self.node_id,
+                                                                            params1))
+
+        self.add_route(next_hop, prefix)
+
+        return self.container.run_command(params1)
+
+    def default_route_params(self, next_hop, prefix):
+        """
+        Build the nfdc command that registers the default route of the mobile station toward next_hop.
+
+        :param next_hop: The new next hop for the mobile station
+        :param prefix: The prefix to register
+        :return: The list with the command and its parameters
+        """
+
         if Globals.layer2_prot != layer_2_protocols[4]:
             face = "{0}://{1}:6363".format(Globals.layer2_prot,
                                            next_hop.get_ip_address())
@@ -999,14 +1095,55 @@ class Station(Router):
             face = "ether://[{0}]/{1}".format(next_hop.get_mac_address(),
                                               next_hop)
 
-        params1 = ["nfdc", "register", prefix, face]
+        return ["nfdc", "register", prefix, face]
 
-        self.logger.debug("[{0}] Updating default route. Params={1}".format(self.node_id,
-                                                                            params1))
+    def handoff_commands(self, previous_base_station, next_base_station, prefix=None, make_before_break=False):
+        """
+        Build the commands required to move the current Station from previous_base_station to next_base_station,
+        grouped in two phases: the attach (the new link, face and route of the station and the face of
+        next_base_station) and the detach (the old link and face of the station and the face of
+        previous_base_station). The phases must run one after the other, while the commands of a phase, one per
+        container, can run in parallel.
 
-        self.add_route(next_hop, prefix)
+        The link and faces toward previous_base_station are removed from the local state, the new ones are added.
 
-        return self.container.run_command(params1)
+        :param previous_base_station: The :class:`BaseStation` the station is leaving
+        :param next_base_station: The :class:`BaseStation` the station is attaching to
+        :param prefix: If not None, the default route for this prefix is moved toward next_base_station
+        :param make_before_break: If True the attach phase comes first, otherwise the detach phase comes first
+        :return: The list of the two phases, in execution order. Each phase is a dictionary node => params, where \
+        params is the single command to run on that node
+        """
+
+        def join(commands):
+            return ["/bin/bash", "-c", " && ".join(" ".join(params) for params in commands)]
+
+        old_link = self.links[previous_base_station]
+        new_link = WirelessLink(self, next_base_station, str(next_base_station))
+
+        station_setup = list(new_link.connect_params())
+        station_setup.append(new_link.face_params(__create__, True))
+
+        if prefix is not None:
+            station_setup.append(self.default_route_params(next_base_station, prefix))
+
+        attach = {next_base_station: new_link.face_params(__create__, False),
+                  self: join(station_setup)}
+
+        detach = {self: join([old_link.face_params(__destroy__, True),
+                              old_link.disconnect_params()]),
+                  previous_base_station: old_link.face_params(__destroy__, False)}
+
+        del self.links[previous_base_station]
+        del previous_base_station.get_links()[self]
+
+        self.add_link(new_link)
+        next_base_station.add_link(WirelessLink(next_base_station, self, "wlan0"))
+
+        if prefix is not None:
+            self.add_route(next_base_station, prefix)
+
+        return [attach, detach] if make_before_break else [detach, attach]
 
     # def remove_default_route(self, old_next_hop):
     #     """
@@ -1074,9 +1211,11 @@ class Client:
     :ivar first_req: Boolean that indicates if the first request has been issued
     """
 
-    def __init__(self, client_id, arrival, popularity, name, start_time=0, duration=0):
-        self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
+    __slots__ = ("client_id", "arrival", "popularity", "name", "catalog", "start_time", "duration", "first_req")
+
+    logger = logging.getLogger(__name__ + ".Client")
 
+    def __init__(self, client_id, arrival, popularity, name, start_time=0, duration=0):
         self.client_id = client_id
         self.arrival = arrival
         self.popularity = popularity
@@ -1227,6 +1366,8 @@ class Repo:
 
     """
 
+    __slots__ = ("repo_id", "folder")
+
     def __init__(self, repo_id, f):
         self.repo_id = repo_id
         self.folder = f
@@ -1259,6 +1400,10 @@ class Route:
     :ivar next_hop: The next hop
     """
 
+    __slots__ = ("node", "icn_name", "next_hop")
+
+    logger = logging.getLogger(__name__ + ".Route")
+
     def __init__(self, node, icn_name, next_hop):
         self.node = node
         self.icn_name = icn_name
@@ -1340,6 +1485,9 @@ class Link:
     """
     Class that's representing a generic Link.
     """
+
+    __slots__ = ("node_from", "node_to", "interface")
+
     def __init__(self, node_from, node_to, interface):
         self.node_from = node_from
         self.node_to = node_to
@@ -1408,6 +1556,12 @@ class Link:
     def destroy_face(self):
         raise NotImplementedError()
 
+    def release(self):
+        """
+        Release the resources allocated for this link when it is deleted.
+        """
+        pass
+
 
 class WirelessLink(Link):
     """
@@ -1415,9 +1569,12 @@ class WirelessLink(Link):
     The information contained in this class are used to create a wireless link between node_from and node_to.
     """
 
+    __slots__ = ()
+
+    logger = logging.getLogger(__name__ + ".WirelessLink")
+
     def __init__(self, node_from, node_to, interface):
         Link.__init__(self, node_from, node_to, interface)
-        self.logger = self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
 
     def __str__(self):
         string = "Link(station:\"{0}\", base_station:\"{1}\")".format(
@@ -1447,7 +1604,7 @@ class WirelessLink(Link):
         :return:
         """
 
-        params = ["ip", "link", "set", str(self.node_to), "down"]
+        params = self.disconnect_params()
 
         self.logger.debug("[{0}] Deattaching from base station {1}. Params: {2}".format(self.node_from,
                                                                                         self.node_to,
@@ -1462,8 +1619,7 @@ class WirelessLink(Link):
         :return:
         """
 
-        params = ["ip", "link", "set", str(self.node_to), "up"]
-        params2 = ["ip", "route", "add", self.node_to.get_ip_address(), "dev", str(self.node_to)]
+        params, params2 = self.connect_params()
 
         self.logger.debug("[{0}] Attaching to base station {1}. Params1: {2} Params2: {3}".format(self.node_from,
                                                                                                   self.node_to,
@@ -1472,6 +1628,25 @@ class WirelessLink(Link):
 
         return self.node_from.run_command(params, websocket=False) and self.node_from.run_command(params2, websocket=False)
 
+    def disconnect_params(self):
+        """
+        Build the command that disconnects the station from the base station.
+
+        :return: The list with the command and its parameters
+        """
+
+        return ["ip", "link", "set", str(self.node_to), "down"]
+
+    def connect_params(self):
+        """
+        Build the commands that connect the station to the base station.
+
+        :return: A tuple with the two lists of parameters (interface up, route toward the base station)
+        """
+
+        return (["ip", "link", "set", str(self.node_to), "up"],
+                ["ip", "route", "add", self.node_to.get_ip_address(), "dev", str(self.node_to)])
+
     def face_command(self, operation, station):
         """
         Create/Destroy a face
@@ -1480,6 +1655,19 @@ class WirelessLink(Link):
         :return:
         """
 
+        params = self.face_params(operation, station)
+
+        return self.node_from.run_command(params, websocket=False) if station else self.node_to.run_command(params, websocket=False)
+
+    def face_params(self, operation, station):
+        """
+        Build the nfdc command that creates/destroys the face of this link.
+
+        :param operation: Either create or destroy
+        :param station: True if the command has to be executed on the station, False if on the base station
+        :return: The list with the command and its parameters
+        """
+
         # Sanity check
         if operation not in [__create__, __destroy__]:
             raise RuntimeError("Operation {0} not supported!".format(operation))
@@ -1497,11 +1685,9 @@ class WirelessLink(Link):
                                                    self.node_to.get_mac_address() if station else self.node_from.get_mac_address(
                                                    self.node_to))
 
-        params = ["nfdc",
-                  operation,
-                  face_id]
-
-        return self.node_from.run_command(params, websocket=False) if station else self.node_to.run_command(params, websocket=False)
+        return ["nfdc",
+                operation,
+                face_id]
 
     def destroy_face(self, station=True):
         """
@@ -1530,26 +1716,41 @@ class WiredLink(Link):
     :ivar interface: The name of the interface
     :ivar shaped: Boolean tht indicates if the link is shaped
     :ivar bandwidth: The bandwidth to assign to this link. It is set using linux traffic shapers.
+    :ivar row: The row of this link in the link table of :mod:`Crackle.TopologyCore`, where the capacity and the \
+    addresses of the link are stored
     """
 
+    __slots__ = ("shaped", "row")
+
     def __init__(self, node_from, node_to, interface, shaped, capacity):
         Link.__init__(self, node_from, node_to, interface)
         self.shaped = shaped
-        self.capacity = capacity
-
-        self.tc_burst = self.get_burst(self.capacity)
 
         node_from_mac_address = AddressGenerator.get_mac_address()
         node_from_ip_address = AddressGenerator.get_ip_address("10.2.0.0/16")
         self.node_from.set_mac_address(node_from_mac_address, self.node_to)
         self.node_from.set_ip_address(node_from_ip_address, self.node_to)
 
+        self.row = TopologyCore.links.add(node_from.index,
+                                          node_to.index,
+                                          capacity,
+                                          node_from_ip_address,
+                                          node_from_mac_address)
+
+    @property
+    def capacity(self):
+        return TopologyCore.links.capacity[self.row]
+
+    @property
+    def tc_burst(self):
+        return self.get_burst(self.capacity)
+
     def __str__(self):
         string = "Link(if_id:\"{0}\", node_to:\"{1}\", node_from:\"{2}\"shaped:\"{3}\",bandwidth:\"{4}\",)".format(
                 self.interface,
                 self.node_to,
                 self.node_from,
-                self.is_shaped,
+                self.shaped,
                 self.capacity)
         return string
 
@@ -1735,7 +1936,7 @@ class WiredLink(Link):
 
         :return: The value of the is_shaped variable.
         """
-        return self.is_shaped
+        return self.shaped
 
     def set_shaped(self, shaped):
         """
@@ -1762,5 +1963,11 @@ class WiredLink(Link):
         :param capacity: Tha capacity of the link
         :return: The current :class:`Link` instance
         """
-        self.capacity = capacity
+        TopologyCore.links.capacity[self.row] = capacity
         return self
+
+    def release(self):
+        """
+        Remove this link from the link table.
+        """
+        TopologyCore.links.remove(self.row)
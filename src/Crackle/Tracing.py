@@ -0,0 +1,336 @@
+"""
+This module measures where the time of an experiment goes. The operations are recorded as **spans**: an operation
+name, a category, a start time, a duration and some tags (e.g. the node and the server involved). Spans are recorded
+for:
+
+    - The phases of the setup of the environment
+    - The tasks executed by :func:`Crackle.AsyncManager.start_thread_pool` and by the
+      :class:`Crackle.AsyncManager.TaskGraph`
+    - The HTTP calls to the LXD daemons, including the waits for the LXD operations (see :func:`http_request`)
+    - The commands executed on the servers through SSH (see :class:`TracedPopen`)
+
+The spans can be exported in the Chrome trace format (open chrome://tracing or https://ui.perfetto.dev and load the
+file), with one process for each server and one row for each thread, or summarized in a table with the number of
+calls, the total time, the median, the 95th percentile and the maximum duration of each operation.
+
+The tracing is enabled by setting Globals.tracing to 1.
+"""
+
+import json
+import logging
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+
+import Crackle.Globals as Globals
+
+module_logger = logging.getLogger(__name__)
+
+# Path segments followed by an identifier (container name, operation id...) in the LXD API
+__lxd_collections__ = {"containers", "operations", "operation", "images", "aliases", "snapshots"}
+
+
+class Span:
+    """
+    An operation recorded by the tracer.
+
+    :ivar name: The name of the operation (e.g. "lxd GET /1.0/operations/*/wait")
+    :ivar category: The category of the operation (phase, task, lxd, ssh)
+    :ivar start: The start time, in seconds since the epoch
+    :ivar duration: The duration, in seconds
+    :ivar thread: The identifier of the thread that executed the operation
+    :ivar tags: Additional information (e.g. node, server)
+    """
+
+    __slots__ = ("name", "category", "start", "duration", "thread", "tags")
+
+    def __init__(self, name, category, start, duration, thread, tags):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.duration = duration
+        self.thread = thread
+        self.tags = tags
+
+
+class Tracer:
+    """
+    Collect the spans of the experiment. The spans are appended to a list shared by all the threads.
+
+    :ivar spans: The list of recorded :class:`Span`
+    :ivar lock: The lock protecting the list
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def record(self, name, category, start, duration, **tags):
+        """
+        Record a span.
+
+        :param name: The name of the operation
+        :param category: The category of the operation
+        :param start: The start time, in seconds since the epoch
+        :param duration: The duration, in seconds
+        :param tags: Additional information (e.g. node, server)
+        """
+
+        if not Globals.tracing:
+            return
+
+        s = Span(name, category, start, duration, threading.current_thread().name,
+                 {key: str(value) for key, value in tags.items() if value is not None})
+
+        with self.lock:
+            self.spans.append(s)
+
+    def reset(self):
+        """
+        Remove all the spans.
+        """
+
+        with self.lock:
+            self.spans = []
+
+    def get_spans(self):
+        """
+        :return: A copy of the list of the recorded spans
+        """
+
+        with self.lock:
+            return list(self.spans)
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def span(name, category="task", **tags):
+    """
+    Record the execution of the enclosed block as a span::
+
+        with span("links", "task", node=node, server=node.get_server()):
+            ...
+
+    :param name: The name of the operation
+    :param category: The category of the operation
+    :param tags: Additional information (e.g. node, server)
+    """
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        tracer.record(name, category, start, time.time() - start, **tags)
+
+
+def node_tags(node):
+    """
+    Get the tags identifying a node of the experiment or a server of the cluster.
+
+    :param node: A :class:`Crackle.TopologyStructs.Router` or a :class:`Crackle.ClusterManager.Server`
+    :return: The dictionary of tags (node and server)
+    """
+
+    if hasattr(node, "get_hostname"):
+        return {"server": node.get_hostname()}
+
+    server = None
+    try:
+        server = node.get_server() or None
+    except AttributeError:
+        pass
+
+    return {"node": node, "server": server}
+
+
+def operation_name(url):
+    """
+    Get the name of the operation corresponding to an URL of the LXD API, replacing the identifiers with "*"
+    (e.g. /1.0/containers/r1/exec => /1.0/containers/*/exec).
+
+    :param url: The URL
+    :return: The path of the URL without identifiers
+    """
+
+    segments = urlsplit(url).path.split("/")
+
+    return "/".join("*" if i > 0 and segments[i - 1] in __lxd_collections__ else segment
+                    for i, segment in enumerate(segments))
+
+
+def http_request(method, url, **kwargs):
+    """
+    Execute an HTTP request with the requests module, recording it as a span tagged with the server and the
+    container.
+
+    :param method: The HTTP method (GET, POST, PUT, DELETE)
+    :param url: The URL
+    :param kwargs: The other parameters of :func:`requests.request`
+    :return: The response
+    """
+
+    parts = urlsplit(url)
+    segments = parts.path.split("/")
+    container = segments[segments.index("containers") + 1] if "containers" in segments[:-1] else None
+
+    with span("lxd {0} {1}".format(method, operation_name(url)), "lxd", server=parts.hostname, node=container):
+        return requests.request(method, url=url, **kwargs)
+
+
+class TracedPopen(subprocess.Popen):
+    """
+    Popen that records the execution of the command as a span, from its start to the moment :meth:`wait` (or
+    :meth:`communicate`) sees it terminated. The name of the operation is the name of the command, and for SSH
+    commands the span is tagged with the remote server.
+    """
+
+    def __init__(self, args, *popen_args, **kwargs):
+        self.trace_start = time.time()
+        self.trace_recorded = False
+
+        command = args[0] if isinstance(args, (list, tuple)) else str(args).split()[0]
+        self.trace_name = str(command).split("/")[-1]
+        self.trace_server = None
+
+        if self.trace_name.startswith("ssh") and isinstance(args, (list, tuple)):
+            destinations = [str(a) for a in args if "@" in str(a) and not str(a).startswith("-")]
+            if destinations:
+                self.trace_server = destinations[0].split("@")[-1]
+
+        subprocess.Popen.__init__(self, args, *popen_args, **kwargs)
+
+    def trace(self):
+        if not self.trace_recorded and self.returncode is not None:
+            self.trace_recorded = True
+            tracer.record(self.trace_name, "ssh" if self.trace_name.startswith("ssh") else "process",
+                          self.trace_start, time.time() - self.trace_start,
+                          server=self.trace_server, returncode=self.returncode)
+
+    def wait(self, *args, **kwargs):
+        returncode = subprocess.Popen.wait(self, *args, **kwargs)
+        self.trace()
+        return returncode
+
+    def communicate(self, *args, **kwargs):
+        result = subprocess.Popen.communicate(self, *args, **kwargs)
+        self.trace()
+        return result
+
+
+def percentile(values, p):
+    """
+    Compute a percentile with the nearest rank method.
+
+    :param values: The sorted list of values
+    :param p: The percentile, between 0 and 100
+    :return: The percentile of the values
+    """
+
+    if not values:
+        return 0.0
+
+    rank = max(int(-(-p * len(values) // 100)), 1)
+
+    return values[min(rank, len(values)) - 1]
+
+
+def summary(spans=None):
+    """
+    Summarize the spans by operation.
+
+    :param spans: The spans to summarize (by default all the recorded ones)
+    :return: The list of tuples (category, name, count, total, p50, p95, max), sorted by total time
+    """
+
+    durations = defaultdict(list)
+
+    for s in tracer.get_spans() if spans is None else spans:
+        durations[(s.category, s.name)].append(s.duration)
+
+    rows = []
+
+    for (category, name), values in durations.items():
+        values.sort()
+        rows.append((category, name, len(values), sum(values),
+                     percentile(values, 50), percentile(values, 95), values[-1]))
+
+    return sorted(rows, key=lambda row: -row[3])
+
+
+def format_summary(spans=None):
+    """
+    Format the summary of the spans as a table.
+
+    :param spans: The spans to summarize (by default all the recorded ones)
+    :return: The table, as a string
+    """
+
+    rows = summary(spans)
+
+    if not rows:
+        return "No operation recorded."
+
+    width = max(len(row[1]) for row in rows)
+    header = "{0:<8} {1:<{w}} {2:>7} {3:>10} {4:>9} {5:>9} {6:>9}".format("Category", "Operation", "Count",
+                                                                         "Total(s)", "p50(ms)", "p95(ms)", "Max(ms)",
+                                                                         w=width)
+    lines = [header, "-" * len(header)]
+
+    for category, name, count, total, p50, p95, maximum in rows:
+        lines.append("{0:<8} {1:<{w}} {2:>7} {3:>10.2f} {4:>9.1f} {5:>9.1f} {6:>9.1f}".format(category, name, count,
+                                                                                           total, p50 * 1000,
+                                                                                           p95 * 1000,
+                                                                                           maximum * 1000,
+                                                                                           w=width))
+
+    return "\n".join(lines)
+
+
+def export_chrome_trace(path, spans=None):
+    """
+    Write the spans in the Chrome trace event format. Each server is a process and each thread is a row.
+
+    :param path: The path of the output file
+    :param spans: The spans to export (by default all the recorded ones)
+    :return: The number of exported spans
+    """
+
+    spans = tracer.get_spans() if spans is None else spans
+
+    processes = {}
+    threads = {}
+    events = []
+
+    for s in spans:
+        process = s.tags.get("server", "crackle")
+        pid = processes.setdefault(process, len(processes) + 1)
+        tid = threads.setdefault((pid, s.thread), len(threads) + 1)
+
+        events.append({"name": s.name,
+                       "cat": s.category,
+                       "ph": "X",
+                       "ts": s.start * 1000000,
+                       "dur": s.duration * 1000000,
+                       "pid": pid,
+                       "tid": tid,
+                       "args": s.tags})
+
+    for process, pid in processes.items():
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process}})
+
+    for (pid, thread), tid in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}})
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    module_logger.info("{0} spans exported in {1}".format(len(spans), path))
+
+    return len(spans)
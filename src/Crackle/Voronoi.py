@@ -0,0 +1,197 @@
+"""
+This module computes the cells of the base stations, i.e. the Voronoi diagram of the base station positions bounded by
+the mobility area. It replaces the function compute_2d_voronoi of pyvoro, and it returns the cells in the same format::
+
+    [{"original": (x, y), "vertices": [(x1, y1), (x2, y2), ...]}, ...]
+
+The diagram is computed in one shot for all the base stations with :class:`scipy.spatial.Voronoi`. In order to bound
+the cells, 4 points far away from the mobility area are added to the base stations: in this way all the cells are
+finite, and each one is then clipped against the sides of the area. The base stations may lie on the sides or on the
+corners of the area.
+
+Since the geometry depends only on the positions of the base stations and on the mobility area, the cells are cached
+on disk and reused when the same topology is loaded again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy
+from scipy.spatial import Voronoi
+
+import Crackle.Constants as Constants
+
+module_logger = logging.getLogger(__name__)
+
+# Changed when the computation of the cells changes, so that the cells cached before are not used
+__cache_version__ = 2
+
+
+def cache_key(points, limits):
+    """
+    Compute the key identifying a set of base station positions in a certain mobility area.
+
+    :param points: The list of (x, y) positions of the base stations
+    :param limits: The mobility area, as [(x_0, x_max), (y_0, y_max)]
+    :return: The hex digest identifying the input of the computation
+    """
+
+    description = json.dumps([__cache_version__,
+                              sorted([float(x), float(y)] for x, y in points),
+                              [[float(l) for l in limit] for limit in limits]])
+
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def load_cells(key):
+    """
+    Load the cells corresponding to key from the cache.
+
+    :param key: The key returned by :func:`cache_key`
+    :return: The list of cells, or None if they are not in the cache
+    """
+
+    cache_file = os.path.join(Constants.voronoi_cache_dir, key + ".json")
+
+    try:
+        with open(cache_file, "r") as f:
+            cells = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    return [{"original": tuple(cell["original"]),
+             "vertices": [tuple(v) for v in cell["vertices"]]} for cell in cells]
+
+
+def store_cells(key, cells):
+    """
+    Store the cells in the cache.
+
+    :param key: The key returned by :func:`cache_key`
+    :param cells: The list of cells
+    """
+
+    cache_file = os.path.join(Constants.voronoi_cache_dir, key + ".json")
+
+    try:
+        os.makedirs(Constants.voronoi_cache_dir, exist_ok=True)
+        with open(cache_file + ".tmp", "w") as f:
+            json.dump(cells, f)
+        os.replace(cache_file + ".tmp", cache_file)
+    except OSError as error:
+        module_logger.warning("Error writing the voronoi cache {0}: {1}".format(cache_file, error))
+
+
+def clip_polygon(polygon, limits):
+    """
+    Clip a convex polygon against a rectangle (Sutherland-Hodgman).
+
+    :param polygon: The list of (x, y) vertices of the polygon, in order
+    :param limits: The rectangle, as [(x_0, x_max), (y_0, y_max)]
+    :return: The list of vertices of the clipped polygon, in the same order
+    """
+
+    (x_0, x_max), (y_0, y_max) = limits
+
+    # Each side as (axis, bound, sign): a point is inside if sign * (point[axis] - bound) >= 0
+    for axis, bound, sign in ((0, x_0, 1), (0, x_max, -1), (1, y_0, 1), (1, y_max, -1)):
+        clipped = []
+
+        for i, current in enumerate(polygon):
+            previous = polygon[i - 1]
+            current_inside = sign * (current[axis] - bound) >= 0
+            previous_inside = sign * (previous[axis] - bound) >= 0
+
+            if current_inside != previous_inside:
+                t = (bound - previous[axis]) / (current[axis] - previous[axis])
+                crossing = [previous[0] + t * (current[0] - previous[0]), previous[1] + t * (current[1] - previous[1])]
+                crossing[axis] = bound
+                clipped.append(tuple(crossing))
+            if current_inside:
+                clipped.append(tuple(current))
+
+        polygon = clipped
+
+    return polygon
+
+
+def bounded_voronoi(points, limits):
+    """
+    Compute the Voronoi cells of points, bounded by the rectangle described by limits.
+
+    :param points: The list of (x, y) positions of the base stations
+    :param limits: The mobility area, as [(x_0, x_max), (y_0, y_max)]
+    :return: The list of cells
+    """
+
+    (x_0, x_max), (y_0, y_max) = [(float(l[0]), float(l[1])) for l in limits]
+
+    original = numpy.array(points, dtype=float).reshape(-1, 2)
+
+    if numpy.any(original[:, 0] < x_0) or numpy.any(original[:, 0] > x_max) or \
+            numpy.any(original[:, 1] < y_0) or numpy.any(original[:, 1] > y_max):
+        raise SyntaxError("Base station outside of the mobility area.")
+
+    # Far points, so that every cell is finite and contains the part of the area closest to its base station
+    size = max(x_max - x_0, y_max - y_0, 1.0) * 10
+    far = numpy.array([(x_0 - size, y_0 - size), (x_max + size, y_0 - size),
+                       (x_max + size, y_max + size), (x_0 - size, y_max + size)])
+
+    vor = Voronoi(numpy.concatenate([original, far]))
+
+    cells = []
+
+    for i, point in enumerate(original):
+        region = vor.vertices[vor.regions[vor.point_region[i]]]
+
+        # Order the vertices counterclockwise around the base station, then clip the cell
+        angles = numpy.arctan2(region[:, 1] - point[1], region[:, 0] - point[0])
+        polygon = clip_polygon(region[numpy.argsort(angles)].tolist(), [(x_0, x_max), (y_0, y_max)])
+
+        # Remove the vertices repeated by the clipping
+        cell_vertices = []
+        for vertex in polygon:
+            if not any(numpy.isclose(vertex, v).all() for v in cell_vertices):
+                cell_vertices.append(vertex)
+
+        # Sort the vertices counterclockwise around the center of the cell (the base station may be a vertex)
+        cell_vertices = numpy.array(cell_vertices)
+        center = cell_vertices.mean(axis=0)
+        angles = numpy.arctan2(cell_vertices[:, 1] - center[1], cell_vertices[:, 0] - center[0])
+        cell_vertices = cell_vertices[numpy.argsort(angles)]
+
+        cells.append({"original": (float(point[0]), float(point[1])),
+                      "vertices": [(float(x), float(y)) for x, y in cell_vertices]})
+
+    return cells
+
+
+def compute_2d_voronoi(points, limits, dispersion=2.0):
+    """
+    Compute the cells of the base stations, using the cache if the same input has already been computed.
+
+    :param points: The list of (x, y) positions of the base stations
+    :param limits: The mobility area, as [(x_0, x_max), (y_0, y_max)]
+    :param dispersion: Not used. Kept for compatibility with pyvoro
+    :return: The list of cells, each one as a dictionary {"original": (x, y), "vertices": [(x1, y1), ...]}
+    """
+
+    if not points:
+        return []
+
+    key = cache_key(points, limits)
+
+    cells = load_cells(key)
+
+    if cells is not None:
+        module_logger.debug("Voronoi cells loaded from cache. Key={0}".format(key))
+        return cells
+
+    module_logger.debug("Computing voronoi cells for {0} base stations".format(len(points)))
+
+    cells = bounded_voronoi(points, limits)
+    store_cells(key, cells)
+
+    return cells
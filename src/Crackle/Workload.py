@@ -0,0 +1,533 @@
+"""
+This module generates and executes the workload of the clients, following the parameters of workload.conf:
+
+    - **arrival**: the process of the requests of the client, e.g. *Poisson_2* (2 requests per second on average, with
+      exponential inter-arrival times) or *Constant_2* (one request every 0.5 seconds)
+    - **popularity**: the distribution of the requested contents, e.g. *rzipf_1.3_100* (a catalog of 100 contents whose
+      popularity follows a Zipf law with exponent 1.3). The content of rank k is <name>/<k>
+    - **start time** and **duration**: the window, relative to the start of the test, in which the client sends its
+      requests. A duration of 0 means until the end of the test (Globals.test_duration)
+
+The timeline of the requests of all the clients is generated on the controller before the test, and executed in one of
+two ways:
+
+    - **dispatch**: the controller starts each request at its scheduled time, with one command execution in the
+      container for each request, on a pool of at most Globals.workload_workers threads
+    - **replay** (Globals.workload_replay): the timeline of each node is written as a compact binary **trace**, pushed
+      once in the container together with a small driver (:data:`replay_script`), and replayed inside the container.
+      The controller is not involved in the single requests, so long tests with millions of requests are possible
+
+At the end the rate achieved by each client is compared with the target rate, together with the delay of the requests
+with respect to their schedule.
+
+A trace has a header (magic, number of clients, then the length and the name of each client as ``!H`` + bytes, then
+the number of requests as ``!I``) followed by one record for each request, sorted by time: the scheduled time since
+the start of the test, the index of the client and the rank of the content, as ``<dHI`` (14 bytes). The containers
+of the different servers start the replay at the same time of the controller clock, so the clocks of the servers
+have to be synchronized (e.g. with NTP).
+"""
+
+import collections
+import concurrent.futures
+import heapq
+import logging
+import struct
+import threading
+import time
+
+import numpy
+
+import Crackle.Globals as Globals
+from Crackle.AsyncManager import start_thread_pool
+from Crackle.Tracing import percentile
+
+module_logger = logging.getLogger(__name__)
+
+__poisson__ = "poisson"
+__constant__ = "constant"
+__zipf__ = ("rzipf", "zipf")
+
+__trace_magic__ = b"CRT1"
+__trace_record__ = numpy.dtype([("time", "<f8"), ("client", "<u2"), ("rank", "<u4")])
+
+# Paths of the driver and of the trace inside the containers
+__replay_script_path__ = "/root/trace_replay.py"
+__trace_path__ = "/root/{0}_trace.bin"
+
+# Time left to the containers to start the driver before the first request, in seconds
+__replay_lead_time__ = 5
+
+# Executed inside the containers: python3 trace_replay.py <trace> <start time since the epoch> <workers>
+# It prints one line for each request: client index, scheduled time, start and end time since the epoch, return code
+# and name
+replay_script = r"""
+import struct, subprocess, sys, threading, time
+trace, start, workers = sys.argv[1], float(sys.argv[2]), int(sys.argv[3])
+with open(trace, "rb") as f:
+    data = f.read()
+if data[:4] != b"CRT1":
+    sys.exit("Invalid trace " + trace)
+offset, names = 8, []
+for _ in range(struct.unpack_from("!I", data, 4)[0]):
+    length = struct.unpack_from("!H", data, offset)[0]
+    names.append(data[offset + 2:offset + 2 + length].decode())
+    offset += 2 + length
+count = struct.unpack_from("!I", data, offset)[0]
+offset += 4
+record = struct.Struct("<dHI")
+slots = threading.BoundedSemaphore(workers)
+lock = threading.Lock()
+def run(client, scheduled, name):
+    started = time.time()
+    try:
+        rc = subprocess.call(["ndn-icp-download", "-u", name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        rc = 127
+    line = "%d %.6f %.6f %.6f %d %s\n" % (client, scheduled, started, time.time(), rc, name)
+    with lock:
+        sys.stdout.write(line)
+    slots.release()
+for i in range(count):
+    scheduled, client, rank = record.unpack_from(data, offset + i * record.size)
+    delay = start + scheduled - time.time()
+    if delay > 0:
+        time.sleep(delay)
+    slots.acquire()
+    threading.Thread(target=run, args=(client, scheduled, "%s/%d" % (names[client], rank))).start()
+for _ in range(workers):
+    slots.acquire()
+sys.stdout.flush()
+"""
+
+
+def parse_arrival(arrival):
+    """
+    Parse the arrival process of a client.
+
+    :param arrival: The arrival process, as <Poisson|Constant>_<rate>
+    :return: The tuple (process, rate in requests per second)
+    :raise: RuntimeError if the arrival process is not recognized
+    """
+
+    parts = str(arrival).split("_")
+
+    try:
+        process, rate = parts[0].lower(), float(parts[1])
+    except (IndexError, ValueError):
+        raise RuntimeError("Arrival process {0} not recognized".format(arrival))
+
+    if process not in (__poisson__, __constant__) or rate <= 0:
+        raise RuntimeError("Arrival process {0} not recognized".format(arrival))
+
+    return process, rate
+
+
+def parse_popularity(popularity):
+    """
+    Parse the popularity of the contents requested by a client.
+
+    :param popularity: The popularity, as rzipf_<exponent>_<catalog size>
+    :return: The tuple (exponent, catalog size)
+    :raise: RuntimeError if the popularity is not recognized
+    """
+
+    parts = str(popularity).split("_")
+
+    try:
+        if parts[0].lower() not in __zipf__:
+            raise ValueError
+        exponent, size = float(parts[1]), int(parts[2])
+    except (IndexError, ValueError):
+        raise RuntimeError("Popularity {0} not recognized".format(popularity))
+
+    if size < 1:
+        raise RuntimeError("Popularity {0} not recognized".format(popularity))
+
+    return exponent, size
+
+
+def zipf_probabilities(exponent, size):
+    """
+    :param exponent: The exponent of the Zipf law
+    :param size: The size of the catalog
+    :return: The array of the probabilities of the contents of rank 1...size
+    """
+
+    weights = numpy.arange(1, size + 1, dtype=numpy.float64) ** -exponent
+
+    return weights / weights.sum()
+
+
+class Request:
+    """
+    A request of a client.
+
+    :ivar time: The scheduled time, in seconds since the start of the test
+    :ivar node: The node of the client
+    :ivar client: The :class:`Crackle.TopologyStructs.Client`
+    :ivar name: The requested name
+    """
+
+    __slots__ = ("time", "node", "client", "name")
+
+    def __init__(self, time, node, client, name):
+        self.time = time
+        self.node = node
+        self.client = client
+        self.name = name
+
+    def __lt__(self, other):
+        return self.time < other.time
+
+
+def client_window(client, test_duration):
+    """
+    Get the window in which a client sends its requests.
+
+    :param client: The :class:`Crackle.TopologyStructs.Client`
+    :param test_duration: The duration of the test, in seconds
+    :return: The tuple (start, end), in seconds since the start of the test
+    """
+
+    start = float(client.get_start_time())
+    end = start + client.get_duration() if client.get_duration() > 0 else test_duration
+
+    return start, min(end, test_duration) if test_duration else end
+
+
+def sample_timeline(client, test_duration, random_state):
+    """
+    Sample the times and the content ranks of the requests of a client.
+
+    :param client: The :class:`Crackle.TopologyStructs.Client`
+    :param test_duration: The duration of the test, in seconds
+    :param random_state: The :class:`numpy.random.RandomState`
+    :return: The tuple (array of the times in seconds since the start of the test, array of the ranks), sorted by time
+    :raise: RuntimeError if the arrival process or the popularity are not recognized
+    """
+
+    process, rate = parse_arrival(client.get_arrival())
+    exponent, size = parse_popularity(client.get_popularity())
+    start, end = client_window(client, test_duration)
+
+    if end <= start:
+        return numpy.empty(0), numpy.empty(0, dtype=numpy.int64)
+
+    # Draw enough inter-arrival times to cover the window, then cut the timeline at its end
+    expected = int((end - start) * rate)
+    count = expected + 4 * int(expected ** 0.5) + 10
+
+    if process == __poisson__:
+        times = start + numpy.cumsum(random_state.exponential(1 / rate, count))
+    else:
+        times = start + numpy.arange(count) / rate
+
+    times = times[times < end]
+    ranks = random_state.choice(size, len(times), p=zipf_probabilities(exponent, size)) + 1
+
+    return times, ranks
+
+
+def generate_requests(node, client, test_duration, random_state):
+    """
+    Generate the timeline of the requests of a client.
+
+    :param node: The node of the client
+    :param client: The :class:`Crackle.TopologyStructs.Client`
+    :param test_duration: The duration of the test, in seconds
+    :param random_state: The :class:`numpy.random.RandomState`
+    :return: The list of :class:`Request`, sorted by time
+    :raise: RuntimeError if the arrival process or the popularity are not recognized
+    """
+
+    times, ranks = sample_timeline(client, test_duration, random_state)
+    name = client.get_name().rstrip("/")
+
+    return [Request(float(t), node, client, "{0}/{1}".format(name, r)) for t, r in zip(times, ranks)]
+
+
+def build_trace(clients, test_duration, random_state):
+    """
+    Build the trace of the requests of the clients of a node.
+
+    :param clients: The list of :class:`Crackle.TopologyStructs.Client` of the node
+    :param test_duration: The duration of the test, in seconds
+    :param random_state: The :class:`numpy.random.RandomState`
+    :return: The array of the records of the requests (time, client index, rank), sorted by time
+    :raise: RuntimeError if the workload of a client is not valid
+    """
+
+    timelines = [sample_timeline(client, test_duration, random_state) for client in clients]
+    records = numpy.empty(sum(len(times) for times, _ in timelines), dtype=__trace_record__)
+
+    offset = 0
+    for index, (times, ranks) in enumerate(timelines):
+        records["time"][offset:offset + len(times)] = times
+        records["client"][offset:offset + len(times)] = index
+        records["rank"][offset:offset + len(times)] = ranks
+        offset += len(times)
+
+    return records[numpy.argsort(records["time"], kind="mergesort")]
+
+
+def encode_trace(clients, records):
+    """
+    Encode a trace in the binary format read by :data:`replay_script`.
+
+    :param clients: The list of :class:`Crackle.TopologyStructs.Client` of the node
+    :param records: The records returned by :func:`build_trace`
+    :return: The trace, as bytes
+    """
+
+    parts = [__trace_magic__, struct.pack("!I", len(clients))]
+
+    for client in clients:
+        name = client.get_name().rstrip("/").encode()
+        parts.append(struct.pack("!H", len(name)) + name)
+
+    parts.append(struct.pack("!I", len(records)))
+    parts.append(records.tobytes())
+
+    return b"".join(parts)
+
+
+class WorkloadEngine:
+    """
+    Generate the requests of the clients and execute them at their scheduled time.
+
+    :ivar node_list: The dictionary node_id => node of the experiment
+    :ivar download: The function executing a request: download(node, client, name) => :class:`DownloadReport`
+    :ivar requests: The generated requests, sorted by time
+    :ivar reports: The list of tuples (request, actual start time since the start of the test, report)
+    :ivar traces: The records of the requests of each node, for the replay (node => array)
+    """
+
+    def __init__(self, node_list, download):
+        self.logger = logging.getLogger(__name__ + "." + type(self).__name__)
+        self.node_list = node_list
+        self.download = download
+        self.requests = []
+        self.reports = []
+        self.lock = threading.Lock()
+        self.stopper = threading.Event()
+        self.duration = 0
+        self.traces = {}
+
+    def generate(self, test_duration=None, seed=None):
+        """
+        Generate the timeline of the requests of all the clients.
+
+        :param test_duration: The duration of the test, in seconds (by default Globals.test_duration)
+        :param seed: The seed of the random generator (by default Globals.workload_seed, random if 0)
+        :return: The number of generated requests
+        :raise: RuntimeError if the workload of a client is not valid
+        """
+
+        self.duration = float(test_duration or Globals.test_duration or 0)
+        seed = seed if seed is not None else int(Globals.workload_seed) or None
+        random_state = numpy.random.RandomState(seed)
+
+        timelines = []
+
+        for node in self.node_list.values():
+            for client in node.get_client_apps():
+                timelines.append(generate_requests(node, client, self.duration, random_state))
+
+        self.requests = list(heapq.merge(*timelines))
+
+        self.logger.info("{0} requests generated for {1} clients in {2}s".format(len(self.requests),
+                                                                                  len(timelines),
+                                                                                  self.duration))
+
+        return len(self.requests)
+
+    def execute(self, request, start):
+        """
+        Execute a request and record its report.
+
+        :param request: The :class:`Request`
+        :param start: The start time of the test, in seconds since the epoch
+        """
+
+        started = time.time() - start
+        report = self.download(request.node, request.client, request.name)
+
+        with self.lock:
+            self.reports.append((request, started, report))
+
+    def run(self, workers=None):
+        """
+        Dispatch the requests at their scheduled time and wait for their end.
+
+        :param workers: The maximum number of requests executed at the same time (by default Globals.workload_workers)
+        :return: The list of the reports of the requests
+        """
+
+        workers = int(workers or Globals.workload_workers)
+        self.reports = []
+        self.stopper.clear()
+
+        start = time.time()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for request in self.requests:
+                delay = start + request.time - time.time()
+                if delay > 0 and self.stopper.wait(delay):
+                    break
+                executor.submit(self.execute, request, start)
+
+        self.logger.info("{0} requests executed in {1:.1f}s".format(len(self.reports), time.time() - start))
+
+        return [report for _, _, report in self.reports]
+
+    def generate_traces(self, test_duration=None, seed=None):
+        """
+        Generate the trace of the requests of each node, for the replay inside the containers.
+
+        :param test_duration: The duration of the test, in seconds (by default Globals.test_duration)
+        :param seed: The seed of the random generator (by default Globals.workload_seed, random if 0)
+        :return: The number of generated requests
+        :raise: RuntimeError if the workload of a client is not valid
+        """
+
+        self.duration = float(test_duration or Globals.test_duration or 0)
+        seed = seed if seed is not None else int(Globals.workload_seed) or None
+        random_state = numpy.random.RandomState(seed)
+
+        self.traces = {node: build_trace(node.get_client_apps(), self.duration, random_state)
+                       for node in self.node_list.values() if node.get_client_apps()}
+
+        total = sum(len(records) for records in self.traces.values())
+
+        self.logger.info("{0} requests generated for {1} nodes in {2}s".format(total, len(self.traces),
+                                                                               self.duration))
+
+        return total
+
+    def push_traces(self):
+        """
+        Push the driver and the trace of each node inside its container.
+
+        :return: True if the push succeed on all the nodes, False otherwise
+        """
+
+        def push_trace(node, results):
+            trace = encode_trace(node.get_client_apps(), self.traces[node])
+            results[node] = node.push_file(None, __replay_script_path__, data=replay_script.encode()) and \
+                node.push_file(None, __trace_path__.format(node), data=trace)
+
+            if not results[node]:
+                self.logger.error("[{0}] Error pushing the trace".format(node))
+
+        return start_thread_pool(list(self.traces), push_trace)
+
+    def replay(self, workers=None):
+        """
+        Replay the traces inside the containers and wait for their end. The replay starts at the same time on all the
+        nodes, and the output of the drivers is collected at the end.
+
+        :param workers: The maximum number of requests executed at the same time on each node (by default
+                        Globals.workload_workers)
+        :return: The list of the reports of the requests
+        """
+
+        from Crackle.NDNManager import DownloadReport
+
+        workers = int(workers or Globals.workload_workers)
+        self.reports = []
+
+        start = time.time() + __replay_lead_time__
+
+        def replay_trace(node, results):
+            ret = node.run_command_output(["python3",
+                                           __replay_script_path__,
+                                           __trace_path__.format(node),
+                                           "{0:.6f}".format(start),
+                                           str(workers)])
+
+            if ret is None or ret[0] != 0:
+                self.logger.error("[{0}] Error replaying the trace: {1}".format(node, ret[2] if ret else None))
+                results[node] = False
+
+            clients = node.get_client_apps()
+            reports = []
+
+            for line in (ret[1].splitlines() if ret else []):
+                try:
+                    client, scheduled, started, ended, rc, name = line.split(" ", 5)
+                    client = clients[int(client)]
+                    report = DownloadReport(node, client.get_client_id(), name, float(started), float(ended),
+                                            int(rc))
+                    reports.append((Request(float(scheduled), node, client, name), float(started) - start, report))
+                except (ValueError, IndexError):
+                    self.logger.warning("[{0}] Unexpected replay output: {1}".format(node, line))
+
+            with self.lock:
+                self.reports.extend(reports)
+
+            results.setdefault(node, True)
+
+        start_thread_pool(list(self.traces), replay_trace)
+
+        self.logger.info("{0} requests replayed in {1:.1f}s".format(len(self.reports), time.time() - start))
+
+        return [report for _, _, report in self.reports]
+
+    def stop(self):
+        """
+        Stop dispatching new requests.
+        """
+
+        self.stopper.set()
+
+    def client_rates(self):
+        """
+        Compare, for each client, the target request rate with the rate achieved in the test.
+
+        :return: The list of tuples (client id, target rate, achieved rate, requests, completed requests), where the
+                 achieved rate counts the requests started inside the window of the client
+        """
+
+        started = collections.defaultdict(list)
+        completed = collections.Counter()
+
+        for request, actual, report in self.reports:
+            started[request.client].append(actual)
+            if report.is_successful():
+                completed[request.client] += 1
+
+        rows = []
+
+        for node in self.node_list.values():
+            for client in node.get_client_apps():
+                _, rate = parse_arrival(client.get_arrival())
+                window_start, window_end = client_window(client, self.duration)
+                length = max(window_end - window_start, 1e-6)
+                in_window = sum(1 for t in started[client] if window_start <= t < window_end)
+                rows.append((client.get_client_id(), rate, in_window / length, len(started[client]),
+                             completed[client]))
+
+        return rows
+
+    def format_summary(self):
+        """
+        Format the target and achieved rates of the clients and the delay of the requests with respect to their
+        schedule.
+
+        :return: The summary, as a string
+        """
+
+        lines = ["{0:<20} {1:>12} {2:>14} {3:>9} {4:>10}".format("Client", "Target(r/s)", "Achieved(r/s)",
+                                                                "Requests", "Completed")]
+
+        for client_id, target, achieved, requests, completed in self.client_rates():
+            lines.append("{0:<20} {1:>12.2f} {2:>14.2f} {3:>9} {4:>10}".format(client_id, target, achieved, requests,
+                                                                               completed))
+
+        delays = sorted(max(actual - request.time, 0) for request, actual, _ in self.reports)
+
+        if delays:
+            lines.append("Dispatch delay (ms): p50 {0:.1f}, p95 {1:.1f}, max {2:.1f}".format(
+                    percentile(delays, 50) * 1000, percentile(delays, 95) * 1000, delays[-1] * 1000))
+
+        return "\n".join(lines)
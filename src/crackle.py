@@ -2,6 +2,7 @@
 import argparse
 import os
 import shutil
+import signal
 import sys
 import time
 import traceback
@@ -15,6 +16,11 @@ from Crackle.CommandLineInterface import CrackleCmd
 from Crackle.ConfigReader import ConfigReader
 from Crackle.MobilityManager import MobilityManager
 from Crackle.ClusterManager import ClusterManager
+from Crackle.SetupPipeline import run_setup_pipeline
+from Crackle import Tracing
+from Crackle import StatsStore
+from Crackle.ExperimentRunner import Experiment, ExperimentRunner
+from Crackle import Sweep
 
 # _DEBUG=True
 _DEBUG = False
@@ -41,23 +47,76 @@ batch_usage = make_colored("green",
                                   in the experiment
               - settings.conf  -> it contains the settings for the experiment regarding username, file locations ...
         -n n_times: execute the test multiple times
+        -e experiment_id: use this experiment id instead of the one in settings.conf
+        -c: set up the cluster and create the containers before the test, and remove them at the end
+        -p folder [folder ...]: run the experiments of several folders at the same time on the cluster
+        -w sweep_spec: run a parameter sweep (see Crackle.Sweep)
     """)
 
 
-def setup(ndn, net, mobility):
-    shutil.rmtree(MyGlobals.log_dir + "/*")
-    net.create_scripts()
-    net.create_links()
-    net.set_stats()
-    ndn.start_nfd()
-    ndn.start_repositories()
-    ndn.configure_router()
-    ndn.create_routing_scripts()
-    ndn.set_ndn_routing()
+def setup(ndn, net, mobility, create_containers=False):
+    shutil.rmtree(MyGlobals.log_dir, ignore_errors=True)
+    os.makedirs(MyGlobals.log_dir, exist_ok=True)
+    with Tracing.span("setup_pipeline", "phase"):
+        graph = run_setup_pipeline(net.node_list, net, ndn, create_containers=create_containers,
+                                   start_services=not create_containers)
+    print(make_colored("blue", graph.report()))
     time.sleep(10)
 
     # TODO Start test function call
 
+    return not graph.failed_tasks()
+
+
+def create_environment(cluster, ndn, net, mobility):
+    """
+    Set up the cluster (placement, bridge and tunnels of the experiment) and create, start and configure the
+    containers of the experiment.
+
+    :return: True if the environment has been created, False otherwise
+    """
+
+    with Tracing.span("setup_cluster", "phase"):
+        if not cluster.setup_cluster():
+            print(make_colored("red", " * Error setting up the cluster."))
+            return False
+
+    if not setup(ndn, net, mobility, create_containers=True):
+        print(make_colored("red", " * Error creating the containers."))
+        return False
+
+    return True
+
+
+def clean_environment(cluster, net, mobility):
+    """
+    Remove the containers of the experiment and clean the cluster, as the command line interface does when exiting.
+    """
+
+    print(make_colored("green", " * Cleaning the cluster."))
+    mobility.kill_threads()
+    mobility.clean_servers()
+    if not net.stop_containers():
+        net.delete_containers()
+    cluster.clean_cluster()
+
+
+def restore(ndn, net, mobility):
+    mobility.kill_threads()
+    with Tracing.span("restore_containers", "phase"):
+        if not net.restore_containers():
+            print(make_colored("red", " * Error restoring the containers, setting up the environment again."))
+            return False
+    # The stateless snapshots do not keep links, faces and routes: set them up again on the restored containers
+    if not MyGlobals.snapshot_stateful:
+        with Tracing.span("setup_pipeline", "phase"):
+            graph = run_setup_pipeline(net.node_list, net, ndn, create_containers=False, start_services=True)
+        if graph.failed_tasks():
+            print(make_colored("red", " * Error setting up the restored containers, setting up the environment "
+                                      "again."))
+            return False
+    return mobility.setup_mobility()
+
 
 def main():
 
@@ -79,16 +138,39 @@ def main():
                              "file locations ...")
     parser.add_argument('-t', action='store_true', help='Start test in background')
     parser.add_argument('-n', metavar='n_times', type=int,  help='Execute the test multiple times')
+    parser.add_argument('-e', metavar='experiment_id', help='Use this experiment id instead of the one in settings.conf')
+    parser.add_argument('-p', metavar='folder', nargs='+',
+                        help='Run the experiments of several configuration folders at the same time on the cluster')
+    parser.add_argument('-w', metavar='sweep_spec', help='Run the parameter sweep described in sweep_spec')
+    parser.add_argument('--points', action='store_true',
+                        help='Test the points of a parameter sweep listed in the configuration folder (used by -w)')
+    parser.add_argument('-c', action='store_true',
+                        help='Set up the cluster and create the containers before the test, and remove them at the end '
+                             '(used by -p and -w)')
 
     arguments = parser.parse_args()
     args = vars(arguments)
 
+    if args["p"]:
+        runner = ExperimentRunner([Experiment(folder, n_times=args["n"] or 1) for folder in args["p"]])
+        ret = runner.run()
+        print(runner.format_summary())
+        sys.exit(0 if ret else 1)
+
+    if args["w"]:
+        try:
+            ret = Sweep.run_sweep(args["w"], args["n"])
+        except RuntimeError as error:
+            print(make_colored("red", str(error)))
+            sys.exit(-1)
+        sys.exit(0 if ret else 1)
+
     for option in args.keys():
         if args[option] is not None:
             if option == "s":
                 print(" * Loading the configuration files at {0}".format(args[option]))
                 conf_reader = ConfigReader()
-                node_list = conf_reader.setup_conf(args[option])
+                node_list = conf_reader.setup_conf(args[option], args["e"])
             elif option == "t" and args[option] is True:
                 background = True
             elif option == "n":
@@ -100,12 +182,43 @@ def main():
         ndn = NDNManager(node_list, cluster.get_server_list())
         mob = MobilityManager(node_list, cluster.get_server_list(), ndn)
 
-        if background:
-            for i in range(n_times):
-                setup(ndn, net, mob)
-                ndn.start_test()
-                net.get_stats()
+        if background and args["c"]:
+            # The runner stops the experiment with SIGTERM: exit through the cleanup below
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+
+        try:
+            if background and args["c"] and not create_environment(cluster, ndn, net, mob):
+                sys.exit(1)
+
+            if background and args["points"]:
+                if not args["c"]:
+                    setup(ndn, net, mob)
+                ret = Sweep.run_points(args["s"], net, ndn, n_times)
+                sys.exit(0 if ret else 1)
+
+            if background:
+                for i in range(n_times):
+                    if i == 0 or not (MyGlobals.snapshot_restore and net.snapshot_taken and restore(ndn, net, mob)):
+                        # With -c the first setup is done by create_environment
+                        if i > 0 or not args["c"]:
+                            setup(ndn, net, mob)
+                        if MyGlobals.snapshot_restore:
+                            with Tracing.span("snapshot_containers", "phase"):
+                                net.snapshot_containers()
+                    with Tracing.span("test", "phase"):
+                        ndn.start_test()
+                    with Tracing.span("get_stats", "phase"):
+                        net.get_stats()
+                    if MyGlobals.ingest_stats:
+                        with Tracing.span("ingest", "phase"):
+                            StatsStore.ingest("{0}-{1}".format(time.strftime("%Y%m%d-%H%M%S"), i))
+                if MyGlobals.tracing:
+                    print(Tracing.format_summary())
+                    Tracing.export_chrome_trace(os.path.join(MyGlobals.log_dir, "trace.json"))
                 sys.exit(0)
+        finally:
+            if background and args["c"]:
+                clean_environment(cluster, net, mob)
 
     crackle = CrackleCmd() if any(item is None for item in [node_list, net, ndn, mob, cluster]) else CrackleCmd(node_list=node_list,
                                                                                                           net=net,
@@ -0,0 +1,81 @@
+import ipaddress
+import unittest
+from unittest import mock
+
+import Crackle.ClusterManager as ClusterManager
+import Crackle.Globals as Globals
+import Crackle.LxcUtils as LxcUtils
+
+
+class TestAddressPlan(unittest.TestCase):
+
+    def test_same_id_same_ranges(self):
+        a, b = LxcUtils.AddressPlan("exp1"), LxcUtils.AddressPlan("exp1")
+
+        self.assertEqual((a.router_network, a.gre_network), (b.router_network, b.gre_network))
+        self.assertEqual(a.get_mac_address(), b.get_mac_address())
+
+    def test_addresses_are_in_the_networks(self):
+        plan = LxcUtils.AddressPlan("exp1")
+
+        gateway = plan.get_ip_address(plan.router_network)
+        endpoint = plan.get_ip_address(LxcUtils.__gre_endpoints_network__)
+
+        self.assertIn(ipaddress.ip_address(gateway), ipaddress.ip_network(plan.router_network))
+        self.assertIn(ipaddress.ip_address(endpoint), ipaddress.ip_network(plan.gre_network))
+        self.assertEqual(ipaddress.ip_network(plan.gre_network).prefixlen, 24)
+
+
+class FakePopen:
+
+    output = ""
+    returncode = 0
+
+    def __init__(self, params, **kwargs):
+        self.params = params
+
+    def communicate(self):
+        return self.output, None
+
+
+class TestServerNamespace(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (Globals.experiment_id, LxcUtils.AddressGenerator.plan, LxcUtils.__router_network__)
+        Globals.experiment_id = "exp1"
+        LxcUtils.AddressGenerator.setup("exp1")
+
+        self.cluster = ClusterManager.ClusterManager.__new__(ClusterManager.ClusterManager)
+        self.cluster.username = "user"
+        self.cluster.logger = mock.Mock()
+
+        patch = mock.patch.object(ClusterManager, "TracedPopen", FakePopen)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        Globals.experiment_id, LxcUtils.AddressGenerator.plan, LxcUtils.__router_network__ = self.saved
+        FakePopen.output, FakePopen.returncode = "", 0
+
+    def test_free_networks(self):
+        self.assertTrue(self.cluster.check_server_namespace("server1"))
+
+    def test_own_interfaces_are_ignored(self):
+        FakePopen.output = "7: exp1int    inet 10.1.2.3/16 brd 10.1.255.255 scope global exp1int\n" \
+                           "8: exp1tep    inet 10.4.5.1/24 brd 10.4.5.255 scope global exp1tep\n"
+
+        self.assertTrue(self.cluster.check_server_namespace("server1"))
+
+    def test_networks_used_by_another_experiment(self):
+        FakePopen.output = "9: exp2int    inet 10.1.2.3/16 brd 10.1.255.255 scope global exp2int\n"
+
+        self.assertFalse(self.cluster.check_server_namespace("server1"))
+
+    def test_ssh_error(self):
+        FakePopen.returncode = 255
+
+        self.assertFalse(self.cluster.check_server_namespace("server1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
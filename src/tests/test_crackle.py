@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import Crackle.Globals as Globals
+import crackle
+
+
+class FakeGraph:
+
+    def __init__(self, failed):
+        self.failed = failed
+
+    def report(self):
+        return "report"
+
+    def failed_tasks(self):
+        return self.failed
+
+
+class FakeCluster:
+
+    def __init__(self, configured=True):
+        self.configured = configured
+        self.setup_calls = 0
+
+    def setup_cluster(self):
+        self.setup_calls += 1
+        return self.configured
+
+
+class TestEnvironment(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.log_dir = os.path.join(self.folder, "logs")
+        self.previous_log_dir = Globals.log_dir
+        Globals.log_dir = self.log_dir
+        self.net = mock.Mock(node_list={})
+        self.pipeline_calls = []
+        self.failed = []
+
+        def pipeline(node_list, net, ndn, create_containers, start_services):
+            self.pipeline_calls.append((create_containers, start_services))
+            return FakeGraph(self.failed)
+
+        patches = [mock.patch.object(crackle, "run_setup_pipeline", pipeline),
+                   mock.patch.object(crackle.time, "sleep")]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        Globals.log_dir = self.previous_log_dir
+        shutil.rmtree(self.folder)
+
+    def test_setup_empties_the_log_dir(self):
+        os.makedirs(os.path.join(self.log_dir, "r1"))
+        open(os.path.join(self.log_dir, "r1", "nfd.log"), "w").close()
+
+        self.assertTrue(crackle.setup(mock.Mock(), self.net, mock.Mock()))
+        self.assertEqual(os.listdir(self.log_dir), [])
+        self.assertEqual(self.pipeline_calls, [(False, True)])
+
+    def test_setup_creates_the_log_dir(self):
+        self.assertTrue(crackle.setup(mock.Mock(), self.net, mock.Mock(), create_containers=True))
+        self.assertTrue(os.path.isdir(self.log_dir))
+        self.assertEqual(self.pipeline_calls, [(True, False)])
+
+    def test_setup_reports_failed_tasks(self):
+        self.failed = ["links:r1"]
+        self.assertFalse(crackle.setup(mock.Mock(), self.net, mock.Mock()))
+
+    def test_create_environment(self):
+        cluster = FakeCluster()
+
+        self.assertTrue(crackle.create_environment(cluster, mock.Mock(), self.net, mock.Mock()))
+        self.assertEqual(cluster.setup_calls, 1)
+        self.assertEqual(self.pipeline_calls, [(True, False)])
+
+    def test_create_environment_stops_if_the_cluster_fails(self):
+        self.assertFalse(crackle.create_environment(FakeCluster(False), mock.Mock(), self.net, mock.Mock()))
+        self.assertEqual(self.pipeline_calls, [])
+
+    def test_clean_environment(self):
+        cluster, mobility = mock.Mock(), mock.Mock()
+        self.net.stop_containers.return_value = False
+
+        crackle.clean_environment(cluster, self.net, mobility)
+
+        mobility.kill_threads.assert_called_once_with()
+        self.net.delete_containers.assert_called_once_with()
+        cluster.clean_cluster.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
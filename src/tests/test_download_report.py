@@ -0,0 +1,40 @@
+import unittest
+
+from Crackle.NDNManager import DownloadReport
+
+
+def parse(text):
+    report = DownloadReport(None, "c1", "/a/b", 100.0, 110.0, 0)
+    report.parse(text)
+    return report
+
+
+class TestDownloadReport(unittest.TestCase):
+
+    def test_bit_rates(self):
+        self.assertEqual(parse("Throughput: 8 Mbps").throughput, 8 * 10 ** 6)
+        self.assertEqual(parse("goodput = 2.5 kbit/s").throughput, 2500)
+        self.assertEqual(parse("Rate: 3 Mb/s").throughput, 3 * 10 ** 6)
+
+    def test_byte_rates(self):
+        self.assertEqual(parse("Throughput: 1 MB/s").throughput, 8 * 10 ** 6)
+        self.assertEqual(parse("Throughput: 2 KBps").throughput, 16 * 10 ** 3)
+        self.assertEqual(parse("Throughput: 5 bytes/s").throughput, 40)
+
+    def test_throughput_from_bytes_and_time(self):
+        report = parse("Elapsed time: 2000 ms\nBytes received: 1000")
+
+        self.assertEqual(report.download_time, 2)
+        self.assertEqual(report.bytes, 1000)
+        self.assertEqual(report.throughput, 4000)
+
+    def test_missing_values(self):
+        report = parse("")
+
+        self.assertEqual(report.download_time, 10)
+        self.assertIsNone(report.throughput)
+        self.assertIsNone(report.retransmissions)
+
+
+if __name__ == "__main__":
+    unittest.main()
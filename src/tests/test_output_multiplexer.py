@@ -0,0 +1,89 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import Crackle.LxdAPI as LxdAPI
+from Crackle import Constants
+
+
+class FakeWebSocket:
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def recv(self):
+        return self.messages.pop(0) if self.messages else b""
+
+
+class TestOutputMultiplexer(unittest.TestCase):
+
+    def setUp(self):
+        self.outputs = {}
+        self.codes = {}
+        self.active = 0
+        self.max_seen = 0
+        self.lock = threading.Lock()
+
+        def start_exec(server, container, cmd, environment, websocket):
+            with self.lock:
+                self.active += 1
+                self.max_seen = max(self.max_seen, self.active)
+            return {Constants.__operation__: container,
+                    Constants.__metadata__: {Constants.__metadata__: {"fds": {}}}}
+
+        def connect_websockets(server, operation, fds):
+            return {"1": FakeWebSocket(self.outputs.get(operation, [])), "2": FakeWebSocket([])}
+
+        def wait_exec(server, container, cmd, response):
+            time.sleep(0.01)
+            with self.lock:
+                self.active -= 1
+            return True, self.codes.get(container, 0)
+
+        patches = [mock.patch.object(LxdAPI, "start_exec", start_exec),
+                   mock.patch.object(LxdAPI, "connect_websockets", connect_websockets),
+                   mock.patch.object(LxdAPI, "close_websockets", lambda sockets: None),
+                   mock.patch.object(LxdAPI, "wait_exec", wait_exec)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_multibyte_characters_split_between_messages(self):
+        text = "caffè ☕\nok\n".encode()
+        split = text.index("☕".encode()) + 1
+        self.outputs["c1"] = [text[:3], text[3:split], text[split:]]
+
+        multiplexer = LxdAPI.OutputMultiplexer(buffer_lines=10, max_active=2)
+        multiplexer.add("n1", "s1", "c1", ["cat"])
+
+        lines = [line for tag, stream, line in multiplexer if stream == LxdAPI.OutputMultiplexer.stdout]
+
+        self.assertEqual(lines, ["caffè ☕", "ok"])
+
+    def test_workers_are_limited(self):
+        multiplexer = LxdAPI.OutputMultiplexer(buffer_lines=10, max_active=3)
+
+        for i in range(50):
+            multiplexer.add("n{0}".format(i), "s1", "c{0}".format(i), ["true"])
+            self.assertLessEqual(multiplexer.workers, 3)
+
+        self.assertEqual(len(list(multiplexer)), 50)
+        self.assertLessEqual(self.max_seen, 3)
+        self.assertEqual(len(multiplexer.return_codes), 50)
+
+    def test_repeated_tags_keep_all_return_codes(self):
+        self.codes = {"c1": 0, "c2": 1}
+
+        multiplexer = LxdAPI.OutputMultiplexer(buffer_lines=10, max_active=2)
+        multiplexer.add("node", "s1", "c1", ["true"])
+        multiplexer.add("node", "s1", "c2", ["false"])
+
+        with mock.patch("builtins.print"):
+            return_codes = multiplexer.relay()
+
+        self.assertEqual(sorted(return_codes), [("node", 0), ("node", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+from collections import defaultdict
+
+import Crackle.Placement as Placement
+
+
+def graph(edges, n_nodes):
+    adjacency = [defaultdict(float) for _ in range(n_nodes)]
+    for a, b, w in edges:
+        adjacency[a][b] += w
+        adjacency[b][a] += w
+    return [1] * n_nodes, adjacency
+
+
+def clusters(n_clusters, size):
+    """
+    Build n_clusters cliques of size nodes, connected in a ring by light links.
+    """
+
+    edges = []
+    for c in range(n_clusters):
+        base = c * size
+        edges += [(base + i, base + j, 10.0) for i in range(size) for j in range(i + 1, size)]
+        edges.append((base, ((c + 1) % n_clusters) * size, 1.0))
+    return graph(edges, n_clusters * size)
+
+
+def cut(adjacency, parts):
+    return sum(w for a in range(len(adjacency)) for b, w in adjacency[a].items() if a < b and parts[a] != parts[b])
+
+
+class TestPartition(unittest.TestCase):
+
+    def test_clusters_are_not_split(self):
+        weights, adjacency = clusters(2, 4)
+        parts = Placement.partition(weights, adjacency, [4, 4], 0.0)
+
+        self.assertEqual(sorted(parts), [0, 0, 0, 0, 1, 1, 1, 1])
+        # Only the two light links of the ring between the cliques cross the servers
+        self.assertEqual(cut(adjacency, parts), 2.0)
+
+    def test_multilevel(self):
+        weights, adjacency = clusters(4, 30)
+        parts = Placement.partition(weights, adjacency, [None] * 4, 0.05)
+
+        self.assertEqual(len(parts), 120)
+        for p in range(4):
+            self.assertLessEqual(parts.count(p), 30 * 1.05)
+        self.assertLessEqual(cut(adjacency, parts), 4.0)
+
+    def test_capacities_are_respected(self):
+        weights, adjacency = clusters(3, 10)
+        parts = Placement.partition(weights, adjacency, [25, 5, None], 0.1)
+
+        self.assertLessEqual(parts.count(0), 25)
+        self.assertLessEqual(parts.count(1), 5)
+        self.assertEqual(len(parts), 30)
+
+    def test_zero_capacity_server_is_skipped(self):
+        weights, adjacency = clusters(2, 4)
+        parts = Placement.partition(weights, adjacency, [0, 8], 0.0)
+
+        self.assertEqual(parts, [1] * 8)
+
+    def test_not_enough_capacity(self):
+        weights, adjacency = clusters(2, 4)
+
+        with self.assertRaises(RuntimeError):
+            Placement.partition(weights, adjacency, [3, 4], 0.0)
+
+    def test_zero_capacities(self):
+        weights, adjacency = clusters(2, 4)
+
+        with self.assertRaises(RuntimeError):
+            Placement.partition(weights, adjacency, [0, 0], 0.0)
+        with self.assertRaises(RuntimeError):
+            Placement.partition(weights, adjacency, [0, None], 0.0)
+
+    def test_empty_topology(self):
+        self.assertEqual(Placement.partition([], [], [4, 4], 0.0), [])
+
+
+class FakeServer:
+
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+
+    def get_capacity(self):
+        return self.capacity
+
+    def __repr__(self):
+        return self.name
+
+
+class FakeNode:
+
+    def __init__(self, server=None, neighbors=()):
+        self.server = server
+        self.links = {i: FakeLink(neighbor) for i, neighbor in enumerate(neighbors)}
+
+    def get_server(self):
+        return self.server
+
+    def get_links(self):
+        return self.links
+
+
+class FakeLink:
+
+    def __init__(self, node_to):
+        self.node_to = node_to
+
+    def get_node_to(self):
+        return self.node_to
+
+
+class TestSelectServer(unittest.TestCase):
+
+    def test_zero_capacity_server_is_full(self):
+        full, free = FakeServer("full", 0), FakeServer("free", 4)
+        nodes = {"a": FakeNode(free), "b": FakeNode(free)}
+        node = FakeNode()
+
+        self.assertIs(Placement.select_server(nodes, [full, free], node), free)
+
+    def test_neighbors_on_a_full_server_are_ignored(self):
+        full, free = FakeServer("full", 0), FakeServer("free", 4)
+        neighbor = FakeNode(full)
+        node = FakeNode(neighbors=[neighbor])
+
+        self.assertIs(Placement.select_server({"a": neighbor}, [full, free], node), free)
+
+    def test_unlimited_server(self):
+        limited, unlimited = FakeServer("limited", 1), FakeServer("unlimited", None)
+        nodes = {"a": FakeNode(limited), "b": FakeNode(unlimited)}
+
+        self.assertIs(Placement.select_server(nodes, [limited, unlimited], FakeNode()), unlimited)
+
+    def test_prefers_neighbors(self):
+        a, b = FakeServer("a", 10), FakeServer("b", 10)
+        neighbor = FakeNode(b)
+        nodes = {"n1": FakeNode(a), "n2": neighbor, "n3": FakeNode(b)}
+
+        self.assertIs(Placement.select_server(nodes, [a, b], FakeNode(neighbors=[neighbor])), b)
+
+    def test_all_servers_full(self):
+        a, b = FakeServer("a", 0), FakeServer("b", 1)
+        nodes = {"n1": FakeNode(b)}
+
+        with self.assertRaises(RuntimeError):
+            Placement.select_server(nodes, [a, b], FakeNode())
+
+
+if __name__ == "__main__":
+    unittest.main()
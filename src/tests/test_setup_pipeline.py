@@ -0,0 +1,77 @@
+import unittest
+from unittest import mock
+
+import Crackle.Globals as Globals
+import Crackle.SetupPipeline as SetupPipeline
+
+
+class FakeNode:
+
+    def __init__(self, node_id, server):
+        self.node_id = node_id
+        self.server = server
+
+    def get_node_id(self):
+        return self.node_id
+
+    def get_server(self):
+        return self.server
+
+    def get_links(self):
+        return {}
+
+    def __str__(self):
+        return self.node_id
+
+
+class TestBundles(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (Globals.bundle_push, Globals.bundle_chunk_size)
+        Globals.bundle_push = 1
+
+        nodes = [FakeNode("n{0}".format(i), "s{0}".format(i % 2)) for i in range(10)]
+        self.node_list = {node.get_node_id(): node for node in nodes}
+
+    def tearDown(self):
+        Globals.bundle_push, Globals.bundle_chunk_size = self.saved
+
+    def build(self):
+        return SetupPipeline.build_setup_pipeline(self.node_list, mock.Mock(), mock.Mock())
+
+    def bundles(self, graph):
+        return {name: task for name, task in graph.tasks.items() if name.startswith("bundle:")}
+
+    def test_nodes_wait_only_for_their_chunk(self):
+        Globals.bundle_chunk_size = 2
+        graph = self.build()
+        bundles = self.bundles(graph)
+
+        # 5 nodes on each server, in chunks of 2
+        self.assertEqual(sorted(bundles), ["bundle:s0:0", "bundle:s0:1", "bundle:s0:2",
+                                           "bundle:s1:0", "bundle:s1:1", "bundle:s1:2"])
+        self.assertEqual([d for d in bundles["bundle:s0:0"].dependencies if d.startswith("spawn:")],
+                         ["spawn:n0", "spawn:n2"])
+
+        for node in ("n0", "n2"):
+            self.assertIn("bundle:s0:0", graph.tasks["start:" + node].dependencies)
+            self.assertIn("bundle:s0:0", graph.tasks["links:" + node].dependencies)
+            self.assertIn("bundle:s0:0", graph.tasks["routing-script:" + node].dependencies)
+        self.assertEqual([d for d in graph.tasks["start:n4"].dependencies if d.startswith("bundle:")],
+                         ["bundle:s0:1"])
+
+    def test_single_bundle_per_server(self):
+        Globals.bundle_chunk_size = 0
+
+        self.assertEqual(sorted(self.bundles(self.build())), ["bundle:s0:0", "bundle:s1:0"])
+
+    def test_no_bundles(self):
+        Globals.bundle_push = 0
+        graph = self.build()
+
+        self.assertEqual(self.bundles(graph), {})
+        self.assertEqual(graph.tasks["start:n0"].dependencies, ["spawn:n0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
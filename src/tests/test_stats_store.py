@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+import Crackle.StatsStore as StatsStore
+
+IFSTAT = """  Time           eth1
+HH:MM:SS   Kbps in  Kbps out
+23:59:58      1.50      2.00
+23:59:59      n/a       4.00
+00:00:00      3.00      6.00
+"""
+
+MPSTAT = """Linux 4.4.0 (r1)   01/01/2018  _x86_64_  (2 CPU)
+
+10:00:00 AM  CPU    %usr   %nice    %sys %iowait    %irq   %soft  %steal  %guest  %gnice   %idle
+10:00:01 AM  all   10.00    0.00    5.00    0.00    0.00    0.00    0.00    0.00    0.00   85.00
+10:00:01 AM    0   20.00    0.00   10.00    0.00    0.00    0.00    0.00    0.00    0.00   70.00
+12:00:02 PM  all   30.00    0.00    0.00    0.00    0.00    0.00    0.00    0.00    0.00   70.00
+Average:     all   20.00    0.00    2.50    0.00    0.00    0.00    0.00    0.00    0.00   77.50
+"""
+
+NFD_LOG = """1500000000.100 DEBUG: [Forwarder] onIncomingInterest face=260 interest=/a
+1500000000.600 DEBUG: [Forwarder] onIncomingInterest face=261 interest=/b
+1500000001.200 INFO: [FaceTable] Added face id=262
+1500000002.900 DEBUG: [Forwarder] onIncomingInterest face=260, interest=/c
+not a log line
+"""
+
+
+class TestParsers(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, name, content):
+        path = os.path.join(self.folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_time_of_day(self):
+        self.assertEqual(StatsStore.time_of_day("01:02:03"), 3723)
+        self.assertEqual(StatsStore.time_of_day("12:00:00", "AM"), 0)
+        self.assertEqual(StatsStore.time_of_day("01:00:00", "PM"), 13 * 3600)
+        self.assertIsNone(StatsStore.time_of_day("Average:"))
+
+    def test_unwrap_days(self):
+        times = StatsStore.unwrap_days(numpy.array([86398.0, 86399.0, 0.0, 1.0]))
+        self.assertEqual(times.tolist(), [86398, 86399, 86400, 86401])
+
+    def test_parse_ifstat(self):
+        columns = StatsStore.parse_ifstat(self.write("ifstat.log", IFSTAT))
+
+        self.assertEqual(columns["time"].tolist(), [86398, 86399, 86400])
+        self.assertEqual(columns["tx"].tolist(), [2000, 4000, 6000])
+        self.assertEqual(columns["rx"][0], 1500)
+        self.assertTrue(numpy.isnan(columns["rx"][1]))
+
+    def test_parse_mpstat(self):
+        columns = StatsStore.parse_mpstat(self.write("mpstat.log", MPSTAT))
+
+        self.assertEqual(columns["time"].tolist(), [36001, 36001, 43202])
+        self.assertEqual(columns["cpu"].tolist(), [-1, 0, -1])
+        self.assertEqual(columns["usr"].tolist(), [10, 20, 30])
+        self.assertEqual(columns["idle"].tolist(), [85, 70, 70])
+
+    def test_parse_nfd_log(self):
+        columns = StatsStore.parse_nfd_log(self.write("nfd.log", NFD_LOG))
+
+        self.assertEqual(len(columns["time"]), 4)
+        self.assertEqual(columns["face"].tolist(), [260, 261, -1, 260])
+        self.assertEqual(list(columns["module_values"]), ["Forwarder", "FaceTable"])
+        self.assertEqual(columns["module"].tolist(), [0, 0, 1, 0])
+        self.assertEqual(list(columns["level_values"]), ["DEBUG", "INFO"])
+
+
+class TestStore(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.log_dir = os.path.join(self.folder, "logs")
+        self.store_dir = os.path.join(self.folder, "store")
+
+        for name, content in (("r1/link_r1_r2.log", IFSTAT),
+                              ("r1/mpstat_r1.log", MPSTAT),
+                              ("r1/nfd.log", NFD_LOG),
+                              ("r1/unrelated.txt", "x"),
+                              ("r2/link_r2_r1.log", IFSTAT)):
+            path = os.path.join(self.log_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_ingest_tasks(self):
+        tasks = StatsStore.ingest_tasks(self.log_dir, "run")
+
+        self.assertEqual(sorted((os.path.relpath(destination, "run"), kind) for _, destination, kind in tasks),
+                         [("r1/cpu.npz", "mpstat"), ("r1/link_r2.npz", "ifstat"), ("r1/nfd.npz", "nfd"),
+                          ("r2/link_r1.npz", "ifstat")])
+
+    def test_ingest_and_query(self):
+        result = StatsStore.ingest("run1", self.log_dir, self.store_dir, workers=1)
+        self.assertEqual(result["files"], 4)
+        self.assertEqual(result["rows"], 3 + 3 + 4 + 3)
+
+        store = StatsStore.StatsStore(self.store_dir)
+        self.assertEqual(store.runs(), ["run1"])
+        self.assertEqual(store.nodes(), ["r1", "r2"])
+        self.assertEqual(store.links("r1"), ["r2"])
+
+        time, rx, tx = store.link_throughput("r1", "r2")
+        self.assertEqual(tx.tolist(), [2000, 4000, 6000])
+
+        time, usage = store.cpu_usage("r1")
+        self.assertEqual(usage.tolist(), [15, 30])
+        time, usage = store.cpu_usage("r1", cpu=0)
+        self.assertEqual(usage.tolist(), [30])
+
+        bins, rates = store.nfd_event_rate("r1", "onIncomingInterest")
+        self.assertEqual(rates.tolist(), [2, 0, 1])
+        bins, rates = store.nfd_event_rate("r1", "missing")
+        self.assertEqual(len(rates), 0)
+
+    def test_empty_store(self):
+        store = StatsStore.StatsStore(self.store_dir)
+
+        self.assertEqual(store.runs(), [])
+        with self.assertRaises(RuntimeError):
+            store.nodes()
+
+
+if __name__ == "__main__":
+    unittest.main()
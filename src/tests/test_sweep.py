@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import Crackle.Sweep as Sweep
+
+
+class TestParseSpec(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, parameters, sweep="base = ../Medium_Network\nn_times = 3\n"):
+        path = os.path.join(self.folder, "spec.ini")
+        with open(path, "w") as f:
+            f.write("[Sweep]\n" + sweep + "[Parameters]\n" + parameters)
+        return path
+
+    def test_valid_spec(self):
+        path = self.write("settings.test_duration = 60, 120\n"
+                          "link.shahab-mauro = 10,100\n"
+                          "strategy.* = best-route, ncc\n"
+                          "topology = topo.brite\n")
+        base, n_times, parameters = Sweep.parse_spec(path)
+
+        self.assertEqual(base, os.path.join(self.folder, "../Medium_Network"))
+        self.assertEqual(n_times, 3)
+        self.assertEqual(parameters, [("settings", "test_duration", ["60", "120"]),
+                                      ("link", "shahab-mauro", ["10", "100"]),
+                                      ("strategy", "*", ["best-route", "ncc"]),
+                                      ("topology", "", ["topo.brite"])])
+
+    def test_n_times_defaults_to_one(self):
+        _, n_times, _ = Sweep.parse_spec(self.write("cache.* = 100\n", sweep="base = .\n"))
+        self.assertEqual(n_times, 1)
+
+    def test_unknown_kind(self):
+        with self.assertRaises(RuntimeError):
+            Sweep.parse_spec(self.write("queue.shahab = 10\n"))
+
+    def test_link_without_pair(self):
+        with self.assertRaises(RuntimeError):
+            Sweep.parse_spec(self.write("link.shahab = 10\n"))
+
+    def test_missing_target(self):
+        with self.assertRaises(RuntimeError):
+            Sweep.parse_spec(self.write("cache = 10\n"))
+
+    def test_no_values(self):
+        with self.assertRaises(RuntimeError):
+            Sweep.parse_spec(self.write("cache.* = , \n"))
+
+    def test_missing_base(self):
+        with self.assertRaises(RuntimeError):
+            Sweep.parse_spec(self.write("cache.* = 10\n", sweep="n_times = 2\n"))
+
+    def test_missing_file(self):
+        with self.assertRaises(RuntimeError):
+            Sweep.parse_spec(os.path.join(self.folder, "missing.ini"))
+
+
+class TestExpand(unittest.TestCase):
+
+    def test_is_runtime(self):
+        self.assertTrue(Sweep.is_runtime("link", "a-b"))
+        self.assertTrue(Sweep.is_runtime("strategy", "*"))
+        self.assertTrue(Sweep.is_runtime("cache", "a"))
+        self.assertTrue(Sweep.is_runtime("settings", "test_duration"))
+        self.assertFalse(Sweep.is_runtime("settings", "layer2_prot"))
+        self.assertFalse(Sweep.is_runtime("settings", "file_size"))
+        self.assertFalse(Sweep.is_runtime("topology", ""))
+
+    def test_groups_by_rebuild_parameters(self):
+        groups = Sweep.expand([("settings", "layer2_prot", ["ether", "udp"]),
+                               ("cache", "*", ["10", "100", "1000"])])
+
+        self.assertEqual(list(groups), [(("settings", "layer2_prot", "ether"),),
+                                        (("settings", "layer2_prot", "udp"),)])
+        for key, points in groups.items():
+            self.assertEqual(len(points), 3)
+            self.assertTrue(all(point[0] == key[0] for point in points))
+            self.assertEqual([point[1][2] for point in points], ["10", "100", "1000"])
+
+    def test_runtime_only_sweep_is_one_group(self):
+        groups = Sweep.expand([("link", "a-b", ["1", "2"]), ("settings", "test_duration", ["60", "120"])])
+
+        self.assertEqual(list(groups), [()])
+        self.assertEqual(len(groups[()]), 4)
+
+    def test_point_name(self):
+        self.assertEqual(Sweep.point_name(7), "p007")
+        self.assertEqual(Sweep.format_parameter("topology", ""), "topology")
+        self.assertEqual(Sweep.format_parameter("cache", "*"), "cache.*")
+
+
+if __name__ == "__main__":
+    unittest.main()
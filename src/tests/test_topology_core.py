@@ -0,0 +1,116 @@
+import time
+import tracemalloc
+import unittest
+
+import Crackle.TopologyCore as TopologyCore
+
+
+class TestFib(unittest.TestCase):
+
+    def test_add_find_remove(self):
+        fib = TopologyCore.Fib()
+        fib.add(1, 10).add(2, 10).add(1, 11).add(1, 10)
+
+        self.assertEqual(len(fib), 3)
+        self.assertEqual(sorted(fib), [(1, 10), (1, 11), (2, 10)])
+        self.assertTrue(fib.contains(2, 10))
+        self.assertFalse(fib.contains(2, 11))
+
+        fib.remove(1, 10)
+
+        self.assertEqual(sorted(fib), [(1, 11), (2, 10)])
+        self.assertFalse(fib.contains(1, 10))
+
+        with self.assertRaises(KeyError):
+            fib.remove(1, 10)
+
+    def test_large_indexes(self):
+        fib = TopologyCore.Fib().add(2 ** 20, 2 ** 32 - 1).add(0, 2 ** 31)
+
+        self.assertEqual(sorted(fib), [(0, 2 ** 31), (2 ** 20, 2 ** 32 - 1)])
+        self.assertFalse(fib.contains(2 ** 20 + 1, 2 ** 32 - 1))
+
+    def test_remove_next_hop(self):
+        fib = TopologyCore.Fib()
+        for name in range(5):
+            fib.add(name % 2, name)
+
+        fib.remove_next_hop(0)
+
+        self.assertEqual(sorted(fib), [(1, 1), (1, 3)])
+
+        with self.assertRaises(KeyError):
+            fib.remove_next_hop(0)
+
+        fib.remove(1, 1)
+        fib.remove(1, 3)
+
+        with self.assertRaises(KeyError):
+            fib.remove_next_hop(1)
+
+    def test_add_is_not_quadratic(self):
+        fib = TopologyCore.Fib()
+        start = time.time()
+
+        for name in range(50000):
+            fib.add(name % 7, name)
+
+        self.assertEqual(len(fib), 50000)
+        self.assertLess(time.time() - start, 2)
+
+    def test_memory(self):
+        n_routes = 100000
+        tracemalloc.start()
+        try:
+            fib = TopologyCore.Fib()
+            for name in range(n_routes):
+                fib.add(1000 + name % 20, 100000 + name)
+            used, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # A dictionary next hop => dictionary name => route uses about 117 bytes per route
+        self.assertLess(used / n_routes, 100)
+
+    def test_clear(self):
+        fib = TopologyCore.Fib().add(1, 2)
+        fib.clear()
+
+        self.assertEqual(len(fib), 0)
+        self.assertFalse(fib.contains(1, 2))
+
+
+class TestTables(unittest.TestCase):
+
+    def test_intern(self):
+        table = TopologyCore.InternTable()
+
+        self.assertEqual(table.intern("/a"), 0)
+        self.assertEqual(table.intern("/b"), 1)
+        self.assertEqual(table.intern("/a"), 0)
+        self.assertEqual(table[1], "/b")
+        self.assertEqual(len(table), 2)
+
+    def test_link_rows_are_reused(self):
+        links = TopologyCore.LinkTable()
+        first = links.add(0, 1, 10, "10.2.0.1", "00:16:3e:00:00:01")
+        links.add(1, 0, 10, "10.2.0.2", "00:16:3e:00:00:02")
+        links.remove(first)
+
+        self.assertEqual(len(links), 1)
+        self.assertEqual(links.add(0, 2, 100, "10.2.0.3", "00:16:3e:00:00:03"), first)
+        self.assertEqual(links.capacity[first], 100)
+        self.assertEqual(links.ip_address[first], TopologyCore.ip_to_int("10.2.0.3"))
+
+    def test_clear(self):
+        TopologyCore.names.intern("/test")
+        TopologyCore.links.add(0, 1, 10, "10.2.0.1", "00:16:3e:00:00:01")
+        TopologyCore.clear()
+
+        self.assertEqual(len(TopologyCore.nodes), 0)
+        self.assertEqual(len(TopologyCore.names), 0)
+        self.assertEqual(len(TopologyCore.links), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import shutil
+import tempfile
+import unittest
+
+import Crackle.Constants as Constants
+import Crackle.Voronoi as Voronoi
+
+
+class TestVoronoi(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.saved_cache_dir = Constants.voronoi_cache_dir
+        Constants.voronoi_cache_dir = self.cache_dir
+
+    def tearDown(self):
+        Constants.voronoi_cache_dir = self.saved_cache_dir
+        shutil.rmtree(self.cache_dir)
+
+    def test_two_cells_split_the_area(self):
+        cells = Voronoi.bounded_voronoi([(2, 5), (8, 5)], [(0, 10), (0, 10)])
+
+        self.assertEqual([c["original"] for c in cells], [(2.0, 5.0), (8.0, 5.0)])
+        self.assertEqual(sorted(cells[0]["vertices"]), [(0.0, 0.0), (0.0, 10.0), (5.0, 0.0), (5.0, 10.0)])
+        self.assertEqual(sorted(cells[1]["vertices"]), [(5.0, 0.0), (5.0, 10.0), (10.0, 0.0), (10.0, 10.0)])
+
+    def test_corner_base_station(self):
+        cells = Voronoi.bounded_voronoi([(0, 0), (50, 50)], [(0, 100), (0, 100)])
+
+        self.assertEqual(sorted(cells[0]["vertices"]), [(0.0, 0.0), (0.0, 50.0), (50.0, 0.0)])
+        self.assertEqual(sorted(cells[1]["vertices"]),
+                         [(0.0, 50.0), (0.0, 100.0), (50.0, 0.0), (100.0, 0.0), (100.0, 100.0)])
+
+    def test_edge_base_stations(self):
+        cells = Voronoi.bounded_voronoi([(0, 50), (100, 50)], [(0, 100), (0, 100)])
+
+        self.assertEqual(sorted(cells[0]["vertices"]), [(0.0, 0.0), (0.0, 100.0), (50.0, 0.0), (50.0, 100.0)])
+        self.assertEqual(sorted(cells[1]["vertices"]), [(50.0, 0.0), (50.0, 100.0), (100.0, 0.0), (100.0, 100.0)])
+
+    def test_single_base_station_covers_the_area(self):
+        cells = Voronoi.bounded_voronoi([(100, 100)], [(0, 100), (0, 100)])
+
+        self.assertEqual(sorted(cells[0]["vertices"]), [(0.0, 0.0), (0.0, 100.0), (100.0, 0.0), (100.0, 100.0)])
+
+    def test_cells_cover_the_area(self):
+        points = [(0, 0), (100, 0), (0, 100), (100, 100), (0, 30), (70, 100), (100, 55), (40, 0), (50, 50),
+                  (20, 70), (80, 20)]
+        cells = Voronoi.bounded_voronoi(points, [(0, 100), (0, 100)])
+
+        def area(vertices):
+            return abs(sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(vertices, vertices[1:] + vertices[:1]))) / 2
+
+        self.assertAlmostEqual(sum(area(cell["vertices"]) for cell in cells), 100 * 100)
+        for cell in cells:
+            self.assertEqual(len(set(cell["vertices"])), len(cell["vertices"]))
+            self.assertTrue(all(0 <= x <= 100 and 0 <= y <= 100 for x, y in cell["vertices"]))
+
+    def test_base_station_outside_the_area(self):
+        with self.assertRaises(SyntaxError):
+            Voronoi.bounded_voronoi([(2, 5), (12, 5)], [(0, 10), (0, 10)])
+
+    def test_cache_key(self):
+        limits = [(0, 10), (0, 10)]
+
+        self.assertEqual(Voronoi.cache_key([(2, 5), (8, 5)], limits), Voronoi.cache_key([(8.0, 5.0), (2, 5)], limits))
+        self.assertNotEqual(Voronoi.cache_key([(2, 5), (8, 5)], limits),
+                            Voronoi.cache_key([(2, 5), (8, 5)], [(0, 10), (0, 20)]))
+
+    def test_cells_are_cached(self):
+        points, limits = [(2, 5), (8, 5), (5, 8)], [(0, 10), (0, 10)]
+        key = Voronoi.cache_key(points, limits)
+
+        self.assertIsNone(Voronoi.load_cells(key))
+
+        cells = Voronoi.compute_2d_voronoi(points, limits)
+
+        self.assertEqual(Voronoi.load_cells(key), cells)
+        self.assertEqual(Voronoi.compute_2d_voronoi(points, limits), cells)
+
+
+if __name__ == "__main__":
+    unittest.main()
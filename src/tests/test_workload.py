@@ -0,0 +1,103 @@
+import unittest
+
+import numpy
+
+import Crackle.Workload as Workload
+
+
+class FakeClient:
+
+    def __init__(self, name, arrival, popularity, start_time=0, duration=0):
+        self.name = name
+        self.arrival = arrival
+        self.popularity = popularity
+        self.start_time = start_time
+        self.duration = duration
+
+    def get_name(self):
+        return self.name
+
+    def get_arrival(self):
+        return self.arrival
+
+    def get_popularity(self):
+        return self.popularity
+
+    def get_start_time(self):
+        return self.start_time
+
+    def get_duration(self):
+        return self.duration
+
+
+class TestParsing(unittest.TestCase):
+
+    def test_arrival(self):
+        self.assertEqual(Workload.parse_arrival("Poisson_2"), ("poisson", 2.0))
+        self.assertEqual(Workload.parse_arrival("Constant_0.5"), ("constant", 0.5))
+
+        for arrival in ("Poisson", "Poisson_x", "Uniform_2", "Constant_0"):
+            with self.assertRaises(RuntimeError):
+                Workload.parse_arrival(arrival)
+
+    def test_popularity(self):
+        self.assertEqual(Workload.parse_popularity("rzipf_1.3_100"), (1.3, 100))
+
+        for popularity in ("rzipf_1.3", "uniform_1_100", "rzipf_1_0"):
+            with self.assertRaises(RuntimeError):
+                Workload.parse_popularity(popularity)
+
+    def test_zipf_probabilities(self):
+        p = Workload.zipf_probabilities(1.0, 4)
+
+        self.assertAlmostEqual(p.sum(), 1.0)
+        self.assertAlmostEqual(p[0] / p[1], 2.0)
+        self.assertTrue(numpy.all(numpy.diff(p) < 0))
+
+
+class TestTimeline(unittest.TestCase):
+
+    def test_window(self):
+        self.assertEqual(Workload.client_window(FakeClient("/a", "", "", 10, 20), 100), (10.0, 30))
+        self.assertEqual(Workload.client_window(FakeClient("/a", "", "", 10, 0), 100), (10.0, 100))
+        self.assertEqual(Workload.client_window(FakeClient("/a", "", "", 90, 20), 100), (90.0, 100))
+
+    def test_constant_arrival(self):
+        client = FakeClient("/a", "Constant_2", "rzipf_1_10", 5, 10)
+        times, ranks = Workload.sample_timeline(client, 100, numpy.random.RandomState(1))
+
+        self.assertEqual(len(times), 20)
+        self.assertAlmostEqual(times[0], 5)
+        self.assertTrue(numpy.allclose(numpy.diff(times), 0.5))
+        self.assertTrue(numpy.all((ranks >= 1) & (ranks <= 10)))
+
+    def test_poisson_arrival(self):
+        client = FakeClient("/a", "Poisson_50", "rzipf_1.2_100")
+        times, ranks = Workload.sample_timeline(client, 100, numpy.random.RandomState(2))
+
+        self.assertTrue(numpy.all(numpy.diff(times) >= 0))
+        self.assertTrue(numpy.all(times < 100))
+        self.assertAlmostEqual(len(times) / 5000.0, 1, delta=0.05)
+        # The most popular content is requested the most
+        self.assertEqual(numpy.bincount(ranks).argmax(), 1)
+
+    def test_requests(self):
+        client = FakeClient("/a/", "Constant_1", "rzipf_1_3", 0, 3)
+        requests = Workload.generate_requests("node", client, 10, numpy.random.RandomState(3))
+
+        self.assertEqual([r.time for r in requests], [0, 1, 2])
+        for request in requests:
+            self.assertIn(request.name, ("/a/1", "/a/2", "/a/3"))
+            self.assertEqual(request.node, "node")
+
+    def test_seed_is_reproducible(self):
+        client = FakeClient("/a", "Poisson_10", "rzipf_1_100")
+        first = Workload.sample_timeline(client, 10, numpy.random.RandomState(7))
+        second = Workload.sample_timeline(client, 10, numpy.random.RandomState(7))
+
+        self.assertTrue(numpy.array_equal(first[0], second[0]))
+        self.assertTrue(numpy.array_equal(first[1], second[1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
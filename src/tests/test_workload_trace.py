@@ -0,0 +1,84 @@
+import os
+import shutil
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import numpy
+
+import Crackle.Workload as Workload
+from test_workload import FakeClient
+
+
+def decode_trace(data):
+    """
+    Decode a trace as the replay driver does.
+    """
+
+    offset, names = 8, []
+    for _ in range(struct.unpack_from("!I", data, 4)[0]):
+        length = struct.unpack_from("!H", data, offset)[0]
+        names.append(data[offset + 2:offset + 2 + length].decode())
+        offset += 2 + length
+    count = struct.unpack_from("!I", data, offset)[0]
+    record = struct.Struct("<dHI")
+    records = [record.unpack_from(data, offset + 4 + i * record.size) for i in range(count)]
+    return data[:4], names, records
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.clients = [FakeClient("/a/", "Constant_2", "rzipf_1_5", 0, 2),
+                        FakeClient("/b", "Constant_1", "rzipf_1_5", 0.25, 2)]
+
+    def test_build_trace(self):
+        records = Workload.build_trace(self.clients, 10, numpy.random.RandomState(1))
+
+        self.assertEqual(len(records), 6)
+        self.assertTrue(numpy.all(numpy.diff(records["time"]) >= 0))
+        self.assertEqual(list(records["client"]), [0, 1, 0, 0, 1, 0])
+        self.assertTrue(numpy.all((records["rank"] >= 1) & (records["rank"] <= 5)))
+
+    def test_encode_trace(self):
+        records = Workload.build_trace(self.clients, 10, numpy.random.RandomState(1))
+        magic, names, decoded = decode_trace(Workload.encode_trace(self.clients, records))
+
+        self.assertEqual(magic, b"CRT1")
+        self.assertEqual(names, ["/a", "/b"])
+        self.assertEqual(decoded, [(float(r["time"]), int(r["client"]), int(r["rank"])) for r in records])
+
+    @unittest.skipIf(os.name != "posix", "the replay driver runs in Linux containers")
+    def test_replay_script(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+
+        download = os.path.join(folder, "ndn-icp-download")
+        with open(download, "w") as f:
+            f.write("#!/bin/sh\nexit 0\n")
+        os.chmod(download, stat.S_IRWXU)
+
+        trace, script = os.path.join(folder, "trace.bin"), os.path.join(folder, "replay.py")
+        clients = [FakeClient("/a", "Constant_20", "rzipf_1_5", 0, 0.2)]
+        with open(trace, "wb") as f:
+            f.write(Workload.encode_trace(clients, Workload.build_trace(clients, 1, numpy.random.RandomState(1))))
+        with open(script, "w") as f:
+            f.write(Workload.replay_script)
+
+        env = dict(os.environ, PATH=folder + os.pathsep + os.environ.get("PATH", ""))
+        output = subprocess.check_output([sys.executable, script, trace, str(time.time()), "2"], env=env)
+        lines = [line.split() for line in output.decode().splitlines()]
+
+        self.assertEqual(len(lines), 4)
+        for line in lines:
+            self.assertEqual(line[0], "0")
+            self.assertEqual(line[4], "0")
+            self.assertTrue(line[5].startswith("/a/"))
+
+
+if __name__ == "__main__":
+    unittest.main()